@@ -62,8 +62,8 @@ def get_ingestion_status(current_user: dict = Depends(get_current_user)):
                 at_risk.append({"ticker": ticker, "quarters": count})
         
         # 2. Flag Engine Status
-        # Get latest flag creation time
-        cursor.execute("SELECT MAX(created_at) as last_run FROM flags")
+        # Get latest flag write time (created_at keeps the first-triggered date)
+        cursor.execute("SELECT MAX(updated_at) as last_run FROM flags")
         last_run_row = cursor.fetchone()
         last_run = last_run_row["last_run"] if last_run_row else None
 
@@ -157,6 +157,51 @@ def get_sanity_report(current_user: dict = Depends(get_current_user)):
         cursor.close()
         conn.close()
 
+@router.get("/engine-report")
+def get_engine_report(current_user: dict = Depends(get_current_user)):
+    # RBAC: Only admin can access
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        # Latest flag engine run report (written by engine/report.py)
+        cursor.execute("SELECT report_data, updated_at FROM system_reports WHERE report_type = 'engine_run'")
+        row = cursor.fetchone()
+        if not row or not row["report_data"]:
+            raise HTTPException(status_code=404, detail="No engine run report yet")
+
+        import json
+        report = json.loads(row["report_data"]) if isinstance(row["report_data"], str) else row["report_data"]
+        report["updated_at"] = row["updated_at"]
+        return report
+
+    finally:
+        cursor.close()
+        conn.close()
+
+@router.get("/score-cache")
+def get_score_cache(current_user: dict = Depends(get_current_user)):
+    # RBAC: Only admin can access
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+
+    # Hit/miss counters of the in-process risk score cache (api/scoring.py)
+    from api.scoring import score_cache_stats
+    return score_cache_stats()
+
+@router.get("/db-pool")
+def get_db_pool(current_user: dict = Depends(get_current_user)):
+    # RBAC: Only admin can access
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+
+    # In-use / idle / waiting connections and checkout latency (db/backends/pool.py)
+    from db.connection import pool_stats
+    return pool_stats() or {"pooled": False}
+
 @router.post("/trigger-ingestion")
 def trigger_full_ingestion(background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
     # RBAC: Only admin can access
@@ -10,6 +10,21 @@ import io
 
 router = APIRouter()
 
+
+def _flag_date(f):
+    """A flag's created_at as a date (DB types or string); today if unknown."""
+    f_date_raw = f["created_at"]
+    if isinstance(f_date_raw, datetime.datetime):
+        return f_date_raw.date()
+    elif isinstance(f_date_raw, datetime.date):
+        return f_date_raw
+    elif isinstance(f_date_raw, str):
+        try:
+            return datetime.datetime.strptime(f_date_raw[:10], "%Y-%m-%d").date()
+        except ValueError:
+            return datetime.date.today()
+    return datetime.date.today()
+
 @router.get("/brokers/zerodha/login")
 def get_zerodha_login(current_user: dict = Depends(get_current_user)):
     """Get the Zerodha login URL."""
@@ -330,6 +345,8 @@ def get_portfolio_detail(portfolio_id: int, current_user: dict = Depends(get_cur
     cursor.execute("SELECT * FROM portfolios WHERE id = %s AND user_id = %s", (portfolio_id, current_user["id"]))
     pf = cursor.fetchone()
     if not pf:
+        cursor.close()
+        conn.close()
         raise HTTPException(status_code=404, detail="Portfolio not found")
         
     # 2. Get Holdings
@@ -360,50 +377,37 @@ def get_portfolio_detail(portfolio_id: int, current_user: dict = Depends(get_cur
     total_flags_active = 0
     escalating = []
     concentration_map = {}
+
+    # --- Company Risk Calculation ---
+    # One flags query and one batched scoring pass for every holding
+    from engine.risk_scores import load_flags_by_company, resolve_risk_scores
+    from .scoring import cached_risk_scores_bulk
+
+    flags_by_company = load_flags_by_company(conn, [c["id"] for c in companies], order_by="f.created_at DESC")
+    flags_by_company = {c["id"]: flags_by_company.get(c["id"], []) for c in companies}
+
+    # 1. Current Score (precomputed by the last engine run unless stale)
+    current_scores = resolve_risk_scores(conn, flags_by_company)
+
+    # 2. Previous Score: flags that existed at the end of the previous quarter
+    previous_scores = cached_risk_scores_bulk({
+        cid: [f for f in flags if _flag_date(f) <= previous_quarter_end]
+        for cid, flags in flags_by_company.items()
+    })
     
     for c in companies:
-        # Fetch ALL flags to determine history vs current
-        cursor.execute("""
-            SELECT f.flag_code, f.flag_name, f.severity, f.period_type, f.message, f.details, f.fiscal_year, f.fiscal_quarter, f.created_at, fd.category, fd.impact_weight
-            FROM flags f
-            LEFT JOIN flag_definitions fd ON f.flag_code = fd.flag_code
-            WHERE f.company_id = %s
-            ORDER BY f.created_at DESC
-        """, (c["id"],))
-        all_flags = cursor.fetchall()
-        
-        # --- Company Risk Calculation ---
-        from .scoring import calculate_risk_score
+        all_flags = flags_by_company[c["id"]]
         
         # Latest Date
         latest_flag_date = all_flags[0]["created_at"] if all_flags else None
         
-        # 1. Current Score
-        current_score_data = calculate_risk_score(all_flags)
+        current_score_data = current_scores[c["id"]]
         c_current_score = current_score_data["risk_score"]
         c_active_flags_count = len(current_score_data["processed_flags"])
         c_drivers = {}
         
-        # 2. Previous Score & Escalations
-        previous_flags = []
-        
         for f in all_flags:
-            # Parse Date matches DB types (datetime or date) or string
-            f_date_raw = f["created_at"]
-            if isinstance(f_date_raw, datetime.datetime):
-                f_date = f_date_raw.date()
-            elif isinstance(f_date_raw, datetime.date):
-                f_date = f_date_raw
-            elif isinstance(f_date_raw, str):
-                try:
-                    f_date = datetime.datetime.strptime(f_date_raw[:10], "%Y-%m-%d").date()
-                except ValueError:
-                    f_date = datetime.date.today()
-            else:
-                f_date = datetime.date.today()
-
-            if f_date <= previous_quarter_end:
-                previous_flags.append(f)
+            f_date = _flag_date(f)
             
             # 3. Escalations (New This Quarter)
             if f_date >= current_quarter_start:
@@ -426,8 +430,7 @@ def get_portfolio_detail(portfolio_id: int, current_user: dict = Depends(get_cur
                     "urgency": urgency
                 })
 
-        previous_score_data = calculate_risk_score(previous_flags)
-        c_previous_score = previous_score_data["risk_score"]
+        c_previous_score = previous_scores[c["id"]]["risk_score"]
 
         # 4. Driver Mapping
         for f in current_score_data["processed_flags"]:
@@ -538,6 +541,8 @@ def get_aggregated_health(current_user: dict = Depends(get_current_user)):
     pfs = cursor.fetchall()
     
     if not pfs:
+        cursor.close()
+        conn.close()
         return {
             "risk_score": 0,
             "risk_delta": 0,
@@ -554,6 +559,9 @@ def get_aggregated_health(current_user: dict = Depends(get_current_user)):
     total_weighted_score = 0
     total_capital = 0
     all_escalations = []
+    # Capital-weighted recorded scores of the last three quarters, oldest first
+    weighted_series = [0, 0, 0]
+    recorded_holdings = 0
     
     for pf in pfs:
         # We reuse the logic or just fetch enough to calc
@@ -569,14 +577,28 @@ def get_aggregated_health(current_user: dict = Depends(get_current_user)):
         pf_total_investment = sum(item["investment"] for item in items)
         pf_weighted_sum = 0
         
-        # Determine each company's score using the centralized logic
-        from .scoring import calculate_risk_score
+        # Determine each company's score using the centralized logic, in one batch
+        from engine.risk_history import load_score_series, acceleration_index
+        from engine.risk_scores import load_flags_by_company, resolve_risk_scores
+
+        flags_by_company = load_flags_by_company(conn, [item["company_id"] for item in items])
+        flags_by_company = {item["company_id"]: flags_by_company.get(item["company_id"], []) for item in items}
+        scores = resolve_risk_scores(conn, flags_by_company)
+        try:
+            series = load_score_series(cursor, list(flags_by_company), quarters=3)
+        except Exception:
+            series = {}
         
         for item in items:
-            cursor.execute("SELECT f.flag_code, f.flag_name, f.severity, f.period_type, f.message, f.details, f.created_at, f.fiscal_year, f.fiscal_quarter, fd.category, fd.impact_weight FROM flags f LEFT JOIN flag_definitions fd ON f.flag_code = fd.flag_code WHERE f.company_id = %s", (item["company_id"],))
-            flags = cursor.fetchall()
-            
-            c_score = calculate_risk_score(flags)["risk_score"]
+            flags = flags_by_company[item["company_id"]]
+            c_score = scores[item["company_id"]]["risk_score"]
+
+            # Quarters before the first recorded one repeat it (no change)
+            recorded = [p["risk_score"] for p in series.get(item["company_id"], [])] or [c_score]
+            recorded_holdings += len(recorded) > 1
+            recorded = [recorded[0]] * (3 - len(recorded)) + recorded
+            for i, value in enumerate(recorded):
+                weighted_series[i] += value * item["investment"]
             
             pf_weighted_sum += (c_score * item["investment"])
             
@@ -617,8 +639,20 @@ def get_aggregated_health(current_user: dict = Depends(get_current_user)):
         total_weighted_score += pf_weighted_sum
         total_capital += pf_total_investment
 
+    cursor.close()
+    conn.close()
+
     avg_weighted_score = round(total_weighted_score / total_capital) if total_capital > 0 else 0
     
+    # QoQ change and acceleration from the recorded quarterly scores
+    risk_delta = 0
+    acceleration = "Moderate" if avg_weighted_score > 30 else "Stable"
+    if recorded_holdings and total_capital > 0:
+        portfolio_series = [value / total_capital for value in weighted_series]
+        risk_delta = round(portfolio_series[-1] - portfolio_series[-2])
+        accel = acceleration_index(portfolio_series)
+        acceleration = "Accelerating" if accel > 0 else "Decelerating" if accel < 0 else "Stable"
+
     # Status Tiers
     if avg_weighted_score < 25: status = "Stable"
     elif avg_weighted_score < 50: status = "Monitoring"
@@ -634,14 +668,14 @@ def get_aggregated_health(current_user: dict = Depends(get_current_user)):
     # Aggregated Response
     return {
         "risk_score": avg_weighted_score,
-        "risk_delta": 2, # Sim for now
+        "risk_delta": risk_delta,
         "total_capital": total_capital,
         "portfolio_count": len(pfs),
         "summaries": all_portfolio_details,
         "escalations": sorted(unique_escalations.values(), key=lambda x: x["date"], reverse=True)[:10],
         "status": status,
         "escalation_prob": min(99, int(avg_weighted_score * 0.8 + 10)),
-        "acceleration": "Moderate" if avg_weighted_score > 30 else "Stable"
+        "acceleration": acceleration
     }
 
 @router.post("/{portfolio_id}/items")
@@ -5,7 +5,6 @@ All REST endpoints for the Flagium AI financial risk engine.
 """
 
 import json
-import random
 import threading
 from datetime import datetime, timedelta
 from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
@@ -22,11 +21,13 @@ router = APIRouter()
 def _query(sql, params=None, one=False):
     """Execute a SELECT query and return results as list of dicts."""
     conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute(sql, params or ())
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, params or ())
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
     if one:
         return rows[0] if rows else None
     return rows
@@ -108,6 +109,16 @@ def get_company(ticker: str, current_user: dict = Depends(get_current_user)):
         (cid,),
     )
 
+    # Precomputed TTM / growth / coverage (engine/financial_metrics.py), by period
+    from engine.financial_metrics import METRIC_COLUMNS
+    metrics = {
+        (m["year"], m["quarter"]): {col: m[col] for col in METRIC_COLUMNS}
+        for m in _query(
+            f"SELECT year, quarter, {', '.join(METRIC_COLUMNS)} FROM financial_metrics WHERE company_id = %s",
+            (cid,),
+        )
+    }
+
     # Active flags
     flags = _query(
         """SELECT f.flag_code, f.flag_name, f.severity, f.period_type, f.message, f.details, f.created_at,
@@ -118,13 +129,26 @@ def get_company(ticker: str, current_user: dict = Depends(get_current_user)):
         (cid,),
     )
 
-    from api.scoring import calculate_risk_score
-    score_data = calculate_risk_score(flags)
-    
-    # Market Data
-    latest_rev = annual[0]['revenue'] if annual else 0
-    market_cap = latest_rev * random.uniform(2.5, 6.0)
-    debt_equity = random.uniform(0.1, 2.5) if score_data['risk_score'] > 5 else random.uniform(0.0, 1.0)
+    from engine.risk_scores import resolve_risk_scores
+    from engine.sector_index import get_sector_index, PEER_METRICS
+    sector_index = get_sector_index()
+    # Precomputed by the last engine run; scored live only when stale
+    conn = get_connection()
+    try:
+        score_data = resolve_risk_scores(conn, {cid: flags}, {cid: company["sector"]}, sector_index)[cid]
+    finally:
+        conn.close()
+
+    # Peer ranks of the latest quarter's metrics (O(log n) lookups in the sector index)
+    latest_metrics = metrics.get((quarterly[0]["year"], quarterly[0]["quarter"]), {}) if quarterly else {}
+    peer_ranks = {
+        m: {
+            "value": latest_metrics.get(m),
+            "sector_percentile": sector_index.percentile(company["sector"], m, latest_metrics.get(m)),
+            "sector_median": sector_index.median(company["sector"], m),
+        }
+        for m in PEER_METRICS
+    }
 
     return {
         "company": {
@@ -133,10 +157,8 @@ def get_company(ticker: str, current_user: dict = Depends(get_current_user)):
             "name": company["name"],
             "sector": company["sector"],
             "index": company["index_name"],
-            "market_cap": market_cap,
-            "debt_to_equity": round(debt_equity, 2),
-            "beta": round(random.uniform(0.8, 1.5), 2),
         },
+        "peer_ranks": peer_ranks,
         "annual": [
             {
                 "year": r["year"],
@@ -147,6 +169,7 @@ def get_company(ticker: str, current_user: dict = Depends(get_current_user)):
                 "fcf": r["free_cash_flow"],
                 "total_debt": r["total_debt"],
                 "interest_expense": r["interest_expense"],
+                **metrics.get((r["year"], 0), {}),
             }
             for r in annual
         ],
@@ -160,6 +183,7 @@ def get_company(ticker: str, current_user: dict = Depends(get_current_user)):
                 "operating_cash_flow": r["operating_cash_flow"],
                 "free_cash_flow": r["free_cash_flow"],
                 "total_debt": r["total_debt"],
+                **metrics.get((r["year"], r["quarter"]), {}),
             }
             for r in quarterly
         ],
@@ -236,6 +260,61 @@ def list_flags(severity: str = None, user_only: bool = True, current_user: dict
     return {"count": len(rows), "flags": rows}
 
 
+# Most events returned by one /flags/changes page
+CHANGES_PAGE_LIMIT = 1000
+
+@router.get("/flags/changes", tags=["Flags"])
+def list_flag_changes(since: int = 0, limit: int = 500, user_only: bool = True,
+                      current_user: dict = Depends(get_current_user)):
+    """Flag events (raised / escalated / deescalated / cleared) after cursor `since`.
+
+    Poll with the returned `next_cursor` to receive only what changed since
+    the previous call; `has_more` means another page is already waiting.
+    The engine writes events under one lock held through the commit
+    (runner._event_feed_lock), so ids become visible in order and an id
+    below the cursor can no longer appear later.
+    """
+    limit = max(1, min(limit, CHANGES_PAGE_LIMIT))
+    # As-of runs evaluate older vintages; their results never belong in the live feed
+    where_sql = "WHERE e.id > %s AND (r.mode IS NULL OR r.mode <> 'as_of')"
+    params = [since]
+    if user_only:
+        where_sql += """
+            AND e.company_id IN (
+                SELECT pi.company_id
+                FROM portfolio_items pi
+                JOIN portfolios p ON pi.portfolio_id = p.id
+                WHERE p.user_id = %s
+            )
+        """
+        params.append(current_user["id"])
+
+    rows = _query(
+        f"""SELECT e.id, e.run_id, e.event_type, e.flag_code, e.flag_name, e.severity, e.previous_severity,
+                   e.period_type, e.fiscal_year, e.fiscal_quarter, e.message, e.created_at,
+                   c.ticker, c.name AS company_name
+            FROM flag_events e
+            JOIN companies c ON e.company_id = c.id
+            LEFT JOIN flag_runs r ON e.run_id = r.id
+            {where_sql}
+            ORDER BY e.id
+            LIMIT %s""",
+        (*params, limit + 1),
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    for r in rows:
+        if r.get("created_at"):
+            r["created_at"] = str(r["created_at"])
+
+    return {
+        "count": len(rows),
+        "next_cursor": rows[-1]["id"] if rows else since,
+        "has_more": has_more,
+        "events": rows,
+    }
+
+
 @router.get("/flags/{ticker}", tags=["Flags"])
 def get_flags_for_company(ticker: str, current_user: dict = Depends(get_current_user)):
     """Get flags for a specific company."""
@@ -277,6 +356,38 @@ def get_flags_for_company(ticker: str, current_user: dict = Depends(get_current_
 # Dashboard
 # ──────────────────────────────────────────────
 
+# Risk points per flag, matching the dashboard's per-company SQL
+_SEVERITY_POINTS = {"HIGH": 3, "MEDIUM": 2}
+
+
+def _risk_tier(score):
+    if score <= 0:
+        return "stable"
+    if score <= 3:
+        return "early_warning"
+    if score <= 6:
+        return "elevated"
+    return "high_risk"
+
+
+def _latest_run_events():
+    """flag_events written by the most recent completed engine run.
+
+    As-of runs evaluate older vintages and --ticker runs cover a single company,
+    so both are skipped (as in incremental.last_watermark).
+    """
+    return _query(
+        """SELECT e.id, e.event_type, e.flag_code, e.flag_name, e.severity, e.previous_severity,
+                  e.period_type, e.message, e.created_at, c.ticker, c.name,
+                  fd.category, fd.impact_weight
+           FROM flag_events e
+           JOIN companies c ON e.company_id = c.id
+           LEFT JOIN flag_definitions fd ON e.flag_code = fd.flag_code
+           WHERE e.run_id = (SELECT MAX(id) FROM flag_runs
+                             WHERE status = 'completed' AND mode <> 'as_of' AND ticker IS NULL)
+           ORDER BY e.id"""
+    )
+
 @router.get("/dashboard", tags=["Dashboard"])
 def dashboard(current_user: dict = Depends(get_current_user)):
     """V2 Risk Intelligence Dashboard."""
@@ -333,14 +444,7 @@ def dashboard(current_user: dict = Depends(get_current_user)):
         c["risk_score"] = int(score)
         if c.get("last_triggered"):
             c["last_triggered"] = str(c["last_triggered"])
-        if score == 0:
-            tier = "stable"
-        elif score <= 3:
-            tier = "early_warning"
-        elif score <= 6:
-            tier = "elevated"
-        else:
-            tier = "high_risk"
+        tier = _risk_tier(score)
         tiers[tier] += 1
         tier_companies[tier].append(c["ticker"])
         c["tier"] = tier
@@ -360,17 +464,21 @@ def dashboard(current_user: dict = Depends(get_current_user)):
     # ── Most At-Risk Companies (top 10) ──
     most_at_risk = [c for c in company_flags if (c["risk_score"] or 0) > 0][:10]
 
-    # ── New Deteriorations (flags from current quarter / most recent scan) ──
-    # Since we don't have historical scans yet, treat all flags as "current quarter"
-    new_flags = _query(
-        """SELECT c.ticker, c.name, f.flag_code, f.flag_name, f.severity, f.period_type, f.message,
-                  f.created_at, fd.category, fd.impact_weight
-           FROM flags f 
-           JOIN companies c ON f.company_id = c.id
-           LEFT JOIN flag_definitions fd ON f.flag_code = fd.flag_code
-           ORDER BY f.severity DESC, f.created_at DESC
-           LIMIT 15"""
-    )
+    # Their company-page risk score and status, scored together in one batch
+    from engine.risk_scores import load_flags_by_company, resolve_risk_scores
+    conn = get_connection()
+    try:
+        flags_by_company = load_flags_by_company(conn, [c["id"] for c in most_at_risk])
+        analysis = resolve_risk_scores(conn, {c["id"]: flags_by_company.get(c["id"], []) for c in most_at_risk})
+    finally:
+        conn.close()
+
+    # ── New Deteriorations (flags raised / escalated by the latest engine run) ──
+    events = _latest_run_events()
+    new_flags = [
+        e for e in sorted(events, key=lambda e: (-_SEVERITY_POINTS.get(e["severity"], 1), -e["id"]))
+        if e["event_type"] in ("raised", "escalated")
+    ][:15]
     for nf in new_flags:
         if nf.get("created_at"):
             nf["created_at"] = str(nf["created_at"])
@@ -387,14 +495,39 @@ def dashboard(current_user: dict = Depends(get_current_user)):
         else:
             new_by_company[tk]["medium_count"] += 1
 
-    # ── QoQ Delta Simulation (since we don't have history yet) ──
-    # Simulating a "previous quarter" state to show movement
+    # ── Deltas vs. the state before that run ──
+    # Undo the run's events to get each company's previous flag count and score
+    severity_delta = {"HIGH": 0, "MEDIUM": 0}
+    company_delta = {}
+    for e in events:
+        before = None if e["event_type"] == "raised" else e["previous_severity"]
+        after = None if e["event_type"] == "cleared" else e["severity"]
+        d = company_delta.setdefault(e["ticker"], {"count": 0, "score": 0})
+        d["count"] += (after is not None) - (before is not None)
+        d["score"] += (_SEVERITY_POINTS.get(after, 1) if after else 0) - (_SEVERITY_POINTS.get(before, 1) if before else 0)
+        for sev, change in ((after, 1), (before, -1)):
+            if sev in severity_delta:
+                severity_delta[sev] += change
+
+    previous_tier = {}
+    tiers_baseline = dict(tiers)
+    flagged_baseline = stats["flagged_companies"]
+    for c in company_flags:
+        d = company_delta.get(c["ticker"])
+        if not d:
+            continue
+        previous_tier[c["ticker"]] = _risk_tier(c["risk_score"] - d["score"])
+        tiers_baseline[c["tier"]] -= 1
+        tiers_baseline[previous_tier[c["ticker"]]] += 1
+        flagged_baseline += (c["flag_count"] - d["count"] > 0) - (c["flag_count"] > 0)
+
+    baseline_weighted = (high_flags - severity_delta["HIGH"]) * 3 + (medium_flags - severity_delta["MEDIUM"]) * 2
     baseline = {
-        "risk_density": max(0, risk_density - 0.12),
-        "total_flags": max(0, total_flags - 5),
-        "high_flags": max(0, high_flags - 2),
-        "medium_flags": max(0, medium_flags - 3),
-        "flagged_companies": max(0, stats["flagged_companies"] - 4)
+        "risk_density": round(baseline_weighted / total_companies, 2) if total_companies else 0,
+        "total_flags": total_flags - sum(d["count"] for d in company_delta.values()),
+        "high_flags": high_flags - severity_delta["HIGH"],
+        "medium_flags": medium_flags - severity_delta["MEDIUM"],
+        "flagged_companies": flagged_baseline,
     }
 
     # ── Narrative Intelligence ──
@@ -407,23 +540,19 @@ def dashboard(current_user: dict = Depends(get_current_user)):
         narrative = f"{len(new_flags)} new deterioration signals detected since last scan."
 
     # ── History for Sparkline ──
-    # Simulated 6-quarter trend ending in current risk_density
-    rd_history = [
-        round(max(0.5, risk_density - 0.4), 2),
-        round(max(0.6, risk_density - 0.35), 2),
-        round(max(0.7, risk_density - 0.2), 2),
-        round(max(0.8, risk_density - 0.15), 2),
-        round(max(0.9, risk_density - 0.05), 2),
-        risk_density
-    ]
-
-    # Health Deltas (Simulated)
-    tiers_baseline = {
-        "stable": tiers["stable"] + 2,
-        "early_warning": max(0, tiers["early_warning"] - 1),
-        "elevated": max(0, tiers["elevated"] - 1),
-        "high_risk": max(0, tiers["high_risk"] - 0) # Assumes high risk is new
-    }
+    # Universe risk density recorded by the engine for the last quarters (risk_density_history)
+    from engine.risk_history import load_density_series, acceleration_index
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        density_series = load_density_series(cursor)
+    except Exception:
+        density_series = []
+    finally:
+        cursor.close()
+        conn.close()
+    rd_history = [round(r["risk_density"], 2) for r in density_series] or [risk_density]
+    rd_acceleration = acceleration_index(rd_history)
 
     # ── Enrich New Deteriorations ──
     # Add trigger details and previous status for the UI
@@ -433,12 +562,12 @@ def dashboard(current_user: dict = Depends(get_current_user)):
         # Find the specific flag that triggered this
         trigger = next((f for f in new_flags if f["ticker"] == tk), None)
         trigger_name = trigger["flag_name"] if trigger else "Multiple Signals"
-        
+
         enriched_deteriorations.append({
             **company,
             "trigger_name": trigger_name,
-            "previous_tier": "stable", # Simulated for now
-            "badge": "New"
+            "previous_tier": previous_tier.get(tk, "stable"),
+            "badge": "New" if trigger and trigger["event_type"] == "raised" else "Escalated"
         })
 
     return {
@@ -460,7 +589,12 @@ def dashboard(current_user: dict = Depends(get_current_user)):
             "delta_high": high_flags - baseline["high_flags"],
             "delta_medium": medium_flags - baseline["medium_flags"],
             "delta_companies": stats["flagged_companies"] - baseline["flagged_companies"],
-            "is_baseline": False, # Now we show movement
+            "is_baseline": not events,  # no engine run with changes recorded yet
+            # Recorded quarterly series
+            "rd_history": rd_history,
+            "rd_periods": [f"Q{r['quarter']} FY{r['year']}" for r in density_series],
+            "delta_density_qoq": round(rd_history[-1] - rd_history[-2], 2) if len(rd_history) > 1 else None,
+            "acceleration_index": round(rd_acceleration, 2) if rd_acceleration is not None else None,
         },
         # Section 2: Portfolio Health
         "portfolio_health": {
@@ -498,6 +632,8 @@ def dashboard(current_user: dict = Depends(get_current_user)):
                 "highest_severity": c["highest_severity"],
                 "last_triggered": c["last_triggered"],
                 "tier": c["tier"],
+                "analysis_score": analysis[c["id"]]["risk_score"],
+                "analysis_status": analysis[c["id"]]["status"],
                 "period_types": c.get("period_types", ""),
             }
             for c in most_at_risk
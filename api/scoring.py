@@ -1,13 +1,16 @@
+import datetime
+import hashlib
 import json
-import random
+import threading
+from collections import OrderedDict
 
-def calculate_risk_score(flags):
+import numpy as np
+
+def process_flags(flags):
     """
-    Centralized function to calculate the company risk score and related insights.
-    Returns a dictionary containing the risk_score, status, timeline, narrative, 
-    and predictive analytics based on the provided flags.
-    
-    This function handles deduplication, score weighting, and capping.
+    Deduplicate flags by flag_code and enrich them for display: decoded
+    details, category / impact weight defaults, explanation and
+    first-triggered label. Returns new dicts; the input rows are not mutated.
     """
     # 1. Deduplicate flags by flag_code
     unique_flag_map = {}
@@ -15,15 +18,8 @@ def calculate_risk_score(flags):
         if f["flag_code"] not in unique_flag_map:
             unique_flag_map[f["flag_code"]] = dict(f) # create a copy to avoid mutating original list safely
             
-    unique_flags = list(unique_flag_map.values())
-    
     processed_flags = []
-    cat_scores = {"Balance Sheet Stress": 0, "Earnings Quality": 0, "Governance": 0}
-    max_cat_scores = {"Balance Sheet Stress": 25, "Earnings Quality": 20, "Governance": 20}
-    
-    total_risk_weight = 0
-    
-    for f in unique_flags:
+    for f in unique_flag_map.values():
         if isinstance(f.get("details"), str):
             f["details"] = json.loads(f["details"])
         if f.get("created_at"):
@@ -32,11 +28,8 @@ def calculate_risk_score(flags):
             f["period_type"] = "annual"
             
         # Enrichment (Values now come directly from flag_definitions DB join)
-        cat = f.get('category') or "Other Risk"
-        impact = f.get('impact_weight') or 10
-        
-        f['category'] = cat
-        f['impact_weight'] = impact
+        f['category'] = f.get('category') or "Other Risk"
+        f['impact_weight'] = f.get('impact_weight') or 10
         f['explanation'] = f.get('message') or f.get('description') or 'Flag triggered based on thresholds.'
         f['threshold_breached'] = 'Limit Breached'
         f['occurrences'] = 1 
@@ -52,13 +45,45 @@ def calculate_risk_score(flags):
             created = f.get('created_at', '')
             f['first_triggered'] = str(created)[:10] if created else "Unknown"
         f['percentile'] = 50 
-        
+        f['duration_quarters'] = 1
+
         processed_flags.append(f)
-        
+    return processed_flags
+
+
+def calculate_risk_score(flags, sector=None, sector_index=None, history=None):
+    """
+    Centralized function to calculate the company risk score and related insights.
+    Returns a dictionary containing the risk_score, status, timeline, narrative, 
+    and predictive analytics based on the provided flags.
+    
+    This function handles deduplication, score weighting, and capping.
+
+    With a `sector_index` (engine.sector_index.SectorIndex), structural scores
+    and the risk score are ranked against the company's `sector` peers;
+    without one the sector fields are None.
+
+    `history` is the company's recorded 6-quarter score series, oldest first
+    (engine.risk_history); without it the series is rebuilt from `flags`.
+    """
+    processed_flags = process_flags(flags)
+    return _assemble(processed_flags, *_score_numbers(processed_flags, history), sector, sector_index)
+
+
+def _score_numbers(processed_flags, history=None):
+    """The numeric part of a score: (cat_scores, risk_score, history, projected_base,
+    projected_stress, escalation_prob, acceleration, delta_qoq)."""
+    cat_scores = dict.fromkeys(DEFAULT_CATEGORIES, 0)
+    
+    total_risk_weight = 0
+    
+    for f in processed_flags:
+        cat = f['category']
+        impact = f['impact_weight']
+
         # Risk Score Logic  
         weight = 15 if impact >= 5 else 10
         total_risk_weight += weight
-        f['duration_quarters'] = 1
         
         if cat not in cat_scores:
             cat_scores[cat] = 0
@@ -67,23 +92,154 @@ def calculate_risk_score(flags):
     # 0-100 Scale
     risk_score = min(100, total_risk_weight)
     
-    # Risk Classification
-    if risk_score >= 60:
-        status = "Structural Deterioration"
-    elif risk_score >= 35:
-        status = "Early Stress"
-    elif risk_score >= 15:
-        status = "Watchlist"
-    else:
-        status = "Stable"
+    # Recorded quarterly scores when given, else rebuilt from the flags
+    if history is None:
+        history = _reconstruct_history(processed_flags)
+    history = list(history)
+
+    # Predictive Mathematics (V6)
+    slope = (history[-1] - history[0]) / 5
+    volatility = sum([abs(history[i] - history[i-1]) for i in range(1, len(history))]) / 5
+    
+    projected_base = min(100, int(risk_score + slope * 1.5))
+    projected_stress = min(100, int(risk_score + (slope * 2) + (volatility * 2)))
+    escalation_prob = min(99, int((projected_stress / 100) * 80 + 20)) if slope > 0 else 15
+    
+    acceleration = 0
+    for i in range(len(history)-1, 0, -1):
+        if history[i] > history[i-1]:
+            acceleration += 1
+        else:
+            break
+
+    return cat_scores, risk_score, history, projected_base, projected_stress, escalation_prob, acceleration, int(slope)
+
+
+def calculate_risk_scores_bulk(flags_by_company, sectors=None, sector_index=None, histories=None):
+    """
+    calculate_risk_score() for many companies in one pass.
+
+    Every company's deduplicated flags go into one flat array, so the
+    weights, category totals and the 6-quarter history matrix are computed
+    for all companies together; only the output dicts are built per company.
+
+    Args:
+        flags_by_company: {company_id: [flag rows]}
+        sectors: {company_id: sector}, used with `sector_index`.
+        sector_index: engine.sector_index.SectorIndex for the sector ranks.
+        histories: {company_id: recorded 6-quarter series}, used in place of
+            the rebuilt history for those companies.
+
+    Returns:
+        {company_id: score dict}, each identical to calculate_risk_score()'s.
+    """
+    company_ids = list(flags_by_company)
+    if not company_ids:
+        return {}
+    sectors = sectors or {}
+    histories = histories or {}
+    processed = [process_flags(flags_by_company[cid]) for cid in company_ids]
+    numbers = _bulk_score_numbers(processed, [histories.get(cid) for cid in company_ids])
+    return {
+        cid: _assemble(flags, *values, sectors.get(cid), sector_index)
+        for cid, flags, values in zip(company_ids, processed, numbers)
+    }
+
+
+def _bulk_score_numbers(processed, histories):
+    """_score_numbers() for many companies' processed flags in one vectorized pass.
+
+    `histories` holds each company's recorded series, or None to rebuild it.
+    """
+    n = len(processed)
+    if not n:
+        return []
+    rows = [f for flags in processed for f in flags]
+    owner = np.repeat(np.arange(n), [len(flags) for flags in processed])
+    weight = np.array([15 if f["impact_weight"] >= 5 else 10 for f in rows], dtype=np.int64)
+    fy = np.array([f.get("fiscal_year") or 0 for f in rows], dtype=np.int64)
+    fq = np.array([f.get("fiscal_quarter") or 0 for f in rows], dtype=np.int64)
+    category_pos = {c: i for i, c in enumerate(DEFAULT_CATEGORIES)}
+    category = np.array([category_pos.setdefault(f["category"], len(category_pos)) for f in rows], dtype=np.int64)
+    categories = list(category_pos)
+
+    risk_scores = np.minimum(100, np.bincount(owner, weights=weight, minlength=n).astype(np.int64))
+    cat_totals = np.zeros((n, len(categories)), dtype=np.int64)
+    np.add.at(cat_totals, (owner, category), weight)
+    # Extra categories keep the order they first appear in, as in the dict version
+    first_seen = np.full((n, len(categories)), len(rows))
+    np.minimum.at(first_seen, (owner, category), np.arange(len(rows)))
+
+    # Current quarter per company. A flag missing its year or quarter borrows
+    # the running value, so this scan is order-dependent and stays sequential.
+    anchors = [current_quarter()] * n
+    for i, y, q in zip(owner.tolist(), fy.tolist(), fq.tolist()):
+        curr_y, curr_q = anchors[i]
+        y, q = y or curr_y, q or curr_q
+        if y > curr_y or (y == curr_y and q > curr_q):
+            anchors[i] = (y, q)
+    anchor_y, anchor_q = np.array(anchors, dtype=np.int64).reshape(n, 2).T
+
+    # A flag counts from the history column of the quarter it was raised in
+    anchor = anchor_y * 4 + anchor_q - 1
+    period = np.where(fy > 0, fy, anchor_y[owner]) * 4 + np.where(fq > 0, fq, anchor_q[owner]) - 1
+    start = np.clip(HISTORY_QUARTERS - 1 - (anchor[owner] - period), 0, HISTORY_QUARTERS)
+    starts = np.zeros((n, HISTORY_QUARTERS + 1), dtype=np.int64)
+    np.add.at(starts, (owner, start), weight)
+    history = np.minimum(100, np.cumsum(starts, axis=1)[:, :HISTORY_QUARTERS])
+    for i, recorded in enumerate(histories):
+        if recorded is not None:
+            history[i] = recorded
 
+    # Predictive Mathematics (V6)
+    slope = (history[:, -1] - history[:, 0]) / 5
+    volatility = np.abs(np.diff(history, axis=1)).sum(axis=1) / 5
+    projected_base = np.minimum(100, np.trunc(risk_scores + slope * 1.5)).astype(np.int64)
+    projected_stress = np.minimum(100, np.trunc(risk_scores + (slope * 2) + (volatility * 2))).astype(np.int64)
+    escalation_prob = np.where(
+        slope > 0, np.minimum(99, np.trunc((projected_stress / 100) * 80 + 20)), 15
+    ).astype(np.int64)
+    rising = history[:, 1:] > history[:, :-1]
+    acceleration = np.cumprod(rising[:, ::-1], axis=1).sum(axis=1)
+    delta_qoq = np.trunc(slope).astype(np.int64)
+
+    cat_totals, first_seen = cat_totals.tolist(), first_seen.tolist()
+    numbers = zip(
+        risk_scores.tolist(), history.tolist(), projected_base.tolist(), projected_stress.tolist(),
+        escalation_prob.tolist(), acceleration.tolist(), delta_qoq.tolist()
+    )
+    results = []
+    for i, (risk_score, *values) in enumerate(numbers):
+        cat_scores = dict(zip(DEFAULT_CATEGORIES, cat_totals[i]))
+        extra = [j for j in range(len(DEFAULT_CATEGORIES), len(categories)) if first_seen[i][j] < len(rows)]
+        for j in sorted(extra, key=first_seen[i].__getitem__):
+            cat_scores[categories[j]] = cat_totals[i][j]
+        results.append((cat_scores, risk_score, *values))
+    return results
+
+
+# ──────────────────────────────────────────────
+# Shared by the single and bulk scorers
+# ──────────────────────────────────────────────
+
+DEFAULT_CATEGORIES = ("Balance Sheet Stress", "Earnings Quality", "Governance")
+MAX_CATEGORY_SCORES = {"Balance Sheet Stress": 25, "Earnings Quality": 20, "Governance": 20}
+
+HISTORY_QUARTERS = 6
+
+
+def current_quarter(day=None):
+    """(year, quarter) of `day` (default today): the earliest quarter a rebuilt history ends at."""
+    day = day or datetime.date.today()
+    return day.year, (day.month - 1) // 3 + 1
+
+
+def _reconstruct_history(unique_flags):
+    """6-quarter score history rebuilt from the current flags, oldest first."""
     # Real History Calculation (Last 6 Quarters)
     # We iterate backwards in time by fiscal quarters. A flag is active in a historical quarter 
     # if its fiscal_year/quarter is before or equal to that target quarter.
-    import datetime
-    today = datetime.date.today()
-    curr_y = today.year
-    curr_q = (today.month - 1) // 3 + 1
+    curr_y, curr_q = current_quarter()
     
     # Adjust current quarter if dataset has a newer one (e.g. Indian FYs)
     for f in unique_flags:
@@ -115,22 +271,24 @@ def calculate_risk_score(flags):
                 historical_score += 15 if impact >= 5 else 10
                 
         history.append(min(100, historical_score))
-        
-    # Predictive Mathematics (V6)
-    slope = (history[-1] - history[0]) / 5
-    volatility = sum([abs(history[i] - history[i-1]) for i in range(1, len(history))]) / 5
-    
-    projected_base = min(100, int(risk_score + slope * 1.5))
-    projected_stress = min(100, int(risk_score + (slope * 2) + (volatility * 2)))
-    escalation_prob = min(99, int((projected_stress / 100) * 80 + 20)) if slope > 0 else 15
-    
-    acceleration = 0
-    for i in range(len(history)-1, 0, -1):
-        if history[i] > history[i-1]:
-            acceleration += 1
-        else:
-            break
 
+    return history
+
+
+def _status(risk_score):
+    if risk_score >= 60:
+        return "Structural Deterioration"
+    elif risk_score >= 35:
+        return "Early Stress"
+    elif risk_score >= 15:
+        return "Watchlist"
+    return "Stable"
+
+
+def _assemble(processed_flags, cat_scores, risk_score, history,
+              projected_base, projected_stress, escalation_prob, acceleration, delta_qoq,
+              sector, sector_index):
+    """The score dict from the computed numbers: narrative, timeline, structural scores."""
     # Institutional Narrative (V6 Cause + Consequence)
     primary_driver = max(cat_scores, key=cat_scores.get) if risk_score > 0 else "No Active Risk"
     if risk_score > 50:
@@ -152,26 +310,27 @@ def calculate_risk_score(flags):
         
     structural_scores = {}
     for cat, curr_score in cat_scores.items():
-        max_score = max_cat_scores.get(cat, 20)
+        max_score = MAX_CATEGORY_SCORES.get(cat, 20)
+        score = round(10 - (curr_score / 5), 1)
         pct = max(0, 100 - (curr_score / max_score) * 100)
         structural_scores[cat] = {
-            "score": round(10 - (curr_score / 5), 1),
+            "score": score,
             "percentile": round(pct),
-            "sector_median": round(random.uniform(4.5, 7.5), 1)
+            "sector_median": None
         }
-        
+
     predictive = {
         "projected_base": projected_base,
         "projected_stress": projected_stress,
         "escalation_prob": escalation_prob,
         "acceleration": acceleration,
-        "delta_qoq": int(slope),
-        "sector_percentile": random.randint(10, 99) if risk_score > 5 else random.randint(80, 99)
+        "delta_qoq": delta_qoq,
+        "sector_percentile": None
     }
 
-    return {
+    return rank_in_sector({
         "risk_score": risk_score,
-        "status": status,
+        "status": _status(risk_score),
         "history": history,
         "narrative": narrative,
         "timeline": timeline,
@@ -179,4 +338,154 @@ def calculate_risk_score(flags):
         "structural_scores": structural_scores,
         "processed_flags": processed_flags,
         "primary_driver": primary_driver
+    }, sector, sector_index)
+
+
+def rank_in_sector(score, sector, sector_index):
+    """Fill a score dict's sector fields from `sector_index`, in place; returns `score`.
+
+    Lets a score computed without an index (e.g. the one feeding the index
+    rebuild) be ranked afterwards instead of scored again.
+    """
+    if sector_index is None:
+        return score
+    for cat, structural in score["structural_scores"].items():
+        metric = f"category:{cat}"
+        peer_pct = sector_index.percentile(sector, metric, structural["score"])
+        if peer_pct is not None:
+            structural["percentile"] = round(peer_pct)
+        sector_median = sector_index.median(sector, metric)
+        structural["sector_median"] = round(sector_median, 1) if sector_median is not None else None
+    score["predictive"]["sector_percentile"] = sector_index.percentile(
+        sector, "risk_score", score["risk_score"], lower_is_better=True
+    )
+    return score
+
+
+# ──────────────────────────────────────────────
+# Memoization
+# ──────────────────────────────────────────────
+
+# Flag fields the numeric part of a score depends on. Companies with the same
+# flag combination share an entry; the enriched flags, timeline, narrative
+# and sector ranks are assembled per call.
+FINGERPRINT_FIELDS = ("flag_code", "severity", "fiscal_year", "fiscal_quarter", "impact_weight", "category")
+
+SCORE_CACHE_SIZE = 4096
+
+_score_cache = OrderedDict()
+_cache_state = {"hits": 0, "misses": 0, "evictions": 0, "run_id": None}
+_cache_lock = threading.Lock()
+
+
+def flag_fingerprint(processed_flags):
+    """Hashable fingerprint of process_flags() output: FINGERPRINT_FIELDS of every row, in order.
+
+    The tuple itself is the key (no collisions); rows holding unhashable
+    values are reduced to a digest of their repr.
+    """
+    rows = tuple(tuple(f.get(field) for field in FINGERPRINT_FIELDS) for f in processed_flags)
+    try:
+        hash(rows)
+        return rows
+    except TypeError:
+        return hashlib.blake2b(repr(rows).encode(), digest_size=16).hexdigest()
+
+
+def _cache_key(processed_flags, history):
+    # The rebuilt history is anchored to today's quarter
+    return flag_fingerprint(processed_flags), tuple(history) if history is not None else None, datetime.date.today()
+
+
+def _cache_get(key):
+    with _cache_lock:
+        numbers = _score_cache.get(key)
+        if numbers is None:
+            _cache_state["misses"] += 1
+            return None
+        _score_cache.move_to_end(key)
+        _cache_state["hits"] += 1
+        return numbers
+
+
+def _cache_put(key, numbers):
+    with _cache_lock:
+        _score_cache[key] = numbers
+        _score_cache.move_to_end(key)
+        while len(_score_cache) > SCORE_CACHE_SIZE:
+            _score_cache.popitem(last=False)
+            _cache_state["evictions"] += 1
+    return numbers
+
+
+def _assemble_cached(processed_flags, numbers, sector, sector_index):
+    cat_scores, risk_score, history, *rest = numbers
+    return _assemble(processed_flags, dict(cat_scores), risk_score, list(history), *rest, sector, sector_index)
+
+
+def cached_risk_score(flags, sector=None, sector_index=None, history=None):
+    """calculate_risk_score() with its numeric part memoized on the flag fingerprint (LRU, SCORE_CACHE_SIZE)."""
+    processed_flags = process_flags(flags)
+    key = _cache_key(processed_flags, history)
+    numbers = _cache_get(key)
+    if numbers is None:
+        numbers = _cache_put(key, _score_numbers(processed_flags, history))
+    return _assemble_cached(processed_flags, numbers, sector, sector_index)
+
+
+def cached_risk_scores_bulk(flags_by_company, sectors=None, sector_index=None, histories=None):
+    """calculate_risk_scores_bulk() through the same cache; only misses are scored."""
+    sectors = sectors or {}
+    histories = histories or {}
+    processed = {cid: process_flags(flags) for cid, flags in flags_by_company.items()}
+    keys = {cid: _cache_key(flags, histories.get(cid)) for cid, flags in processed.items()}
+    # One lookup per distinct key, so companies sharing a flag combination are scored once
+    by_key, misses = {}, {}
+    for cid, key in keys.items():
+        if key in by_key or key in misses:
+            continue
+        cached = _cache_get(key)
+        if cached is None:
+            misses[key] = cid
+        else:
+            by_key[key] = cached
+    scored = _bulk_score_numbers([processed[cid] for cid in misses.values()],
+                                 [histories.get(cid) for cid in misses.values()])
+    for key, values in zip(misses, scored):
+        by_key[key] = _cache_put(key, values)
+    return {
+        cid: _assemble_cached(processed[cid], by_key[keys[cid]], sectors.get(cid), sector_index)
+        for cid in flags_by_company
     }
+
+
+def invalidate_score_cache(run_id=None):
+    """Drop every cached score when the engine run id moves on (always, without one).
+
+    The engine runs in its own process, so this is driven from the API side:
+    engine.risk_scores.resolve_risk_scores() calls it with the newest run_id
+    it reads from company_risk_scores.
+
+    Returns:
+        True if the cache was cleared.
+    """
+    with _cache_lock:
+        if run_id is not None and run_id == _cache_state["run_id"]:
+            return False
+        if run_id is not None and _cache_state["run_id"] is not None and run_id < _cache_state["run_id"]:
+            return False
+        _score_cache.clear()
+        _cache_state["run_id"] = run_id
+        return True
+
+
+def score_cache_stats():
+    """Hit/miss counters and size of the score cache."""
+    with _cache_lock:
+        lookups = _cache_state["hits"] + _cache_state["misses"]
+        return {
+            **_cache_state,
+            "size": len(_score_cache),
+            "capacity": SCORE_CACHE_SIZE,
+            "hit_rate": round(_cache_state["hits"] / lookups, 3) if lookups else None,
+        }
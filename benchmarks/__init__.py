@@ -0,0 +1 @@
+"""Synthetic-data benchmarks for the flag engine (see benchmarks/run.py)."""
@@ -0,0 +1,63 @@
+"""
+Flagium — Benchmark Databases
+
+Builds a local database (db/backends: SQLite or DuckDB) holding a synthetic
+universe, so the benchmarks time `run_flags` end to end without a MySQL
+server. The engine reaches it through its normal get_connection() once
+DB_BACKEND / DB_PATH point at the file.
+"""
+
+from db.backends import connect
+from db.backends.base import sync_sequences
+from engine.history import FINANCIAL_COLUMNS
+
+_COMPANY_COLUMNS = ("id", "name", "ticker", "sector")
+_FINANCIAL_COLUMNS = ("company_id", "year", "quarter") + FINANCIAL_COLUMNS
+
+# Rows per executemany() batch while loading
+LOAD_BATCH = 10000
+
+
+def _insert_sql(table, columns):
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+
+
+def create_database(path, companies, rows, backend="sqlite"):
+    """Create the schema at `path` and bulk-load a (synthetic) universe."""
+    conn = connect(backend, path)
+    cursor = conn.cursor()
+    try:
+        if backend == "duckdb":
+            # Columnar engine: one INSERT ... SELECT from a DataFrame beats executemany
+            import pandas as pd
+            raw = conn.native
+            for table, columns, data in (("companies", _COMPANY_COLUMNS, companies),
+                                         ("financials", _FINANCIAL_COLUMNS, rows)):
+                frame = pd.DataFrame(data, columns=list(columns))
+                raw.register("_bench_load", frame)
+                cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) SELECT * FROM _bench_load")
+                raw.unregister("_bench_load")
+        else:
+            cursor.executemany(_insert_sql("companies", _COMPANY_COLUMNS),
+                               [tuple(c[k] for k in _COMPANY_COLUMNS) for c in companies])
+            for start in range(0, len(rows), LOAD_BATCH):
+                cursor.executemany(_insert_sql("financials", _FINANCIAL_COLUMNS),
+                                   [tuple(r[k] for k in _FINANCIAL_COLUMNS) for r in rows[start:start + LOAD_BATCH]])
+        conn.commit()
+        sync_sequences(conn)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def reset_outputs(path, backend="sqlite"):
+    """Clear everything the engine writes, so each timed run starts cold."""
+    conn = connect(backend, path)
+    cursor = conn.cursor()
+    try:
+        for table in ("flags", "flag_runs", "system_jobs", "system_reports"):
+            cursor.execute(f"DELETE FROM {table}")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
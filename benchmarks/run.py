@@ -0,0 +1,243 @@
+"""
+Flagium — Engine Benchmark Suite
+
+Times `run_flags` end to end over synthetic universes (benchmarks/synthetic.py)
+loaded into a local SQLite or DuckDB database (db/backends,
+benchmarks/local_db.py), once per execution mode:
+
+    row         per-flag SQL queries (the default scheduled run)
+    preload     one bulk read, flags evaluated on in-memory histories
+    vectorized  panel/array evaluation of batch-capable flags
+    sharded     vectorized, split by company-id range across --workers
+
+Each result is appended to a JSON history file and compared with the last
+entry for the same size/quarters/mode, so slowdowns between releases show up
+as regressions instead of anecdotes.
+
+Usage:
+    python -m benchmarks.run                                  # 1k, 10k, 50k
+    python -m benchmarks.run --sizes 1000 --modes preload vectorized
+    python -m benchmarks.run --sizes 50000 --workers 8 --backfill 4
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.synthetic import generate_universe
+from benchmarks.local_db import create_database, reset_outputs
+from db.backends import connect, get_backend
+
+MODES = ("row", "preload", "vectorized", "sharded")
+DEFAULT_SIZES = (1000, 10000, 50000)
+DEFAULT_HISTORY = os.path.join(os.path.dirname(__file__), "history.json")
+
+# Per-row mode issues several queries per company and flag; above this many
+# companies it is skipped unless --force-row is given
+ROW_MODE_MAX_COMPANIES = 10000
+
+# Slowdown vs. the previous matching entry reported as a regression
+REGRESSION_THRESHOLD = 0.20
+
+_MODE_ARGS = {
+    "row": {},
+    "preload": {"preload": True},
+    "vectorized": {"vectorized": True},
+    "sharded": {"vectorized": True},
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+@contextlib.contextmanager
+def _environ(**values):
+    """Set environment variables for the duration of the block."""
+    previous = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def time_run(db_path, mode, backfill_quarters=1, workers=1, backend="sqlite"):
+    """Run the flag engine once against `db_path`.
+
+    DB_BACKEND / DB_PATH point the engine's get_connection() at the local
+    database (forked shard workers inherit them). engine.log and the run
+    report are written next to the database rather than to logs/, and only
+    warnings reach stdout.
+
+    Returns:
+        (seconds, post_run_seconds, flags stored): `seconds` is the flag
+        evaluation and write, without the post-run risk history / sector
+        index / score refresh, which is the same work in every mode and is
+        reported separately as `post_run_seconds`.
+    """
+    from engine import runner
+
+    reset_outputs(db_path, backend)
+    out_dir = os.path.dirname(db_path)
+    report_path = os.path.join(out_dir, "engine_run_report.json")
+    kwargs = dict(_MODE_ARGS[mode], backfill_quarters=backfill_quarters)
+    if mode == "sharded":
+        kwargs["workers"] = workers
+
+    _, console_level = runner.configure_logging(console_level=logging.WARNING)
+    try:
+        with _environ(DB_BACKEND=backend, DB_PATH=db_path):
+            started = time.perf_counter()
+            runner.run_flags(**kwargs, log_dir=out_dir, report_path=report_path)
+            seconds = time.perf_counter() - started
+    finally:
+        runner.configure_logging(console_level=console_level)
+
+    with open(report_path, encoding="utf-8") as f:
+        post_run_seconds = json.load(f).get("post_run_seconds") or 0.0
+
+    conn = connect(backend, db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM flags")
+        flags = cursor.fetchone()[0]
+        cursor.execute("SELECT status FROM flag_runs ORDER BY id DESC LIMIT 1")
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    if not row or row[0] != "completed":
+        raise RuntimeError(f"{mode} run did not complete (flag_runs status: {row[0] if row else None})")
+    return seconds - post_run_seconds, post_run_seconds, flags
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+
+
+def previous_result(history, result):
+    """Latest history entry benchmarking the same workload as `result`."""
+    keys = ("companies", "quarters", "backfill_quarters", "mode", "workers")
+    for entry in reversed(history):
+        if all(entry.get(k) == result[k] for k in keys) and entry.get("backend", "sqlite") == result["backend"]:
+            return entry
+    return None
+
+
+def compare(previous, result, threshold=REGRESSION_THRESHOLD):
+    """Relative change in seconds vs. `previous` and whether it is a regression."""
+    if not previous or not previous.get("seconds"):
+        return None, False
+    change = (result["seconds"] - previous["seconds"]) / previous["seconds"]
+    return change, change > threshold
+
+
+def run_suite(sizes=DEFAULT_SIZES, modes=MODES, quarters=40, backfill_quarters=1, workers=4,
+              history_path=DEFAULT_HISTORY, force_row=False, seed=42, backend="sqlite"):
+    """Benchmark every size x mode, append to the history file and return the results."""
+    from engine.runner import get_current_fiscal_quarter
+
+    if "row" in modes and backfill_quarters > 1:
+        print("ℹ️  row mode is promoted to preload when backfilling >1 quarter; skipping it")
+        modes = [m for m in modes if m != "row"]
+    if "sharded" in modes and not get_backend(backend).MULTIPROCESS:
+        print(f"ℹ️  the {backend} backend runs in one process; skipping sharded mode")
+        modes = [m for m in modes if m != "sharded"]
+
+    history = load_history(history_path) if history_path else []
+    commit, python = _git_commit(), platform.python_version()
+    results, regressions = [], []
+
+    with tempfile.TemporaryDirectory(prefix="flagium-bench-") as tmp:
+        for size in sizes:
+            started = time.perf_counter()
+            companies, rows = generate_universe(size, quarters=quarters, end=get_current_fiscal_quarter(), seed=seed)
+            db_path = os.path.join(tmp, f"universe_{size}.{backend}")
+            create_database(db_path, companies, rows, backend)
+            print(f"📦 {size:,} companies, {len(rows):,} financials rows ({time.perf_counter() - started:.1f}s to build)")
+            del rows
+
+            for mode in modes:
+                if mode == "row" and size > ROW_MODE_MAX_COMPANIES and not force_row:
+                    print(f"   {mode:<11} skipped (> {ROW_MODE_MAX_COMPANIES:,} companies, use --force-row)")
+                    continue
+                seconds, post_run_seconds, flags = time_run(db_path, mode, backfill_quarters, workers, backend)
+                result = {
+                    "timestamp": datetime.now().isoformat(timespec="seconds"),
+                    "commit": commit,
+                    "python": python,
+                    "backend": backend,
+                    "companies": size,
+                    "quarters": quarters,
+                    "backfill_quarters": backfill_quarters,
+                    "mode": mode,
+                    "workers": workers if mode == "sharded" else 1,
+                    "seconds": round(seconds, 3),
+                    "post_run_seconds": round(post_run_seconds, 3),
+                    "companies_per_second": round(size / seconds, 1) if seconds else None,
+                    "flags": flags,
+                }
+                change, regressed = compare(previous_result(history, result), result)
+                note = "" if change is None else f"  ({change:+.0%} vs last)"
+                if regressed:
+                    note += "  ⚠️ regression"
+                    regressions.append(result)
+                print(f"   {mode:<11} {seconds:8.2f}s  {result['companies_per_second']:>9,.0f} co/s  {flags:>7,} flags{note}")
+                results.append(result)
+                history.append(result)
+
+    if history_path:
+        save_history(history_path, history)
+        print(f"📝 {len(results)} result(s) appended to {history_path}")
+    if regressions:
+        print(f"⚠️  {len(regressions)} regression(s) above {REGRESSION_THRESHOLD:.0%}")
+    return results, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the flag engine on synthetic universes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Universe sizes (default 1000 10000 50000)")
+    parser.add_argument("--quarters", type=int, default=40, help="Quarters of history per company (default 40)")
+    parser.add_argument("--backfill", type=int, default=1, help="Quarters evaluated per run (default 1)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="Execution modes to time")
+    parser.add_argument("--workers", type=int, default=4, help="Processes for sharded mode (default 4)")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSON history file results are appended to")
+    parser.add_argument("--force-row", action="store_true", help=f"Time row mode above {ROW_MODE_MAX_COMPANIES:,} companies")
+    parser.add_argument("--backend", choices=("sqlite", "duckdb"), default="sqlite", help="Local database the engine runs against (default sqlite)")
+    parser.add_argument("--seed", type=int, default=42, help="Synthetic data seed")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 if any mode regressed")
+    args = parser.parse_args()
+
+    _, regressions = run_suite(
+        sizes=args.sizes, modes=args.modes, quarters=args.quarters, backfill_quarters=args.backfill,
+        workers=args.workers, history_path=args.history, force_row=args.force_row, seed=args.seed,
+        backend=args.backend,
+    )
+    sys.exit(1 if regressions and args.fail_on_regression else 0)
@@ -0,0 +1,128 @@
+"""
+Flagium — Synthetic Universe Generator
+
+Generates `companies` and `financials` rows that behave like the real
+universe closely enough to exercise every flag: lognormal revenue scale,
+autocorrelated growth, margin and cash-conversion noise, debt that drifts
+with funding needs, a share of companies that slide into distress (margin
+collapse, rising debt, negative free cash flow), and sparse missing values.
+Quarterly flows are generated first; annual rows are their fiscal-year
+sums (debt: the Q4 balance), as ingestion synthesizes them.
+
+Deterministic for a given seed.
+"""
+
+import numpy as np
+
+from engine.history import FINANCIAL_COLUMNS
+
+SECTORS = [
+    "Financial Services", "Information Technology", "Capital Goods", "Chemicals",
+    "Healthcare", "FMCG", "Automobile", "Metals & Mining", "Realty", "Power",
+]
+
+# Share of companies that enter a distress regime at some point
+DISTRESS_SHARE = 0.12
+
+# Share of metric values left NULL (unreported line items)
+MISSING_SHARE = 0.03
+
+TAX_RATE = 0.25
+
+
+def _quarter_axis(end_year, end_quarter, quarters):
+    """[(year, quarter), ...] oldest first, ending at (end_year, end_quarter)."""
+    periods = []
+    year, quarter = end_year, end_quarter
+    for _ in range(quarters):
+        periods.append((year, quarter))
+        quarter -= 1
+        if quarter < 1:
+            year, quarter = year - 1, 4
+    return periods[::-1]
+
+
+def generate_universe(n_companies, quarters=40, end=(2025, 4), seed=42):
+    """Synthetic companies and their quarterly + annual financials.
+
+    Args:
+        n_companies: Universe size.
+        quarters: Quarterly history length per company (annual rows are
+            derived for every complete fiscal year inside it).
+        end: Last (fiscal_year, quarter) generated.
+        seed: RNG seed.
+
+    Returns:
+        (companies, rows): companies are {id, ticker, name, sector} dicts
+        with ids 1..n; rows are financials dicts (company_id, year, quarter,
+        FINANCIAL_COLUMNS), quarter 0 = annual.
+    """
+    rng = np.random.default_rng(seed)
+    periods = _quarter_axis(end[0], end[1], quarters)
+    n, t = n_companies, len(periods)
+
+    # Revenue: lognormal scale (crore-ish rupees) with AR(1) quarterly growth
+    scale = np.exp(rng.normal(20.5, 1.6, n))
+    growth = np.zeros((n, t))
+    shocks = rng.normal(0.02, 0.06, (n, t))
+    for q in range(1, t):
+        growth[:, q] = 0.6 * growth[:, q - 1] + shocks[:, q]
+    seasonality = 1 + 0.05 * np.sin(np.arange(t) * np.pi / 2 + rng.uniform(0, 2 * np.pi, (n, 1)))
+    revenue = scale[:, None] * np.exp(np.cumsum(growth, axis=1)) * seasonality
+
+    # Distress regime: from a random quarter on, margins collapse and debt climbs
+    distressed = rng.random(n) < DISTRESS_SHARE
+    onset = rng.integers(t // 3, t, n)
+    in_distress = distressed[:, None] & (np.arange(t)[None, :] >= onset[:, None])
+
+    margin = rng.normal(0.09, 0.05, (n, 1)) + rng.normal(0, 0.03, (n, t))
+    margin = np.where(in_distress, margin - rng.uniform(0.08, 0.25, (n, 1)), margin)
+    net_profit = revenue * margin
+
+    conversion = rng.normal(1.05, 0.35, (n, t))
+    conversion = np.where(in_distress, conversion - 0.6, conversion)
+    operating_cash_flow = net_profit * conversion + revenue * rng.normal(0, 0.02, (n, t))
+    capex = revenue * np.abs(rng.normal(0.05, 0.03, (n, t)))
+    free_cash_flow = operating_cash_flow - capex
+
+    leverage = np.abs(rng.normal(0.6, 0.4, (n, 1)))
+    debt = scale[:, None] * leverage * np.exp(np.cumsum(rng.normal(0.005, 0.03, (n, t)), axis=1))
+    debt = np.where(in_distress, debt * (1 + 0.04 * (np.arange(t)[None, :] - onset[:, None]).clip(0)), debt)
+    interest_expense = debt * rng.uniform(0.018, 0.03, (n, 1))
+    profit_before_tax = np.where(net_profit > 0, net_profit / (1 - TAX_RATE), net_profit)
+
+    metrics = {
+        "revenue": revenue,
+        "net_profit": net_profit,
+        "profit_before_tax": profit_before_tax,
+        "operating_cash_flow": operating_cash_flow,
+        "free_cash_flow": free_cash_flow,
+        "total_debt": debt,
+        "interest_expense": interest_expense,
+    }
+    missing = {m: rng.random((n, t)) < MISSING_SHARE for m in FINANCIAL_COLUMNS}
+
+    companies = [
+        {"id": i + 1, "ticker": f"SYN{i + 1:05d}", "name": f"Synthetic {i + 1}", "sector": SECTORS[i % len(SECTORS)]}
+        for i in range(n)
+    ]
+
+    rows = []
+    year_quarters = {}
+    for qi, (year, _) in enumerate(periods):
+        year_quarters.setdefault(year, []).append(qi)
+    complete_years = [(year, idx) for year, idx in sorted(year_quarters.items()) if len(idx) == 4]
+    for ci in range(n):
+        cid = ci + 1
+        for qi, (year, quarter) in enumerate(periods):
+            row = {"company_id": cid, "year": year, "quarter": quarter}
+            for m in FINANCIAL_COLUMNS:
+                row[m] = None if missing[m][ci, qi] else int(metrics[m][ci, qi])
+            rows.append(row)
+        for year, idx in complete_years:
+            row = {"company_id": cid, "year": year, "quarter": 0}
+            for m in FINANCIAL_COLUMNS:
+                values = metrics[m][ci, idx]
+                row[m] = int(values[-1] if m == "total_debt" else values.sum())
+            rows.append(row)
+    return companies, rows
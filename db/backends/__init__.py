@@ -0,0 +1,43 @@
+"""
+Flagium — Storage Backends
+
+`db.connection.get_connection()` opens a connection on the backend named by
+DB_BACKEND:
+
+    mysql   (default) production server, DB_HOST / DB_USER / ...
+    sqlite  single file at DB_PATH (default stock_data.db)
+    duckdb  columnar file at DB_PATH (default flagium.duckdb)
+
+Every backend hands back a mysql.connector-shaped connection and accepts
+the engine's MySQL SQL (see db/backends/base.py), so callers do not branch
+on the backend. Backends import lazily: a SQLite run needs no MySQL driver.
+"""
+
+import importlib
+import os
+
+BACKENDS = {
+    "mysql": "db.backends.mysql",
+    "sqlite": "db.backends.sqlite",
+    "duckdb": "db.backends.duckdb",
+}
+
+DEFAULT_BACKEND = "mysql"
+
+
+def backend_name():
+    """Backend selected by DB_BACKEND (lower-cased)."""
+    return os.getenv("DB_BACKEND", DEFAULT_BACKEND).strip().lower()
+
+
+def get_backend(name=None):
+    """Backend module: NAME, DIALECT, MULTIPROCESS and connect(path=None)."""
+    name = name or backend_name()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DB_BACKEND '{name}' (expected one of: {', '.join(BACKENDS)})")
+    return importlib.import_module(BACKENDS[name])
+
+
+def connect(name=None, path=None):
+    """Open a connection on backend `name` (default: DB_BACKEND)."""
+    return get_backend(name).connect(path)
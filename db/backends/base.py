@@ -0,0 +1,255 @@
+"""
+Flagium — Local Backend Adapter
+
+The engine, flags and ingestion write MySQL SQL against mysql.connector
+connections. Local backends (SQLite, DuckDB) wrap their native connection
+in `Connection` / `Cursor`, which keep that contract:
+
+- `%s` placeholders
+- `cursor(dictionary=True)` rows as dicts
+- `NOW()`, `INSERT IGNORE` and `ON DUPLICATE KEY UPDATE col = VALUES(col)`
+- `cursor.lastrowid` after an INSERT
+- autocommit off: nothing is visible until `commit()`
+
+so callers need no per-backend branches.
+"""
+
+import re
+
+from db.backends.schema import CONFLICT_KEYS, AUTO_ID_TABLES, ddl
+
+_INSERT_TABLE = re.compile(r"^\s*INSERT\s+(?:IGNORE\s+)?INTO\s+(\w+)", re.IGNORECASE)
+_INSERT_IGNORE = re.compile(r"\bINSERT\s+IGNORE\b", re.IGNORECASE)
+_DUPLICATE_KEY = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_REF = re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE)
+_NOW = re.compile(r"\bNOW\(\)", re.IGNORECASE)
+_VALUES_ROW = re.compile(r"\bVALUES\s*(\([\s?,]*\))", re.IGNORECASE)
+
+# Rows per multi-row INSERT when executemany() is batched
+MULTIROW_BATCH = 500
+
+# NOW() per dialect: SQLite's CURRENT_TIMESTAMP (UTC text, same clock as the
+# column defaults); DuckDB's is timezone-aware, so cast it like the columns.
+# now() rather than CURRENT_TIMESTAMP: DuckDB binds a bare CURRENT_TIMESTAMP
+# in ON CONFLICT ... DO UPDATE SET as a column name
+_NOW_SQL = {
+    "sqlite": "CURRENT_TIMESTAMP",
+    "duckdb": "CAST(now() AS TIMESTAMP)",
+}
+
+
+def insert_table(sql):
+    """Target table of an INSERT statement, or None."""
+    match = _INSERT_TABLE.match(sql)
+    return match.group(1).lower() if match else None
+
+
+def conflict_clause(dialect, table):
+    """`ON CONFLICT (...) DO UPDATE SET` for `table` (the upsert dialect helper)."""
+    if dialect == "mysql":
+        return "ON DUPLICATE KEY UPDATE"
+    keys = CONFLICT_KEYS.get(table)
+    target = f" ({', '.join(keys)})" if keys else ""
+    return f"ON CONFLICT{target} DO UPDATE SET"
+
+
+def upsert_sql(dialect, table, columns, update_columns):
+    """INSERT ... upsert statement for `table` in `dialect`, with %s placeholders.
+
+    For new code that wants one statement per backend; existing MySQL
+    upserts are rewritten by translate().
+    """
+    placeholders = ", ".join(["%s"] * len(columns))
+    if dialect == "mysql":
+        updates = ", ".join(f"{col} = VALUES({col})" for col in update_columns)
+    else:
+        updates = ", ".join(f"{col} = excluded.{col}" for col in update_columns)
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"{conflict_clause(dialect, table)} {updates}"
+    )
+
+
+def translate(sql, dialect):
+    """Rewrite the MySQL-isms the engine and ingestion use into `dialect`."""
+    if dialect == "mysql":
+        return sql
+    sql = sql.replace("%s", "?")
+    sql = _NOW.sub(_NOW_SQL[dialect], sql)
+    sql = _INSERT_IGNORE.sub("INSERT OR IGNORE", sql)
+    match = _DUPLICATE_KEY.search(sql)
+    if match:
+        clause = conflict_clause(dialect, insert_table(sql))
+        sql = sql[:match.start()] + clause + _VALUES_REF.sub(r"excluded.\1", sql[match.end():])
+    return sql
+
+
+class Cursor:
+    """mysql.connector-shaped cursor over a native DB-API cursor."""
+
+    def __init__(self, connection, raw, dictionary=False):
+        self._connection = connection
+        self._raw = raw
+        self._dictionary = dictionary
+        self._rows = None
+        self.description = None
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((d[0] for d in self.description), row))
+
+    def execute(self, sql, params=None):
+        dialect = self._connection.dialect
+        sql = translate(sql, dialect)
+        table = insert_table(sql)
+        # DuckDB has no lastrowid; ask the INSERT for the generated id instead
+        returning = dialect == "duckdb" and table in AUTO_ID_TABLES and "RETURNING" not in sql.upper()
+        if returning:
+            sql = sql.rstrip().rstrip(";") + " RETURNING id"
+
+        self._connection._begin()
+        self._raw.execute(sql, tuple(params or ()))
+        self.description = self._raw.description
+        self.rowcount = getattr(self._raw, "rowcount", -1)
+        self._rows = None
+
+        if returning:
+            inserted = self._raw.fetchall()
+            self.lastrowid = inserted[0][0] if inserted else None
+            self.description = None
+        elif self._connection.buffered and self.description:
+            # One result set per native connection: read it out so other
+            # cursors on this connection can execute before it is consumed
+            self._rows = self._raw.fetchall()
+            self._rows.reverse()
+        elif table:
+            self.lastrowid = getattr(self._raw, "lastrowid", None)
+
+    def executemany(self, sql, seq_params):
+        sql = translate(sql, self._connection.dialect)
+        seq_params = [tuple(p) for p in seq_params]
+        self._connection._begin()
+        self.description = None
+        self._rows = None
+
+        match = _VALUES_ROW.search(sql) if self._connection.buffered and insert_table(sql) else None
+        if not match:
+            self._raw.executemany(sql, seq_params)
+            return
+        # DuckDB runs executemany() row by row; send INSERTs as multi-row
+        # VALUES batches instead (as mysql.connector does)
+        head, row, tail = sql[:match.start(1)], match.group(1), sql[match.end(1):]
+        for start in range(0, len(seq_params), MULTIROW_BATCH):
+            batch = seq_params[start:start + MULTIROW_BATCH]
+            self._raw.execute(head + ", ".join([row] * len(batch)) + tail, [v for p in batch for v in p])
+
+    def fetchone(self):
+        if self._rows is not None:
+            return self._row(self._rows.pop()) if self._rows else None
+        return self._row(self._raw.fetchone())
+
+    def fetchmany(self, size=1000):
+        if self._rows is not None:
+            rows = [self._rows.pop() for _ in range(min(size, len(self._rows)))]
+        else:
+            rows = self._raw.fetchmany(size)
+        return [self._row(r) for r in rows]
+
+    def fetchall(self):
+        if self._rows is not None:
+            rows, self._rows = self._rows[::-1], []
+        else:
+            rows = self._raw.fetchall()
+        return [self._row(r) for r in rows]
+
+    def close(self):
+        self._rows = None
+
+
+class Connection:
+    """mysql.connector-shaped connection around a native local connection.
+
+    Args:
+        raw: sqlite3 / duckdb connection.
+        dialect: "sqlite" or "duckdb".
+        buffered: Results are read out on execute (DuckDB: one open
+            result per connection). Statements then run on `raw` itself
+            and the transaction is opened explicitly.
+    """
+
+    def __init__(self, raw, dialect, buffered=False):
+        self._raw = raw
+        self.dialect = dialect
+        self.buffered = buffered
+        self._in_transaction = False
+
+    @property
+    def native(self):
+        """The underlying sqlite3 / duckdb connection, for bulk-load paths."""
+        return self._raw
+
+    def _begin(self):
+        if self.buffered and not self._in_transaction:
+            self._raw.begin()
+            self._in_transaction = True
+
+    def cursor(self, dictionary=False, **kwargs):
+        return Cursor(self, self._raw if self.buffered else self._raw.cursor(), dictionary)
+
+    def is_connected(self):
+        return True
+
+    def commit(self):
+        if self.buffered:
+            if self._in_transaction:
+                self._raw.commit()
+                self._in_transaction = False
+        else:
+            self._raw.commit()
+
+    def rollback(self):
+        if self.buffered:
+            if self._in_transaction:
+                self._raw.rollback()
+                self._in_transaction = False
+        else:
+            self._raw.rollback()
+
+    def close(self):
+        self._raw.close()
+
+
+def create_schema(conn):
+    """Create every table the engine and ingestion use (idempotent), then commit."""
+    cursor = conn.cursor()
+    try:
+        for statement in ddl(conn.dialect):
+            cursor.execute(statement)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def sync_sequences(conn):
+    """Move DuckDB id sequences past rows inserted with explicit ids (bulk loads, clones).
+
+    SQLite's AUTOINCREMENT follows explicit ids on its own.
+    """
+    if conn.dialect != "duckdb":
+        return
+    cursor = conn.cursor()
+    try:
+        for table in sorted(AUTO_ID_TABLES):
+            sequence = f"seq_{table}_id"
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+            max_id = cursor.fetchone()[0]
+            cursor.execute("SELECT last_value FROM duckdb_sequences() WHERE sequence_name = %s", (sequence,))
+            last = cursor.fetchone()[0] or 0
+            if max_id > last:
+                cursor.execute(f"SELECT MAX(nextval('{sequence}')) FROM range({max_id - last})")
+        conn.commit()
+    finally:
+        cursor.close()
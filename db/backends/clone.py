@@ -0,0 +1,92 @@
+"""
+Flagium — Clone Into a Local Backend
+
+Copies the engine's tables from the configured backend (normally the MySQL
+server) into a local SQLite or DuckDB file, so backfills, backtests and
+sweeps can run against the copy:
+
+    python -m db.backends.clone --to duckdb --path snapshot.duckdb
+    DB_BACKEND=duckdb DB_PATH=snapshot.duckdb python main.py backtest
+
+Each table is streamed in CLONE_BATCH-row batches and replaces the
+destination table's contents; columns missing on either side are skipped.
+"""
+
+import argparse
+import time
+
+from db.backends import connect
+from db.backends.base import sync_sequences
+from db.backends.schema import TABLES
+
+# Rows per fetchmany()/executemany() batch
+CLONE_BATCH = 5000
+
+
+def _columns(cursor, table):
+    cursor.execute(f"SELECT * FROM {table} WHERE 1 = 0")
+    cursor.fetchall()
+    return [d[0] for d in cursor.description]
+
+
+def clone_tables(source, dest, tables=None):
+    """Copy `tables` (default: every table in the local schema) from `source` to `dest`.
+
+    Args:
+        source: Connection to read from.
+        dest: Local backend connection to write to (schema already created).
+        tables: Table names.
+
+    Returns:
+        {table: rows copied}
+    """
+    counts = {}
+    src_cursor = source.cursor()
+    dest_cursor = dest.cursor()
+    try:
+        for table in tables or TABLES:
+            dest_columns = set(_columns(dest_cursor, table))
+            columns = [c for c in _columns(src_cursor, table) if c in dest_columns]
+            insert = (
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))})"
+            )
+            dest_cursor.execute(f"DELETE FROM {table}")
+            src_cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            counts[table] = 0
+            while True:
+                rows = src_cursor.fetchmany(CLONE_BATCH)
+                if not rows:
+                    break
+                dest_cursor.executemany(insert, rows)
+                counts[table] += len(rows)
+        dest.commit()
+        sync_sequences(dest)
+        return counts
+    except Exception:
+        dest.rollback()
+        raise
+    finally:
+        src_cursor.close()
+        dest_cursor.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy the engine's tables into a local SQLite/DuckDB file")
+    parser.add_argument("--to", dest="backend", choices=("sqlite", "duckdb"), default="duckdb", help="Destination backend (default duckdb)")
+    parser.add_argument("--path", required=True, help="Destination database file")
+    parser.add_argument("--tables", nargs="+", choices=sorted(TABLES), help="Tables to copy (default all)")
+    args = parser.parse_args()
+
+    print(f"🚀 Cloning into {args.backend}:{args.path}...")
+    started = time.perf_counter()
+    source, dest = connect(), connect(args.backend, args.path)
+    try:
+        for table, rows in clone_tables(source, dest, args.tables).items():
+            print(f"   {table:<20} {rows:>10,} rows")
+        print(f"✅ Done in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        print(f"❌ Clone failed: {e}")
+    finally:
+        source.close()
+        dest.close()
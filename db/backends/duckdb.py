@@ -0,0 +1,35 @@
+"""
+Flagium — DuckDB Backend
+
+A columnar single-file database (DB_PATH, default flagium.duckdb) for
+heavy analytical runs — backfills, backtests, sweeps — on a local copy of
+the data instead of the production server. The schema is created on first
+connect.
+
+A DuckDB file admits one writing process, so sharded engine runs fall
+back to a single process on this backend.
+"""
+
+import os
+
+import duckdb
+
+from db.backends.base import Connection, create_schema
+
+NAME = "duckdb"
+DIALECT = "duckdb"
+MULTIPROCESS = False
+
+DEFAULT_PATH = "flagium.duckdb"
+
+# Paths whose schema this process has already ensured
+_initialized = set()
+
+
+def connect(path=None):
+    path = path or os.getenv("DB_PATH", DEFAULT_PATH)
+    conn = Connection(duckdb.connect(path), DIALECT, buffered=True)
+    if path not in _initialized:
+        create_schema(conn)
+        _initialized.add(path)
+    return conn
@@ -0,0 +1,79 @@
+"""
+Flagium — MySQL Backend (production default)
+
+Native mysql.connector connections; the engine's SQL is written for this
+dialect, so nothing is translated.
+
+connect() checks connections out of a process-wide ConnectionPool
+(db/backends/pool.py); close() hands them back. The pool is sized by env:
+
+    DB_POOL_SIZE        most open connections (default 10; 0 disables pooling)
+    DB_POOL_TIMEOUT     seconds to wait for a free connection (default 10)
+    DB_POOL_RECYCLE     seconds before a connection is reopened (default 3600)
+    DB_POOL_PING_AFTER  idle seconds before a connection is pinged (default 30)
+"""
+
+import os
+import threading
+
+import mysql.connector
+from mysql.connector import Error
+
+from db.backends.pool import ConnectionPool
+
+NAME = "mysql"
+DIALECT = "mysql"
+
+# Shard workers may each open their own connection
+MULTIPROCESS = True
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _open():
+    try:
+        connection = mysql.connector.connect(
+            host=os.getenv("DB_HOST", "localhost"),
+            port=int(os.getenv("DB_PORT", 3306)),
+            user=os.getenv("DB_USER", "flagium_user"),
+            password=os.getenv("DB_PASS"),
+            database=os.getenv("DB_NAME", "flagium")
+        )
+
+        if connection.is_connected():
+            return connection
+
+    except Error as e:
+        print("❌ Error while connecting to MySQL:", e)
+        raise
+
+
+def get_pool():
+    """The process-wide pool, created on first use; None when DB_POOL_SIZE=0."""
+    global _pool
+    if _pool is None:
+        size = int(os.getenv("DB_POOL_SIZE", 10))
+        if size <= 0:
+            return None
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _open,
+                    size=size,
+                    timeout=float(os.getenv("DB_POOL_TIMEOUT", 10)),
+                    recycle=float(os.getenv("DB_POOL_RECYCLE", 3600)),
+                    ping_after=float(os.getenv("DB_POOL_PING_AFTER", 30)),
+                )
+    return _pool
+
+
+def connect(path=None):
+    pool = get_pool()
+    return pool.checkout() if pool is not None else _open()
+
+
+def pool_stats():
+    """ConnectionPool.stats(), or None when pooling is off."""
+    pool = get_pool()
+    return pool.stats() if pool is not None else None
@@ -0,0 +1,218 @@
+"""
+Flagium — Connection Pool
+
+A size-bounded pool of open server connections, so an API request checks
+out a live connection instead of paying a TCP + auth handshake (often
+twice: once in get_current_user, once in the handler).
+
+    pool = ConnectionPool(factory, size=10, timeout=10)
+    conn = pool.checkout()      # PooledConnection
+    ...
+    conn.close()                # back to the pool, not closed
+
+- Checkout: an idle connection if any, else a new one while fewer than
+  `size` exist, else wait up to `timeout` seconds (PoolTimeoutError).
+- Health checks: an idle connection older than `recycle` seconds is
+  replaced; one idle longer than `ping_after` seconds is pinged first.
+- Release: the connection is rolled back, so the next borrower starts a
+  fresh transaction (and snapshot); one that fails the rollback is dropped.
+  A PooledConnection that is garbage-collected without close() is released
+  too.
+- Fork safety: a child process (shard workers) never reuses the parent's
+  sockets; it starts an empty pool.
+
+stats() reports size, in-use, idle, waiters and checkout latency.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+# Checkout latencies kept for the percentile in stats()
+LATENCY_SAMPLES = 1000
+
+
+class PoolTimeoutError(Exception):
+    """No connection became free within the checkout timeout."""
+
+
+class PooledConnection:
+    """A checked-out connection; close() returns it to its pool."""
+
+    def __init__(self, pool, raw, opened_at):
+        self._pool = pool
+        self._raw = raw
+        self._opened_at = opened_at
+        self._pid = os.getpid()
+
+    @property
+    def native(self):
+        """The pooled driver connection."""
+        return self._raw
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None and self._pid == os.getpid():
+            self._pool._release(raw, self._opened_at)
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise AttributeError(f"connection already returned to the pool ({name})")
+        return getattr(raw, name)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Bounded pool over `factory()` connections.
+
+    Args:
+        factory: Opens a new driver connection.
+        size: Most connections open at once (checked out + idle).
+        timeout: Seconds checkout() waits for a free connection.
+        recycle: Seconds after which a connection is closed and reopened.
+        ping_after: Idle seconds after which a connection is pinged on checkout.
+    """
+
+    def __init__(self, factory, size=10, timeout=10.0, recycle=3600.0, ping_after=30.0):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._lock = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = deque()          # (raw, opened_at, released_at), most recent last
+        self._open = 0                # open or being opened, checked out or idle
+        self._in_use = 0
+        self._waiters = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._counters = {"checkouts": 0, "created": 0, "discarded": 0, "timeouts": 0, "failed_checks": 0}
+
+    # ── Checkout ──
+
+    def checkout(self):
+        """A healthy connection, waiting up to `timeout` seconds for one."""
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        raw = opened_at = None
+        with self._lock:
+            # A forked child starts empty rather than share the parent's sockets
+            if self._pid != os.getpid():
+                self._reset()
+            while True:
+                if self._idle:
+                    raw, opened_at, released_at = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection free within {self.timeout:g}s "
+                        f"({self._in_use} in use, pool size {self.size})"
+                    )
+                self._waiters += 1
+                try:
+                    self._lock.wait(remaining)
+                finally:
+                    self._waiters -= 1
+            self._in_use += 1
+            self._counters["checkouts"] += 1
+
+        try:
+            if raw is not None and not self._healthy(raw, opened_at, released_at):
+                self._close_raw(raw)
+                raw = None
+            if raw is None:
+                raw = self.factory()
+                opened_at = time.monotonic()
+                with self._lock:
+                    self._counters["created"] += 1
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+        with self._lock:
+            self._latencies.append(time.perf_counter() - started)
+        return PooledConnection(self, raw, opened_at)
+
+    def _healthy(self, raw, opened_at, released_at):
+        now = time.monotonic()
+        if now - opened_at > self.recycle:
+            return False
+        if now - released_at > self.ping_after:
+            try:
+                if not raw.is_connected():
+                    raise ConnectionError("ping failed")
+            except Exception:
+                with self._lock:
+                    self._counters["failed_checks"] += 1
+                return False
+        return True
+
+    def _close_raw(self, raw):
+        with self._lock:
+            self._counters["discarded"] += 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    # ── Release ──
+
+    def _release(self, raw, opened_at):
+        try:
+            # End the borrower's transaction so the next one gets a fresh snapshot
+            raw.rollback()
+        except Exception:
+            self._close_raw(raw)
+            with self._lock:
+                self._open -= 1
+                self._in_use -= 1
+                self._lock.notify()
+            return
+        with self._lock:
+            self._in_use -= 1
+            self._idle.append((raw, opened_at, time.monotonic()))
+            self._lock.notify()
+
+    def close(self):
+        """Close every idle connection (checked-out ones close on release)."""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+        for raw, _, _ in idle:
+            self._close_raw(raw)
+
+    # ── Metrics ──
+
+    def stats(self):
+        """Pool size, in-use / idle / waiting counts, counters and checkout latency (ms)."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                **self._counters,
+                "checkout_ms_avg": round(1000 * sum(latencies) / len(latencies), 3) if latencies else None,
+                "checkout_ms_p95": round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 3) if latencies else None,
+                "checkout_ms_max": round(1000 * latencies[-1], 3) if latencies else None,
+            }
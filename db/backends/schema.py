@@ -0,0 +1,255 @@
+"""
+Flagium — Portable Schema for Local Backends
+
+The tables the flag engine and ingestion write to, in DDL that SQLite and
+DuckDB both accept. db/bootstrap.sql stays the source of truth for MySQL;
+keep the two in step when a migration adds a column the engine uses.
+
+`{id}` marks the auto-increment primary key, rendered per dialect.
+"""
+
+_METRICS = """
+        revenue BIGINT,
+        net_profit BIGINT,
+        profit_before_tax BIGINT,
+        operating_cash_flow BIGINT,
+        free_cash_flow BIGINT,
+        total_debt BIGINT,
+        interest_expense BIGINT"""
+
+TABLES = {
+    "companies": """
+        {id},
+        name VARCHAR NOT NULL,
+        ticker VARCHAR NOT NULL,
+        sector VARCHAR,
+        index_name VARCHAR,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """,
+    "financials": f"""
+        {{id}},
+        company_id INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        quarter INTEGER DEFAULT 0,
+        {_METRICS.strip()},
+        is_consolidated INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (company_id, year, quarter)
+    """,
+    "financials_history": f"""
+        {{id}},
+        company_id INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        quarter INTEGER DEFAULT 0,
+        filing_date DATE NOT NULL,
+        {_METRICS.strip()},
+        recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (company_id, year, quarter, filing_date)
+    """,
+    "financial_metrics": """
+        company_id INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        quarter INTEGER NOT NULL DEFAULT 0,
+        ttm_revenue BIGINT,
+        ttm_net_profit BIGINT,
+        ttm_profit_before_tax BIGINT,
+        ebit BIGINT,
+        interest_coverage DOUBLE,
+        revenue_yoy DOUBLE,
+        net_profit_yoy DOUBLE,
+        revenue_qoq DOUBLE,
+        net_profit_qoq DOUBLE,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (company_id, year, quarter)
+    """,
+    "sector_distributions": """
+        sector VARCHAR NOT NULL,
+        metric VARCHAR NOT NULL,
+        sample_size INTEGER,
+        sorted_values TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (sector, metric)
+    """,
+    "company_risk_scores": """
+        company_id INTEGER PRIMARY KEY,
+        risk_score INTEGER,
+        status VARCHAR,
+        primary_driver VARCHAR,
+        narrative TEXT,
+        history TEXT,
+        predictive TEXT,
+        structural_scores TEXT,
+        timeline TEXT,
+        flag_count INTEGER,
+        run_id INTEGER,
+        computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """,
+    "risk_score_history": """
+        company_id INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        quarter INTEGER NOT NULL,
+        risk_score INTEGER,
+        flag_count INTEGER,
+        severity_points INTEGER,
+        run_id INTEGER,
+        computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (company_id, year, quarter)
+    """,
+    "risk_density_history": """
+        year INTEGER NOT NULL,
+        quarter INTEGER NOT NULL,
+        total_companies INTEGER,
+        flagged_companies INTEGER,
+        total_flags INTEGER,
+        high_flags INTEGER,
+        medium_flags INTEGER,
+        risk_density DOUBLE,
+        avg_risk_score DOUBLE,
+        run_id INTEGER,
+        computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (year, quarter)
+    """,
+    "shareholding": """
+        {id},
+        company_id INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        promoter_holding_pct DOUBLE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (company_id, year)
+    """,
+    "flags": """
+        {id},
+        company_id INTEGER NOT NULL,
+        flag_code VARCHAR,
+        flag_name VARCHAR,
+        severity VARCHAR,
+        period_type VARCHAR DEFAULT 'annual',
+        fiscal_year INTEGER,
+        fiscal_quarter INTEGER DEFAULT 0,
+        message TEXT,
+        details TEXT,
+        content_hash VARCHAR,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (company_id, flag_code, period_type, fiscal_year, fiscal_quarter)
+    """,
+    "flag_runs": """
+        {id},
+        mode VARCHAR NOT NULL,
+        status VARCHAR NOT NULL,
+        watermark TIMESTAMP NOT NULL,
+        companies_evaluated INTEGER DEFAULT 0,
+        flags_detected INTEGER DEFAULT 0,
+        message TEXT,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP,
+        ticker VARCHAR,
+        target_periods TEXT,
+        last_company_id INTEGER,
+        checkpointed_at TIMESTAMP,
+        as_of DATE
+    """,
+    "flags_as_of": """
+        as_of DATE NOT NULL,
+        company_id INTEGER NOT NULL,
+        flag_code VARCHAR NOT NULL,
+        flag_name VARCHAR,
+        severity VARCHAR,
+        period_type VARCHAR NOT NULL DEFAULT 'annual',
+        fiscal_year INTEGER NOT NULL,
+        fiscal_quarter INTEGER NOT NULL DEFAULT 0,
+        message TEXT,
+        details TEXT,
+        run_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (as_of, company_id, flag_code, period_type, fiscal_year, fiscal_quarter)
+    """,
+    "flag_events": """
+        {id},
+        run_id INTEGER,
+        company_id INTEGER NOT NULL,
+        flag_code VARCHAR,
+        flag_name VARCHAR,
+        period_type VARCHAR,
+        fiscal_year INTEGER,
+        fiscal_quarter INTEGER DEFAULT 0,
+        event_type VARCHAR NOT NULL,
+        severity VARCHAR,
+        previous_severity VARCHAR,
+        message TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """,
+    "flag_definitions": """
+        flag_code VARCHAR PRIMARY KEY,
+        flag_name VARCHAR,
+        category VARCHAR,
+        impact_weight INTEGER DEFAULT 5,
+        description TEXT,
+        severity VARCHAR,
+        params TEXT,
+        is_active INTEGER DEFAULT 1
+    """,
+    "system_jobs": """
+        job_name VARCHAR PRIMARY KEY,
+        status VARCHAR,
+        last_run_start TIMESTAMP,
+        last_run_end TIMESTAMP,
+        message TEXT
+    """,
+    "system_reports": """
+        {id},
+        report_type VARCHAR NOT NULL UNIQUE,
+        report_date DATE NOT NULL,
+        report_data TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """,
+}
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_financials_updated_at ON financials (updated_at)",
+    "CREATE INDEX IF NOT EXISTS idx_financials_history_filed ON financials_history (filing_date)",
+    "CREATE INDEX IF NOT EXISTS idx_flag_runs_status ON flag_runs (status, watermark)",
+    "CREATE INDEX IF NOT EXISTS idx_flag_events_run ON flag_events (run_id)",
+    "CREATE INDEX IF NOT EXISTS idx_flag_events_company ON flag_events (company_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_risk_score_history_period ON risk_score_history (year, quarter)",
+]
+
+# Unique key each MySQL `ON DUPLICATE KEY UPDATE` / `INSERT IGNORE` resolves
+# against, per table (DuckDB requires the conflict target to be spelled out)
+CONFLICT_KEYS = {
+    "companies": ("id",),
+    "financials": ("company_id", "year", "quarter"),
+    "financials_history": ("company_id", "year", "quarter", "filing_date"),
+    "financial_metrics": ("company_id", "year", "quarter"),
+    "sector_distributions": ("sector", "metric"),
+    "company_risk_scores": ("company_id",),
+    "risk_score_history": ("company_id", "year", "quarter"),
+    "risk_density_history": ("year", "quarter"),
+    "shareholding": ("company_id", "year"),
+    "flags": ("company_id", "flag_code", "period_type", "fiscal_year", "fiscal_quarter"),
+    "flag_runs": ("id",),
+    "flags_as_of": ("as_of", "company_id", "flag_code", "period_type", "fiscal_year", "fiscal_quarter"),
+    "flag_events": ("id",),
+    "flag_definitions": ("flag_code",),
+    "system_jobs": ("job_name",),
+    "system_reports": ("report_type",),
+}
+
+# Tables whose `{id}` is generated (cursor.lastrowid after INSERT)
+AUTO_ID_TABLES = frozenset(table for table, body in TABLES.items() if "{id}" in body)
+
+
+def ddl(dialect):
+    """CREATE statements for every table and index, in order, for `dialect`."""
+    statements = []
+    for table, body in TABLES.items():
+        if dialect == "duckdb":
+            if table in AUTO_ID_TABLES:
+                statements.append(f"CREATE SEQUENCE IF NOT EXISTS seq_{table}_id")
+            pk = f"id INTEGER PRIMARY KEY DEFAULT nextval('seq_{table}_id')"
+        else:
+            pk = "id INTEGER PRIMARY KEY AUTOINCREMENT"
+        body = body.replace("{id}", pk)
+        statements.append(f"CREATE TABLE IF NOT EXISTS {table} ({body})")
+    return statements + INDEXES
@@ -0,0 +1,31 @@
+"""
+Flagium — SQLite Backend
+
+A single-file database (DB_PATH, default stock_data.db) for local runs and
+tests. The schema is created on first connect. Several processes can read
+the same file, so sharded runs work; writes are serialized by SQLite.
+"""
+
+import os
+import sqlite3
+
+from db.backends.base import Connection, create_schema
+
+NAME = "sqlite"
+DIALECT = "sqlite"
+MULTIPROCESS = True
+
+DEFAULT_PATH = "stock_data.db"
+
+# Paths whose schema this process has already ensured
+_initialized = set()
+
+
+def connect(path=None):
+    path = path or os.getenv("DB_PATH", DEFAULT_PATH)
+    raw = sqlite3.connect(path, timeout=60, detect_types=sqlite3.PARSE_DECLTYPES)
+    conn = Connection(raw, DIALECT)
+    if path not in _initialized:
+        create_schema(conn)
+        _initialized.add(path)
+    return conn
@@ -49,8 +49,66 @@ CREATE TABLE IF NOT EXISTS financials (
     interest_expense BIGINT,
 
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
 
     UNIQUE (company_id, year, quarter),
+    INDEX idx_financials_updated_at (updated_at),
+    FOREIGN KEY (company_id) REFERENCES companies(id)
+);
+
+-- Derived metrics per company-period (maintained by save_financials, see engine/financial_metrics.py)
+CREATE TABLE IF NOT EXISTS financial_metrics (
+    company_id INT NOT NULL,
+    year INT NOT NULL,
+    quarter TINYINT NOT NULL DEFAULT 0,
+
+    ttm_revenue BIGINT,                    -- sums of the four quarters ending here (quarterly rows)
+    ttm_net_profit BIGINT,
+    ttm_profit_before_tax BIGINT,
+    ebit BIGINT,                           -- profit_before_tax + interest_expense
+    interest_coverage DOUBLE,              -- ebit / interest_expense
+    revenue_yoy DOUBLE,                    -- fractional growth vs the same period a year earlier
+    net_profit_yoy DOUBLE,
+    revenue_qoq DOUBLE,                    -- fractional growth vs the preceding quarter
+    net_profit_qoq DOUBLE,
+
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (company_id, year, quarter),
+    FOREIGN KEY (company_id) REFERENCES companies(id)
+);
+
+-- Sector percentile index: sorted peer values per sector and metric (engine/sector_index.py)
+CREATE TABLE IF NOT EXISTS sector_distributions (
+    sector VARCHAR(100) NOT NULL,          -- '*' = whole universe
+    metric VARCHAR(100) NOT NULL,          -- 'risk_score', 'category:<name>', financial_metrics column
+    sample_size INT,
+    sorted_values LONGTEXT,                -- JSON array, ascending
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (sector, metric)
+);
+
+-- Point-in-time financials: every version of a period, by filing date (append-only)
+CREATE TABLE IF NOT EXISTS financials_history (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    company_id INT NOT NULL,
+    year INT NOT NULL,
+    quarter TINYINT DEFAULT 0,
+    filing_date DATE NOT NULL,             -- when this version became public
+
+    revenue BIGINT,
+    net_profit BIGINT,
+    profit_before_tax BIGINT,
+    operating_cash_flow BIGINT,
+    free_cash_flow BIGINT,
+
+    total_debt BIGINT,
+    interest_expense BIGINT,
+
+    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    UNIQUE KEY uq_financials_vintage (company_id, year, quarter, filing_date),  -- latest-before-date lookups
+    INDEX idx_financials_history_filed (filing_date),
     FOREIGN KEY (company_id) REFERENCES companies(id)
 );
 
@@ -81,12 +139,118 @@ CREATE TABLE IF NOT EXISTS flags (
     fiscal_quarter INT DEFAULT 0,
     message TEXT,
     details JSON,
+    content_hash CHAR(40),                     -- hash of severity/message/details
     
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- first triggered
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    UNIQUE KEY uq_flags_period (company_id, flag_code, period_type, fiscal_year, fiscal_quarter),
+    FOREIGN KEY (company_id) REFERENCES companies(id)
+);
+
+-- Flag Engine Run Ledger (watermarks for --incremental)
+CREATE TABLE IF NOT EXISTS flag_runs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    mode VARCHAR(20) NOT NULL,             -- 'full' or 'incremental'
+    status VARCHAR(20) NOT NULL,           -- 'running', 'completed', 'failed'
+    watermark DATETIME NOT NULL,           -- financials.updated_at covered by this run
+    companies_evaluated INT DEFAULT 0,
+    flags_detected INT DEFAULT 0,
+    message TEXT,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP NULL,
+    ticker VARCHAR(50) NULL,               -- single-company runs (for --resume)
+    target_periods TEXT NULL,              -- JSON [[year, quarter], ...]
+    last_company_id INT NULL,              -- checkpoint: last company fully written
+    checkpointed_at TIMESTAMP NULL,
+    as_of DATE NULL,                       -- point-in-time runs: financials vintage date
+    INDEX idx_flag_runs_status (status, watermark)
+);
+
+-- Point-in-time results of `run_flags(as_of=...)`, kept apart from the live flags
+CREATE TABLE IF NOT EXISTS flags_as_of (
+    as_of DATE NOT NULL,                   -- financials vintage date evaluated
+    company_id INT NOT NULL,
+    flag_code VARCHAR(50) NOT NULL,
+    flag_name VARCHAR(100),
+    severity VARCHAR(20),
+    period_type VARCHAR(20) NOT NULL DEFAULT 'annual',
+    fiscal_year INT NOT NULL,
+    fiscal_quarter INT NOT NULL DEFAULT 0,
+    message TEXT,
+    details JSON,
+    run_id INT NULL,                       -- flag_runs id that wrote the row
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (as_of, company_id, flag_code, period_type, fiscal_year, fiscal_quarter)
+);
 
+-- Flag Change Feed (append-only; id is the /api/flags/changes cursor)
+CREATE TABLE IF NOT EXISTS flag_events (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    run_id INT NULL,                       -- flag_runs id (NULL for streamed evaluations)
+    company_id INT NOT NULL,
+    flag_code VARCHAR(50),
+    flag_name VARCHAR(100),
+    period_type VARCHAR(20),
+    fiscal_year INT,
+    fiscal_quarter INT DEFAULT 0,
+    event_type VARCHAR(20) NOT NULL,       -- 'raised', 'escalated', 'deescalated', 'cleared'
+    severity VARCHAR(20) NULL,             -- severity after the event (before, for 'cleared')
+    previous_severity VARCHAR(20) NULL,
+    message TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_flag_events_run (run_id),
+    INDEX idx_flag_events_company (company_id, id)
+);
+
+-- Precomputed calculate_risk_score() output per company (engine/risk_scores.py)
+CREATE TABLE IF NOT EXISTS company_risk_scores (
+    company_id INT PRIMARY KEY,
+    risk_score INT,
+    status VARCHAR(50),
+    primary_driver VARCHAR(100),
+    narrative TEXT,
+    history JSON,                          -- 6-quarter score history
+    predictive JSON,
+    structural_scores JSON,
+    timeline JSON,
+    flag_count INT,                        -- flags scored; a different live count marks the row stale
+    run_id INT NULL,                       -- flag_runs id that wrote the row
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (company_id) REFERENCES companies(id)
+);
+
+-- Risk score per company per fiscal quarter, recorded by each engine run
+CREATE TABLE IF NOT EXISTS risk_score_history (
+    company_id INT NOT NULL,
+    year INT NOT NULL,
+    quarter INT NOT NULL,
+    risk_score INT,                        -- calculate_risk_score() over the flags raised up to the quarter
+    flag_count INT,
+    severity_points INT,                   -- HIGH=3, MEDIUM=2, other=1 (dashboard tiers)
+    run_id INT NULL,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (company_id, year, quarter),
+    INDEX idx_period (year, quarter),
     FOREIGN KEY (company_id) REFERENCES companies(id)
 );
 
+-- Universe-level risk density per fiscal quarter
+CREATE TABLE IF NOT EXISTS risk_density_history (
+    year INT NOT NULL,
+    quarter INT NOT NULL,
+    total_companies INT,
+    flagged_companies INT,
+    total_flags INT,
+    high_flags INT,
+    medium_flags INT,
+    risk_density DOUBLE,                   -- (HIGH*3 + MEDIUM*2) / total_companies
+    avg_risk_score DOUBLE,
+    run_id INT NULL,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (year, quarter)
+);
+
 -- Flag Definitions (Optional but future-proof)
 CREATE TABLE IF NOT EXISTS flag_definitions (
     flag_code VARCHAR(50) PRIMARY KEY,
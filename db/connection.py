@@ -1,24 +1,19 @@
-import os
-import mysql.connector
-from mysql.connector import Error
 from dotenv import load_dotenv
 
+from db.backends import get_backend
+
 # Load environment variables
 load_dotenv()
 
 def get_connection():
-    try:
-        connection = mysql.connector.connect(
-            host=os.getenv("DB_HOST", "localhost"),
-            port=int(os.getenv("DB_PORT", 3306)),
-            user=os.getenv("DB_USER", "flagium_user"),
-            password=os.getenv("DB_PASS"),
-            database=os.getenv("DB_NAME", "flagium")
-        )
+    """Connection on the configured storage backend (DB_BACKEND, default mysql).
+
+    On MySQL it comes from the shared connection pool; close() returns it.
+    """
+    return get_backend().connect()
 
-        if connection.is_connected():
-            return connection
 
-    except Error as e:
-        print("❌ Error while connecting to MySQL:", e)
-        raise
+def pool_stats():
+    """Connection pool metrics for the configured backend, or None if it does not pool."""
+    stats = getattr(get_backend(), "pool_stats", None)
+    return stats() if stats is not None else None
@@ -0,0 +1,34 @@
+from db.connection import get_connection
+
+# flag_runs columns needed to checkpoint and --resume engine runs
+CHECKPOINT_COLUMNS = [
+    ("ticker", "VARCHAR(50) NULL"),
+    ("target_periods", "TEXT NULL"),
+    ("last_company_id", "INT NULL"),
+    ("checkpointed_at", "TIMESTAMP NULL"),
+]
+
+def migrate():
+    print("🚀 Starting flag engine checkpoint migration...")
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        for column, definition in CHECKPOINT_COLUMNS:
+            cursor.execute(f"SHOW COLUMNS FROM flag_runs LIKE '{column}'")
+            if not cursor.fetchone():
+                cursor.execute(f"ALTER TABLE flag_runs ADD COLUMN {column} {definition}")
+                print(f"✅ '{column}' column added to 'flag_runs'.")
+            else:
+                print(f"ℹ️ '{column}' column already exists.")
+
+        conn.commit()
+        print("✅ Migration Complete.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
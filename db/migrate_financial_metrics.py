@@ -0,0 +1,45 @@
+from db.connection import get_connection
+from engine.financial_metrics import rebuild_financial_metrics
+
+def migrate():
+    print("🚀 Starting financial metrics migration...")
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        # TTM / growth / coverage per company-period, kept current by save_financials()
+        print("Creating 'financial_metrics' table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS financial_metrics (
+                company_id INT NOT NULL,
+                year INT NOT NULL,
+                quarter TINYINT NOT NULL DEFAULT 0,
+                ttm_revenue BIGINT,
+                ttm_net_profit BIGINT,
+                ttm_profit_before_tax BIGINT,
+                ebit BIGINT,
+                interest_coverage DOUBLE,
+                revenue_yoy DOUBLE,
+                net_profit_yoy DOUBLE,
+                revenue_qoq DOUBLE,
+                net_profit_qoq DOUBLE,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (company_id, year, quarter),
+                FOREIGN KEY (company_id) REFERENCES companies(id)
+            )
+        """)
+        conn.commit()
+
+        # Seed every existing period
+        count = rebuild_financial_metrics(conn)
+        print(f"✅ Seeded {count} row(s) from 'financials'.")
+
+        print("✅ Migration Complete.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,61 @@
+from db.connection import get_connection
+
+def migrate():
+    print("🚀 Starting point-in-time financials migration...")
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        # Append-only vintages: one row per (company, period, filing date)
+        print("Creating 'financials_history' table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS financials_history (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                company_id INT NOT NULL,
+                year INT NOT NULL,
+                quarter TINYINT DEFAULT 0,
+                filing_date DATE NOT NULL,
+                revenue BIGINT,
+                net_profit BIGINT,
+                profit_before_tax BIGINT,
+                operating_cash_flow BIGINT,
+                free_cash_flow BIGINT,
+                total_debt BIGINT,
+                interest_expense BIGINT,
+                recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE KEY uq_financials_vintage (company_id, year, quarter, filing_date),
+                INDEX idx_financials_history_filed (filing_date),
+                FOREIGN KEY (company_id) REFERENCES companies(id)
+            )
+        """)
+
+        # Seed with the current numbers, dated when they were last written
+        cursor.execute("""
+            INSERT IGNORE INTO financials_history
+                (company_id, year, quarter, filing_date, revenue, net_profit, profit_before_tax,
+                 operating_cash_flow, free_cash_flow, total_debt, interest_expense)
+            SELECT company_id, year, quarter, DATE(COALESCE(updated_at, created_at)),
+                   revenue, net_profit, profit_before_tax,
+                   operating_cash_flow, free_cash_flow, total_debt, interest_expense
+            FROM financials
+        """)
+        print(f"✅ Seeded {cursor.rowcount} vintage(s) from 'financials'.")
+
+        # As-of date of a flag run (for --resume)
+        cursor.execute("SHOW COLUMNS FROM flag_runs LIKE 'as_of'")
+        if not cursor.fetchone():
+            cursor.execute("ALTER TABLE flag_runs ADD COLUMN as_of DATE NULL")
+            print("✅ 'as_of' column added to 'flag_runs'.")
+        else:
+            print("ℹ️ 'as_of' column already exists.")
+
+        conn.commit()
+        print("✅ Migration Complete.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,44 @@
+from db.connection import get_connection
+
+def migrate():
+    print("🚀 Starting flag change feed migration...")
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        # Append-only change log written by save_flags(); id is the API cursor
+        cursor.execute("SHOW TABLES LIKE 'flag_events'")
+        if not cursor.fetchone():
+            cursor.execute("""
+                CREATE TABLE flag_events (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    run_id INT NULL,
+                    company_id INT NOT NULL,
+                    flag_code VARCHAR(50),
+                    flag_name VARCHAR(100),
+                    period_type VARCHAR(20),
+                    fiscal_year INT,
+                    fiscal_quarter INT DEFAULT 0,
+                    event_type VARCHAR(20) NOT NULL,
+                    severity VARCHAR(20) NULL,
+                    previous_severity VARCHAR(20) NULL,
+                    message TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_flag_events_run (run_id),
+                    INDEX idx_flag_events_company (company_id, id)
+                )
+            """)
+            print("✅ 'flag_events' table created.")
+        else:
+            print("ℹ️ 'flag_events' table already exists.")
+
+        conn.commit()
+        print("✅ Migration Complete.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,60 @@
+from db.connection import get_connection
+
+def migrate():
+    print("🚀 Adding change tracking columns to 'flags'...")
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SHOW COLUMNS FROM flags LIKE 'content_hash'")
+        if not cursor.fetchone():
+            cursor.execute("ALTER TABLE flags ADD COLUMN content_hash CHAR(40) NULL")
+            print("✅ 'content_hash' column added.")
+        else:
+            print("ℹ️ 'content_hash' column already exists.")
+
+        cursor.execute("SHOW COLUMNS FROM flags LIKE 'updated_at'")
+        if not cursor.fetchone():
+            cursor.execute("""
+                ALTER TABLE flags
+                ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            """)
+            cursor.execute("UPDATE flags SET updated_at = created_at")
+            print("✅ 'updated_at' column added.")
+        else:
+            print("ℹ️ 'updated_at' column already exists.")
+
+        # One row per company / flag / period (save_flags upserts on it)
+        cursor.execute("SHOW INDEX FROM flags WHERE Key_name = 'uq_flags_period'")
+        if not cursor.fetchall():
+            # The old writer could insert a period twice; keep the newest row of each
+            cursor.execute("""
+                DELETE older FROM flags older
+                JOIN flags newer
+                  ON newer.company_id = older.company_id
+                 AND newer.flag_code = older.flag_code
+                 AND newer.period_type = older.period_type
+                 AND newer.fiscal_year = older.fiscal_year
+                 AND newer.fiscal_quarter = older.fiscal_quarter
+                 AND newer.id > older.id
+            """)
+            if cursor.rowcount:
+                print(f"✅ Removed {cursor.rowcount} duplicate flag row(s), kept the newest of each period.")
+            cursor.execute("""
+                ALTER TABLE flags ADD UNIQUE KEY uq_flags_period
+                    (company_id, flag_code, period_type, fiscal_year, fiscal_quarter)
+            """)
+            print("✅ Unique key 'uq_flags_period' added.")
+        else:
+            print("ℹ️ Unique key 'uq_flags_period' already exists.")
+
+        conn.commit()
+        print("✅ Migration Complete.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,42 @@
+from db.connection import get_connection
+
+def migrate():
+    print("🚀 Starting point-in-time flags migration...")
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        # run_flags(as_of=...) writes here instead of the live flags / flag_events
+        cursor.execute("SHOW TABLES LIKE 'flags_as_of'")
+        if not cursor.fetchone():
+            cursor.execute("""
+                CREATE TABLE flags_as_of (
+                    as_of DATE NOT NULL,
+                    company_id INT NOT NULL,
+                    flag_code VARCHAR(50) NOT NULL,
+                    flag_name VARCHAR(100),
+                    severity VARCHAR(20),
+                    period_type VARCHAR(20) NOT NULL DEFAULT 'annual',
+                    fiscal_year INT NOT NULL,
+                    fiscal_quarter INT NOT NULL DEFAULT 0,
+                    message TEXT,
+                    details JSON,
+                    run_id INT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (as_of, company_id, flag_code, period_type, fiscal_year, fiscal_quarter)
+                )
+            """)
+            print("✅ 'flags_as_of' table created.")
+        else:
+            print("ℹ️ 'flags_as_of' table already exists.")
+
+        conn.commit()
+        print("✅ Migration Complete.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
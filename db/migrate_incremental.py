@@ -0,0 +1,48 @@
+from db.connection import get_connection
+
+def migrate():
+    print("🚀 Starting incremental flag engine migration...")
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        # Per-row data watermark on financials
+        cursor.execute("SHOW COLUMNS FROM financials LIKE 'updated_at'")
+        if not cursor.fetchone():
+            cursor.execute("""
+                ALTER TABLE financials
+                ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                ADD INDEX idx_financials_updated_at (updated_at)
+            """)
+            cursor.execute("UPDATE financials SET updated_at = created_at")
+            print("✅ 'updated_at' column added to 'financials'.")
+        else:
+            print("ℹ️ 'updated_at' column already exists.")
+
+        # Flag engine run ledger
+        print("Creating 'flag_runs' table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS flag_runs (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                mode VARCHAR(20) NOT NULL,
+                status VARCHAR(20) NOT NULL,
+                watermark DATETIME NOT NULL,
+                companies_evaluated INT DEFAULT 0,
+                flags_detected INT DEFAULT 0,
+                message TEXT,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP NULL,
+                INDEX idx_flag_runs_status (status, watermark)
+            )
+        """)
+
+        conn.commit()
+        print("✅ Migration Complete.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
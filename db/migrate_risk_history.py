@@ -0,0 +1,62 @@
+from db.connection import get_connection
+from engine.risk_history import record_risk_history, SERIES_QUARTERS
+from engine.runner import get_current_fiscal_quarter, get_previous_quarters
+
+def migrate():
+    print("🚀 Starting risk score history migration...")
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        # Per-company risk score per fiscal quarter
+        print("Creating 'risk_score_history' table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS risk_score_history (
+                company_id INT NOT NULL,
+                year INT NOT NULL,
+                quarter INT NOT NULL,
+                risk_score INT,
+                flag_count INT,
+                severity_points INT,
+                run_id INT NULL,
+                computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (company_id, year, quarter),
+                INDEX idx_period (year, quarter),
+                FOREIGN KEY (company_id) REFERENCES companies(id)
+            )
+        """)
+
+        # Universe risk density per fiscal quarter
+        print("Creating 'risk_density_history' table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS risk_density_history (
+                year INT NOT NULL,
+                quarter INT NOT NULL,
+                total_companies INT,
+                flagged_companies INT,
+                total_flags INT,
+                high_flags INT,
+                medium_flags INT,
+                risk_density DOUBLE,
+                avg_risk_score DOUBLE,
+                run_id INT NULL,
+                computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (year, quarter)
+            )
+        """)
+        conn.commit()
+
+        # Seed the sparkline window from the flags currently stored
+        periods = get_previous_quarters(*get_current_fiscal_quarter(), count=SERIES_QUARTERS)
+        count = record_risk_history(conn, periods)
+        print(f"✅ Recorded {count} company-quarter score(s) for {len(periods)} quarter(s).")
+
+        print("✅ Migration Complete.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
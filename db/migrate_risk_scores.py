@@ -0,0 +1,42 @@
+from db.connection import get_connection
+from engine.risk_scores import refresh_risk_scores
+
+def migrate():
+    print("🚀 Starting company risk score migration...")
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        # calculate_risk_score() output per company, rewritten after every engine run
+        print("Creating 'company_risk_scores' table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS company_risk_scores (
+                company_id INT PRIMARY KEY,
+                risk_score INT,
+                status VARCHAR(50),
+                primary_driver VARCHAR(100),
+                narrative TEXT,
+                history JSON,
+                predictive JSON,
+                structural_scores JSON,
+                timeline JSON,
+                flag_count INT,
+                run_id INT NULL,
+                computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (company_id) REFERENCES companies(id)
+            )
+        """)
+        conn.commit()
+
+        count = refresh_risk_scores(conn)
+        print(f"✅ Scored {count} company(ies) from current flags.")
+
+        print("✅ Migration Complete.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
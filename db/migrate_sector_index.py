@@ -0,0 +1,35 @@
+from db.connection import get_connection
+from engine.sector_index import refresh_sector_index
+
+def migrate():
+    print("🚀 Starting sector percentile index migration...")
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        # Sorted peer values per (sector, metric), rebuilt after every engine run
+        print("Creating 'sector_distributions' table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sector_distributions (
+                sector VARCHAR(100) NOT NULL,
+                metric VARCHAR(100) NOT NULL,
+                sample_size INT,
+                sorted_values LONGTEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (sector, metric)
+            )
+        """)
+        conn.commit()
+
+        count = refresh_sector_index(conn)
+        print(f"✅ Built {count} distribution(s) from current flags.")
+
+        print("✅ Migration Complete.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
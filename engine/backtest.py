@@ -0,0 +1,381 @@
+"""
+Flagium — Historical Backtest
+
+Replays every active flag over every company and every available fiscal
+quarter, joins the hits with what happened next (a later profit collapse,
+consecutive negative FCF years) and reports, per flag and outcome:
+
+    precision   share of hits followed by the outcome within the horizon
+    base_rate   same share over every evaluated company-quarter (lift = precision / base_rate)
+    lead time   quarters from the hit to the first subsequent outcome
+    coverage    share of outcomes preceded by a hit within the horizon
+
+Financials are read once into an in-memory snapshot and the connection is
+closed before evaluation starts: a backtest never writes to, or holds, the
+production database. Periods are split across a process pool; every
+worker evaluates its periods with vectorized check_batch() passes.
+
+With --point-in-time, each quarter is evaluated against the
+financials_history vintages public REPORTING_LAG_DAYS after it ended, so
+restated numbers do not leak into past signals. Outcomes are always judged
+on the latest numbers.
+
+Usage:
+    python -m engine.backtest --horizon 8 --workers 4
+    python -m engine.backtest --point-in-time --json backtest.json
+"""
+
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+from db.connection import get_connection
+from engine.history import load_histories, load_vintages, histories_as_of
+from engine.panel import FinancialsPanel
+from engine.rules import load_flag_definitions
+from flags import FLAG_REGISTRY, flags_from_definitions
+from ingestion.db_writer import get_all_companies
+
+# Quarters after a hit within which an outcome counts as predicted
+DEFAULT_HORIZON = 8
+
+# Days after a fiscal quarter ends until its results are assumed public (--point-in-time)
+REPORTING_LAG_DAYS = 60
+
+# Outcome: net profit falls by more than this fraction YoY (from a positive base)
+PROFIT_COLLAPSE_DROP = 0.5
+
+# Outcome: this many consecutive years of negative free cash flow
+NEGATIVE_FCF_YEARS = 2
+
+# Row label for "any active flag"
+ANY_FLAG = "ANY"
+
+
+# ──────────────────────────────────────────────
+# Timeline helpers
+# ──────────────────────────────────────────────
+
+def quarter_end(year, quarter):
+    """Last calendar day of Indian fiscal (year, quarter); Q4 ends 31 March of `year`."""
+    if quarter == 4:
+        return date(year, 3, 31)
+    return {1: date(year - 1, 6, 30), 2: date(year - 1, 9, 30), 3: date(year - 1, 12, 31)}[quarter]
+
+
+def available_periods(panel):
+    """Every (year, quarter) with at least one quarterly row, or an annual row at Q4."""
+    periods = []
+    for yi, year in enumerate(panel.years):
+        for quarter in range(1, 5):
+            has_data = panel.quarterly_present[:, yi * 4 + quarter - 1].any()
+            if quarter == 4:
+                has_data = has_data or panel.annual_present[:, yi].any()
+            if has_data:
+                periods.append((int(year), quarter))
+    return periods
+
+
+def evaluated_mask(panel):
+    """(companies, quarters) bool: the company has data to evaluate at that quarter."""
+    mask = panel.quarterly_present.copy()
+    mask[:, 3::4] |= panel.annual_present
+    return mask
+
+
+# ──────────────────────────────────────────────
+# Outcomes
+# ──────────────────────────────────────────────
+
+def _shift(values, periods):
+    """values[:, t - periods] at t (NaN before the start)."""
+    shifted = np.full_like(values, np.nan)
+    shifted[:, periods:] = values[:, :-periods]
+    return shifted
+
+
+def outcome_events(panel):
+    """{outcome: (companies, quarters) bool} on the panel's quarterly timeline.
+
+    Annual outcomes are placed at the fiscal year's Q4.
+    """
+    quarters = panel.quarterly.shape[1]
+
+    net_q = panel.metric("net_profit", "quarterly")
+    prev_q = _shift(net_q, 4)
+    net_a = panel.metric("net_profit", "annual")
+    prev_a = _shift(net_a, 1)
+    collapse = (prev_q > 0) & (net_q < prev_q * (1 - PROFIT_COLLAPSE_DROP))
+    collapse[:, 3::4] |= (prev_a > 0) & (net_a < prev_a * (1 - PROFIT_COLLAPSE_DROP))
+
+    fcf = panel.metric("free_cash_flow", "annual")
+    streak = fcf < 0
+    for lag in range(1, NEGATIVE_FCF_YEARS):
+        streak &= _shift(fcf, lag) < 0
+    negative_fcf = np.zeros((panel.size, quarters), dtype=bool)
+    negative_fcf[:, 3::4] = streak
+
+    return {"profit_collapse": collapse, "negative_fcf_streak": negative_fcf}
+
+
+def _next_event(events):
+    """Index of the first event strictly after each t (len(timeline) if none)."""
+    n, quarters = events.shape
+    following = np.full((n, quarters), quarters)
+    upcoming = np.full(n, quarters)
+    for t in range(quarters - 1, -1, -1):
+        following[:, t] = upcoming
+        upcoming = np.where(events[:, t], t, upcoming)
+    return following
+
+
+def _previous_hit(hits):
+    """Index of the last hit strictly before each t (-1 if none)."""
+    n, quarters = hits.shape
+    preceding = np.full((n, quarters), -1)
+    last = np.full(n, -1)
+    for t in range(quarters):
+        preceding[:, t] = last
+        last = np.where(hits[:, t], t, last)
+    return preceding
+
+
+def score_flag(hits, events, evaluated, horizon, first_t, last_t):
+    """Precision / lead-time / coverage for one hit matrix against one outcome.
+
+    Hits within `horizon` quarters of the end of the data, and outcomes
+    within `horizon` quarters of its start, are censored (their window is
+    not fully observed) and excluded.
+    """
+    quarters = hits.shape[1]
+    timeline = np.arange(quarters)
+    following = _next_event(events)
+    lead = following - timeline[None, :]
+    predicted = lead <= horizon
+
+    observed = (timeline + horizon <= last_t)[None, :]
+    scored_hits = hits & observed
+    population = evaluated & observed
+    true_hits = scored_hits & predicted
+
+    covered_window = (timeline - horizon >= first_t)[None, :]
+    scored_events = events & covered_window
+    preceding = _previous_hit(hits)
+    covered = scored_events & (preceding >= 0) & (timeline[None, :] - preceding <= horizon)
+
+    n_hits = int(scored_hits.sum())
+    base_rate = float((population & predicted).sum() / population.sum()) if population.any() else 0.0
+    precision = float(true_hits.sum() / n_hits) if n_hits else 0.0
+    leads = lead[true_hits]
+    return {
+        "hits": n_hits,
+        "companies_flagged": int(scored_hits.any(axis=1).sum()),
+        "precision": round(precision, 4),
+        "base_rate": round(base_rate, 4),
+        "lift": round(precision / base_rate, 2) if base_rate else None,
+        "median_lead_quarters": float(np.median(leads)) if leads.size else None,
+        "mean_lead_quarters": round(float(leads.mean()), 2) if leads.size else None,
+        "events": int(scored_events.sum()),
+        "coverage": round(float(covered.sum() / scored_events.sum()), 4) if scored_events.any() else 0.0,
+    }
+
+
+# ──────────────────────────────────────────────
+# Replay (process-pool workers)
+# ──────────────────────────────────────────────
+
+_WORKER = {}
+
+
+def _init_worker(state):
+    """Pool initializer: keep the snapshot and build the flag set once per process."""
+    _WORKER.clear()
+    _WORKER.update(state)
+    definitions = state.get("definitions")
+    _WORKER["flags"] = flags_from_definitions(definitions) if definitions is not None else FLAG_REGISTRY
+    if state.get("histories") is not None:
+        _WORKER["panel"] = FinancialsPanel.from_histories(state["histories"], state["companies"])
+
+
+def _check_all(flag, panel, period_type, year, quarter=None):
+    """Company ids flagged by `flag` at one period (check_batch, else per company)."""
+    if hasattr(flag, "check_batch"):
+        return set(flag.check_batch(panel, period_type, year, quarter))
+    return {
+        int(panel.company_ids[ci])
+        for ci in range(panel.size)
+        if flag.check_history(panel.history(ci), panel.tickers[ci], period_type=period_type, year=year, quarter=quarter)
+    }
+
+
+def _replay_periods(periods):
+    """Worker task: [(flag_code, company_id, year, quarter), ...] hits for `periods`."""
+    flags = _WORKER["flags"]
+    hits = []
+    for year, quarter in periods:
+        panel = _WORKER.get("panel")
+        if panel is None:
+            known_on = quarter_end(year, quarter) + timedelta(days=_WORKER["lag_days"])
+            panel = FinancialsPanel.from_histories(histories_as_of(_WORKER["vintages"], known_on),
+                                                   _WORKER["companies"])
+        for flag in flags:
+            flagged = set()
+            if getattr(flag, "SUPPORTS_QUARTERLY", False):
+                flagged |= _check_all(flag, panel, "quarterly", year, quarter)
+            if quarter == 4:
+                flagged |= _check_all(flag, panel, "annual", year)
+            hits.extend((flag.FLAG_CODE, cid, year, quarter) for cid in flagged)
+    return hits
+
+
+def replay(companies, periods, definitions=None, histories=None, vintages=None, workers=1,
+           lag_days=REPORTING_LAG_DAYS):
+    """Evaluate every active flag at every period, in parallel over periods.
+
+    Exactly one of `histories` (latest numbers) or `vintages` (point-in-time)
+    is used as the snapshot.
+
+    Returns:
+        List of (flag_code, company_id, year, quarter) hits.
+    """
+    state = {"companies": companies, "definitions": definitions, "histories": histories,
+             "vintages": vintages, "lag_days": lag_days}
+    if workers <= 1 or len(periods) <= 1:
+        _init_worker(state)
+        return _replay_periods(periods)
+
+    chunks = [periods[i::workers] for i in range(workers) if periods[i::workers]]
+    with ProcessPoolExecutor(max_workers=len(chunks), initializer=_init_worker, initargs=(state,)) as pool:
+        return [hit for chunk_hits in pool.map(_replay_periods, chunks) for hit in chunk_hits]
+
+
+# ──────────────────────────────────────────────
+# Backtest
+# ──────────────────────────────────────────────
+
+def backtest(histories, companies, definitions=None, horizon=DEFAULT_HORIZON, workers=1, vintages=None,
+             lag_days=REPORTING_LAG_DAYS):
+    """Run the full backtest over an in-memory snapshot.
+
+    Args:
+        histories: {company_id: CompanyHistory} with the latest numbers
+            (outcomes are judged on these).
+        companies: List of {id, ticker, ...} dicts.
+        definitions: Output of load_flag_definitions(); None = built-in defaults.
+        horizon: Quarters after a hit in which an outcome counts.
+        workers: Processes to spread the periods over.
+        vintages: Optional load_vintages() output; flags are then evaluated
+            point-in-time, `lag_days` after each quarter ends.
+
+    Returns:
+        dict with "periods", "horizon" and "rows" (one per flag × outcome,
+        plus ANY_FLAG for the union of all flags).
+    """
+    panel = FinancialsPanel.from_histories(histories, companies)
+    periods = available_periods(panel)
+    if not periods:
+        return {"periods": [], "horizon": horizon, "rows": []}
+
+    hits = replay(companies, periods, definitions,
+                  histories=None if vintages is not None else histories, vintages=vintages,
+                  workers=workers, lag_days=lag_days)
+
+    row_of = {int(cid): i for i, cid in enumerate(panel.company_ids)}
+    shape = panel.quarterly_present.shape
+    matrices = {}
+    for code, cid, year, quarter in hits:
+        t = panel.period_index("quarterly", year, quarter)
+        if t is None:
+            continue
+        matrices.setdefault(code, np.zeros(shape, dtype=bool))[row_of[cid], t] = True
+    if matrices:
+        matrices[ANY_FLAG] = np.logical_or.reduce(list(matrices.values()))
+
+    evaluated = evaluated_mask(panel)
+    timeline = np.flatnonzero(evaluated.any(axis=0))
+    first_t, last_t = int(timeline[0]), int(timeline[-1])
+
+    rows = []
+    for outcome, events in outcome_events(panel).items():
+        for code in sorted(matrices, key=lambda c: (c == ANY_FLAG, c)):
+            rows.append({"flag_code": code, "outcome": outcome,
+                         **score_flag(matrices[code], events, evaluated, horizon, first_t, last_t)})
+
+    return {"periods": [list(p) for p in periods], "horizon": horizon, "rows": rows}
+
+
+def load_snapshot(point_in_time=False, snapshot=None):
+    """Read everything the backtest needs in one pass, then release the connection.
+
+    With `snapshot` (a directory written by engine/snapshot.py, or a root
+    holding several), the data is read from its Parquet files instead of
+    the database.
+
+    Returns:
+        (histories, companies, definitions, vintages) — vintages is None
+        unless `point_in_time`.
+    """
+    if snapshot is not None:
+        if point_in_time:
+            raise ValueError("--point-in-time needs financials_history, which snapshots do not carry")
+        from engine import snapshot as snap
+        return snap.load_histories(snapshot), snap.load_companies(snapshot), snap.load_flag_definitions(snapshot), None
+
+    conn = get_connection()
+    try:
+        companies = get_all_companies(conn)
+        histories = load_histories(conn)
+        vintages = load_vintages(conn) if point_in_time else None
+        try:
+            definitions = load_flag_definitions(conn)
+        except Exception:
+            definitions = None
+    finally:
+        conn.close()
+    return histories, companies, definitions, vintages
+
+
+def run_backtest(horizon=DEFAULT_HORIZON, workers=1, point_in_time=False, snapshot=None):
+    """Snapshot the database (or read a columnar snapshot) and run backtest() over it."""
+    histories, companies, definitions, vintages = load_snapshot(point_in_time, snapshot)
+    return backtest(histories, companies, definitions, horizon=horizon, workers=workers, vintages=vintages)
+
+
+def write_result(result, path):
+    """Write the full backtest result to a JSON file."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote backtest result to {path}")
+
+
+def print_report(result):
+    periods = result["periods"]
+    if periods:
+        print(f"Backtest over {len(periods)} quarter(s) {tuple(periods[0])} .. {tuple(periods[-1])}, "
+              f"horizon {result['horizon']} quarter(s)")
+    print(f"{'Flag':<5} {'Outcome':<20} {'Hits':>6} {'Prec':>6} {'Base':>6} {'Lift':>5} "
+          f"{'Lead(med)':>9} {'Events':>7} {'Cover':>6}")
+    for r in result["rows"]:
+        lift = f"{r['lift']:.1f}" if r["lift"] is not None else "-"
+        lead = f"{r['median_lead_quarters']:.1f}" if r["median_lead_quarters"] is not None else "-"
+        print(f"{r['flag_code']:<5} {r['outcome']:<20} {r['hits']:>6} {r['precision']:>6.2f} {r['base_rate']:>6.2f} "
+              f"{lift:>5} {lead:>9} {r['events']:>7} {r['coverage']:>6.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest flag hit rates against later outcomes (read-only)")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON, help="Quarters after a hit in which an outcome counts")
+    parser.add_argument("--workers", type=int, default=1, help="Processes to spread the periods over")
+    parser.add_argument("--point-in-time", action="store_true", help="Evaluate each quarter on the financials_history vintages known at the time")
+    parser.add_argument("--snapshot", help="Read a columnar snapshot directory (engine/snapshot.py) instead of the database")
+    parser.add_argument("--json", dest="json_path", help="Write the full result to this file")
+    args = parser.parse_args()
+
+    result = run_backtest(horizon=args.horizon, workers=args.workers, point_in_time=args.point_in_time,
+                          snapshot=args.snapshot)
+    print_report(result)
+    if args.json_path:
+        write_result(result, args.json_path)
@@ -0,0 +1,173 @@
+"""
+Flagium — Materialized Financial Metrics
+
+`financial_metrics` holds, per company-period, the derived values the API
+and the engine keep re-deriving from raw `financials` rows: TTM revenue /
+PAT / PBT, YoY and QoQ growth, EBIT and interest coverage. The formulas
+are engine/metrics.py's, so the table always agrees with what the flags
+compute in memory.
+
+`save_financials()` calls `refresh_financial_metrics()` for the periods it
+writes, in the same transaction. A written period also moves the metrics
+of the periods that read it:
+
+    quarter (Y, Q)   itself, the next quarter (QoQ), the next three
+                     quarters (TTM) and (Y+1, Q) (YoY)
+    annual  (Y, 0)   itself and (Y+1, 0) (YoY)
+
+so only those rows are recomputed. `rebuild_financial_metrics()` recomputes
+everything (first load, or after a formula change):
+
+    python -m engine.financial_metrics
+"""
+
+import time
+
+from db.connection import get_connection
+from engine.history import CompanyHistory, FINANCIAL_COLUMNS, load_histories
+from engine.metrics import derived_metrics
+
+# Sums over the four quarters ending at the period (quarterly rows only)
+TTM_METRICS = ("revenue", "net_profit", "profit_before_tax")
+
+# Growth vs the same period a year earlier / the preceding quarter
+GROWTH_METRICS = ("revenue", "net_profit")
+
+METRIC_COLUMNS = (
+    tuple(f"ttm_{m}" for m in TTM_METRICS)
+    + ("ebit", "interest_coverage")
+    + tuple(f"{m}_yoy" for m in GROWTH_METRICS)
+    + tuple(f"{m}_qoq" for m in GROWTH_METRICS)
+)
+
+# Rows per executemany() batch while rebuilding
+REBUILD_BATCH = 5000
+
+
+def _next_quarter(year, quarter):
+    return (year, quarter + 1) if quarter < 4 else (year + 1, 1)
+
+
+def affected_periods(periods):
+    """Periods whose metrics read any of `periods` (including themselves)."""
+    affected = set()
+    for year, quarter in periods:
+        affected.add((year, quarter))
+        affected.add((year + 1, quarter))
+        if quarter:
+            period = (year, quarter)
+            for _ in range(3):
+                period = _next_quarter(*period)
+                affected.add(period)
+    return affected
+
+
+def period_metrics(history, year, quarter=0):
+    """{column: value} for one period of `history` (see METRIC_COLUMNS)."""
+    metrics = derived_metrics(history)
+    values = {
+        "ebit": metrics.ebit(year, quarter),
+        "interest_coverage": metrics.interest_coverage(year, quarter),
+    }
+    for m in TTM_METRICS:
+        values[f"ttm_{m}"] = metrics.ttm(m, year, quarter) if quarter else None
+    for m in GROWTH_METRICS:
+        values[f"{m}_yoy"] = metrics.yoy(m, year, quarter)
+        values[f"{m}_qoq"] = metrics.qoq(m, year, quarter) if quarter else None
+    return values
+
+
+def _rows(company_id, history, periods):
+    """financial_metrics rows for the `periods` present in `history`."""
+    rows = []
+    for year, quarter in sorted(periods):
+        present = history.quarter_row(year, quarter, ("year",)) if quarter else history.annual_row(year, ("year",))
+        if present:
+            values = period_metrics(history, year, quarter)
+            rows.append((company_id, year, quarter) + tuple(values[c] for c in METRIC_COLUMNS))
+    return rows
+
+
+_UPSERT_SQL = f"""
+    INSERT INTO financial_metrics (company_id, year, quarter, {", ".join(METRIC_COLUMNS)})
+    VALUES ({", ".join(["%s"] * (3 + len(METRIC_COLUMNS)))})
+    ON DUPLICATE KEY UPDATE {", ".join(f"{c} = VALUES({c})" for c in METRIC_COLUMNS)},
+        updated_at = NOW()
+"""
+
+
+def refresh_financial_metrics(cursor, company_id, periods):
+    """Recompute the metrics `periods` feed for one company.
+
+    Reads the company's financials in the year range those metrics span
+    (one indexed range scan) and upserts the affected rows. The caller
+    commits.
+
+    Args:
+        cursor: Active cursor (tuple rows).
+        company_id: Company whose financials were written.
+        periods: (year, quarter) tuples just inserted or revised.
+
+    Returns:
+        Number of financial_metrics rows written.
+    """
+    if not periods:
+        return 0
+    targets = affected_periods(periods)
+    years = [y for y, _ in targets]
+    cursor.execute(
+        f"""
+        SELECT year, quarter, {", ".join(FINANCIAL_COLUMNS)} FROM financials
+        WHERE company_id = %s AND year BETWEEN %s AND %s
+        """,
+        (company_id, min(years) - 1, max(years))
+    )
+    names = ("year", "quarter") + FINANCIAL_COLUMNS
+    history = CompanyHistory.from_rows(company_id, [dict(zip(names, r)) for r in cursor.fetchall()])
+
+    rows = _rows(company_id, history, targets)
+    if rows:
+        cursor.executemany(_UPSERT_SQL, rows)
+    return len(rows)
+
+
+def rebuild_financial_metrics(conn, company_ids=None):
+    """Recompute financial_metrics for every period of `company_ids` (default all).
+
+    Returns:
+        Number of rows written.
+    """
+    histories = load_histories(conn, company_ids)
+    cursor = conn.cursor()
+    written, batch = 0, []
+    try:
+        for cid, history in histories.items():
+            periods = [(y, 0) for y in history.annual] + list(history.quarterly)
+            batch.extend(_rows(cid, history, periods))
+            if len(batch) >= REBUILD_BATCH:
+                cursor.executemany(_UPSERT_SQL, batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(_UPSERT_SQL, batch)
+            written += len(batch)
+        conn.commit()
+        return written
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+if __name__ == "__main__":
+    print("🚀 Rebuilding financial_metrics...")
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        count = rebuild_financial_metrics(conn)
+        print(f"✅ {count:,} row(s) written in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        print(f"❌ Rebuild failed: {e}")
+    finally:
+        conn.close()
@@ -0,0 +1,245 @@
+"""
+Flagium — Preloaded Financial History
+
+Streams the whole `financials` table once (ordered by company, year, quarter)
+and builds an in-memory history per company. Flag modules that implement
+`check_history()` evaluate against these histories instead of issuing their
+own SELECTs, so a full scan costs one sequential read.
+
+With `as_of`, the same histories are built from `financials_history`
+instead: for every period, the latest vintage filed on or before that
+date, i.e. the numbers that were knowable then.
+"""
+
+from bisect import bisect_right
+
+# Metric columns carried for every period
+FINANCIAL_COLUMNS = (
+    "revenue",
+    "net_profit",
+    "profit_before_tax",
+    "operating_cash_flow",
+    "free_cash_flow",
+    "total_debt",
+    "interest_expense",
+)
+
+# Rows pulled from the cursor per round trip while streaming
+FETCH_BATCH_SIZE = 5000
+
+
+def _project(row, columns):
+    """Return a copy of `row` restricted to `columns` (all columns if None)."""
+    if row is None:
+        return None
+    if columns is None:
+        return dict(row)
+    return {col: row.get(col) for col in columns}
+
+
+class CompanyHistory:
+    """All annual and quarterly financial rows for one company.
+
+    Annual rows are keyed by year, quarterly rows by (year, quarter).
+    Accessors mirror the SELECTs the flag modules used to run, so
+    `check_history()` can produce exactly what `check()` would.
+    """
+
+    def __init__(self, company_id):
+        self.company_id = company_id
+        self.annual = {}
+        self.quarterly = {}
+        self._derived = None
+        self._annual_years = None
+
+    @classmethod
+    def from_rows(cls, company_id, rows):
+        """History holding just `rows` (e.g. the result of a flag's own SELECT)."""
+        history = cls(company_id)
+        for row in rows:
+            if row:
+                history.add(row)
+        return history
+
+    def add(self, row):
+        """Add a financials row (dict with year, quarter and metric columns)."""
+        self._derived = None
+        self._annual_years = None
+        quarter = row.get("quarter") or 0
+        if quarter == 0:
+            self.annual[row["year"]] = {k: v for k, v in row.items() if k != "quarter"}
+        else:
+            self.quarterly[(row["year"], quarter)] = dict(row)
+
+    # ── Annual ──
+
+    def annual_rows(self, year=None, limit=None, columns=None):
+        """Annual rows (newest first) with year <= `year`, at most `limit` rows.
+
+        The sorted year index is built once per history, so sliding this
+        window across backfill periods is a bisect and a slice.
+        """
+        if self._annual_years is None:
+            self._annual_years = sorted(self.annual)
+        end = len(self._annual_years) if year is None else bisect_right(self._annual_years, year)
+        start = 0 if limit is None else max(end - limit, 0)
+        return [_project(self.annual[y], columns) for y in reversed(self._annual_years[start:end])]
+
+    def annual_row(self, year, columns=None):
+        """Annual row for exactly `year`, or None."""
+        return _project(self.annual.get(year), columns)
+
+    def latest_annual_row(self, columns=None):
+        rows = self.annual_rows(limit=1, columns=columns)
+        return rows[0] if rows else None
+
+    # ── Quarterly ──
+
+    def quarter_row(self, year, quarter, columns=None):
+        """Quarterly row for exactly (year, quarter), or None."""
+        return _project(self.quarterly.get((year, quarter)), columns)
+
+    def latest_quarter_row(self, columns=None):
+        if not self.quarterly:
+            return None
+        return _project(self.quarterly[max(self.quarterly)], columns)
+
+
+def load_histories(conn, company_ids=None, id_range=None, as_of=None):
+    """Stream `financials` once and build a CompanyHistory per company.
+
+    Args:
+        conn: Active MySQL connection.
+        company_ids: Optional iterable of company ids to restrict the read to.
+        id_range: Optional inclusive (min_id, max_id) company id range.
+        as_of: Optional date. Read `financials_history` instead, taking for
+            each (company, year, quarter) the latest vintage with
+            filing_date <= as_of. Periods first filed later are absent.
+
+    Returns:
+        dict mapping company_id -> CompanyHistory
+    """
+    where, params = [], ()
+    if company_ids is not None:
+        company_ids = list(company_ids)
+        if not company_ids:
+            return {}
+        placeholders = ", ".join(["%s"] * len(company_ids))
+        where.append(f"company_id IN ({placeholders})")
+        params = tuple(company_ids)
+    elif id_range is not None:
+        where.append("company_id BETWEEN %s AND %s")
+        params = tuple(id_range)
+
+    if as_of is None:
+        columns = ", ".join(FINANCIAL_COLUMNS)
+        query = f"SELECT company_id, year, quarter, {columns} FROM financials"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY company_id, year, quarter"
+    else:
+        query, params = _as_of_query(where, params, as_of)
+
+    names = ("company_id", "year", "quarter") + FINANCIAL_COLUMNS
+    histories = {}
+    current = None
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not batch:
+                break
+            for values in batch:
+                row = dict(zip(names, values))
+                cid = row.pop("company_id")
+                if current is None or current.company_id != cid:
+                    current = histories.setdefault(cid, CompanyHistory(cid))
+                current.add(row)
+    finally:
+        cursor.close()
+
+    return histories
+
+
+def _as_of_query(where, params, as_of):
+    """Latest-vintage-before-date SELECT over financials_history.
+
+    The inner MAX(filing_date) ... GROUP BY is served by the
+    (company_id, year, quarter, filing_date) unique key, so each period's
+    vintage is one index probe.
+    """
+    columns = ", ".join(f"h.{col}" for col in FINANCIAL_COLUMNS)
+    inner_where = " AND ".join(["filing_date <= %s"] + where)
+    query = f"""
+        SELECT h.company_id, h.year, h.quarter, {columns}
+        FROM financials_history h
+        JOIN (
+            SELECT company_id, year, quarter, MAX(filing_date) AS filing_date
+            FROM financials_history
+            WHERE {inner_where}
+            GROUP BY company_id, year, quarter
+        ) v ON v.company_id = h.company_id AND v.year = h.year
+           AND v.quarter = h.quarter AND v.filing_date = h.filing_date
+        ORDER BY h.company_id, h.year, h.quarter
+    """
+    return query, (as_of,) + tuple(params)
+
+
+def load_vintages(conn, company_ids=None):
+    """Stream every `financials_history` version into memory.
+
+    Returns:
+        dict mapping company_id -> {(year, quarter): (filing_dates, rows)},
+        both lists in ascending filing_date order. Pass to
+        histories_as_of() to rebuild the universe as of any date without
+        going back to the database.
+    """
+    columns = ", ".join(FINANCIAL_COLUMNS)
+    query = f"SELECT company_id, year, quarter, filing_date, {columns} FROM financials_history"
+    params = ()
+    if company_ids is not None:
+        company_ids = list(company_ids)
+        if not company_ids:
+            return {}
+        query += f" WHERE company_id IN ({', '.join(['%s'] * len(company_ids))})"
+        params = tuple(company_ids)
+    query += " ORDER BY company_id, year, quarter, filing_date"
+
+    names = ("company_id", "year", "quarter", "filing_date") + FINANCIAL_COLUMNS
+    vintages = {}
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not batch:
+                break
+            for values in batch:
+                row = dict(zip(names, values))
+                cid = row.pop("company_id")
+                filed = row.pop("filing_date")
+                dates, rows = vintages.setdefault(cid, {}).setdefault((row["year"], row["quarter"] or 0), ([], []))
+                dates.append(filed)
+                rows.append(row)
+    finally:
+        cursor.close()
+
+    return vintages
+
+
+def histories_as_of(vintages, as_of):
+    """In-memory counterpart of load_histories(as_of=...) over load_vintages() output."""
+    histories = {}
+    for cid, periods in vintages.items():
+        history = None
+        for dates, rows in periods.values():
+            i = bisect_right(dates, as_of)
+            if not i:
+                continue
+            if history is None:
+                history = histories[cid] = CompanyHistory(cid)
+            history.add(rows[i - 1])
+    return histories
@@ -0,0 +1,217 @@
+"""
+Flagium — Incremental Flag Engine Support
+
+Tracks which financials changed since the last successful engine run
+(via `financials.updated_at`) and which target periods those changes can
+affect, plus the `flag_runs` ledger that records each run's watermark and
+its per-company checkpoints (for `--resume`).
+"""
+
+import json
+
+# Annual flags look back at most this many annual rows (F1 lookback, F2 streak);
+# the default when the active flags are not known, see flag_lookbacks()
+ANNUAL_LOOKBACK_YEARS = 3
+
+# Quarterly flags compare a quarter with the same quarter this many years later (YoY)
+QUARTERLY_LOOKAHEAD_YEARS = 1
+
+
+def current_watermark(conn):
+    """Database clock at the start of a run; becomes the run's watermark."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT NOW()")
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def last_watermark(conn):
+    """Watermark of the latest completed run, or None if there is none.
+
+    As-of runs evaluate older vintages and --ticker runs cover one company,
+    so neither advances the watermark.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT MAX(watermark) FROM flag_runs WHERE status = 'completed' AND mode <> 'as_of' AND ticker IS NULL"
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        cursor.close()
+
+
+def start_run(conn, mode, watermark, ticker=None, target_periods=None, as_of=None):
+    """Insert a 'running' row into the flag_runs ledger and return its id.
+
+    `ticker`, `target_periods` and `as_of` are stored so the run can be resumed.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            INSERT INTO flag_runs (mode, status, watermark, ticker, target_periods, as_of)
+            VALUES (%s, 'running', %s, %s, %s, %s)
+            """,
+            (mode, watermark, ticker, json.dumps([list(p) for p in target_periods or []]), as_of)
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        cursor.close()
+
+
+def load_run(conn, run_id):
+    """A flag_runs row with its checkpoint, or None.
+
+    Returns:
+        dict with mode, status, watermark, ticker, target_periods (list of
+        (year, quarter)), as_of, last_company_id, companies_evaluated,
+        flags_detected
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            """
+            SELECT id, mode, status, watermark, ticker, target_periods, as_of,
+                   last_company_id, companies_evaluated, flags_detected
+            FROM flag_runs WHERE id = %s
+            """,
+            (run_id,)
+        )
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not row:
+        return None
+    row["target_periods"] = [tuple(p) for p in json.loads(row["target_periods"] or "[]")]
+    return row
+
+
+def reopen_run(conn, run_id):
+    """Mark an interrupted run as 'running' again before resuming it."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "UPDATE flag_runs SET status = 'running', message = NULL, finished_at = NULL WHERE id = %s",
+            (run_id,)
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def save_checkpoint(conn, run_id, last_company_id, companies_evaluated, flags_detected):
+    """Record the last fully written company for a run.
+
+    Not committed here: the caller commits it in the same transaction as
+    the flags it covers, so a checkpoint never points past unwritten work.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            UPDATE flag_runs
+            SET last_company_id = %s, companies_evaluated = %s, flags_detected = %s,
+                checkpointed_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+            """,
+            (last_company_id, companies_evaluated, flags_detected, run_id)
+        )
+    finally:
+        cursor.close()
+
+
+def finish_run(conn, run_id, status, companies_evaluated=0, flags_detected=0, message=None):
+    """Close a flag_runs row as 'completed' or 'failed'."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            UPDATE flag_runs
+            SET status = %s, companies_evaluated = %s, flags_detected = %s,
+                message = %s, finished_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+            """,
+            (status, companies_evaluated, flags_detected, message, run_id)
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def get_changed_periods(conn, since, company_ids=None):
+    """Financials rows written at or after `since`.
+
+    The comparison is inclusive so rows written in the same second the
+    previous run started are re-evaluated rather than missed.
+
+    Returns:
+        dict mapping company_id -> set of (year, quarter); quarter 0 = annual
+    """
+    query = "SELECT company_id, year, quarter FROM financials WHERE updated_at >= %s"
+    params = [since]
+    if company_ids is not None:
+        company_ids = list(company_ids)
+        if not company_ids:
+            return {}
+        query += f" AND company_id IN ({', '.join(['%s'] * len(company_ids))})"
+        params.extend(company_ids)
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, tuple(params))
+        changed = {}
+        for cid, year, quarter in cursor.fetchall():
+            changed.setdefault(cid, set()).add((year, quarter or 0))
+        return changed
+    finally:
+        cursor.close()
+
+
+def flag_lookbacks(flags):
+    """(annual_lookback, quarterly_lookahead) covering every flag in `flags`.
+
+    Each flag's LOOKBACK_YEARS is the number of years of rows one of its
+    evaluations reads, ending at the evaluated period (configured windows
+    included: F1 `lookback`, F2 `streak_years`, a rule's prev() and window
+    sizes). Flags without it count with the module defaults.
+    """
+    annual = quarterly = 1
+    for flag in flags:
+        years = getattr(flag, "LOOKBACK_YEARS", None)
+        annual = max(annual, years or ANNUAL_LOOKBACK_YEARS)
+        if getattr(flag, "SUPPORTS_QUARTERLY", False):
+            quarterly = max(quarterly, years or QUARTERLY_LOOKAHEAD_YEARS + 1)
+    return annual, quarterly - 1
+
+
+def affected_targets(changed, target_quarters, annual_lookback=ANNUAL_LOOKBACK_YEARS,
+                     quarterly_lookahead=QUARTERLY_LOOKAHEAD_YEARS):
+    """Target (year, quarter) periods whose flags read any of the `changed` rows.
+
+    A quarterly row (y, q) feeds the quarterly checks at (y, q) and its YoY
+    comparisons up to (y + quarterly_lookahead, q). An annual row y feeds
+    the annual checks (run at Q4) for years y .. y + annual_lookback - 1.
+
+    Args:
+        changed: Set of (year, quarter) rows that changed for one company.
+        target_quarters: List of (year, quarter) periods the run covers.
+        annual_lookback, quarterly_lookahead: From flag_lookbacks() over the
+            run's active flags.
+
+    Returns:
+        The subset of target_quarters to re-evaluate, in the same order.
+    """
+    affected = set()
+    for year, quarter in changed:
+        if quarter:
+            for offset in range(quarterly_lookahead + 1):
+                affected.add((year + offset, quarter))
+        else:
+            for offset in range(annual_lookback):
+                affected.add((year + offset, 4))
+    return [period for period in target_quarters if period in affected]
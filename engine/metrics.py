@@ -0,0 +1,156 @@
+"""
+Flagium — Derived Metrics
+
+Values several flags need (EBIT, interest coverage, YoY/QoQ growth, TTM
+sums, rolling annual windows) computed once per company-period and
+memoized on the company's history. Flag modules read these through
+`derived_metrics(history)` instead of re-deriving them from raw rows, so
+adding a flag does not add another pass over the same data.
+
+Periods are (year, quarter) with quarter 0 for the annual row.
+"""
+
+
+# ──────────────────────────────────────────────
+# Row-level formulas
+# ──────────────────────────────────────────────
+
+def ebit(row):
+    """EBIT = Profit Before Tax + Interest Expense (None if either is missing)."""
+    if not row:
+        return None
+    pbt = row.get("profit_before_tax")
+    interest = row.get("interest_expense")
+    if pbt is None or interest is None:
+        return None
+    return pbt + interest
+
+
+def interest_coverage(row):
+    """EBIT / Interest Expense (None if missing or interest is zero)."""
+    value = ebit(row)
+    if value is None or not row["interest_expense"]:
+        return None
+    return value / row["interest_expense"]
+
+
+def growth(current, previous):
+    """Fractional change from `previous` to `current` (None if undefined)."""
+    if current is None or previous is None or not previous:
+        return None
+    return (current - previous) / previous
+
+
+def _previous_quarter(year, quarter):
+    return (year, quarter - 1) if quarter > 1 else (year - 1, 4)
+
+
+# ──────────────────────────────────────────────
+# Memoized per-company stage
+# ──────────────────────────────────────────────
+
+class DerivedMetrics:
+    """Memoized derived values over one company's history.
+
+    Works on anything exposing the CompanyHistory accessor API (the
+    preloaded CompanyHistory and the panel's per-row view alike).
+    """
+
+    def __init__(self, history):
+        self.history = history
+        self._cache = {}
+
+    def _memo(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    # ── Rows ──
+
+    def row(self, year, quarter=0):
+        """Full row for one period, or None."""
+        def compute():
+            if quarter:
+                return self.history.quarter_row(year, quarter)
+            return self.history.annual_row(year)
+        return self._memo(("row", year, quarter), compute)
+
+    def latest_period(self, period_type="annual"):
+        """(year, quarter) of the newest row of `period_type`, or None."""
+        def compute():
+            if period_type == "quarterly":
+                row = self.history.latest_quarter_row(("year", "quarter"))
+                return (row["year"], row["quarter"]) if row else None
+            row = self.history.latest_annual_row(("year",))
+            return (row["year"], 0) if row else None
+        return self._memo(("latest", period_type), compute)
+
+    def annual_window(self, year, size, columns=None):
+        """Last `size` existing annual rows at or before `year` (newest first)."""
+        years = self._memo(
+            ("window", year, size),
+            lambda: tuple(r["year"] for r in self.history.annual_rows(year, limit=size, columns=("year",))),
+        )
+        rows = [self.row(y) for y in years]
+        if columns is None:
+            return rows
+        return [{col: r.get(col) for col in columns} for r in rows]
+
+    def rolling(self, metric, year, size):
+        """Values of `metric` over annual_window(year, size), newest first."""
+        return self._memo(
+            ("rolling", metric, year, size),
+            lambda: [r.get(metric) for r in self.annual_window(year, size)],
+        )
+
+    # ── Derived values ──
+
+    def ebit(self, year, quarter=0):
+        return self._memo(("ebit", year, quarter), lambda: ebit(self.row(year, quarter)))
+
+    def interest_coverage(self, year, quarter=0):
+        return self._memo(("coverage", year, quarter), lambda: interest_coverage(self.row(year, quarter)))
+
+    def _value(self, metric, year, quarter):
+        row = self.row(year, quarter)
+        return row.get(metric) if row else None
+
+    def change(self, metric, current, previous):
+        """Growth of `metric` from period `previous` to period `current`."""
+        return self._memo(
+            ("change", metric, current, previous),
+            lambda: growth(self._value(metric, *current), self._value(metric, *previous)),
+        )
+
+    def yoy(self, metric, year, quarter=0):
+        """Growth of `metric` vs the same period one year earlier."""
+        return self.change(metric, (year, quarter), (year - 1, quarter))
+
+    def qoq(self, metric, year, quarter):
+        """Growth of `metric` vs the immediately preceding quarter."""
+        return self.change(metric, (year, quarter), _previous_quarter(year, quarter))
+
+    def ttm(self, metric, year, quarter):
+        """Sum of `metric` over the four quarters ending at (year, quarter).
+
+        None unless all four quarters are present with a value.
+        """
+        def compute():
+            total, period = 0, (year, quarter)
+            for _ in range(4):
+                value = self._value(metric, *period)
+                if value is None:
+                    return None
+                total += value
+                period = _previous_quarter(*period)
+            return total
+        return self._memo(("ttm", metric, year, quarter), compute)
+
+
+def derived_metrics(history):
+    """The memoized DerivedMetrics attached to `history` (created on first use)."""
+    metrics = getattr(history, "_derived", None)
+    if metrics is None:
+        metrics = DerivedMetrics(history)
+        history._derived = metrics
+    return metrics
@@ -0,0 +1,245 @@
+"""
+Flagium — Vectorized Financials Panel
+
+Dense company × fiscal period × metric arrays built from preloaded
+histories. Flag modules implement `check_batch(panel, ...)` as array
+expressions over every company at once; only the hits are turned into
+result dicts (through the module's own `check_history()`, so the message
+and details are identical to the per-row path).
+
+Layout:
+    annual     (companies, years, metrics)         NaN = missing value
+    quarterly  (companies, years * 4, metrics)     index = year_offset * 4 + quarter - 1
+    *_present  (companies, periods) bool           row exists in financials
+"""
+
+import numpy as np
+
+from engine.history import FINANCIAL_COLUMNS
+
+METRICS = FINANCIAL_COLUMNS
+METRIC_INDEX = {name: i for i, name in enumerate(METRICS)}
+
+
+def _to_python(value):
+    """Convert a panel cell back to the DB representation (int or None)."""
+    value = float(value)
+    if value != value:
+        return None
+    return int(value)
+
+
+class FinancialsPanel:
+    """Company × period × metric arrays for the whole universe."""
+
+    def __init__(self, company_ids, tickers, years, annual, annual_present, quarterly, quarterly_present):
+        self.company_ids = np.asarray(company_ids)
+        self.tickers = list(tickers)
+        self.years = np.asarray(years)
+        self.annual = annual
+        self.annual_present = annual_present
+        self.quarterly = quarterly
+        self.quarterly_present = quarterly_present
+        self.row_of = {int(cid): i for i, cid in enumerate(self.company_ids)}
+        self._annual_order = None
+        self._annual_counts = None
+
+    @classmethod
+    def from_histories(cls, histories, companies):
+        """Build a panel from {company_id: CompanyHistory} for `companies`.
+
+        Args:
+            histories: Output of engine.history.load_histories().
+            companies: List of {id, ticker, ...} dicts; defines the row order.
+        """
+        all_years = set()
+        for h in histories.values():
+            all_years.update(h.annual)
+            all_years.update(y for y, _ in h.quarterly)
+        years = np.arange(min(all_years), max(all_years) + 1) if all_years else np.arange(0)
+        first_year = int(years[0]) if len(years) else 0
+
+        n_companies = len(companies)
+        n_years = len(years)
+        n_metrics = len(METRICS)
+
+        annual = np.full((n_companies, n_years, n_metrics), np.nan)
+        annual_present = np.zeros((n_companies, n_years), dtype=bool)
+        quarterly = np.full((n_companies, n_years * 4, n_metrics), np.nan)
+        quarterly_present = np.zeros((n_companies, n_years * 4), dtype=bool)
+
+        for ci, company in enumerate(companies):
+            h = histories.get(company["id"])
+            if h is None:
+                continue
+            for year, row in h.annual.items():
+                yi = year - first_year
+                annual_present[ci, yi] = True
+                annual[ci, yi] = [np.nan if row.get(m) is None else row[m] for m in METRICS]
+            for (year, quarter), row in h.quarterly.items():
+                pi = (year - first_year) * 4 + quarter - 1
+                quarterly_present[ci, pi] = True
+                quarterly[ci, pi] = [np.nan if row.get(m) is None else row[m] for m in METRICS]
+
+        return cls(
+            [c["id"] for c in companies],
+            [c["ticker"] for c in companies],
+            years, annual, annual_present, quarterly, quarterly_present,
+        )
+
+    @property
+    def size(self):
+        return len(self.company_ids)
+
+    # ── Indexing ──
+
+    def period_index(self, period_type, year, quarter=None):
+        """Position of (year, quarter) on the period axis, or None if out of range."""
+        if not len(self.years) or year is None:
+            return None
+        yi = int(year) - int(self.years[0])
+        if yi < 0 or yi >= len(self.years):
+            return None
+        if period_type == "quarterly":
+            if not quarter:
+                return None
+            return yi * 4 + int(quarter) - 1
+        return yi
+
+    def metric(self, name, period_type="annual"):
+        """(companies, periods) view of one metric."""
+        values = self.quarterly if period_type == "quarterly" else self.annual
+        return values[:, :, METRIC_INDEX[name]]
+
+    def present(self, period_type="annual"):
+        return self.quarterly_present if period_type == "quarterly" else self.annual_present
+
+    def column(self, name, period_type, year, quarter=None):
+        """(companies,) values of `name` at one period; all NaN if out of range."""
+        idx = self.period_index(period_type, year, quarter)
+        if idx is None:
+            return np.full(self.size, np.nan)
+        return self.metric(name, period_type)[:, idx]
+
+    def present_at(self, period_type, year, quarter=None):
+        """(companies,) bool: row exists at one period."""
+        idx = self.period_index(period_type, year, quarter)
+        if idx is None:
+            return np.zeros(self.size, dtype=bool)
+        return self.present(period_type)[:, idx]
+
+    def annual_window(self, year, size, metrics):
+        """Last `size` existing annual rows at or before `year`, newest first.
+
+        Mirrors `WHERE year <= %s ORDER BY year DESC LIMIT size`: rows need
+        not be consecutive years, only consecutive *existing* rows.
+
+        The ordering of present years and their running counts are computed
+        once per panel, so each additional backfill year is a gather.
+
+        Returns:
+            (values, complete): values maps metric -> (companies, size) array,
+            complete is a (companies,) bool mask of companies with `size` rows.
+        """
+        n_years = len(self.years)
+        values = {m: np.full((self.size, size), np.nan) for m in metrics}
+        if not n_years or year is None or year < self.years[0]:
+            return values, np.zeros(self.size, dtype=bool)
+
+        if self._annual_order is None:
+            # Year positions of present rows in ascending order, left-aligned,
+            # and the number of present rows up to each year
+            self._annual_order = np.argsort(~self.annual_present, axis=1, kind="stable")
+            self._annual_counts = np.cumsum(self.annual_present, axis=1)
+
+        yi = min(int(year) - int(self.years[0]), n_years - 1)
+        counts = self._annual_counts[:, yi]
+        complete = counts >= size
+
+        ranks = counts[:, None] - 1 - np.arange(size)[None, :]
+        ranks = np.clip(ranks, 0, max(yi, 0))
+        year_idx = np.take_along_axis(self._annual_order, ranks, axis=1)
+
+        rows = np.arange(self.size)[:, None]
+        for m in metrics:
+            window = self.annual[rows, year_idx, METRIC_INDEX[m]]
+            window[~complete] = np.nan
+            values[m] = window
+        return values, complete
+
+    # ── Per-company access (CompanyHistory-compatible) ──
+
+    def history(self, row):
+        """CompanyHistory-compatible view of one panel row."""
+        return _PanelHistory(self, row)
+
+    def hits_to_results(self, check_history, hits, period_type, year, quarter=None):
+        """Turn a (companies,) hit mask into {company_id: result} via check_history()."""
+        results = {}
+        for ci in np.flatnonzero(hits):
+            result = check_history(
+                self.history(ci), self.tickers[ci],
+                period_type=period_type, year=year, quarter=quarter,
+            )
+            if result:
+                results[int(self.company_ids[ci])] = result
+        return results
+
+
+class _PanelHistory:
+    """Read-only view of one company inside a FinancialsPanel.
+
+    Exposes the CompanyHistory accessor API so flag modules can format
+    batch hits with the same check_history() used by the per-row path.
+    """
+
+    def __init__(self, panel, row):
+        self.panel = panel
+        self.row = row
+        self.company_id = int(panel.company_ids[row])
+
+    def _annual(self, yi, columns):
+        values = self.panel.annual[self.row, yi]
+        row = {"year": int(self.panel.years[yi])}
+        for m in (METRICS if columns is None else columns):
+            if m in METRIC_INDEX:
+                row[m] = _to_python(values[METRIC_INDEX[m]])
+        return row if columns is None else {c: row.get(c) for c in columns}
+
+    def _quarter(self, pi, columns):
+        values = self.panel.quarterly[self.row, pi]
+        row = {"year": int(self.panel.years[0]) + pi // 4, "quarter": pi % 4 + 1}
+        for m in (METRICS if columns is None else columns):
+            if m in METRIC_INDEX:
+                row[m] = _to_python(values[METRIC_INDEX[m]])
+        return row if columns is None else {c: row.get(c) for c in columns}
+
+    def annual_rows(self, year=None, limit=None, columns=None):
+        present = np.flatnonzero(self.panel.annual_present[self.row])[::-1]
+        if year is not None:
+            present = present[self.panel.years[present] <= year]
+        if limit is not None:
+            present = present[:limit]
+        return [self._annual(int(yi), columns) for yi in present]
+
+    def annual_row(self, year, columns=None):
+        yi = self.panel.period_index("annual", year)
+        if yi is None or not self.panel.annual_present[self.row, yi]:
+            return None
+        return self._annual(yi, columns)
+
+    def latest_annual_row(self, columns=None):
+        rows = self.annual_rows(limit=1, columns=columns)
+        return rows[0] if rows else None
+
+    def quarter_row(self, year, quarter, columns=None):
+        pi = self.panel.period_index("quarterly", year, quarter)
+        if pi is None or not self.panel.quarterly_present[self.row, pi]:
+            return None
+        return self._quarter(pi, columns)
+
+    def latest_quarter_row(self, columns=None):
+        present = np.flatnonzero(self.panel.quarterly_present[self.row])
+        if not len(present):
+            return None
+        return self._quarter(int(present[-1]), columns)
@@ -0,0 +1,211 @@
+"""
+Flagium — Flag Engine Run Report
+
+Instrumentation collected while the engine runs: wall time per flag module
+and per company, SQL statements and rows read per flag, exceptions per
+flag and the slowest companies. At the end of a run the report is written
+to logs/engine_run_report.json and to the `system_reports` row
+'engine_run' (next to 'daily_sanity'), where api/admin.py serves it.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+REPORT_TYPE = "engine_run"
+REPORT_PATH = os.path.join(
+    os.getenv("FLAGIUM_LOG_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs"),
+    "engine_run_report.json"
+)
+
+# Slowest companies kept in the report / sample error messages kept per flag
+SLOWEST_COMPANIES = 20
+MAX_ERROR_SAMPLES = 5
+
+# Attribution bucket for SQL issued outside any flag (preload, writes, ...)
+ENGINE_SCOPE = "engine"
+
+
+def _flag_entry():
+    return {"seconds": 0.0, "calls": 0, "hits": 0, "errors": 0, "error_samples": [],
+            "sql_statements": 0, "rows_read": 0, "batch_seconds": 0.0}
+
+
+class RunReport:
+    """Accumulates per-flag / per-company timings for one engine run.
+
+    Plain dicts only, so shard reports pickle back from worker processes
+    and merge() into the parent's report.
+    """
+
+    def __init__(self):
+        self.flags = {}
+        self.companies = {}
+        self.scope = ENGINE_SCOPE
+
+    def _flag(self, code):
+        if code not in self.flags:
+            self.flags[code] = _flag_entry()
+        return self.flags[code]
+
+    @contextmanager
+    def flag_scope(self, code):
+        """Attribute SQL issued inside the block to flag `code`."""
+        previous, self.scope = self.scope, code
+        try:
+            yield
+        finally:
+            self.scope = previous
+
+    def record_call(self, code, seconds, hit):
+        entry = self._flag(code)
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        entry["hits"] += 1 if hit else 0
+
+    def record_batch(self, code, seconds, hits):
+        entry = self._flag(code)
+        entry["batch_seconds"] += seconds
+        entry["hits"] += hits
+
+    def record_error(self, code, context, error):
+        entry = self._flag(code)
+        entry["errors"] += 1
+        if len(entry["error_samples"]) < MAX_ERROR_SAMPLES:
+            entry["error_samples"].append(f"{context}: {type(error).__name__}: {error}")
+
+    def record_company(self, ticker, seconds):
+        self.companies[ticker] = self.companies.get(ticker, 0.0) + seconds
+
+    def record_sql(self, statements=0, rows=0):
+        entry = self._flag(self.scope)
+        entry["sql_statements"] += statements
+        entry["rows_read"] += rows
+
+    def merge(self, other):
+        """Fold another RunReport (e.g. from a shard worker) into this one."""
+        for code, theirs in other.flags.items():
+            mine = self._flag(code)
+            for key, value in theirs.items():
+                if key == "error_samples":
+                    mine[key] = (mine[key] + value)[:MAX_ERROR_SAMPLES]
+                else:
+                    mine[key] += value
+        for ticker, seconds in other.companies.items():
+            self.record_company(ticker, seconds)
+
+    def to_dict(self, **summary):
+        """JSON-serializable report; `summary` keys are added at the top level."""
+        slowest = sorted(self.companies.items(), key=lambda kv: kv[1], reverse=True)[:SLOWEST_COMPANIES]
+        flags = {
+            code: {**entry, "seconds": round(entry["seconds"], 4), "batch_seconds": round(entry["batch_seconds"], 4)}
+            for code, entry in sorted(self.flags.items())
+        }
+        return {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            **summary,
+            "companies_timed": len(self.companies),
+            "company_seconds_total": round(sum(self.companies.values()), 4),
+            "flags": flags,
+            "slowest_companies": [{"ticker": t, "seconds": round(s, 4)} for t, s in slowest],
+        }
+
+
+# ──────────────────────────────────────────────
+# SQL counting
+# ──────────────────────────────────────────────
+
+class _CountingCursor:
+    """Cursor proxy that counts statements and fetched rows into a RunReport."""
+
+    def __init__(self, cursor, report):
+        self._cursor = cursor
+        self._report = report
+
+    def execute(self, *args, **kwargs):
+        self._report.record_sql(statements=1)
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._report.record_sql(statements=1)
+        return self._cursor.executemany(*args, **kwargs)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._report.record_sql(rows=1)
+        return row
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._report.record_sql(rows=len(rows) if isinstance(rows, list) else 0)
+        return rows
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._report.record_sql(rows=len(rows) if isinstance(rows, list) else 0)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CountingConnection:
+    """Connection proxy whose cursors report SQL to `report`'s current scope."""
+
+    def __init__(self, conn, report):
+        self._conn = conn
+        self._report = report
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._conn.cursor(*args, **kwargs), self._report)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+# ──────────────────────────────────────────────
+# Persistence
+# ──────────────────────────────────────────────
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def save_report(conn, data, path=REPORT_PATH):
+    """Write the report to `path` and upsert the 'engine_run' system_reports row."""
+    payload = json.dumps(data, indent=2, default=_json_default)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(payload)
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO system_reports (report_type, report_date, report_data)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                report_date = VALUES(report_date),
+                report_data = VALUES(report_data),
+                updated_at = CURRENT_TIMESTAMP
+        """, (REPORT_TYPE, date.today(), payload))
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+class Timer:
+    """Tiny perf_counter stopwatch: `with Timer() as t: ...; t.seconds`."""
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.started
+        return False
@@ -0,0 +1,247 @@
+"""
+Flagium — Persisted Risk Score Series
+
+Each engine run records every company's risk score at each of its target
+quarters in `risk_score_history`, and the universe's severity-weighted
+risk density in `risk_density_history`. A quarter's value counts the flags
+raised in or before it (quarterly flags at their quarter, annual flags at
+Q4 of their fiscal year). A backfill run fills its whole window; a regular
+run overwrites only its own quarter, so earlier quarters keep the values
+they had when they were recorded, even after a flag is retired.
+
+Sparklines, QoQ deltas and acceleration are then range scans over
+precomputed rows:
+
+    load_score_series(cursor, [company_id])     # last SERIES_QUARTERS rows
+    load_density_series(cursor)
+
+`refresh_risk_scores()` scores a company on its recorded window in place of
+the history `calculate_risk_score()` reconstructs from the current flags,
+once every quarter of the window is recorded.
+
+Usage:
+    python -m engine.risk_history [QUARTERS]    # record the last QUARTERS fiscal quarters
+"""
+
+import sys
+import time
+
+from db.connection import get_connection
+from engine.risk_scores import load_flags_by_company
+
+SERIES_QUARTERS = 6
+
+# Dashboard severity points: HIGH=3, MEDIUM=2, anything else 1
+SEVERITY_POINTS = {"HIGH": 3, "MEDIUM": 2}
+
+# Rows per executemany() batch
+HISTORY_WRITE_CHUNK = 1000
+
+
+def quarter_ordinal(year, quarter):
+    """Consecutive integer per fiscal quarter, for comparisons and gaps."""
+    return year * 4 + quarter - 1
+
+
+def _flag_ordinal(flag):
+    """Quarter a flag was raised in: its own quarter, or Q4 for annual flags; None if unknown."""
+    year = flag.get("fiscal_year")
+    if not year:
+        return None
+    return quarter_ordinal(year, flag.get("fiscal_quarter") or 4)
+
+
+def flags_as_of(flags_by_company, year, quarter):
+    """{company_id: flags raised in or before (year, quarter)}; undated flags always count."""
+    end = quarter_ordinal(year, quarter)
+    as_of = {}
+    for cid, flags in flags_by_company.items():
+        as_of[cid] = [f for f in flags if (_flag_ordinal(f) or end) <= end]
+    return as_of
+
+
+# ──────────────────────────────────────────────
+# Record
+# ──────────────────────────────────────────────
+
+def period_rows(flags_by_company, year, quarter):
+    """Per-company rows and the universe row for one quarter.
+
+    Returns:
+        ([(company_id, risk_score, flag_count, severity_points)],
+         {total_companies, flagged_companies, total_flags, high_flags,
+          medium_flags, risk_density, avg_risk_score})
+    """
+    from api.scoring import calculate_risk_scores_bulk
+
+    as_of = flags_as_of(flags_by_company, year, quarter)
+    scores = calculate_risk_scores_bulk(as_of)
+
+    rows = []
+    high = medium = 0
+    for cid, flags in as_of.items():
+        severities = [f.get("severity") for f in flags]
+        high += severities.count("HIGH")
+        medium += severities.count("MEDIUM")
+        points = sum(SEVERITY_POINTS.get(s, 1) for s in severities)
+        rows.append((cid, scores[cid]["risk_score"], len(flags), points))
+
+    total = len(rows)
+    universe = {
+        "total_companies": total,
+        "flagged_companies": sum(1 for r in rows if r[2]),
+        "total_flags": sum(r[2] for r in rows),
+        "high_flags": high,
+        "medium_flags": medium,
+        "risk_density": (high * 3 + medium * 2) / total if total else 0.0,
+        "avg_risk_score": sum(r[1] for r in rows) / total if total else 0.0,
+    }
+    return rows, universe
+
+
+def record_risk_history(conn, periods, run_id=None, flags_by_company=None):
+    """Upsert every company's score and the universe row for each of `periods`.
+
+    Args:
+        conn: Active connection; committed on success.
+        periods: [(fiscal_year, fiscal_quarter)], e.g. a run's target quarters.
+        run_id: flag_runs id recorded on the rows.
+        flags_by_company: load_flags_by_company() output, read when omitted.
+
+    Returns:
+        Number of company-quarter rows written.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id FROM companies")
+        company_ids = [r[0] for r in cursor.fetchall()]
+        flags = load_flags_by_company(conn, None) if flags_by_company is None else flags_by_company
+        flags_by_company = {cid: flags.get(cid, []) for cid in company_ids}
+
+        written = 0
+        for year, quarter in periods:
+            rows, universe = period_rows(flags_by_company, year, quarter)
+            rows = [(cid, year, quarter, score, count, points, run_id) for cid, score, count, points in rows]
+            for i in range(0, len(rows), HISTORY_WRITE_CHUNK):
+                cursor.executemany(
+                    """
+                    INSERT INTO risk_score_history
+                        (company_id, year, quarter, risk_score, flag_count, severity_points, run_id)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE risk_score = VALUES(risk_score), flag_count = VALUES(flag_count),
+                        severity_points = VALUES(severity_points), run_id = VALUES(run_id), computed_at = NOW()
+                    """,
+                    rows[i:i + HISTORY_WRITE_CHUNK]
+                )
+            cursor.execute(
+                """
+                INSERT INTO risk_density_history
+                    (year, quarter, total_companies, flagged_companies, total_flags, high_flags,
+                     medium_flags, risk_density, avg_risk_score, run_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE total_companies = VALUES(total_companies),
+                    flagged_companies = VALUES(flagged_companies), total_flags = VALUES(total_flags),
+                    high_flags = VALUES(high_flags), medium_flags = VALUES(medium_flags),
+                    risk_density = VALUES(risk_density), avg_risk_score = VALUES(avg_risk_score),
+                    run_id = VALUES(run_id), computed_at = NOW()
+                """,
+                (year, quarter, universe["total_companies"], universe["flagged_companies"],
+                 universe["total_flags"], universe["high_flags"], universe["medium_flags"],
+                 universe["risk_density"], universe["avg_risk_score"], run_id)
+            )
+            written += len(rows)
+        conn.commit()
+        return written
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# ──────────────────────────────────────────────
+# Read
+# ──────────────────────────────────────────────
+
+def load_score_series(cursor, company_ids, quarters=SERIES_QUARTERS):
+    """Each company's last `quarters` recorded scores, oldest first.
+
+    Args:
+        cursor: Dictionary cursor.
+        company_ids: Companies to read, or None for all.
+
+    Returns:
+        {company_id: [{"year", "quarter", "risk_score"}]}; companies without
+        rows are absent.
+    """
+    if company_ids is not None and not company_ids:
+        return {}
+    where = "" if company_ids is None else f"WHERE company_id IN ({', '.join(['%s'] * len(company_ids))})"
+    cursor.execute(
+        f"""
+        SELECT company_id, year, quarter, risk_score
+        FROM risk_score_history
+        {where}
+        ORDER BY company_id, year DESC, quarter DESC
+        """,
+        tuple(company_ids or ())
+    )
+    series = {}
+    for row in cursor.fetchall():
+        points = series.setdefault(row["company_id"], [])
+        if len(points) < quarters:
+            points.append({"year": row["year"], "quarter": row["quarter"], "risk_score": row["risk_score"]})
+    return {cid: points[::-1] for cid, points in series.items()}
+
+
+def load_density_series(cursor, quarters=SERIES_QUARTERS):
+    """The universe's last `quarters` recorded rows of risk_density_history, oldest first."""
+    cursor.execute(
+        """
+        SELECT year, quarter, total_companies, flagged_companies, total_flags, high_flags,
+               medium_flags, risk_density, avg_risk_score
+        FROM risk_density_history
+        ORDER BY year DESC, quarter DESC
+        LIMIT %s
+        """,
+        (quarters,)
+    )
+    return cursor.fetchall()[::-1]
+
+
+def complete_window(points, quarters=SERIES_QUARTERS):
+    """Scores of `points` if they are `quarters` consecutive quarters, else None."""
+    if len(points) < quarters:
+        return None
+    points = points[-quarters:]
+    ordinals = [quarter_ordinal(p["year"], p["quarter"]) for p in points]
+    if ordinals[-1] - ordinals[0] != quarters - 1:
+        return None
+    return [p["risk_score"] for p in points]
+
+
+def acceleration_index(values):
+    """Change in the quarter-on-quarter change of the last three values (None if fewer).
+
+    Positive when deterioration is speeding up, negative when it is slowing.
+    """
+    if len(values) < 3:
+        return None
+    return (values[-1] - values[-2]) - (values[-2] - values[-3])
+
+
+if __name__ == "__main__":
+    from engine.runner import get_current_fiscal_quarter, get_previous_quarters
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else SERIES_QUARTERS
+    periods = get_previous_quarters(*get_current_fiscal_quarter(), count=count)
+    print(f"🚀 Recording risk score history for {len(periods)} quarter(s)...")
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        written = record_risk_history(conn, periods)
+        print(f"✅ {written:,} company-quarter score(s) written in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        print(f"❌ Recording failed: {e}")
+    finally:
+        conn.close()
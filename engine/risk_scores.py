@@ -0,0 +1,300 @@
+"""
+Flagium — Materialized Company Risk Scores
+
+`company_risk_scores` holds `api.scoring.calculate_risk_score()`'s output
+per company (risk score, status, 6-quarter history, predictive block,
+structural scores, narrative, timeline); everything but the enriched flag
+list, which callers build with `process_flags()`. `run_flags()` rewrites it
+in bulk after the sector index, so the sector percentiles are current too;
+both are built from one score_companies() pass, and a `--ticker` run
+rewrites only that company's row.
+The history is the company's recorded series from `risk_score_history`
+once six consecutive quarters are recorded (engine.risk_history).
+
+The API reads these rows with one indexed query instead of re-scoring on
+every request. A row is stale, and the caller scores that company live,
+when the company's flags changed after the row was computed (a different
+flag count, or a flag updated later), when a newer universe-wide run has
+completed, or when it was computed in an earlier quarter (the history is
+anchored to the current quarter). Rows do not expire by age, so the weekly
+scan's rows serve the whole week.
+
+Usage:
+    python -m engine.risk_scores        # rebuild every company's row
+"""
+
+import json
+import time
+from datetime import datetime
+
+from db.connection import get_connection
+from engine.sector_index import load_sector_index
+
+# Scored columns stored as JSON text
+JSON_COLUMNS = ("history", "predictive", "structural_scores", "timeline")
+SCORE_COLUMNS = ("risk_score", "status", "primary_driver", "narrative") + JSON_COLUMNS
+
+# Rows per executemany() batch
+SCORE_WRITE_CHUNK = 1000
+
+FLAG_SELECT = """
+    SELECT f.company_id, f.flag_code, f.flag_name, f.severity, f.period_type, f.message, f.details,
+           f.fiscal_year, f.fiscal_quarter, f.created_at, fd.category, fd.impact_weight
+    FROM flags f
+    LEFT JOIN flag_definitions fd ON f.flag_code = fd.flag_code
+"""
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("T", " ")[:19])
+    return value
+
+
+def _recorded_histories(conn, company_ids):
+    """{company_id: recorded 6-quarter series} for companies with a complete window."""
+    from engine.risk_history import complete_window, load_score_series
+
+    cursor = conn.cursor(dictionary=True)
+    try:
+        series = load_score_series(cursor, company_ids)
+    except Exception:
+        return {}
+    finally:
+        cursor.close()
+    windows = {cid: complete_window(points) for cid, points in series.items()}
+    return {cid: window for cid, window in windows.items() if window is not None}
+
+
+# ──────────────────────────────────────────────
+# Write
+# ──────────────────────────────────────────────
+
+def load_flags_by_company(conn, company_ids=None, order_by="f.severity DESC"):
+    """{company_id: [flag rows]} with the columns calculate_risk_score() reads.
+
+    One query for every company. `order_by` orders each company's rows,
+    which decides the row kept when a flag_code repeats; the default matches
+    the company page.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if company_ids is None:
+            cursor.execute(FLAG_SELECT + f" ORDER BY f.company_id, {order_by}")
+        else:
+            if not company_ids:
+                return {}
+            cursor.execute(
+                FLAG_SELECT + f" WHERE f.company_id IN ({', '.join(['%s'] * len(company_ids))})"
+                f" ORDER BY f.company_id, {order_by}",
+                tuple(company_ids)
+            )
+        flags = {}
+        for row in cursor.fetchall():
+            flags.setdefault(row["company_id"], []).append(row)
+        return flags
+    finally:
+        cursor.close()
+
+
+def score_companies(conn, flags_by_company=None):
+    """Every company's current score, without sector ranks.
+
+    One calculate_risk_scores_bulk() pass with the recorded histories.
+    `run_flags()` computes it once after a run and hands it to both
+    refresh_sector_index() and refresh_risk_scores(), which adds the ranks.
+
+    Args:
+        conn: Active connection.
+        flags_by_company: load_flags_by_company() output, read when omitted.
+
+    Returns:
+        {company_id: score dict}
+    """
+    from api.scoring import calculate_risk_scores_bulk
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id FROM companies")
+        company_ids = [r[0] for r in cursor.fetchall()]
+    finally:
+        cursor.close()
+    if flags_by_company is None:
+        flags_by_company = load_flags_by_company(conn)
+    histories = _recorded_histories(conn, None)
+    return calculate_risk_scores_bulk(
+        {cid: flags_by_company.get(cid, []) for cid in company_ids}, histories=histories
+    )
+
+
+def refresh_risk_scores(conn, company_ids=None, run_id=None, sector_index=None, flags_by_company=None, scores=None):
+    """Score `company_ids` (default every company) and upsert their rows.
+
+    Args:
+        conn: Active connection; committed on success.
+        company_ids: Companies to rescore, or None for all.
+        run_id: flag_runs id recorded on the rows.
+        sector_index: SectorIndex for the sector fields; read from
+            sector_distributions when omitted.
+        flags_by_company: load_flags_by_company() output covering
+            `company_ids`, read when omitted.
+        scores: score_companies() output; those companies are only ranked
+            against `sector_index`, the rest are scored here.
+
+    Returns:
+        Number of rows written.
+    """
+    from api.scoring import calculate_risk_scores_bulk, rank_in_sector
+
+    if sector_index is None:
+        try:
+            sector_index = load_sector_index(conn)
+        except Exception:
+            sector_index = None
+
+    cursor = conn.cursor()
+    try:
+        if company_ids is None:
+            cursor.execute("SELECT id, sector FROM companies")
+        else:
+            cursor.execute(
+                f"SELECT id, sector FROM companies WHERE id IN ({', '.join(['%s'] * len(company_ids))})",
+                tuple(company_ids)
+            )
+        sectors = dict(cursor.fetchall())
+        flags = flags_by_company
+        if flags is None:
+            flags = load_flags_by_company(conn, None if company_ids is None else list(sectors))
+
+        given = scores or {}
+        ranked = {cid: rank_in_sector(given[cid], sectors[cid], sector_index) for cid in sectors if cid in given}
+        unscored = [cid for cid in sectors if cid not in given]
+        if unscored:
+            histories = _recorded_histories(conn, None if company_ids is None and not given else unscored)
+            ranked.update(calculate_risk_scores_bulk(
+                {cid: flags.get(cid, []) for cid in unscored}, sectors, sector_index, histories
+            ))
+        rows = [
+            (cid,)
+            + tuple(json.dumps(data[c], default=str) if c in JSON_COLUMNS else data[c] for c in SCORE_COLUMNS)
+            + (len(flags.get(cid, [])), run_id)
+            for cid, data in ranked.items()
+        ]
+
+        for i in range(0, len(rows), SCORE_WRITE_CHUNK):
+            cursor.executemany(
+                f"""
+                INSERT INTO company_risk_scores
+                    (company_id, {", ".join(SCORE_COLUMNS)}, flag_count, run_id)
+                VALUES ({", ".join(["%s"] * (len(SCORE_COLUMNS) + 3))})
+                ON DUPLICATE KEY UPDATE {", ".join(f"{c} = VALUES({c})" for c in SCORE_COLUMNS)},
+                    flag_count = VALUES(flag_count), run_id = VALUES(run_id), computed_at = NOW()
+                """,
+                rows[i:i + SCORE_WRITE_CHUNK]
+            )
+        conn.commit()
+        return len(rows)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# ──────────────────────────────────────────────
+# Read
+# ──────────────────────────────────────────────
+
+def load_risk_scores(cursor, company_ids, now=None):
+    """Fresh precomputed scores for `company_ids`.
+
+    Args:
+        cursor: Dictionary cursor.
+        company_ids: Companies to look up.
+        now: Clock for the quarter check (defaults to datetime.now()).
+
+    Returns:
+        {company_id: {risk_score, status, primary_driver, narrative, history,
+        predictive, structural_scores, timeline, run_id}} for rows that are
+        not stale. Missing companies need live scoring.
+    """
+    from api.scoring import current_quarter
+
+    if not company_ids:
+        return {}
+    cursor.execute(
+        f"""
+        SELECT s.company_id, {", ".join(f"s.{c}" for c in SCORE_COLUMNS)}, s.flag_count, s.run_id, s.computed_at,
+               (SELECT COUNT(*) FROM flags f WHERE f.company_id = s.company_id) AS live_flag_count,
+               (SELECT MAX(f.updated_at) FROM flags f WHERE f.company_id = s.company_id) AS flags_updated_at,
+               (SELECT MAX(r.id) FROM flag_runs r
+                WHERE r.status = 'completed' AND r.mode <> 'as_of' AND r.ticker IS NULL) AS latest_run_id
+        FROM company_risk_scores s
+        WHERE s.company_id IN ({", ".join(["%s"] * len(company_ids))})
+        """,
+        tuple(company_ids)
+    )
+    quarter = current_quarter((now or datetime.now()).date())
+    scores = {}
+    for row in cursor.fetchall():
+        computed_at = _as_datetime(row["computed_at"])
+        flags_updated_at = _as_datetime(row["flags_updated_at"])
+        if row["flag_count"] != row["live_flag_count"] or computed_at is None:
+            continue
+        if current_quarter(computed_at.date()) != quarter:
+            continue
+        if flags_updated_at is not None and flags_updated_at > computed_at:
+            continue
+        if row["run_id"] is not None and row["latest_run_id"] is not None and row["run_id"] < row["latest_run_id"]:
+            continue
+        scores[row["company_id"]] = {
+            c: json.loads(row[c]) if c in JSON_COLUMNS and isinstance(row[c], (str, bytes, bytearray)) else row[c]
+            for c in SCORE_COLUMNS
+        }
+        scores[row["company_id"]]["run_id"] = row["run_id"]
+    return scores
+
+
+def resolve_risk_scores(conn, flags_by_company, sectors=None, sector_index=None):
+    """Scores for every company in `flags_by_company`: the stored row when
+    fresh, calculate_risk_scores_bulk() in one batch for the rest (through
+    the in-process score cache, which a newer stored run_id invalidates).
+
+    Args:
+        conn: Active connection.
+        flags_by_company: {company_id: [flag rows]}, e.g. from load_flags_by_company().
+        sectors, sector_index: Passed to the live scoring.
+
+    Returns:
+        {company_id: score dict}, with `processed_flags` on every entry.
+    """
+    from api.scoring import cached_risk_scores_bulk, invalidate_score_cache, process_flags
+
+    cursor = conn.cursor(dictionary=True)
+    try:
+        stored = load_risk_scores(cursor, list(flags_by_company))
+    except Exception:
+        stored = {}
+    finally:
+        cursor.close()
+    for cid, data in stored.items():
+        data["processed_flags"] = process_flags(flags_by_company[cid])
+    run_ids = [data["run_id"] for data in stored.values() if data.get("run_id")]
+    if run_ids:
+        invalidate_score_cache(max(run_ids))
+    stale = {cid: flags for cid, flags in flags_by_company.items() if cid not in stored}
+    histories = _recorded_histories(conn, list(stale)) if stale else {}
+    return {**stored, **cached_risk_scores_bulk(stale, sectors, sector_index, histories)}
+
+
+if __name__ == "__main__":
+    print("🚀 Rebuilding company_risk_scores...")
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        count = refresh_risk_scores(conn)
+        print(f"✅ {count:,} company score(s) written in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        print(f"❌ Rebuild failed: {e}")
+    finally:
+        conn.close()
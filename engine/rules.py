@@ -0,0 +1,481 @@
+"""
+Flagium — Declarative Flag Rules
+
+Flags defined entirely in `flag_definitions.params` under a "rule" key,
+compiled into vectorized evaluators over the FinancialsPanel. Every other
+key in `params` is a named constant the rule can reference, so analysts
+tune thresholds (or add whole flags) with an UPDATE instead of a deploy.
+
+Example params:
+
+    {
+      "drop_threshold": 0.5,
+      "rule": {
+        "period_types": ["annual", "quarterly"],
+        "when": "prev(net_profit) > 0 and net_profit < drop_threshold * prev(net_profit)",
+        "severity": "HIGH",
+        "values": {"current": "net_profit", "previous": "prev(net_profit)"},
+        "message": "{ticker}: Net Profit fell from {previous:,.0f} to {current:,.0f} in {period}."
+      }
+    }
+
+Expression language (a whitelisted subset of Python expressions):
+    names        financials columns, derived names (ebit), params constants
+    arithmetic   + - * /   (x / 0 is missing, not infinite)
+    comparison   < <= > >= == !=   (missing when either side is missing)
+    logic        and  or  not      (missing propagates: `not` of missing is
+                                    missing; `and` is false and `or` true as
+                                    soon as one side decides it)
+    functions    prev(x[, years])   value of x the same period `years` earlier
+                 count(cond, n)     annual rows among the last n where cond holds
+                 all(cond, n)       cond holds on each of the last n annual rows
+                 any(cond, n)       cond holds on at least one of the last n rows
+                 abs(x)  min(a, b)  max(a, b)  missing(x)
+
+A rule fires only where `when` is true: a missing result never fires,
+and neither does a company with no financials row at the evaluated period
+(set `"require_row": false` for window rules that, like ocf_vs_pat, look
+back from a period that has no row yet).
+
+Window functions follow the engine's `LIMIT n` semantics: the last n
+*existing* annual rows at or before the period, and only companies with
+n rows qualify.
+
+`severity` is a level or a list of {"when": expr, "level": ...} tried in
+order (first match wins, "when" may be omitted for a default).
+"""
+
+import ast
+import json
+
+import numpy as np
+
+from engine.history import FINANCIAL_COLUMNS, load_histories
+from engine.panel import FinancialsPanel
+
+# Names computed from financials columns
+DERIVED = {
+    "ebit": "profit_before_tax + interest_expense",
+}
+
+WINDOW_FUNCTIONS = ("count", "all", "any")
+DEFAULT_SEVERITY = "MEDIUM"
+
+_COMPARE = {
+    ast.Lt: np.less, ast.LtE: np.less_equal,
+    ast.Gt: np.greater, ast.GtE: np.greater_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+
+
+class RuleError(ValueError):
+    """A rule in flag_definitions.params could not be compiled."""
+
+
+# ──────────────────────────────────────────────
+# Evaluation contexts
+# ──────────────────────────────────────────────
+
+class _PeriodContext:
+    """Columns of the panel at one (period_type, year, quarter)."""
+
+    def __init__(self, panel, period_type, year, quarter):
+        self.panel = panel
+        self.period_type = period_type
+        self.year = year
+        self.quarter = quarter
+
+    def metric(self, name):
+        return self.panel.column(name, self.period_type, self.year, self.quarter)
+
+    def shift(self, years):
+        return _PeriodContext(self.panel, self.period_type, self.year - years, self.quarter)
+
+    def window(self, size, metrics):
+        if self.period_type != "annual":
+            return None, np.zeros(self.panel.size, dtype=bool)
+        return self.panel.annual_window(self.year, size, metrics)
+
+
+class _WindowContext:
+    """(companies, n) arrays over the last n annual rows."""
+
+    def __init__(self, values):
+        self.values = values
+
+    def metric(self, name):
+        return self.values[name]
+
+    def shift(self, years):
+        raise RuleError("prev() cannot be used inside a window function")
+
+    def window(self, size, metrics):
+        raise RuleError("window functions cannot be nested")
+
+
+# ──────────────────────────────────────────────
+# Compiler
+# ──────────────────────────────────────────────
+
+def _as_float(values):
+    return np.asarray(values, dtype=float)
+
+
+def _as_bool(values):
+    values = np.asarray(values)
+    if values.dtype == bool:
+        return values
+    return np.nan_to_num(values.astype(float), nan=0.0) != 0
+
+
+def _truth(values):
+    """Three-valued truth as floats: 1.0 true, 0.0 false, NaN missing."""
+    values = np.asarray(values)
+    if values.dtype == bool:
+        return values.astype(float)
+    values = values.astype(float)
+    return np.where(np.isnan(values), np.nan, (values != 0).astype(float))
+
+
+def _and(a, b):
+    a, b = _truth(a), _truth(b)
+    return np.where((a == 0) | (b == 0), 0.0, np.where(np.isnan(a) | np.isnan(b), np.nan, 1.0))
+
+
+def _or(a, b):
+    a, b = _truth(a), _truth(b)
+    return np.where((a == 1) | (b == 1), 1.0, np.where(np.isnan(a) | np.isnan(b), np.nan, 0.0))
+
+
+def _not(values):
+    values = _truth(values)
+    return np.where(np.isnan(values), np.nan, 1.0 - values)
+
+
+def _divide(a, b):
+    a, b = _as_float(a), _as_float(b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(b == 0, np.nan, a / b)
+
+
+_BINOPS = {
+    ast.Add: lambda a, b: _as_float(a) + _as_float(b),
+    ast.Sub: lambda a, b: _as_float(a) - _as_float(b),
+    ast.Mult: lambda a, b: _as_float(a) * _as_float(b),
+    ast.Div: _divide,
+}
+
+
+class _Compiler:
+    """Compiles one expression string into fn(context) -> array."""
+
+    def __init__(self, constants):
+        self.constants = constants
+
+    def compile(self, source):
+        return self._node(self._parse(source))
+
+    def lookback_years(self, sources):
+        """Years of rows the expressions read, ending at the evaluated period."""
+        return 1 + max((self.reach(self._parse(source)) for source in sources), default=0)
+
+    def _parse(self, source):
+        try:
+            return ast.parse(source, mode="eval").body
+        except SyntaxError as e:
+            raise RuleError(f"Invalid expression {source!r}: {e.msg}")
+
+    def reach(self, node):
+        """Years before the evaluated period that `node` reads (prev() offsets, window sizes)."""
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.args:
+            if node.func.id == "prev":
+                years = int(self._constant(node.args[1])) if len(node.args) == 2 else 1
+                return years + self.reach(node.args[0])
+            if node.func.id in WINDOW_FUNCTIONS and len(node.args) == 2:
+                return int(self._constant(node.args[1])) - 1
+        if isinstance(node, ast.Name) and node.id in DERIVED:
+            return 0
+        return max((self.reach(child) for child in ast.iter_child_nodes(node)), default=0)
+
+    def metrics(self, node):
+        """Financials columns referenced anywhere under `node`."""
+        names = set()
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name):
+                if child.id in FINANCIAL_COLUMNS:
+                    names.add(child.id)
+                elif child.id in DERIVED:
+                    names |= self.metrics(ast.parse(DERIVED[child.id], mode="eval").body)
+        return names
+
+    def _constant(self, node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.Name) and isinstance(self.constants.get(node.id), (int, float)):
+            return self.constants[node.id]
+        raise RuleError(f"Expected a number or numeric param, got {ast.unparse(node)!r}")
+
+    def _node(self, node):
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or isinstance(node.value, (int, float)):
+                value = float(node.value)
+                return lambda ctx: value
+            raise RuleError(f"Unsupported constant {node.value!r}")
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name in FINANCIAL_COLUMNS:
+                return lambda ctx: ctx.metric(name)
+            if name in DERIVED:
+                return self._node(ast.parse(DERIVED[name], mode="eval").body)
+            if isinstance(self.constants.get(name), (int, float)):
+                value = float(self.constants[name])
+                return lambda ctx: value
+            if name in ("true", "True"):
+                return lambda ctx: True
+            raise RuleError(f"Unknown name {name!r}")
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+            op = _BINOPS[type(node.op)]
+            left, right = self._node(node.left), self._node(node.right)
+            return lambda ctx: op(left(ctx), right(ctx))
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._node(node.operand)
+            if isinstance(node.op, ast.USub):
+                return lambda ctx: -_as_float(operand(ctx))
+            if isinstance(node.op, ast.Not):
+                return lambda ctx: _not(operand(ctx))
+
+        if isinstance(node, ast.BoolOp):
+            parts = [self._node(v) for v in node.values]
+            combine = _and if isinstance(node.op, ast.And) else _or
+
+            def boolop(ctx):
+                result = parts[0](ctx)
+                for part in parts[1:]:
+                    result = combine(result, part(ctx))
+                return result
+            return boolop
+
+        if isinstance(node, ast.Compare):
+            operands = [self._node(node.left)] + [self._node(c) for c in node.comparators]
+            ops = []
+            for op in node.ops:
+                if type(op) not in _COMPARE:
+                    raise RuleError(f"Unsupported comparison in {ast.unparse(node)!r}")
+                ops.append(_COMPARE[type(op)])
+
+            def compare(ctx):
+                values = [_as_float(o(ctx)) for o in operands]
+                result = True
+                with np.errstate(invalid="ignore"):
+                    for op, a, b in zip(ops, values, values[1:]):
+                        held = np.where(np.isnan(a) | np.isnan(b), np.nan, op(a, b).astype(float))
+                        result = _and(result, held)
+                return result
+            return compare
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            return self._call(node.func.id, node.args, node)
+
+        raise RuleError(f"Unsupported expression {ast.unparse(node)!r}")
+
+    def _call(self, name, args, node):
+        if name == "prev":
+            if len(args) not in (1, 2):
+                raise RuleError("prev() takes an expression and an optional number of years")
+            inner = self._node(args[0])
+            years = int(self._constant(args[1])) if len(args) == 2 else 1
+            return lambda ctx: inner(ctx.shift(years))
+
+        if name in WINDOW_FUNCTIONS:
+            if len(args) != 2:
+                raise RuleError(f"{name}() takes a condition and a window size")
+            inner = self._node(args[0])
+            size = int(self._constant(args[1]))
+            metrics = tuple(sorted(self.metrics(args[0])))
+
+            def window(ctx):
+                values, complete = ctx.window(size, metrics)
+                if values is None or not complete.any():
+                    held = np.zeros((len(complete), size), dtype=bool)
+                else:
+                    held = _as_bool(inner(_WindowContext(values)))
+                    held = np.broadcast_to(held, (len(complete), size))
+                if name == "count":
+                    return np.where(complete, held.sum(axis=1), np.nan)
+                if name == "all":
+                    return complete & held.all(axis=1)
+                return complete & held.any(axis=1)
+            return window
+
+        if name == "abs" and len(args) == 1:
+            inner = self._node(args[0])
+            return lambda ctx: np.abs(_as_float(inner(ctx)))
+
+        if name in ("min", "max") and len(args) == 2:
+            a, b = self._node(args[0]), self._node(args[1])
+            pick = np.fmin if name == "min" else np.fmax
+            return lambda ctx: pick(_as_float(a(ctx)), _as_float(b(ctx)))
+
+        if name == "missing" and len(args) == 1:
+            inner = self._node(args[0])
+            return lambda ctx: np.isnan(_as_float(inner(ctx)))
+
+        raise RuleError(f"Unsupported function call {ast.unparse(node)!r}")
+
+
+# ──────────────────────────────────────────────
+# Compiled rule (flag-module compatible)
+# ──────────────────────────────────────────────
+
+def _period_label(period_type, year, quarter):
+    return f"FY{year} Q{quarter}" if period_type == "quarterly" else str(year)
+
+
+def _detail_value(value):
+    value = float(value)
+    if value != value:
+        return None
+    if value.is_integer():
+        return int(value)
+    return round(value, 4)
+
+
+class RuleFlag:
+    """A flag compiled from flag_definitions.params.
+
+    Exposes the flag-module interface (FLAG_CODE, FLAG_NAME,
+    SUPPORTS_QUARTERLY, check, check_history, check_batch) so the runner
+    treats it like any module in flags/.
+    """
+
+    # The runner evaluates rule flags through check_batch() whenever a
+    # preloaded panel is available, even without --vectorized
+    PREFERS_BATCH = True
+
+    def __init__(self, flag_code, flag_name, params):
+        rule = params.get("rule")
+        if not isinstance(rule, dict) or "when" not in rule:
+            raise RuleError(f"{flag_code}: params.rule must be an object with a 'when' expression")
+
+        constants = {k: v for k, v in params.items() if k != "rule"}
+        compiler = _Compiler(constants)
+
+        self.FLAG_CODE = flag_code
+        self.FLAG_NAME = flag_name
+        self.params = params
+        self.period_types = tuple(rule.get("period_types", ["annual"]))
+        self.SUPPORTS_QUARTERLY = "quarterly" in self.period_types
+        self.require_row = bool(rule.get("require_row", True))
+        self.message = rule.get("message", "{ticker}: " + flag_name + " in {period}.")
+
+        self._when = compiler.compile(rule["when"])
+        self._values = {name: compiler.compile(expr) for name, expr in rule.get("values", {}).items()}
+
+        severity = rule.get("severity", DEFAULT_SEVERITY)
+        if isinstance(severity, str):
+            severity = [{"level": severity}]
+        self._severity = [
+            (compiler.compile(s["when"]) if s.get("when") else None, s["level"])
+            for s in severity
+        ]
+        self.LOOKBACK_YEARS = compiler.lookback_years(
+            [rule["when"], *rule.get("values", {}).values(), *(s["when"] for s in severity if s.get("when"))]
+        )
+
+    def __repr__(self):
+        return f"RuleFlag({self.FLAG_CODE!r})"
+
+    def check_batch(self, panel, period_type="annual", year=None, quarter=None):
+        """Vectorized evaluation over every company in the panel for one period."""
+        if period_type not in self.period_types or year is None:
+            return {}
+        if period_type == "quarterly" and not quarter:
+            return {}
+
+        ctx = _PeriodContext(panel, period_type, year, quarter)
+        hits = np.broadcast_to(_as_bool(self._when(ctx)), (panel.size,))
+        if self.require_row:
+            hits = hits & panel.present_at(period_type, year, quarter)
+        rows = np.flatnonzero(hits)
+        if not len(rows):
+            return {}
+
+        values = {
+            name: np.broadcast_to(_as_float(fn(ctx)), (panel.size,))
+            for name, fn in self._values.items()
+        }
+        levels = np.full(panel.size, None, dtype=object)
+        for condition, level in reversed(self._severity):
+            if condition is None:
+                levels[:] = level
+            else:
+                levels[np.broadcast_to(_as_bool(condition(ctx)), (panel.size,))] = level
+
+        period = _period_label(period_type, year, quarter)
+        results = {}
+        for ci in rows:
+            if levels[ci] is None:
+                continue
+            details = {"period": period, "year": int(year), "quarter": int(quarter or 0)}
+            details.update({name: _detail_value(v[ci]) for name, v in values.items()})
+            fields = {k: (v if v is not None else float("nan")) for k, v in details.items()}
+            try:
+                message = self.message.format(ticker=panel.tickers[ci], **fields)
+            except (KeyError, ValueError, IndexError):
+                message = f"{panel.tickers[ci]}: {self.FLAG_NAME} in {period}."
+            results[int(panel.company_ids[ci])] = {
+                "flag_code": self.FLAG_CODE,
+                "flag_name": self.FLAG_NAME,
+                "severity": levels[ci],
+                "period_type": period_type,
+                "message": message,
+                "details": details,
+            }
+        return results
+
+    def check_history(self, history, ticker, period_type="annual", year=None, quarter=None):
+        """Evaluate for one company by running the batch path on a one-row panel."""
+        if period_type == "quarterly" and not (year and quarter):
+            latest = history.latest_quarter_row(("year", "quarter"))
+            year, quarter = (latest["year"], latest["quarter"]) if latest else (None, None)
+        elif period_type != "quarterly" and year is None:
+            latest = history.latest_annual_row(("year",))
+            year = latest["year"] if latest else None
+        if year is None:
+            return None
+        panel = FinancialsPanel.from_histories(
+            {history.company_id: history}, [{"id": history.company_id, "ticker": ticker}],
+        )
+        return self.check_batch(panel, period_type, year, quarter).get(history.company_id)
+
+    def check(self, conn, company_id, ticker, period_type="annual", year=None, quarter=None):
+        """Per-connection entry point: loads the company's history and evaluates it."""
+        history = load_histories(conn, [company_id]).get(company_id)
+        if history is None:
+            return None
+        return self.check_history(history, ticker, period_type, year, quarter)
+
+
+def compile_rule(flag_code, flag_name, params):
+    """Compile a flag_definitions row into a RuleFlag (raises RuleError)."""
+    if isinstance(params, (str, bytes)):
+        params = json.loads(params)
+    return RuleFlag(flag_code, flag_name, params or {})
+
+
+def load_flag_definitions(conn):
+    """flag_definitions rows as {flag_code: (flag_name, params dict, is_active)}."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT flag_code, flag_name, params, is_active FROM flag_definitions")
+        definitions = {}
+        for code, name, params, is_active in cursor.fetchall():
+            if isinstance(params, (str, bytes)):
+                params = json.loads(params)
+            definitions[code] = (name, params or {}, bool(is_active))
+        return definitions
+    finally:
+        cursor.close()
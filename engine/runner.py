@@ -1,25 +1,42 @@
 import argparse
+import hashlib
 import json
 import sys
 import os
 import logging
-from datetime import datetime
+import time
+import threading
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import date, datetime
 from db.connection import get_connection
+from db.backends import get_backend
 from db.utils import update_job_status
 from flags import get_all_flags
 from ingestion.db_writer import get_all_companies
+from engine.history import CompanyHistory, load_histories
+from engine.panel import FinancialsPanel
+from engine import incremental as inc
+from engine.report import RunReport, CountingConnection, Timer, save_report, REPORT_PATH
+from engine.sector_index import refresh_sector_index
+from engine.risk_scores import load_flags_by_company, refresh_risk_scores, score_companies
+from engine.risk_history import record_risk_history
 
 
 # ──────────────────────────────────────────────
 # Logging Setup
 # ──────────────────────────────────────────────
 
-_LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
-os.makedirs(_LOG_DIR, exist_ok=True)
+_LOG_DIR = os.getenv("FLAGIUM_LOG_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
 
 _LOG_FORMAT = "[%(asctime)s], [%(levelname)s], [%(ticker)s], %(message)s"
 _LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
 
+# stdout and logs/engine.log, shared by every engine logger (see configure_logging())
+_console_handler = None
+_file_handler = None
+
 
 class _EngineTickerFilter(logging.Filter):
     """Injects a 'ticker' field into every log record."""
@@ -32,6 +49,24 @@ class _EngineTickerFilter(logging.Filter):
         return True
 
 
+def _open_file_handler(log_dir):
+    os.makedirs(log_dir, exist_ok=True)
+    fh = logging.FileHandler(os.path.join(log_dir, "engine.log"), encoding="utf-8", delay=True)
+    fh.setLevel(logging.DEBUG)
+    fh.setFormatter(logging.Formatter(_LOG_FORMAT, datefmt=_LOG_DATEFMT))
+    return fh
+
+
+def _handlers():
+    global _console_handler, _file_handler
+    if _console_handler is None:
+        _console_handler = logging.StreamHandler(sys.stdout)
+        _console_handler.setLevel(logging.INFO)
+        _console_handler.setFormatter(logging.Formatter(_LOG_FORMAT, datefmt=_LOG_DATEFMT))
+        _file_handler = _open_file_handler(_LOG_DIR)
+    return _console_handler, _file_handler
+
+
 def _get_engine_logger(ticker: str = "ENGINE") -> logging.Logger:
     """Returns a logger for the flag engine.
 
@@ -44,23 +79,36 @@ def _get_engine_logger(ticker: str = "ENGINE") -> logging.Logger:
         return logger
 
     logger.setLevel(logging.DEBUG)
-    tf = _EngineTickerFilter(ticker)
-    fmt = logging.Formatter(_LOG_FORMAT, datefmt=_LOG_DATEFMT)
+    logger.addFilter(_EngineTickerFilter(ticker))
+    for handler in _handlers():
+        logger.addHandler(handler)
+    logger.propagate = False
+    return logger
 
-    ch = logging.StreamHandler(sys.stdout)
-    ch.setLevel(logging.INFO)
-    ch.setFormatter(fmt)
-    ch.addFilter(tf)
-    logger.addHandler(ch)
 
-    fh = logging.FileHandler(os.path.join(_LOG_DIR, "engine.log"), encoding="utf-8")
-    fh.setLevel(logging.DEBUG)
-    fh.setFormatter(fmt)
-    fh.addFilter(tf)
-    logger.addHandler(fh)
+def configure_logging(log_dir=None, console_level=None):
+    """Point engine.log at `log_dir` and/or set the stdout level, for every engine logger.
 
-    logger.propagate = False
-    return logger
+    FLAGIUM_LOG_DIR sets the directory at import (default logs/).
+
+    Returns:
+        The previous (log_dir, console_level), to restore them afterwards.
+    """
+    global _LOG_DIR, _file_handler
+    console, previous_file = _handlers()
+    previous = (_LOG_DIR, console.level)
+    if console_level is not None:
+        console.setLevel(console_level)
+    if log_dir is not None and os.path.abspath(log_dir) != os.path.abspath(_LOG_DIR):
+        _file_handler = _open_file_handler(log_dir)
+        _LOG_DIR = log_dir
+        for name, logger in list(logging.Logger.manager.loggerDict.items()):
+            if name.startswith("flagium.engine.") and isinstance(logger, logging.Logger):
+                if previous_file in logger.handlers:
+                    logger.removeHandler(previous_file)
+                    logger.addHandler(_file_handler)
+        previous_file.close()
+    return previous
 
 
 # Module-level logger (company-agnostic lines)
@@ -68,12 +116,14 @@ _logger = _get_engine_logger()
 
 
 
-def get_current_fiscal_quarter():
+def get_current_fiscal_quarter(today=None):
     """
     Returns (year, quarter) for the *previous* completed quarter.
     (Since usually we run flags on completed data)
+
+    `today` (a date) evaluates the same rule at another point in time.
     """
-    now = datetime.now()
+    now = today or datetime.now()
     month = now.month
     year = now.year
     
@@ -121,11 +171,459 @@ def get_previous_quarters(start_year, start_q, count=8):
     return quarters
 
 
-def run_flags(ticker=None, backfill_quarters=1):
+def _run_check(flag_module, conn, history, company_id, ticker, period_type, year, quarter=None):
+    """Evaluate one flag for one company-period.
+
+    Uses the module's check_history() when a preloaded history is available,
+    otherwise falls back to the per-connection check().
+    """
+    if history is not None and hasattr(flag_module, "check_history"):
+        return flag_module.check_history(history, ticker, period_type=period_type, year=year, quarter=quarter)
+    return flag_module.check(conn, company_id, ticker, period_type=period_type, year=year, quarter=quarter)
+
+
+def _run_batch(batch_flags, panel, target_quarters, report=None):
+    """Evaluate every batch-capable flag over the whole panel, once per period.
+
+    Returns:
+        (results, evaluations, failed): results maps
+        (flag_code, period_type, year, quarter) -> {company_id: result};
+        failed lists modules whose batch path raised (they fall back to
+        per-company evaluation).
+    """
+    results = {}
+    evaluations = 0
+    failed = []
+
+    for flag_module in batch_flags:
+        code = flag_module.FLAG_CODE
+        timer = Timer()
+        try:
+            with timer:
+                for year, quarter in target_quarters:
+                    if getattr(flag_module, "SUPPORTS_QUARTERLY", False):
+                        results[(code, "quarterly", year, quarter)] = \
+                            flag_module.check_batch(panel, "quarterly", year, quarter)
+                        evaluations += panel.size
+                    if quarter == 4:
+                        results[(code, "annual", year, None)] = \
+                            flag_module.check_batch(panel, "annual", year)
+                        evaluations += panel.size
+            if report is not None:
+                hits = sum(len(v) for k, v in results.items() if k[0] == code)
+                report.record_batch(code, timer.seconds, hits)
+        except Exception as e:
+            _logger.warning(f"Batch path failed for {code}, falling back to per-company: {e}")
+            if report is not None:
+                report.record_error(code, "batch", e)
+            results = {k: v for k, v in results.items() if k[0] != code}
+            failed.append(flag_module)
+
+    return results, evaluations, failed
+
+
+def _estimate_row_seconds(batch_flags, histories, companies, period, sample=50):
+    """Time the per-company check_history() path on a sample of companies.
+
+    Returns the estimated seconds per (company, flag, period type) evaluation,
+    used to report the vectorized speedup without running the full slow path.
+    """
+    year, quarter = period
+    evaluations = 0
+    started = time.perf_counter()
+    for company in companies[:sample]:
+        history = histories.get(company["id"]) or CompanyHistory(company["id"])
+        for flag_module in batch_flags:
+            try:
+                if getattr(flag_module, "SUPPORTS_QUARTERLY", False):
+                    flag_module.check_history(history, company["ticker"], "quarterly", year, quarter)
+                    evaluations += 1
+                flag_module.check_history(history, company["ticker"], "annual", year)
+                evaluations += 1
+            except Exception:
+                pass
+    elapsed = time.perf_counter() - started
+    return elapsed / evaluations if evaluations else 0.0
+
+
+def _evaluate_companies(conn, companies, target_quarters, histories=None, vectorized=False, on_progress=None,
+                        periods=None, report=None):
+    """Evaluate every active flag for `companies` over `target_quarters`.
+
+    Args:
+        conn: Active DB connection, used by modules without an in-memory path.
+        companies: List of {id, ticker, ...} dicts.
+        target_quarters: List of (year, quarter) tuples.
+        histories: Preloaded {company_id: CompanyHistory}, or None to query per check.
+        vectorized: Use check_batch() over a panel built from `histories`.
+        on_progress: Optional callable(done_companies) invoked as companies complete.
+        periods: Optional {company_id: [(year, quarter), ...]} restricting each
+            company to a subset of target_quarters (incremental runs).
+        report: Optional RunReport receiving per-flag / per-company timings,
+            SQL counts and exceptions.
+
+    Returns:
+        (hits, stats): hits is a list of (company_id, result) tuples with
+        fiscal_year / fiscal_quarter filled in; stats holds vectorized timings.
+    """
+    if report is None:
+        report = RunReport()
+    if not isinstance(conn, CountingConnection):
+        conn = CountingConnection(conn, report)
+
+    active_flags = get_all_flags(conn)
+    stats = {"batch_flags": 0, "batch_evals": 0, "batch_seconds": 0.0, "row_seconds": 0.0}
+
+    # Vectorized path for modules that provide check_batch() (rule flags
+    # compiled from flag_definitions take it whenever histories are loaded)
+    batch_flags = []
+    batch_results = {}
+    if vectorized:
+        batch_flags = [m for m in active_flags if hasattr(m, "check_batch")]
+    elif histories is not None:
+        batch_flags = [m for m in active_flags if getattr(m, "PREFERS_BATCH", False)]
+    if batch_flags:
+        panel = FinancialsPanel.from_histories(histories, companies)
+        started = time.perf_counter()
+        batch_results, batch_evals, failed = _run_batch(batch_flags, panel, target_quarters, report)
+        batch_flags = [m for m in batch_flags if m not in failed]
+        stats["batch_seconds"] = time.perf_counter() - started
+        stats["batch_evals"] = batch_evals
+        stats["batch_flags"] = len(batch_flags)
+        _logger.info(f"Vectorized {len(batch_flags)} flag(s) over {panel.size} companies in {stats['batch_seconds']:.3f}s")
+
+    def _result_for(flag_module, cid, cticker, history, period_type, year, quarter=None):
+        key = (flag_module.FLAG_CODE, period_type, year, quarter)
+        if key in batch_results:
+            return batch_results[key].get(cid)
+        code = flag_module.FLAG_CODE
+        timer = Timer()
+        try:
+            with report.flag_scope(code), timer:
+                result = _run_check(flag_module, conn, history, cid, cticker, period_type, year, quarter)
+        except Exception as e:
+            label = f"FY{year} Q{quarter}" if period_type == "quarterly" else f"FY{year}"
+            report.record_error(code, f"{cticker} {label}", e)
+            _get_engine_logger(cticker).warning(f"{code} [{label}] failed: {e}")
+            return None
+        report.record_call(code, timer.seconds, result is not None)
+        return result
+
+    hits = []
+
+    for done, company in enumerate(companies, 1):
+        cid = company["id"]
+        cticker = company["ticker"]
+        logger = _get_engine_logger(cticker)
+        logger.info(f"Analyzing {cticker}")
+        company_started = time.perf_counter()
+
+        history = None
+        if histories is not None:
+            history = histories.get(cid) or CompanyHistory(cid)
+
+        # For backfill, we iterate through periods
+        company_quarters = periods.get(cid, []) if periods is not None else target_quarters
+        for year, quarter in company_quarters:
+            
+            company_flags = 0
+            
+            # Run each flag
+            for flag_module in active_flags:
+                # We check both annual and quarterly, but we pass the explicit period
+                
+                # 1. Quarterly Check
+                if getattr(flag_module, "SUPPORTS_QUARTERLY", False):
+                    try:
+                        result = _result_for(flag_module, cid, cticker, history, "quarterly", year, quarter)
+                        if result:
+                            result["fiscal_year"] = year
+                            result["fiscal_quarter"] = quarter
+                            hits.append((cid, result))
+                            logger.info(f"{result['flag_code']} [FY{year} Q{quarter}]: {result['message']}")
+                            company_flags += 1
+                    except Exception as e:
+                        report.record_error(flag_module.FLAG_CODE, f"{cticker} FY{year} Q{quarter}", e)
+                        logger.warning(f"{flag_module.FLAG_CODE} [FY{year} Q{quarter}] result rejected: {e}")
+
+                # 2. Annual Check
+                # Usually annual flags are calculated at end of year (Q4).
+                # But we can check them every time if we want, or only if quarter == 4.
+                # For now, let's run them if quarter == 4 to avoid duplicates, or just run them.
+                # Simplest: Run annual check using the 'year'.
+                if quarter == 4:
+                    try:
+                        result = _result_for(flag_module, cid, cticker, history, "annual", year)
+                        if result:
+                            result["fiscal_year"] = year
+                            result["fiscal_quarter"] = 0
+                            hits.append((cid, result))
+                            logger.info(f"{result['flag_code']} [FY{year} Annual]: {result['message']}")
+                            company_flags += 1
+                    except Exception as e:
+                        report.record_error(flag_module.FLAG_CODE, f"{cticker} FY{year}", e)
+                        logger.warning(f"{flag_module.FLAG_CODE} [FY{year} Annual] result rejected: {e}")
+
+        if company_flags == 0:
+            logger.debug(f"No flags detected for {cticker}")
+        report.record_company(cticker, time.perf_counter() - company_started)
+
+        if on_progress and (done % PROGRESS_EVERY == 0 or done == len(companies)):
+            on_progress(done)
+
+    if batch_flags and stats["batch_evals"]:
+        stats["row_seconds"] = _estimate_row_seconds(batch_flags, histories, companies, target_quarters[0])
+
+    return hits, stats
+
+
+# ──────────────────────────────────────────────
+# Sharded Execution (--workers N)
+# ──────────────────────────────────────────────
+
+# Companies between progress callbacks / seconds between parent progress polls
+PROGRESS_EVERY = 25
+PROGRESS_POLL_SECONDS = 5
+
+# Companies (per worker) evaluated and committed between flag_runs checkpoints
+CHECKPOINT_COMPANIES = 100
+
+
+def _shard_by_id(companies, workers):
+    """Split companies into at most `workers` contiguous company-id ranges."""
+    ordered = sorted(companies, key=lambda c: c["id"])
+    size = -(-len(ordered) // workers) if ordered else 0
+    return [ordered[i:i + size] for i in range(0, len(ordered), size)] if size else []
+
+
+def _evaluate_shard(index, companies, target_quarters, preload, vectorized, progress, periods=None, as_of=None):
+    """Process-pool worker: evaluate one id-range shard on its own connection.
+
+    Returns:
+        (hits, stats, report) for the shard.
+    """
+    report = RunReport()
+    conn = CountingConnection(get_connection(), report)
+    try:
+        histories = None
+        if preload or vectorized:
+            histories = load_histories(conn, id_range=(companies[0]["id"], companies[-1]["id"]), as_of=as_of)
+
+        def _on_progress(done):
+            progress[index] = done
+
+        hits, stats = _evaluate_companies(conn, companies, target_quarters, histories, vectorized, _on_progress,
+                                          periods, report)
+        return hits, stats, report
+    finally:
+        conn.close()
+
+
+class _ShardPool:
+    """Process pool and shared progress dict for one run's sharded chunks.
+
+    Started on first use and reused by every checkpoint chunk, so a run pays
+    for worker start-up once; close() shuts both down.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._manager = None
+        self._pool = None
+        self._progress = None
+
+    def start(self):
+        """(pool, progress dict), starting them on the first call."""
+        if self._pool is None:
+            self._manager = multiprocessing.Manager()
+            self._progress = self._manager.dict()
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool, self._progress
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._manager.shutdown()
+            self._pool = self._manager = self._progress = None
+
+
+def _run_sharded(companies, target_quarters, workers, preload, vectorized, periods=None, report=None,
+                 done_before=0, overall=None, as_of=None, shard_pool=None):
+    """Evaluate companies across a process pool, one id-range shard per worker.
+
+    Per-shard progress is reported through a shared dict and aggregated into
+    a single "Flag Engine Job" percentage for the admin panel.
+
+    `done_before` / `overall` place this call within a larger checkpointed
+    run for the reported percentage. `shard_pool` is the run's _ShardPool;
+    without one a pool is started and shut down for this call.
+
+    Returns:
+        (hits, stats) merged across shards; shard reports are merged into `report`.
+    """
+    shards = _shard_by_id(companies, workers)
+    total = overall or len(companies)
+    _logger.info(f"Sharding {len(companies)} of {total} companies across {len(shards)} worker(s): "
+                 f"{[(s[0]['id'], s[-1]['id']) for s in shards]}")
+
+    owned = shard_pool is None
+    if owned:
+        shard_pool = _ShardPool(len(shards))
+    try:
+        pool, progress = shard_pool.start()
+        progress.clear()
+        futures = [
+            pool.submit(
+                _evaluate_shard, i, shard, target_quarters, preload, vectorized, progress,
+                {c["id"]: periods[c["id"]] for c in shard} if periods is not None else None,
+                as_of,
+            )
+            for i, shard in enumerate(shards)
+        ]
+        pending = set(futures)
+        reported = 0
+        while pending:
+            _, pending = wait(pending, timeout=PROGRESS_POLL_SECONDS)
+            done = done_before + sum(progress.values())
+            if done != reported:
+                reported = done
+                pct = int((done / total) * 100) if total else 100
+                update_job_status(
+                    "Flag Engine Job", "running",
+                    f"Flag engine {pct}% complete ({done}/{total} companies, {len(shards)} shards)",
+                )
+        shard_results = [f.result() for f in futures]
+    finally:
+        if owned:
+            shard_pool.close()
+
+    hits = []
+    stats = {"batch_flags": 0, "batch_evals": 0, "batch_seconds": 0.0, "row_seconds": 0.0}
+    for shard_hits, shard_stats, shard_report in shard_results:
+        hits.extend(shard_hits)
+        if report is not None:
+            report.merge(shard_report)
+        _merge_stats(stats, shard_stats)
+    return hits, stats
+
+
+def _incremental_scope(conn, companies, target_quarters):
+    """Companies and per-company periods affected since the last completed run.
+
+    Returns:
+        (companies, periods, since) — `periods` is None (evaluate everything)
+        when there is no completed run to compare against.
+    """
+    try:
+        since = inc.last_watermark(conn)
+    except Exception as e:
+        _logger.warning(f"Run ledger unavailable ({e}); falling back to a full run")
+        return companies, None, None
+    if since is None:
+        _logger.info("No completed flag run recorded yet; running a full evaluation")
+        return companies, None, None
+
+    # Windows follow the configured flags (e.g. a raised F1 lookback)
+    annual_lookback, quarterly_lookahead = inc.flag_lookbacks(get_all_flags(conn))
+    changed = inc.get_changed_periods(conn, since, [c["id"] for c in companies])
+    periods = {}
+    for cid, rows in changed.items():
+        targets = inc.affected_targets(rows, target_quarters, annual_lookback, quarterly_lookahead)
+        if targets:
+            periods[cid] = targets
+    return [c for c in companies if c["id"] in periods], periods, since
+
+
+def _merge_stats(total, stats):
+    """Fold one evaluation's stats into `total` (row_seconds weighted by batch_evals)."""
+    evals = total["batch_evals"] + stats["batch_evals"]
+    if evals:
+        total["row_seconds"] = (
+            total["row_seconds"] * total["batch_evals"] + stats["row_seconds"] * stats["batch_evals"]
+        ) / evals
+    total["batch_flags"] = max(total["batch_flags"], stats["batch_flags"])
+    total["batch_evals"] = evals
+    total["batch_seconds"] += stats["batch_seconds"]
+    return total
+
+
+def run_flags(ticker=None, backfill_quarters=1, preload=False, vectorized=False, workers=1, incremental=False,
+              resume=None, as_of=None, log_dir=None, report_path=None):
+    """Run every active flag over the target periods.
+
+    Companies are processed in id order, CHECKPOINT_COMPANIES at a time
+    (per worker). Each chunk's flags are written and committed together
+    with a checkpoint on the run's flag_runs row, so an interrupted run can
+    be continued with `resume`.
+
+    Args:
+        ticker: Restrict the run to a single company.
+        backfill_quarters: Number of quarters to evaluate, newest first. More
+            than one quarter implies preload: each company's series is read
+            once and every target period is evaluated in one sweep over it.
+        preload: Read the financials table once into memory and evaluate
+            flags against it instead of querying per company/period/flag.
+        vectorized: Build a company × period × metric panel from the preload
+            and use each module's check_batch() where available. Implies preload.
+        workers: Number of processes; companies are sharded by id range and
+            each worker uses its own connection. Results are written by the
+            parent, one transaction per checkpoint.
+        incremental: Only evaluate companies, and only the target periods,
+            whose financials changed since the last completed run in the
+            flag_runs ledger.
+        resume: id of an interrupted flag_runs row. Its ticker, mode, target
+            periods and watermark are reused and only companies after its
+            last checkpoint are evaluated.
+        as_of: Evaluate against the financials vintage knowable on this date
+            (financials_history) instead of today's restated numbers. Target
+            periods are counted back from the fiscal quarter of `as_of`.
+            Results are written to flags_as_of (save_flags_as_of()); the live
+            flags, flag_events and post-run score tables are left as they are.
+            Implies preload; not combinable with incremental.
+        log_dir: Write engine.log here for this run instead of logs/.
+        report_path: Write the JSON run report here instead of
+            logs/engine_run_report.json.
+    """
+    previous = configure_logging(log_dir) if log_dir else None
+    try:
+        _run_flags(ticker, backfill_quarters, preload, vectorized, workers, incremental, resume, as_of, report_path)
+    finally:
+        if previous:
+            configure_logging(previous[0])
+
+
+def _run_flags(ticker, backfill_quarters, preload, vectorized, workers, incremental, resume, as_of, report_path):
     conn = get_connection()
     if not conn:
         _logger.error("DB Connection failed")
         return
+    # Closed here so every early return below (unknown ticker, nothing to resume) releases it too
+    try:
+        _run_flags_on(conn, ticker, backfill_quarters, preload, vectorized, workers, incremental, resume, as_of,
+                      report_path)
+    finally:
+        conn.close()
+
+
+def _run_flags_on(conn, ticker, backfill_quarters, preload, vectorized, workers, incremental, resume, as_of,
+                  report_path):
+    # Every statement issued through `conn` is counted into the run report
+    report = RunReport()
+    run_started = time.perf_counter()
+    conn = CountingConnection(conn, report)
+
+    checkpoint = None
+    if resume is not None:
+        checkpoint = inc.load_run(conn, resume)
+        if checkpoint is None:
+            _logger.error(f"Run {resume} not found in flag_runs.")
+            return
+        if checkpoint["status"] == "completed":
+            _logger.info(f"Run {resume} already completed; nothing to resume.")
+            return
+        ticker = checkpoint["ticker"]
+        incremental = checkpoint["mode"] == "incremental"
+        as_of = checkpoint.get("as_of")
 
     # 1. Get companies
     companies = get_all_companies(conn)
@@ -135,125 +633,569 @@ def run_flags(ticker=None, backfill_quarters=1):
             _logger.error(f"Company {ticker} not found in DB.")
             return
 
-    # 2. Get active flags
-    active_flags = get_all_flags()
+    # 2. Get active flags (thresholds and rule flags from flag_definitions)
+    active_flags = get_all_flags(conn)
     
     # 3. Determine Periods
     # For now, let's assume "Quarterly" flags run on specific quarters
     # And "Annual" flags run on the year associated with that quarter (if it's Q4) OR just run annually.
     # To keep it simple: We run 'annual' check only if we are in Q4 backfill, or just always run it.
     
-    # Let's derive the periods
-    fy, fq = get_current_fiscal_quarter()
-    
-    # If standard run, backfill_quarters=1 (just the latest)
-    target_quarters = get_previous_quarters(fy, fq, count=backfill_quarters)
-    
+    if checkpoint:
+        target_quarters = checkpoint["target_periods"]
+    else:
+        # Let's derive the periods
+        fy, fq = get_current_fiscal_quarter(as_of)
+
+        # If standard run, backfill_quarters=1 (just the latest)
+        target_quarters = get_previous_quarters(fy, fq, count=backfill_quarters)
+
+    # Point-in-time runs read vintages from financials_history into memory
+    if as_of is not None:
+        preload = True
+        if incremental:
+            _logger.warning("--incremental is ignored for as-of runs")
+            incremental = False
+        _logger.info(f"Evaluating financials as known on {as_of}")
+
+    # Single-pass backfill: one read of the financials, all periods swept in memory
+    elif len(target_quarters) > 1 and not (preload or vectorized):
+        preload = True
+        _logger.info(f"Backfilling {len(target_quarters)} quarters from a single preloaded read")
+
+    # A DuckDB file admits one writing process: evaluate without shard workers
+    if workers > 1 and not get_backend().MULTIPROCESS:
+        _logger.warning(f"The {get_backend().NAME} backend does not support --workers; running in one process")
+        workers = 1
+
+    # Watermark is taken before anything is read, so rows written during
+    # this run are picked up by the next incremental run. A resumed run
+    # keeps the watermark it started with.
+    watermark = checkpoint["watermark"] if checkpoint else inc.current_watermark(conn)
+    periods = None
+    if incremental:
+        companies, periods, since = _incremental_scope(conn, companies, target_quarters)
+        if periods is not None:
+            _logger.info(f"Incremental run since {since}: {len(companies)} company(ies) with changed financials")
+    mode = "as_of" if as_of is not None else "incremental" if periods is not None else "full"
+
+    companies = sorted(companies, key=lambda c: c["id"])
+    done_before = flags_before = 0
+    if checkpoint and checkpoint["last_company_id"] is not None:
+        companies = [c for c in companies if c["id"] > checkpoint["last_company_id"]]
+        done_before = checkpoint["companies_evaluated"] or 0
+        flags_before = checkpoint["flags_detected"] or 0
+        _logger.info(f"Resuming run {resume} after company id {checkpoint['last_company_id']} "
+                     f"({done_before} company(ies) already done)")
+    overall = done_before + len(companies)
+
     _logger.info(f"Running {len(active_flags)} flags on {len(companies)} companies for {len(target_quarters)} quarter(s)")
     _logger.info(f"Target periods: {target_quarters}")
 
     update_job_status("Flag Engine Job", "running", f"Running {len(active_flags)} flags on {len(companies)} companies")
 
+    run_id = None
+    try:
+        if checkpoint:
+            run_id = resume
+            inc.reopen_run(conn, run_id)
+        else:
+            run_id = inc.start_run(conn, mode, watermark, ticker, target_quarters, as_of)
+    except Exception as e:
+        _logger.warning(f"Could not record run in flag_runs ledger: {e}")
+
     cursor = conn.cursor()
     
     total_flags_found = 0
+    stats = {"batch_flags": 0, "batch_evals": 0, "batch_seconds": 0.0, "row_seconds": 0.0}
+    write_counts = {"inserted": 0, "updated": 0, "unchanged": 0, "retired": 0}
+    status = "failed"
+    done = 0
+    post_run_seconds = 0.0
+    shard_pool = _ShardPool(workers)
 
     try:
-        for company in companies:
-            cid = company["id"]
-            cticker = company["ticker"]
-            logger = _get_engine_logger(cticker)
-            logger.info(f"Analyzing {cticker}")
-
-            # For backfill, we iterate through periods
-            for year, quarter in target_quarters:
-                
-                company_flags = 0
-                
-                # Run each flag
-                for flag_module in active_flags:
-                    # We check both annual and quarterly, but we pass the explicit period
-                    
-                    # 1. Quarterly Check
-                    if getattr(flag_module, "SUPPORTS_QUARTERLY", False):
-                        try:
-                            result = flag_module.check(conn, cid, cticker, period_type="quarterly", year=year, quarter=quarter)
-                            if result:
-                                result["fiscal_year"] = year
-                                result["fiscal_quarter"] = quarter
-                                save_flag(cursor, cid, result)
-                                logger.info(f"{result['flag_code']} [FY{year} Q{quarter}]: {result['message']}")
-                                company_flags += 1
-                                total_flags_found += 1
-                        except Exception as e:
-                            pass
-
-                    # 2. Annual Check
-                    # Usually annual flags are calculated at end of year (Q4).
-                    # But we can check them every time if we want, or only if quarter == 4.
-                    # For now, let's run them if quarter == 4 to avoid duplicates, or just run them.
-                    # Simplest: Run annual check using the 'year'.
-                    if quarter == 4:
-                        try:
-                            result = flag_module.check(conn, cid, cticker, period_type="annual", year=year)
-                            if result:
-                                result["fiscal_year"] = year
-                                result["fiscal_quarter"] = 0
-                                save_flag(cursor, cid, result)
-                                logger.info(f"{result['flag_code']} [FY{year} Annual]: {result['message']}")
-                                company_flags += 1
-                                total_flags_found += 1
-                        except Exception as e:
-                            pass
-
-            if company_flags == 0:
-                logger.debug(f"No flags detected for {cticker}")
-
-        conn.commit()
-        update_job_status("Flag Engine Job", "completed", f"Analyzed {len(companies)} companies. Flags detected: {total_flags_found}")
+        # 4. Evaluate checkpoint by checkpoint (sharded across processes, or in this process)
+        chunk_size = CHECKPOINT_COMPANIES * max(workers, 1)
+        for start in range(0, len(companies), chunk_size):
+            chunk = companies[start:start + chunk_size]
+            if workers > 1 and len(chunk) > 1:
+                hits, chunk_stats = _run_sharded(chunk, target_quarters, workers, preload, vectorized, periods, report,
+                                                 done_before + done, overall, as_of, shard_pool)
+            else:
+                histories = None
+                if preload or vectorized:
+                    if ticker or periods is not None:
+                        histories = load_histories(conn, [c["id"] for c in chunk], as_of=as_of)
+                    else:
+                        histories = load_histories(conn, id_range=(chunk[0]["id"], chunk[-1]["id"]), as_of=as_of)
+                    _logger.info(f"Preloaded financial history for {len(histories)} companies")
+
+                def _on_progress(chunk_done):
+                    finished = done_before + done + chunk_done
+                    pct = int((finished / overall) * 100)
+                    update_job_status("Flag Engine Job", "running",
+                                      f"Flag engine {pct}% complete ({finished}/{overall} companies)")
+
+                hits, chunk_stats = _evaluate_companies(conn, chunk, target_quarters, histories, vectorized,
+                                                        _on_progress, periods, report)
+            _merge_stats(stats, chunk_stats)
+
+            # 5. One transaction per checkpoint: this chunk's flag diff plus the checkpoint.
+            # As-of results go to flags_as_of; the live flags and change feed stay untouched,
+            # so only live runs take the change-feed write lock.
+            write_lock = contextlib.nullcontext() if as_of is not None else _event_feed_lock(conn)
+            with write_lock:
+                if as_of is not None:
+                    write_counts["inserted"] += save_flags_as_of(cursor, hits, chunk, as_of, run_id)
+                else:
+                    slots = _evaluated_slots(chunk, target_quarters, periods, active_flags)
+                    for key, count in save_flags(cursor, hits, slots, run_id).items():
+                        write_counts[key] += count
+                total_flags_found += len(hits)
+                done += len(chunk)
+                if run_id:
+                    inc.save_checkpoint(conn, run_id, chunk[-1]["id"], done_before + done,
+                                        flags_before + total_flags_found)
+                conn.commit()
+
+        shard_pool.close()
+        if as_of is not None:
+            # Scores, history and the sector index describe today's flags, not this vintage
+            _logger.info(f"As-of {as_of} results written to flags_as_of: {write_counts['inserted']} flag(s)")
+        else:
+            _logger.info(
+                f"Flags written: {write_counts['inserted']} new, {write_counts['updated']} changed, "
+                f"{write_counts['retired']} retired, {write_counts['unchanged']} unchanged"
+            )
+            # One flag read and one scoring pass shared by the post-run tables
+            post_run_started = time.perf_counter()
+            flags_by_company = _load_current_flags(conn)
+            _record_risk_history(conn, target_quarters, run_id, flags_by_company)
+            scores = _score_companies(conn, flags_by_company)
+            _refresh_sector_index(conn, scores)
+            _refresh_risk_scores(conn, run_id, [c["id"] for c in companies] if ticker else None,
+                                 flags_by_company, scores)
+            post_run_seconds = time.perf_counter() - post_run_started
+        message = f"Analyzed {overall} companies. Flags detected: {flags_before + total_flags_found}"
+        if run_id:
+            inc.finish_run(conn, run_id, "completed", overall, flags_before + total_flags_found, message)
+        update_job_status("Flag Engine Job", "completed", message)
+        status = "completed"
 
     except Exception as e:
         _logger.error(f"Flag engine failed: {e}", exc_info=True)
+        if run_id:
+            _logger.error(f"Run {run_id} checkpointed at {done_before + done}/{overall} companies; "
+                          f"continue with --resume {run_id}")
+            try:
+                conn.rollback()
+                inc.finish_run(conn, run_id, "failed", done_before + done, flags_before + total_flags_found, str(e))
+            except Exception:
+                pass
         update_job_status("Flag Engine Job", "failed", str(e))
         raise e
     finally:
+        shard_pool.close()
         cursor.close()
-        conn.close()
+        _save_run_report(conn, report, {
+            "run_id": run_id,
+            "mode": mode,
+            "status": status,
+            "resumed": checkpoint is not None,
+            "as_of": as_of,
+            "companies": done,
+            "target_periods": [list(p) for p in target_quarters],
+            "flags_detected": total_flags_found,
+            "write_counts": write_counts,
+            "workers": workers,
+            "vectorized": vectorized,
+            "wall_seconds": round(time.perf_counter() - run_started, 3),
+            "post_run_seconds": round(post_run_seconds, 3),
+        }, report_path)
+
+    summary = f"Finished. Total flags detected: {total_flags_found}"
+    if stats.get("batch_evals"):
+        batch_seconds = stats["batch_seconds"]
+        speedup = (stats["row_seconds"] * stats["batch_evals"]) / batch_seconds if batch_seconds else 0.0
+        summary += (
+            f" | vectorized {stats['batch_flags']} flag(s): {stats['batch_evals']} evaluations in {batch_seconds:.3f}s"
+            f" (~{speedup:.1f}x vs per-company)"
+        )
 
     _logger.info("=" * 60)
-    _logger.info(f"Finished. Total flags detected: {total_flags_found}")
+    _logger.info(summary)
     _logger.info("=" * 60)
 
 
-def save_flag(cursor, company_id, result):
-    """Insert or Update flag into database (Idempotent)."""
-    query = """
-        INSERT INTO flags 
-        (company_id, flag_code, flag_name, severity, period_type, fiscal_year, fiscal_quarter, message, details)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            severity = VALUES(severity),
-            message = VALUES(message),
-            details = VALUES(details),
-            created_at = CURRENT_TIMESTAMP
+def run_company_flags(conn, ticker, target_quarters):
+    """Evaluate and write flags for one company on an open connection.
+
+    Used by the streaming path (engine/stream.py) right after a ticker's
+    financials are saved: one preloaded read of the company, then the same
+    diff write as run_flags(). No flag_runs ledger row or job status.
+
+    Returns:
+        save_flags() counts, or None if the ticker is not in `companies`.
     """
-    cursor.execute(query, (
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, ticker FROM companies WHERE ticker = %s", (ticker,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        companies = [{"id": row[0], "ticker": row[1]}]
+
+        histories = load_histories(conn, [row[0]])
+        hits, _ = _evaluate_companies(conn, companies, target_quarters, histories)
+        slots = _evaluated_slots(companies, target_quarters, None, get_all_flags(conn))
+        with _event_feed_lock(conn):
+            counts = save_flags(cursor, hits, slots)
+            conn.commit()
+        return counts
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _load_current_flags(conn):
+    """Every company's flags after the run, or None (each step then reads its own)."""
+    try:
+        return load_flags_by_company(conn)
+    except Exception as e:
+        _logger.warning(f"Could not load flags for the post-run refresh: {e}")
+        return None
+
+
+def _score_companies(conn, flags_by_company):
+    """Every company's current score, or None (each step then scores its own)."""
+    try:
+        return score_companies(conn, flags_by_company)
+    except Exception as e:
+        _logger.warning(f"Could not score companies for the post-run refresh: {e}")
+        return None
+
+
+def _record_risk_history(conn, target_quarters, run_id, flags_by_company=None):
+    """Record the target quarters' company and universe scores; never fails the run."""
+    try:
+        count = record_risk_history(conn, target_quarters, run_id, flags_by_company)
+        _logger.info(f"Risk history recorded: {count} company-quarter(s) for {len(target_quarters)} quarter(s)")
+    except Exception as e:
+        _logger.warning(f"Could not record risk score history: {e}")
+
+
+def _refresh_sector_index(conn, scores=None):
+    """Rebuild the sector percentile index from the flags just written; never fails the run."""
+    try:
+        count = refresh_sector_index(conn, scores)
+        _logger.info(f"Sector index refreshed: {count} distribution(s)")
+    except Exception as e:
+        _logger.warning(f"Could not refresh sector index: {e}")
+
+
+def _refresh_risk_scores(conn, run_id, company_ids=None, flags_by_company=None, scores=None):
+    """Rewrite company_risk_scores from the flags just written (only `company_ids` when given);
+    never fails the run."""
+    try:
+        started = time.perf_counter()
+        count = refresh_risk_scores(conn, company_ids, run_id, flags_by_company=flags_by_company, scores=scores)
+        _logger.info(f"Risk scores refreshed: {count} company(ies) in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        _logger.warning(f"Could not refresh company risk scores: {e}")
+
+
+def _save_run_report(conn, report, summary, path=None):
+    """Write the engine run report (logs/ or `path`, + system_reports); never fails the run."""
+    try:
+        data = report.to_dict(**summary)
+        save_report(conn, data, path or REPORT_PATH)
+        slowest = data["slowest_companies"][:1]
+        _logger.info(
+            f"Run report written: {sum(f['sql_statements'] for f in data['flags'].values())} SQL statement(s), "
+            f"{sum(f['errors'] for f in data['flags'].values())} flag error(s)"
+            + (f", slowest {slowest[0]['ticker']} ({slowest[0]['seconds']:.3f}s)" if slowest else "")
+        )
+    except Exception as e:
+        _logger.warning(f"Could not write engine run report: {e}")
+
+
+# ──────────────────────────────────────────────
+# Flag Persistence
+# ──────────────────────────────────────────────
+
+# Rows per executemany() / IN (...) chunk when writing flags
+FLAG_WRITE_CHUNK = 500
+
+
+def flag_content_hash(result):
+    """Stable hash of what a flag says (severity, message, details)."""
+    payload = json.dumps(
+        [result["severity"], result["message"], result["details"]],
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _flag_key(company_id, result):
+    return (
         company_id,
         result["flag_code"],
-        result["flag_name"],
-        result["severity"],
         result.get("period_type", "annual"),
         result.get("fiscal_year", 0),
         result.get("fiscal_quarter", 0),
-        result["message"],
-        json.dumps(result["details"])
-    ))
+    )
+
+
+def _evaluated_slots(companies, target_quarters, periods, active_flags):
+    """(company_id, flag_code, period_type, fiscal_year, fiscal_quarter) keys this run evaluated.
+
+    Mirrors the loop in _evaluate_companies(): quarterly checks at every
+    target quarter for SUPPORTS_QUARTERLY modules, annual checks at Q4.
+    """
+    quarterly_codes = [m.FLAG_CODE for m in active_flags if getattr(m, "SUPPORTS_QUARTERLY", False)]
+    annual_codes = [m.FLAG_CODE for m in active_flags]
+    slots = set()
+    for company in companies:
+        cid = company["id"]
+        company_quarters = periods.get(cid, []) if periods is not None else target_quarters
+        for year, quarter in company_quarters:
+            for code in quarterly_codes:
+                slots.add((cid, code, "quarterly", year, quarter))
+            if quarter == 4:
+                for code in annual_codes:
+                    slots.add((cid, code, "annual", year, 0))
+    return slots
+
+
+def _chunks(items, size=FLAG_WRITE_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# Severity order used to classify a changed flag as escalated or de-escalated
+SEVERITY_RANK = {"LOW": 1, "MEDIUM": 2, "HIGH": 3, "CRITICAL": 4}
+
+
+# Named lock serializing flag_events writers on MySQL, and how long to wait for it
+EVENT_FEED_LOCK = "flagium.flag_events"
+EVENT_FEED_LOCK_SECONDS = 300
+
+_event_feed_mutex = threading.Lock()
+
+
+@contextlib.contextmanager
+def _event_feed_lock(conn):
+    """Hold the change-feed write lock until the block (ending in the commit) exits.
+
+    flag_events ids are handed out at insert but become visible at commit.
+    With one writer at a time, ids are committed in order, so a poller's
+    `id > since` cursor never passes an id that is still to appear. MySQL
+    takes a named lock shared by every process; SQLite already admits one
+    writer at a time and DuckDB one process, so an in-process lock covers
+    their threads (the streaming path).
+    """
+    if get_backend().DIALECT != "mysql":
+        with _event_feed_mutex:
+            yield
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (EVENT_FEED_LOCK, EVENT_FEED_LOCK_SECONDS))
+        row = cursor.fetchone()
+        if not row or row[0] != 1:
+            raise RuntimeError(f"Timed out waiting {EVENT_FEED_LOCK_SECONDS}s for the flag_events write lock")
+        try:
+            yield
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (EVENT_FEED_LOCK,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def _flag_event(run_id, key, event_type, flag_name, severity, previous_severity=None, message=None):
+    cid, code, period_type, fy, fq = key
+    return (run_id, cid, code, flag_name, period_type, fy, fq, event_type, severity, previous_severity, message)
+
+
+def save_flags(cursor, hits, slots, run_id=None):
+    """Write the diff between this run's hits and the stored flags.
+
+    New flags are inserted, flags whose content hash changed are updated in
+    place (created_at keeps the first-triggered time), identical flags are
+    skipped, and stored flags inside the evaluated `slots` that no longer
+    fire are retired. Writes use executemany() in FLAG_WRITE_CHUNK chunks;
+    the caller commits, so the whole diff lands in one transaction.
+
+    Each transition is also appended to `flag_events` (the change feed
+    behind /api/flags/changes): `raised` for a new flag, `escalated` /
+    `deescalated` when a stored flag's severity moves, `cleared` for a
+    retired one. Content-only changes at the same severity emit no event.
+    Callers hold _event_feed_lock() from here through the commit.
+
+    Args:
+        cursor: Active MySQL cursor.
+        hits: List of (company_id, result) tuples from the evaluation.
+        slots: Set of flag keys evaluated this run (see _evaluated_slots).
+        run_id: flag_runs id stamped on the events (None when not ledgered).
+
+    Returns:
+        dict with counts: {inserted, updated, unchanged, retired}
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "retired": 0}
+    if not slots and not hits:
+        return counts
+
+    # Existing flags in the evaluated scope: key -> (id, content_hash, flag_name, severity)
+    existing = {}
+    company_ids = sorted({key[0] for key in slots} | {cid for cid, _ in hits})
+    years = [key[3] for key in slots] + [r.get("fiscal_year", 0) for _, r in hits]
+    for chunk in _chunks(company_ids):
+        cursor.execute(
+            f"""
+            SELECT id, company_id, flag_code, period_type, fiscal_year, fiscal_quarter, content_hash,
+                   flag_name, severity
+            FROM flags
+            WHERE company_id IN ({", ".join(["%s"] * len(chunk))})
+              AND fiscal_year BETWEEN %s AND %s
+            """,
+            (*chunk, min(years), max(years))
+        )
+        for fid, cid, code, period_type, fy, fq, content_hash, flag_name, severity in cursor.fetchall():
+            existing[(cid, code, period_type, fy, fq or 0)] = (fid, content_hash, flag_name, severity)
+
+    inserts, updates, events, seen = [], [], [], set()
+    for cid, result in hits:
+        key = _flag_key(cid, result)
+        seen.add(key)
+        content_hash = flag_content_hash(result)
+        details = json.dumps(result["details"])
+        if key not in existing:
+            inserts.append((
+                cid, result["flag_code"], result["flag_name"], result["severity"],
+                key[2], key[3], key[4], result["message"], details, content_hash,
+            ))
+            events.append(_flag_event(run_id, key, "raised", result["flag_name"], result["severity"],
+                                      message=result["message"]))
+        elif existing[key][1] != content_hash:
+            updates.append((result["severity"], result["message"], details, content_hash, existing[key][0]))
+            before = existing[key][3]
+            rank, before_rank = SEVERITY_RANK.get(result["severity"], 0), SEVERITY_RANK.get(before, 0)
+            if rank != before_rank:
+                events.append(_flag_event(run_id, key, "escalated" if rank > before_rank else "deescalated",
+                                          result["flag_name"], result["severity"], before, result["message"]))
+        else:
+            counts["unchanged"] += 1
+
+    retired = []
+    for key, (fid, _, flag_name, severity) in existing.items():
+        if key in slots and key not in seen:
+            retired.append(fid)
+            events.append(_flag_event(run_id, key, "cleared", flag_name, severity, severity))
+
+    for chunk in _chunks(inserts):
+        cursor.executemany(
+            """
+            INSERT INTO flags
+            (company_id, flag_code, flag_name, severity, period_type, fiscal_year, fiscal_quarter,
+             message, details, content_hash)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                severity = VALUES(severity),
+                message = VALUES(message),
+                details = VALUES(details),
+                content_hash = VALUES(content_hash)
+            """,
+            chunk
+        )
+    for chunk in _chunks(updates):
+        cursor.executemany(
+            """
+            UPDATE flags
+            SET severity = %s, message = %s, details = %s, content_hash = %s,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+            """,
+            chunk
+        )
+    for chunk in _chunks(retired):
+        cursor.execute(
+            f"DELETE FROM flags WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+            tuple(chunk)
+        )
+    for chunk in _chunks(events):
+        cursor.executemany(
+            """
+            INSERT INTO flag_events
+            (run_id, company_id, flag_code, flag_name, period_type, fiscal_year, fiscal_quarter,
+             event_type, severity, previous_severity, message)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            chunk
+        )
+
+    counts["inserted"] = len(inserts)
+    counts["updated"] = len(updates)
+    counts["retired"] = len(retired)
+    return counts
+
+
+def save_flags_as_of(cursor, hits, companies, as_of, run_id=None):
+    """Replace the `flags_as_of` rows of `companies` for one as-of date.
+
+    Point-in-time results never touch the live `flags` table or the
+    `flag_events` feed. Re-running (or resuming) the same date rewrites the
+    companies' rows; the caller commits.
+
+    Returns:
+        Number of rows written.
+    """
+    for chunk in _chunks([c["id"] for c in companies]):
+        cursor.execute(
+            f"DELETE FROM flags_as_of WHERE as_of = %s AND company_id IN ({', '.join(['%s'] * len(chunk))})",
+            (as_of, *chunk)
+        )
+    rows = [
+        (as_of, cid, result["flag_code"], result["flag_name"], result["severity"], key[2], key[3], key[4],
+         result["message"], json.dumps(result["details"]), run_id)
+        for cid, result in hits
+        for key in (_flag_key(cid, result),)
+    ]
+    for chunk in _chunks(rows):
+        cursor.executemany(
+            """
+            INSERT INTO flags_as_of
+            (as_of, company_id, flag_code, flag_name, severity, period_type, fiscal_year, fiscal_quarter,
+             message, details, run_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                flag_name = VALUES(flag_name),
+                severity = VALUES(severity),
+                message = VALUES(message),
+                details = VALUES(details),
+                run_id = VALUES(run_id)
+            """,
+            chunk
+        )
+    return len(rows)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run Red Flag Engine")
     parser.add_argument("--ticker", help="Run for specific ticker (e.g. RELIANCE)")
     parser.add_argument("--backfill", type=int, default=1, help="Number of quarters to backfill (default 1)")
+    parser.add_argument("--preload", action="store_true", help="Read financials once into memory instead of querying per flag")
+    parser.add_argument("--vectorized", action="store_true", help="Evaluate flags as array expressions over all companies (implies --preload)")
+    parser.add_argument("--workers", type=int, default=1, help="Shard companies by id range across N processes (default 1)")
+    parser.add_argument("--incremental", action="store_true", help="Only re-evaluate companies/periods whose financials changed since the last completed run")
+    parser.add_argument("--resume", type=int, metavar="RUN_ID", help="Continue an interrupted run from its last checkpoint")
+    parser.add_argument("--as-of", type=date.fromisoformat, metavar="YYYY-MM-DD", help="Evaluate against the financials known on this date")
     args = parser.parse_args()
 
-    run_flags(ticker=args.ticker, backfill_quarters=args.backfill)
+    run_flags(ticker=args.ticker, backfill_quarters=args.backfill, preload=args.preload,
+              vectorized=args.vectorized, workers=args.workers, incremental=args.incremental, resume=args.resume,
+              as_of=args.as_of)
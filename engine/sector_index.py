@@ -0,0 +1,233 @@
+"""
+Flagium — Sector Percentile Index
+
+Per-sector distributions of each company's risk score, category
+(structural) scores and key financial metrics, precomputed after every
+engine run and stored as sorted arrays in `sector_distributions`.
+
+At request time a percentile or median is a bisect into the cached array
+(O(log n)), so the company page shows real peer ranks without scanning
+the sector:
+
+    index = get_sector_index()
+    index.percentile("Banking", "risk_score", 35, lower_is_better=True)
+    index.median("Banking", "category:Earnings Quality")
+
+Sectors with fewer than MIN_PEERS companies fall back to the whole
+universe (ALL_SECTORS).
+
+Usage:
+    python -m engine.sector_index        # rebuild from the current flags
+"""
+
+import json
+import time
+from bisect import bisect_left, bisect_right
+
+from db.connection import get_connection
+
+# Distribution over every company, used when a sector is too small
+ALL_SECTORS = "*"
+UNCLASSIFIED = "Unclassified"
+MIN_PEERS = 5
+
+# Latest quarterly financial_metrics columns ranked within the sector
+PEER_METRICS = ("ttm_revenue", "revenue_yoy", "net_profit_yoy", "interest_coverage")
+
+# Seconds a loaded index is reused before re-reading sector_distributions
+INDEX_TTL_SECONDS = 300
+
+
+def category_metric(category):
+    return f"category:{category}"
+
+
+# ──────────────────────────────────────────────
+# Build
+# ──────────────────────────────────────────────
+
+def _company_scores(conn, scores=None):
+    """{company_id: {metric: value}} for risk and category scores (api.scoring).
+
+    `scores` is engine.risk_scores.score_companies() output, computed here when omitted.
+    """
+    from api.scoring import calculate_risk_score
+    from engine.risk_scores import score_companies
+
+    if scores is None:
+        scores = score_companies(conn)
+
+    company_values = {}
+    categories = set()
+    for cid, data in scores.items():
+        values = {"risk_score": data["risk_score"]}
+        for category, structural in data["structural_scores"].items():
+            values[category_metric(category)] = structural["score"]
+            categories.add(category)
+        company_values[cid] = values
+
+    # A company without a category's flags has that category's clean score
+    clean = calculate_risk_score([])["structural_scores"]
+    clean_score = next(iter(clean.values()))["score"] if clean else None
+    for values in company_values.values():
+        for category in categories:
+            values.setdefault(category_metric(category), clean_score)
+    return company_values
+
+
+def _latest_metrics(conn):
+    """{company_id: {metric: value}} from each company's newest quarterly financial_metrics row."""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            f"""SELECT m.company_id, {", ".join(f"m.{c}" for c in PEER_METRICS)}
+                FROM financial_metrics m
+                JOIN (SELECT company_id, MAX(year * 10 + quarter) AS period
+                      FROM financial_metrics WHERE quarter > 0
+                      GROUP BY company_id) latest
+                  ON m.company_id = latest.company_id AND m.year * 10 + m.quarter = latest.period"""
+        )
+        return {r["company_id"]: {c: r[c] for c in PEER_METRICS} for r in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def build_distributions(company_sectors, company_values):
+    """Sorted value arrays per (sector, metric), plus the ALL_SECTORS universe.
+
+    Args:
+        company_sectors: {company_id: sector or None}
+        company_values: {company_id: {metric: value}}; None values are skipped.
+
+    Returns:
+        {(sector, metric): sorted list}
+    """
+    distributions = {}
+    for cid, values in company_values.items():
+        sector = company_sectors.get(cid) or UNCLASSIFIED
+        for metric, value in values.items():
+            if value is None:
+                continue
+            distributions.setdefault((sector, metric), []).append(value)
+            distributions.setdefault((ALL_SECTORS, metric), []).append(value)
+    for values in distributions.values():
+        values.sort()
+    return distributions
+
+
+def refresh_sector_index(conn, scores=None):
+    """Rebuild sector_distributions from the current flags and financial_metrics.
+
+    Replaces the whole table in one transaction. `scores` is every company's
+    engine.risk_scores.score_companies() output, computed here when omitted.
+
+    Returns:
+        Number of (sector, metric) distributions written.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, sector FROM companies")
+        company_sectors = dict(cursor.fetchall())
+
+        company_values = _company_scores(conn, scores)
+        for cid, values in _latest_metrics(conn).items():
+            company_values.setdefault(cid, {}).update(values)
+        distributions = build_distributions(company_sectors, company_values)
+
+        cursor.execute("DELETE FROM sector_distributions")
+        rows = [(sector, metric, len(values), json.dumps(values))
+                for (sector, metric), values in sorted(distributions.items())]
+        if rows:
+            cursor.executemany(
+                """
+                INSERT INTO sector_distributions (sector, metric, sample_size, sorted_values)
+                VALUES (%s, %s, %s, %s)
+                """,
+                rows
+            )
+        conn.commit()
+        return len(rows)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# ──────────────────────────────────────────────
+# Lookup
+# ──────────────────────────────────────────────
+
+class SectorIndex:
+    """Percentile and median lookups over the precomputed distributions."""
+
+    def __init__(self, distributions):
+        self.distributions = distributions
+
+    def values(self, sector, metric):
+        """Sorted peer values for `metric` in `sector` (or the universe if too few)."""
+        values = self.distributions.get((sector or UNCLASSIFIED, metric))
+        if not values or len(values) < MIN_PEERS:
+            values = self.distributions.get((ALL_SECTORS, metric))
+        return values or []
+
+    def percentile(self, sector, metric, value, lower_is_better=False):
+        """Share of peers (0-100) that `value` is at least as good as, or None."""
+        values = self.values(sector, metric)
+        if value is None or not values:
+            return None
+        if lower_is_better:
+            at_least_as_good = len(values) - bisect_left(values, value)
+        else:
+            at_least_as_good = bisect_right(values, value)
+        return round(100 * at_least_as_good / len(values))
+
+    def median(self, sector, metric):
+        values = self.values(sector, metric)
+        if not values:
+            return None
+        mid = len(values) // 2
+        return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def load_sector_index(conn):
+    """SectorIndex over every row of sector_distributions."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT sector, metric, sorted_values FROM sector_distributions")
+        return SectorIndex({(sector, metric): json.loads(values) for sector, metric, values in cursor.fetchall()})
+    finally:
+        cursor.close()
+
+
+_cache = {"index": None, "loaded_at": 0.0}
+
+
+def get_sector_index():
+    """Process-wide SectorIndex, re-read at most every INDEX_TTL_SECONDS.
+
+    Returns an empty index (every lookup None) if the table is unavailable.
+    """
+    if _cache["index"] is None or time.monotonic() - _cache["loaded_at"] > INDEX_TTL_SECONDS:
+        conn = get_connection()
+        try:
+            _cache["index"] = load_sector_index(conn)
+        except Exception:
+            _cache["index"] = _cache["index"] or SectorIndex({})
+        finally:
+            conn.close()
+        _cache["loaded_at"] = time.monotonic()
+    return _cache["index"]
+
+
+if __name__ == "__main__":
+    print("🚀 Rebuilding sector percentile index...")
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        count = refresh_sector_index(conn)
+        print(f"✅ {count:,} distribution(s) written in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        print(f"❌ Rebuild failed: {e}")
+    finally:
+        conn.close()
@@ -0,0 +1,306 @@
+"""
+Flagium — Columnar Snapshots
+
+Exports `companies`, `financials`, `flags` and `flag_definitions` into a
+versioned, read-only snapshot directory:
+
+    snapshots/
+      LATEST                      name of the newest complete snapshot
+      20261017T030000/
+        manifest.json             version, counts, panel layout, files
+        companies.parquet         one Parquet file per table
+        financials.parquet
+        flags.parquet
+        flag_definitions.parquet
+        company_ids.npy           panel row -> company id
+        years.npy                 panel year axis
+        annual.npy                (companies, years, metrics) float64, NaN = missing
+        annual_present.npy        (companies, years) bool
+        quarterly.npy             (companies, years * 4, metrics)
+        quarterly_present.npy     (companies, years * 4) bool
+
+The .npy arrays follow engine/panel.py's layout, so `load_panel()` memory-maps
+them straight into a FinancialsPanel: no rows are parsed and pages are read
+only when touched. Backtests, sweeps and offline analytics load the universe
+this way instead of paging it through the database driver; the Parquet files
+serve everything else (pandas, DuckDB, Arrow).
+
+A snapshot is written into a temporary directory and renamed into place,
+so readers never see a partial one.
+
+Usage:
+    python main.py snapshot [--dir snapshots]
+    python -m engine.snapshot --dir /data/snapshots
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+
+from db.connection import get_connection
+from engine.history import CompanyHistory, FINANCIAL_COLUMNS
+from engine.panel import FinancialsPanel, METRICS
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snapshots")
+LATEST_FILE = "LATEST"
+
+# Bumped when the directory layout changes incompatibly
+FORMAT_VERSION = 1
+
+# Rows pulled from the cursor per round trip while exporting
+EXPORT_BATCH_SIZE = 10000
+
+TABLE_QUERIES = {
+    "companies": "SELECT id, ticker, name, sector, index_name FROM companies ORDER BY id",
+    "financials": (
+        f"SELECT company_id, year, quarter, {', '.join(FINANCIAL_COLUMNS)}, is_consolidated, updated_at "
+        "FROM financials ORDER BY company_id, year, quarter"
+    ),
+    "flags": (
+        "SELECT id, company_id, flag_code, flag_name, severity, period_type, fiscal_year, fiscal_quarter, "
+        "message, details, created_at, updated_at FROM flags ORDER BY id"
+    ),
+    "flag_definitions": "SELECT * FROM flag_definitions ORDER BY flag_code",
+}
+
+PANEL_ARRAYS = ("company_ids", "years", "annual", "annual_present", "quarterly", "quarterly_present")
+
+
+# ──────────────────────────────────────────────
+# Export
+# ──────────────────────────────────────────────
+
+def _read_columns(conn, query):
+    """Run `query` and return {column: [values]} in select order."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query)
+        names = [d[0] for d in cursor.description]
+        columns = {name: [] for name in names}
+        while True:
+            batch = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not batch:
+                break
+            for values in batch:
+                for name, value in zip(names, values):
+                    columns[name].append(value)
+        return columns
+    finally:
+        cursor.close()
+
+
+def build_panel_arrays(company_ids, financials):
+    """Panel arrays (engine/panel.py layout) straight from financials columns.
+
+    Args:
+        company_ids: Ascending company ids; one panel row each.
+        financials: {column: [values]} with company_id, year, quarter and
+            every metric. Rows of unknown companies are dropped.
+
+    Returns:
+        {name: ndarray} for every entry of PANEL_ARRAYS.
+    """
+    company_ids = np.asarray(company_ids, dtype=np.int64)
+    cid = np.asarray(financials["company_id"], dtype=np.int64)
+    year = np.asarray(financials["year"], dtype=np.int64)
+    quarter = np.asarray(financials["quarter"], dtype=np.int64)
+    # None -> NaN
+    values = np.column_stack([np.asarray(financials[m], dtype=np.float64) for m in METRICS]) \
+        if len(cid) else np.zeros((0, len(METRICS)))
+
+    if len(company_ids):
+        row = np.minimum(np.searchsorted(company_ids, cid), len(company_ids) - 1)
+        known = company_ids[row] == cid
+    else:
+        row, known = np.zeros(len(cid), dtype=np.int64), np.zeros(len(cid), dtype=bool)
+    row, year, quarter, values = row[known], year[known], quarter[known], values[known]
+
+    years = np.arange(year.min(), year.max() + 1) if len(year) else np.arange(0)
+    n_companies, n_years = len(company_ids), len(years)
+    yi = year - (years[0] if n_years else 0)
+
+    annual = np.full((n_companies, n_years, len(METRICS)), np.nan)
+    annual_present = np.zeros((n_companies, n_years), dtype=bool)
+    quarterly = np.full((n_companies, n_years * 4, len(METRICS)), np.nan)
+    quarterly_present = np.zeros((n_companies, n_years * 4), dtype=bool)
+
+    is_annual = quarter == 0
+    annual[row[is_annual], yi[is_annual]] = values[is_annual]
+    annual_present[row[is_annual], yi[is_annual]] = True
+    pi = yi[~is_annual] * 4 + quarter[~is_annual] - 1
+    quarterly[row[~is_annual], pi] = values[~is_annual]
+    quarterly_present[row[~is_annual], pi] = True
+
+    return {
+        "company_ids": company_ids,
+        "years": years,
+        "annual": annual,
+        "annual_present": annual_present,
+        "quarterly": quarterly,
+        "quarterly_present": quarterly_present,
+    }
+
+
+def _write_parquet(path, columns):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    pq.write_table(pa.table(columns), path, compression="zstd")
+
+
+def export_snapshot(conn, root=SNAPSHOT_DIR, version=None):
+    """Write a new snapshot of the engine's tables under `root`.
+
+    Args:
+        conn: Active database connection (any backend).
+        root: Snapshot root directory; created if missing.
+        version: Directory name; defaults to the current local timestamp.
+
+    Returns:
+        Path of the new snapshot directory.
+    """
+    version = version or datetime.now().strftime("%Y%m%dT%H%M%S")
+    final = os.path.join(root, version)
+    if os.path.exists(final):
+        raise FileExistsError(f"Snapshot {final} already exists")
+    tmp = os.path.join(root, f".{version}.tmp")
+    os.makedirs(tmp, exist_ok=True)
+
+    try:
+        tables, files = {}, {}
+        for table, query in TABLE_QUERIES.items():
+            tables[table] = _read_columns(conn, query)
+            files[table] = f"{table}.parquet"
+            _write_parquet(os.path.join(tmp, files[table]), tables[table])
+
+        arrays = build_panel_arrays(tables["companies"]["id"], tables["financials"])
+        for name, array in arrays.items():
+            files[name] = f"{name}.npy"
+            np.save(os.path.join(tmp, files[name]), array)
+
+        manifest = {
+            "format": FORMAT_VERSION,
+            "version": version,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "rows": {table: len(next(iter(cols.values()), [])) for table, cols in tables.items()},
+            "panel": {
+                "metrics": list(METRICS),
+                "first_year": int(arrays["years"][0]) if len(arrays["years"]) else None,
+                "shape": {name: list(arrays[name].shape) for name in ("annual", "quarterly")},
+            },
+            "files": files,
+        }
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        os.replace(tmp, final)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    # Swap LATEST in one rename too, so resolve_snapshot() never reads a partial name
+    latest_tmp = os.path.join(root, f".{LATEST_FILE}.{os.getpid()}")
+    with open(latest_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(latest_tmp, os.path.join(root, LATEST_FILE))
+    return final
+
+
+# ──────────────────────────────────────────────
+# Read
+# ──────────────────────────────────────────────
+
+def resolve_snapshot(path=None):
+    """Snapshot directory for `path`: a snapshot itself, or a root (its LATEST)."""
+    path = path or SNAPSHOT_DIR
+    if os.path.exists(os.path.join(path, "manifest.json")):
+        return path
+    latest = os.path.join(path, LATEST_FILE)
+    if not os.path.exists(latest):
+        raise FileNotFoundError(f"No snapshot found under {path}")
+    with open(latest, encoding="utf-8") as f:
+        return os.path.join(path, f.read().strip())
+
+
+def load_manifest(path=None):
+    with open(os.path.join(resolve_snapshot(path), "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_table(path, table):
+    """One exported table as a pyarrow.Table."""
+    import pyarrow.parquet as pq
+    return pq.read_table(os.path.join(resolve_snapshot(path), f"{table}.parquet"))
+
+
+def load_companies(path=None):
+    """Companies as [{id, ticker, name, sector, index_name}], ordered by id."""
+    return load_table(path, "companies").to_pylist()
+
+
+def load_panel(path=None, mmap=True):
+    """FinancialsPanel over the snapshot's arrays (memory-mapped, read-only by default)."""
+    path = resolve_snapshot(path)
+    manifest = load_manifest(path)
+    if manifest["format"] != FORMAT_VERSION:
+        raise ValueError(f"Snapshot format {manifest['format']} is not supported (expected {FORMAT_VERSION})")
+    if manifest["panel"]["metrics"] != list(METRICS):
+        raise ValueError("Snapshot metrics do not match engine.panel.METRICS; re-export it")
+
+    mode = "r" if mmap else None
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in PANEL_ARRAYS}
+    tickers = load_table(path, "companies").column("ticker").to_pylist()
+    return FinancialsPanel(
+        arrays["company_ids"], tickers, arrays["years"],
+        arrays["annual"], arrays["annual_present"], arrays["quarterly"], arrays["quarterly_present"],
+    )
+
+
+def load_histories(path=None):
+    """{company_id: CompanyHistory} from the snapshot's financials, like engine.history.load_histories()."""
+    columns = load_table(path, "financials").select(["company_id", "year", "quarter", *FINANCIAL_COLUMNS]).to_pydict()
+    names = ("year", "quarter") + FINANCIAL_COLUMNS
+    histories = {}
+    current = None
+    for i, cid in enumerate(columns["company_id"]):
+        if current is None or current.company_id != cid:
+            current = histories.setdefault(cid, CompanyHistory(cid))
+        current.add({name: columns[name][i] for name in names})
+    return histories
+
+
+def load_flag_definitions(path=None):
+    """flag_definitions as {flag_code: (flag_name, params dict, is_active)}, like engine.rules."""
+    definitions = {}
+    for row in load_table(path, "flag_definitions").to_pylist():
+        params = row.get("params")
+        if isinstance(params, (str, bytes)):
+            params = json.loads(params)
+        is_active = row.get("is_active")
+        definitions[row["flag_code"]] = (row.get("flag_name"), params or {}, True if is_active is None else bool(is_active))
+    return definitions
+
+
+def run_export(root=SNAPSHOT_DIR):
+    """Export a snapshot from the configured database and print a summary."""
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        path = export_snapshot(conn, root)
+    finally:
+        conn.close()
+    manifest = load_manifest(path)
+    rows = ", ".join(f"{count:,} {table}" for table, count in manifest["rows"].items())
+    print(f"✅ Snapshot {manifest['version']} written to {path} ({rows}) in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export companies/financials/flags to a columnar snapshot")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR, help="Snapshot root directory (default ./snapshots)")
+    args = parser.parse_args()
+    run_export(args.dir)
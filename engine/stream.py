@@ -0,0 +1,106 @@
+"""
+Flagium — Streaming Flag Evaluation
+
+Runs the flag engine for a ticker as soon as its financials are saved,
+instead of waiting for ingestion to finish the whole universe. Ingestion
+calls the hook registered with `ingestion.ingest.register_on_saved()`;
+the ticker is queued and evaluated on a background worker thread with its
+own connection, so flag computation overlaps the I/O-bound downloads.
+
+Usage:
+    python main.py ingest --stream-flags
+
+    stream = FlagStream()
+    stream.start()
+    register_on_saved(stream.on_saved)
+    ...                      # ingest
+    stream.close()           # drains the queue, then stops the worker
+"""
+
+import queue
+import threading
+
+from db.connection import get_connection
+from engine.runner import _get_engine_logger, get_current_fiscal_quarter, get_previous_quarters, run_company_flags
+
+_logger = _get_engine_logger("STREAM")
+
+# Sentinel that stops the worker once everything queued before it is done
+_STOP = object()
+
+
+class FlagStream:
+    """Background worker evaluating flags for tickers queued by ingestion.
+
+    A ticker already waiting in the queue is not queued twice; a ticker
+    saved again while it is being evaluated is queued again, so the last
+    save always gets evaluated.
+    """
+
+    def __init__(self, backfill_quarters=1):
+        year, quarter = get_current_fiscal_quarter()
+        self.target_quarters = get_previous_quarters(year, quarter, count=backfill_quarters)
+        self.stats = {"evaluated": 0, "failed": 0, "inserted": 0, "updated": 0, "retired": 0}
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="flag-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, ticker):
+        """Queue `ticker`; returns False if it is already waiting."""
+        with self._lock:
+            if ticker in self._pending:
+                return False
+            self._pending.add(ticker)
+        self._queue.put(ticker)
+        return True
+
+    def on_saved(self, ticker, db_result):
+        """ingestion.ingest post-save hook: queue tickers whose financials changed."""
+        if db_result.get("inserted") or db_result.get("updated"):
+            self.submit(ticker)
+
+    def close(self, timeout=None):
+        """Evaluate everything already queued, then stop the worker."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        _logger.info(
+            f"Streamed flags for {self.stats['evaluated']} ticker(s): {self.stats['inserted']} new, "
+            f"{self.stats['updated']} changed, {self.stats['retired']} retired, {self.stats['failed']} failed"
+        )
+
+    def _run(self):
+        conn = get_connection()
+        try:
+            while True:
+                ticker = self._queue.get()
+                if ticker is _STOP:
+                    break
+                with self._lock:
+                    self._pending.discard(ticker)
+                self._evaluate(conn, ticker)
+        finally:
+            conn.close()
+
+    def _evaluate(self, conn, ticker):
+        try:
+            counts = run_company_flags(conn, ticker, self.target_quarters)
+        except Exception as e:
+            self.stats["failed"] += 1
+            _logger.error(f"Streaming flags failed for {ticker}: {e}")
+            return
+        if counts is None:
+            return
+        self.stats["evaluated"] += 1
+        for key in ("inserted", "updated", "retired"):
+            self.stats[key] += counts[key]
+        _logger.info(f"{ticker}: flags {counts['inserted']} new, {counts['updated']} changed, "
+                     f"{counts['retired']} retired")
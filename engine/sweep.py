@@ -0,0 +1,184 @@
+"""
+Flagium — Threshold Sweep (What-If Mode)
+
+Evaluates a grid of parameter values per flag against the in-memory
+universe and reports, for every grid point, how many companies would be
+flagged and which ones flip relative to the current thresholds. Financials
+are read once; each grid point is one vectorized check_batch() pass over
+the panel. Nothing is written to the `flags` table.
+
+Usage:
+    python -m engine.sweep --grid '{"F4": {"medium_severity_threshold": [2.0, 2.5, 3.0]}}'
+    python -m engine.sweep --grid grid.json --year 2025 --quarter 3 --json sweep.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+
+from db.connection import get_connection
+from engine.history import load_histories
+from engine.panel import FinancialsPanel
+from engine.rules import RuleFlag, compile_rule, load_flag_definitions
+from flags import get_all_flags
+from ingestion.db_writer import get_all_companies
+
+
+def grid_points(param_grid):
+    """Expand {param: [values...]} into a list of {param: value} dicts."""
+    names = sorted(param_grid)
+    values = [v if isinstance(v, (list, tuple)) else [v] for v in (param_grid[n] for n in names)]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def _base_params(flag, definitions):
+    params = dict(getattr(flag, "DEFAULT_PARAMS", {}))
+    params.update(definitions.get(flag.FLAG_CODE, (None, {}, True))[1])
+    return params
+
+
+def _evaluate_point(flag, base, point, panel, period_type, year, quarter):
+    """{company_id: severity} for one flag at one grid point."""
+    params = {**base, **point}
+    if isinstance(flag, RuleFlag):
+        results = compile_rule(flag.FLAG_CODE, flag.FLAG_NAME, params).check_batch(panel, period_type, year, quarter)
+    else:
+        flag.configure(params)
+        try:
+            results = flag.check_batch(panel, period_type, year, quarter)
+        finally:
+            flag.configure(base)
+    return {cid: r["severity"] for cid, r in results.items()}
+
+
+def sweep_panel(panel, flags, grid, year, quarter, definitions=None):
+    """Evaluate every grid point for every flag in `grid` over `panel`.
+
+    Args:
+        panel: FinancialsPanel of the universe.
+        flags: Active flags (modules or RuleFlags), e.g. get_all_flags(conn).
+        grid: {flag_code: {param: [values...]}}.
+        year, quarter: Target fiscal period. Quarterly-capable flags are
+            evaluated at (year, quarter); annual checks use `year` when
+            quarter == 4, otherwise the last completed fiscal year.
+        definitions: Output of load_flag_definitions() (current params).
+
+    Returns:
+        List of dicts, one per (flag, grid point, period type): params,
+        count, flagged tickers, and the tickers added / removed relative to
+        the current thresholds.
+    """
+    definitions = definitions or {}
+    by_code = {f.FLAG_CODE: f for f in flags}
+    unknown = sorted(set(grid) - set(by_code))
+    if unknown:
+        raise ValueError(f"Unknown or inactive flag(s) in grid: {', '.join(unknown)}")
+
+    annual_year = year if quarter == 4 else year - 1
+    ticker_of = dict(zip((int(c) for c in panel.company_ids), panel.tickers))
+
+    def _tickers(ids):
+        return sorted(ticker_of[cid] for cid in ids)
+
+    rows = []
+    for code in sorted(grid):
+        flag = by_code[code]
+        if not hasattr(flag, "check_batch"):
+            raise ValueError(f"Flag {code} has no vectorized check_batch() and cannot be swept")
+        if not isinstance(flag, RuleFlag) and not hasattr(flag, "configure"):
+            raise ValueError(f"Flag {code} has no tunable params")
+
+        base = _base_params(flag, definitions)
+        periods = [("annual", annual_year, None)]
+        if getattr(flag, "SUPPORTS_QUARTERLY", False):
+            periods.append(("quarterly", year, quarter))
+
+        for period_type, p_year, p_quarter in periods:
+            baseline = _evaluate_point(flag, base, {}, panel, period_type, p_year, p_quarter)
+            for point in grid_points(grid[code]):
+                hits = _evaluate_point(flag, base, point, panel, period_type, p_year, p_quarter)
+                rows.append({
+                    "flag_code": code,
+                    "params": point,
+                    "period_type": period_type,
+                    "year": p_year,
+                    "quarter": p_quarter or 0,
+                    "count": len(hits),
+                    "baseline_count": len(baseline),
+                    "companies": _tickers(hits),
+                    "added": _tickers(set(hits) - set(baseline)),
+                    "removed": _tickers(set(baseline) - set(hits)),
+                    "severity_changed": _tickers(
+                        cid for cid in set(hits) & set(baseline) if hits[cid] != baseline[cid]
+                    ),
+                })
+    return rows
+
+
+def run_sweep(grid, year=None, quarter=None, ticker=None):
+    """Load the universe once and sweep `grid` over it (read-only).
+
+    Returns:
+        The rows produced by sweep_panel().
+    """
+    from engine.runner import get_current_fiscal_quarter
+
+    if year is None or quarter is None:
+        year, quarter = get_current_fiscal_quarter()
+
+    conn = get_connection()
+    try:
+        companies = get_all_companies(conn)
+        if ticker:
+            companies = [c for c in companies if c["ticker"] == ticker]
+        histories = load_histories(conn, [c["id"] for c in companies] if ticker else None)
+        flags = get_all_flags(conn)
+        try:
+            definitions = load_flag_definitions(conn)
+        except Exception:
+            definitions = {}
+    finally:
+        conn.close()
+
+    panel = FinancialsPanel.from_histories(histories, companies)
+    return sweep_panel(panel, flags, grid, year, quarter, definitions)
+
+
+def load_grid(value):
+    """A sweep grid from a JSON string or the path of a JSON file."""
+    if os.path.exists(value):
+        with open(value, encoding="utf-8") as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def write_rows(rows, path):
+    """Write the full sweep rows (including company lists) to a JSON file."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2)
+    print(f"Wrote {len(rows)} grid point(s) to {path}")
+
+
+def print_rows(rows):
+    print(f"{'Flag':<5} {'Period':<16} {'Params':<45} {'Count':>6} {'+':>5} {'-':>5} {'Sev':>5}")
+    for r in rows:
+        period = f"{r['period_type']} {r['year']}" + (f" Q{r['quarter']}" if r["quarter"] else "")
+        params = json.dumps(r["params"], sort_keys=True)
+        print(f"{r['flag_code']:<5} {period:<16} {params:<45} {r['count']:>6} "
+              f"{len(r['added']):>5} {len(r['removed']):>5} {len(r['severity_changed']):>5}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Threshold sweep / what-if for the flag engine (read-only)")
+    parser.add_argument("--grid", required=True, help="JSON grid or path to a JSON file: {flag_code: {param: [values]}}")
+    parser.add_argument("--year", type=int, help="Fiscal year (default: current)")
+    parser.add_argument("--quarter", type=int, help="Fiscal quarter (default: current)")
+    parser.add_argument("--ticker", help="Restrict to one company")
+    parser.add_argument("--json", dest="json_path", help="Write full results (including company lists) to this file")
+    args = parser.parse_args()
+
+    rows = run_sweep(load_grid(args.grid), year=args.year, quarter=args.quarter, ticker=args.ticker)
+    print_rows(rows)
+    if args.json_path:
+        write_rows(rows, args.json_path)
@@ -1,5 +1,9 @@
+import logging
+
 from . import ocf_vs_pat, negative_fcf, revenue_debt_divergence, interest_coverage, profit_collapse
 
+_logger = logging.getLogger("flagium.flags")
+
 # Registry of all active flags
 FLAG_REGISTRY = [
     ocf_vs_pat,
@@ -9,5 +13,55 @@ FLAG_REGISTRY = [
     profit_collapse,
 ]
 
-def get_all_flags():
-    return FLAG_REGISTRY
+def get_all_flags(conn=None):
+    """Active flags.
+
+    Without a connection, the built-in modules with their default thresholds.
+    With one, `flag_definitions.params` is applied: built-in modules pick up
+    their thresholds via configure(), and definitions carrying a "rule" are
+    compiled into RuleFlags (replacing a built-in with the same code).
+    """
+    if conn is None:
+        return FLAG_REGISTRY
+
+    from engine.rules import load_flag_definitions
+
+    try:
+        definitions = load_flag_definitions(conn)
+    except Exception as e:
+        _logger.warning(f"Could not load flag_definitions, using built-in defaults: {e}")
+        return FLAG_REGISTRY
+
+    return flags_from_definitions(definitions)
+
+
+def flags_from_definitions(definitions):
+    """Active flags for already-loaded definitions ({code: (name, params, is_active)}).
+
+    Lets processes without a database connection (backtest workers) build
+    the same flag set as get_all_flags(conn).
+    """
+    from engine.rules import compile_rule, RuleError
+
+    definitions = dict(definitions)
+    active = []
+    for module in FLAG_REGISTRY:
+        name, params, is_active = definitions.pop(module.FLAG_CODE, (None, {}, True))
+        if not is_active:
+            continue
+        if "rule" in params:
+            definitions[module.FLAG_CODE] = (name or module.FLAG_NAME, params, True)
+            continue
+        if hasattr(module, "configure"):
+            module.configure(params)
+        active.append(module)
+
+    for code, (name, params, is_active) in sorted(definitions.items()):
+        if not is_active or "rule" not in params:
+            continue
+        try:
+            active.append(compile_rule(code, name or code, params))
+        except RuleError as e:
+            _logger.warning(f"Skipping flag {code}: {e}")
+
+    return active
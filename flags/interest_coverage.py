@@ -7,13 +7,38 @@ Rule: Trigger if Interest Coverage Ratio (EBIT / Interest Expense) < 2.5.
 Severity: HIGH (< 1.5), MEDIUM (< 2.5)
 """
 
+import numpy as np
+
+from engine.history import CompanyHistory
+from engine.metrics import derived_metrics
+
 FLAG_CODE = "F4"
 FLAG_NAME = "Low Interest Coverage"
 
+HIGH_SEVERITY_THRESHOLD = 1.5
+MEDIUM_SEVERITY_THRESHOLD = 2.5
+
+# Years of rows one evaluation reads, ending at its own period (engine.incremental)
+LOOKBACK_YEARS = 1
+
+# Keys in flag_definitions.params (see configure())
+DEFAULT_PARAMS = {
+    "high_severity_threshold": HIGH_SEVERITY_THRESHOLD,
+    "medium_severity_threshold": MEDIUM_SEVERITY_THRESHOLD,
+}
+
 # pbt and interest_expense are available in quarterly data
 SUPPORTS_QUARTERLY = True
 
 
+def configure(params):
+    """Apply thresholds from flag_definitions.params (missing keys use defaults)."""
+    global HIGH_SEVERITY_THRESHOLD, MEDIUM_SEVERITY_THRESHOLD
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    HIGH_SEVERITY_THRESHOLD = float(params["high_severity_threshold"])
+    MEDIUM_SEVERITY_THRESHOLD = float(params["medium_severity_threshold"])
+
+
 def check(conn, company_id, ticker, period_type="annual", year=None, quarter=None):
     """
     Check if Interest Coverage Ratio is low.
@@ -63,25 +88,58 @@ def check(conn, company_id, ticker, period_type="annual", year=None, quarter=Non
     row = cursor.fetchone()
     cursor.close()
 
+    history = CompanyHistory.from_rows(company_id, [row])
+    return check_history(history, ticker, period_type=period_type, year=year, quarter=quarter)
+
+
+def check_history(history, ticker, period_type="annual", year=None, quarter=None):
+    """
+    Same rule as check(), evaluated against a preloaded CompanyHistory.
+    EBIT and the coverage ratio come from the shared derived-metrics stage.
+    """
+    metrics = derived_metrics(history)
+    if period_type == "quarterly":
+        columns = ("year", "quarter", "profit_before_tax", "interest_expense")
+        period = (year, quarter) if year and quarter else metrics.latest_period("quarterly")
+    else:
+        columns = ("year", "profit_before_tax", "interest_expense")
+        period = (year, 0) if year else metrics.latest_period("annual")
+
+    row = metrics.row(*period) if period else None
     if not row:
         return None
 
-    pbt = row["profit_before_tax"]
-    interest = row["interest_expense"]
+    return _evaluate(
+        {col: row.get(col) for col in columns},
+        metrics.ebit(*period), metrics.interest_coverage(*period),
+        ticker, period_type,
+    )
 
-    if pbt is None or interest is None:
-        return None
 
-    # Calculate EBIT
-    ebit = pbt + interest
+def check_batch(panel, period_type="annual", year=None, quarter=None):
+    """
+    Vectorized check() over every company in a FinancialsPanel for one period.
+    Returns {company_id: result} for companies that trigger.
+    """
+    pbt = panel.column("profit_before_tax", period_type, year, quarter)
+    interest = panel.column("interest_expense", period_type, year, quarter)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = (pbt + interest) / interest
+
+    hits = (interest != 0) & (ratio < MEDIUM_SEVERITY_THRESHOLD)
+    return panel.hits_to_results(check_history, hits, period_type, year, quarter)
 
-    if interest == 0:
+
+def _evaluate(row, ebit, ratio, ticker, period_type):
+    """Apply the coverage rule to a period row and its derived EBIT / ratio."""
+    if ebit is None or ratio is None:
         return None
 
-    ratio = ebit / interest
+    interest = row["interest_expense"]
 
-    if ratio < 2.5:
-        severity = "HIGH" if ratio < 1.5 else "MEDIUM"
+    if ratio < MEDIUM_SEVERITY_THRESHOLD:
+        severity = "HIGH" if ratio < HIGH_SEVERITY_THRESHOLD else "MEDIUM"
 
         if period_type == "quarterly":
             period_label = f"FY{row['year']} Q{row['quarter']}"
@@ -95,7 +153,7 @@ def check(conn, company_id, ticker, period_type="annual", year=None, quarter=Non
             "period_type": period_type,
             "message": (
                 f"{ticker}: Low Interest Coverage Ratio of {ratio:.2f}x in {period_label} "
-                f"(Threshold: 2.5x)."
+                f"(Threshold: {MEDIUM_SEVERITY_THRESHOLD}x)."
             ),
             "details": {
                 "period": period_label,
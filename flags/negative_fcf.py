@@ -6,15 +6,33 @@ Rule: Trigger if FCF < 0 for 3 consecutive years.
 Severity: HIGH
 """
 
+import numpy as np
+
+from engine.history import CompanyHistory
+from engine.metrics import derived_metrics
+
 FLAG_CODE = "F2"
 FLAG_NAME = "Negative FCF Streak"
 SEVERITY = "HIGH"
 STREAK_YEARS = 3
 
+# Years of rows one evaluation reads, ending at its own period (engine.incremental)
+LOOKBACK_YEARS = STREAK_YEARS
+
+# Keys in flag_definitions.params (see configure())
+DEFAULT_PARAMS = {"streak_years": STREAK_YEARS}
+
 # quarterly data has no free_cash_flow
 SUPPORTS_QUARTERLY = False
 
 
+def configure(params):
+    """Apply thresholds from flag_definitions.params (missing keys use defaults)."""
+    global STREAK_YEARS, LOOKBACK_YEARS
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    STREAK_YEARS = LOOKBACK_YEARS = int(params["streak_years"])
+
+
 def check(conn, company_id, ticker, period_type="annual", year=None, quarter=None):
     """
     Check if FCF < 0 for last 3 years consecutively.
@@ -47,6 +65,36 @@ def check(conn, company_id, ticker, period_type="annual", year=None, quarter=Non
     rows = cursor.fetchall()
     cursor.close()
 
+    history = CompanyHistory.from_rows(company_id, rows)
+    return check_history(history, ticker, period_type=period_type, year=year, quarter=quarter)
+
+
+def check_history(history, ticker, period_type="annual", year=None, quarter=None):
+    """
+    Same rule as check(), evaluated against a preloaded CompanyHistory.
+    """
+    if period_type == "quarterly":
+        return None
+
+    rows = derived_metrics(history).annual_window(year, STREAK_YEARS, ("year", "free_cash_flow"))
+    return _evaluate(rows, ticker)
+
+
+def check_batch(panel, period_type="annual", year=None, quarter=None):
+    """
+    Vectorized check() over every company in a FinancialsPanel for one year.
+    Returns {company_id: result} for companies that trigger.
+    """
+    if period_type == "quarterly":
+        return {}
+
+    values, complete = panel.annual_window(year, STREAK_YEARS, ("free_cash_flow",))
+    hits = complete & np.all(values["free_cash_flow"] < 0, axis=1)
+    return panel.hits_to_results(check_history, hits, period_type, year, quarter)
+
+
+def _evaluate(rows, ticker):
+    """Apply the streak rule to annual rows ordered newest first."""
     if not rows or len(rows) < STREAK_YEARS:
         return None
 
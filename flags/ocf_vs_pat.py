@@ -6,16 +6,33 @@ Rule: Trigger if OCF < Net Profit in at least 2 of the last 3 years/quarters.
 Severity: HIGH
 """
 
+from engine.history import CompanyHistory
+from engine.metrics import derived_metrics
+
 FLAG_CODE = "F1"
 FLAG_NAME = "OCF < PAT"
 SEVERITY = "HIGH"
 THRESHOLD_COUNT = 2
 LOOKBACK = 3
 
+# Years of rows one evaluation reads, ending at its own period (engine.incremental)
+LOOKBACK_YEARS = LOOKBACK
+
+# Keys in flag_definitions.params (see configure())
+DEFAULT_PARAMS = {"lookback": LOOKBACK, "threshold_count": THRESHOLD_COUNT}
+
 # quarterly data has no operating_cash_flow
 SUPPORTS_QUARTERLY = False
 
 
+def configure(params):
+    """Apply thresholds from flag_definitions.params (missing keys use defaults)."""
+    global LOOKBACK, LOOKBACK_YEARS, THRESHOLD_COUNT
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    LOOKBACK = LOOKBACK_YEARS = int(params["lookback"])
+    THRESHOLD_COUNT = int(params["threshold_count"])
+
+
 def check(conn, company_id, ticker, period_type="annual", year=None, quarter=None):
     """
     Check if OCF < Net Profit in 2 of last 3 years.
@@ -47,6 +64,37 @@ def check(conn, company_id, ticker, period_type="annual", year=None, quarter=Non
     rows = cursor.fetchall()
     cursor.close()
 
+    history = CompanyHistory.from_rows(company_id, rows)
+    return check_history(history, ticker, period_type=period_type, year=year, quarter=quarter)
+
+
+def check_history(history, ticker, period_type="annual", year=None, quarter=None):
+    """
+    Same rule as check(), evaluated against a preloaded CompanyHistory.
+    """
+    if period_type == "quarterly":
+        return None
+
+    rows = derived_metrics(history).annual_window(year, LOOKBACK, ("year", "net_profit", "operating_cash_flow"))
+    return _evaluate(rows, ticker)
+
+
+def check_batch(panel, period_type="annual", year=None, quarter=None):
+    """
+    Vectorized check() over every company in a FinancialsPanel for one year.
+    Returns {company_id: result} for companies that trigger.
+    """
+    if period_type == "quarterly":
+        return {}
+
+    values, complete = panel.annual_window(year, LOOKBACK, ("net_profit", "operating_cash_flow"))
+    below = values["operating_cash_flow"] < values["net_profit"]
+    hits = complete & (below.sum(axis=1) >= THRESHOLD_COUNT)
+    return panel.hits_to_results(check_history, hits, period_type, year, quarter)
+
+
+def _evaluate(rows, ticker):
+    """Count OCF < PAT years across annual rows ordered newest first."""
     if not rows or len(rows) < LOOKBACK:
         return None
 
@@ -7,14 +7,31 @@ Rule: Trigger if Net Profit(Current) < 0.5 * Net Profit(Previous).
 Severity: HIGH
 """
 
+from engine.history import CompanyHistory
+from engine.metrics import derived_metrics
+
 FLAG_CODE = "F5"
 FLAG_NAME = "Profit Collapse"
 SEVERITY = "HIGH"
+DROP_THRESHOLD = 0.5
+
+# Years of rows one evaluation reads, ending at its own period (engine.incremental)
+LOOKBACK_YEARS = 2
+
+# Keys in flag_definitions.params (see configure())
+DEFAULT_PARAMS = {"drop_threshold": DROP_THRESHOLD}
 
 # net_profit is available in quarterly data
 SUPPORTS_QUARTERLY = True
 
 
+def configure(params):
+    """Apply thresholds from flag_definitions.params (missing keys use defaults)."""
+    global DROP_THRESHOLD
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    DROP_THRESHOLD = float(params["drop_threshold"])
+
+
 def check(conn, company_id, ticker, period_type="annual", year=None, quarter=None):
     """
     Check for > 50% drop in Net Profit.
@@ -63,7 +80,8 @@ def check(conn, company_id, ticker, period_type="annual", year=None, quarter=Non
         if not previous or previous["net_profit"] is None:
             return None
 
-        current = latest
+        history = CompanyHistory.from_rows(company_id, [latest, previous])
+        return check_history(history, ticker, period_type=period_type, year=year, quarter=quarter)
     else:
         # Annual path
         # If specific year provided, we need that year AND previous year
@@ -88,25 +106,80 @@ def check(conn, company_id, ticker, period_type="annual", year=None, quarter=Non
         rows = cursor.fetchall()
         cursor.close()
 
-        if not rows or len(rows) < 2:
-            return None
+        history = CompanyHistory.from_rows(company_id, rows)
+        return check_history(history, ticker, period_type=period_type, year=year, quarter=quarter)
 
-        current = rows[0]
-        # Verify we got the right pair if we queried specific
-        if year and current["year"] != year:
-             return None 
 
-        previous = rows[1]
+def check_history(history, ticker, period_type="annual", year=None, quarter=None):
+    """
+    Same rule as check(), evaluated against a preloaded CompanyHistory.
+    The profit change comes from the shared derived-metrics stage.
+    """
+    metrics = derived_metrics(history)
 
-        if not rows or len(rows) < 2:
-            return None
+    if period_type == "quarterly":
+        period = (year, quarter) if year and quarter else metrics.latest_period("quarterly")
+        latest = metrics.row(*period) if period else None
 
-        current = rows[0]
-        previous = rows[1]
+        if not latest or latest["net_profit"] is None:
+            return None
 
-        if current["year"] <= previous["year"]:
+        previous = metrics.row(period[0] - 1, period[1])
+        if not previous or previous["net_profit"] is None:
             return None
 
+        columns = ("year", "quarter", "net_profit")
+        return _evaluate(
+            {col: latest.get(col) for col in columns},
+            {col: previous.get(col) for col in columns},
+            metrics.yoy("net_profit", *period),
+            ticker, period_type,
+        )
+
+    if year:
+        rows = [r for r in (metrics.row(year), metrics.row(year - 1)) if r]
+    else:
+        rows = metrics.annual_window(None, 2)
+
+    return _evaluate_annual(metrics, [{"year": r["year"], "net_profit": r.get("net_profit")} for r in rows], year, ticker)
+
+
+def check_batch(panel, period_type="annual", year=None, quarter=None):
+    """
+    Vectorized check() over every company in a FinancialsPanel for one period.
+    Returns {company_id: result} for companies that trigger.
+    """
+    if year is None:
+        return {}
+
+    current = panel.column("net_profit", period_type, year, quarter)
+    previous = panel.column("net_profit", period_type, year - 1, quarter)
+
+    hits = (previous > 0) & (current < DROP_THRESHOLD * previous)
+    return panel.hits_to_results(check_history, hits, period_type, year, quarter)
+
+
+def _evaluate_annual(metrics, rows, year, ticker):
+    """Pick the (current, previous) annual pair from rows ordered newest first."""
+    if not rows or len(rows) < 2:
+        return None
+
+    current = rows[0]
+    # Verify we got the right pair if we queried specific
+    if year and current["year"] != year:
+        return None
+
+    previous = rows[1]
+
+    if current["year"] <= previous["year"]:
+        return None
+
+    change = metrics.change("net_profit", (current["year"], 0), (previous["year"], 0))
+    return _evaluate(current, previous, change, ticker, "annual")
+
+
+def _evaluate(current, previous, change, ticker, period_type):
+    """Apply the collapse rule to a (current, previous) pair of period rows and their change."""
     curr_pat = current["net_profit"]
     prev_pat = previous["net_profit"]
 
@@ -116,10 +189,10 @@ def check(conn, company_id, ticker, period_type="annual", year=None, quarter=Non
     if prev_pat <= 0:
         return None
 
-    threshold = 0.5 * prev_pat
+    threshold = DROP_THRESHOLD * prev_pat
 
     if curr_pat < threshold:
-        drop_pct = ((prev_pat - curr_pat) / prev_pat) * 100
+        drop_pct = -change * 100
 
         if period_type == "quarterly":
             curr_label = f"FY{current['year']} Q{current['quarter']}"
@@ -6,10 +6,16 @@ Rule: Trigger if Revenue(Current) < Revenue(Previous) AND Total Debt(Current) >
 Severity: MEDIUM
 """
 
+from engine.history import CompanyHistory
+from engine.metrics import derived_metrics
+
 FLAG_CODE = "F3"
 FLAG_NAME = "Revenue-Debt Divergence"
 SEVERITY = "MEDIUM"
 
+# Years of rows one evaluation reads, ending at its own period (engine.incremental)
+LOOKBACK_YEARS = 2
+
 # quarterly data has no total_debt
 SUPPORTS_QUARTERLY = False
 
@@ -45,6 +51,48 @@ def check(conn, company_id, ticker, period_type="annual", year=None, quarter=Non
     rows = cursor.fetchall()
     cursor.close()
 
+    history = CompanyHistory.from_rows(company_id, rows)
+    return check_history(history, ticker, period_type=period_type, year=year, quarter=quarter)
+
+
+def check_history(history, ticker, period_type="annual", year=None, quarter=None):
+    """
+    Same rule as check(), evaluated against a preloaded CompanyHistory.
+    Revenue and debt growth come from the shared derived-metrics stage.
+    """
+    if period_type == "quarterly":
+        return None
+
+    metrics = derived_metrics(history)
+    rows = metrics.annual_window(year, 2, ("year", "revenue", "total_debt"))
+    if len(rows) < 2:
+        return None
+
+    current, previous = (rows[0]["year"], 0), (rows[1]["year"], 0)
+    return _evaluate(
+        rows,
+        metrics.change("revenue", current, previous),
+        metrics.change("total_debt", current, previous),
+        ticker,
+    )
+
+
+def check_batch(panel, period_type="annual", year=None, quarter=None):
+    """
+    Vectorized check() over every company in a FinancialsPanel for one year.
+    Returns {company_id: result} for companies that trigger.
+    """
+    if period_type == "quarterly":
+        return {}
+
+    values, complete = panel.annual_window(year, 2, ("revenue", "total_debt"))
+    revenue, debt = values["revenue"], values["total_debt"]
+    hits = complete & (revenue[:, 0] < revenue[:, 1]) & (debt[:, 0] > debt[:, 1])
+    return panel.hits_to_results(check_history, hits, period_type, year, quarter)
+
+
+def _evaluate(rows, revenue_growth, debt_growth, ticker):
+    """Compare the latest two annual rows (newest first) and their growth rates."""
     if not rows or len(rows) < 2:
         return None
 
@@ -66,8 +114,8 @@ def check(conn, company_id, ticker, period_type="annual", year=None, quarter=Non
     debt_increasing = curr_debt > prev_debt
 
     if revenue_declining and debt_increasing:
-        rev_change_pct = ((curr_rev - prev_rev) / prev_rev) * 100 if prev_rev else 0
-        debt_change_pct = ((curr_debt - prev_debt) / prev_debt) * 100 if prev_debt else 0
+        rev_change_pct = revenue_growth * 100 if revenue_growth is not None else 0
+        debt_change_pct = debt_growth * 100 if debt_growth is not None else 0
 
         return {
             "flag_code": FLAG_CODE,
@@ -17,7 +17,7 @@ from playwright.sync_api import sync_playwright
 # Module Logger
 # ──────────────────────────────────────────────
 
-_LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
+_LOG_DIR = os.getenv("FLAGIUM_LOG_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
 os.makedirs(_LOG_DIR, exist_ok=True)
 _LOG_FORMAT = "[%(asctime)s], [%(levelname)s], [%(ticker)s], %(message)s"
 _LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
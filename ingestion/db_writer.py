@@ -8,14 +8,16 @@ Handles company upserts and financial data insertion.
 import logging
 import os
 import sys
+from datetime import date
 from db.connection import get_connection
+from engine.financial_metrics import refresh_financial_metrics
 
 
 # ──────────────────────────────────────────────
 # Module Logger
 # ──────────────────────────────────────────────
 
-_LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
+_LOG_DIR = os.getenv("FLAGIUM_LOG_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
 os.makedirs(_LOG_DIR, exist_ok=True)
 _LOG_FORMAT = "[%(asctime)s], [%(levelname)s], [%(ticker)s], %(message)s"
 _LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
@@ -95,20 +97,61 @@ def ensure_company(cursor, ticker, name=None, sector=None, index_name=None):
     return cursor.lastrowid, True
 
 
+# Metric columns compared to decide whether an existing row really changed
+_FINANCIAL_METRICS = (
+    "revenue",
+    "net_profit",
+    "profit_before_tax",
+    "operating_cash_flow",
+    "free_cash_flow",
+    "total_debt",
+    "interest_expense",
+)
+
+
+def _record_vintage(cursor, company_id, record):
+    """Append the record to financials_history as the vintage filed on its filing date.
+
+    Falls back to today when the filing date is unknown (the day the
+    numbers became knowable to us). A second version filed the same day
+    replaces the first.
+    """
+    columns = ", ".join(_FINANCIAL_METRICS)
+    placeholders = ", ".join(["%s"] * len(_FINANCIAL_METRICS))
+    updates = ", ".join(f"{col} = VALUES({col})" for col in _FINANCIAL_METRICS)
+    cursor.execute(
+        f"""
+        INSERT INTO financials_history (company_id, year, quarter, filing_date, {columns})
+        VALUES (%s, %s, %s, %s, {placeholders})
+        ON DUPLICATE KEY UPDATE {updates}
+        """,
+        (company_id, record["year"], record.get("quarter", 0), record.get("filing_date") or date.today())
+        + tuple(record.get(col) for col in _FINANCIAL_METRICS)
+    )
+
+
 def save_financials(conn, ticker, records, company_info=None):
     """Save parsed financial records to the database.
 
+    Rows whose values are identical to what is already stored are left
+    untouched, so `financials.updated_at` only moves when the data changes
+    (the incremental flag engine keys off it). Every insert or revision is
+    also appended to `financials_history`, keyed by the record's
+    `filing_date`, for point-in-time (as-of) evaluation, and the
+    `financial_metrics` rows those periods feed are recomputed.
+
     Args:
         conn: Active MySQL connection.
         ticker: Stock ticker.
-        records: List of dicts from xbrl_parser (each has year, revenue, etc.)
+        records: List of dicts from xbrl_parser (each has year, revenue, etc.,
+            and optionally filing_date)
         company_info: Optional dict with name, sector, index fields.
 
     Returns:
-        dict with counts: {inserted, updated, skipped, errors}
+        dict with counts: {inserted, updated, unchanged, skipped, errors}
     """
     cursor = conn.cursor()
-    result = {"inserted": 0, "updated": 0, "skipped": 0, "errors": []}
+    result = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0, "errors": []}
 
     try:
         # Ensure company exists
@@ -124,12 +167,13 @@ def save_financials(conn, ticker, records, company_info=None):
             _get_db_logger(ticker).info(f"Created company: {ticker} ({name})")
 
         # Insert/update each financial record
+        written = []
         for record in records:
             try:
                 # Check if record already exists
                 cursor.execute(
-                    """
-                    SELECT id, is_consolidated FROM financials
+                    f"""
+                    SELECT id, is_consolidated, {", ".join(_FINANCIAL_METRICS)} FROM financials
                     WHERE company_id = %s AND year = %s AND quarter = %s
                     """,
                     (company_id, record["year"], record.get("quarter", 0))
@@ -139,7 +183,8 @@ def save_financials(conn, ticker, records, company_info=None):
                 is_cons = record.get("is_consolidated", False)
 
                 if existing_row:
-                    existing_id, existing_is_cons = existing_row
+                    existing_id, existing_is_cons = existing_row[0], existing_row[1]
+                    existing_values = tuple(existing_row[2:])
                     
                     # PRIORITY LOGIC: 
                     # 1. If currently consolidated and DB is standalone -> Update
@@ -148,6 +193,12 @@ def save_financials(conn, ticker, records, company_info=None):
                     if existing_is_cons and not is_cons:
                         result["skipped"] += 1
                         continue
+
+                    # Identical restatement: don't touch the row (keeps updated_at)
+                    new_values = tuple(record.get(col) for col in _FINANCIAL_METRICS)
+                    if new_values == existing_values and bool(existing_is_cons) == bool(is_cons):
+                        result["unchanged"] += 1
+                        continue
                     
                     # Update existing record
                     cursor.execute(
@@ -160,7 +211,8 @@ def save_financials(conn, ticker, records, company_info=None):
                             free_cash_flow = %s,
                             total_debt = %s,
                             interest_expense = %s,
-                            is_consolidated = %s
+                            is_consolidated = %s,
+                            updated_at = CURRENT_TIMESTAMP
                         WHERE id = %s
                         """,
                         (
@@ -175,6 +227,8 @@ def save_financials(conn, ticker, records, company_info=None):
                             existing_id,
                         )
                     )
+                    _record_vintage(cursor, company_id, record)
+                    written.append((record["year"], record.get("quarter", 0)))
                     result["updated"] += 1
                 else:
                     # Insert new record
@@ -200,6 +254,8 @@ def save_financials(conn, ticker, records, company_info=None):
                             is_cons,
                         )
                     )
+                    _record_vintage(cursor, company_id, record)
+                    written.append((record["year"], record.get("quarter", 0)))
                     result["inserted"] += 1
 
             except Exception as e:
@@ -207,6 +263,12 @@ def save_financials(conn, ticker, records, company_info=None):
                     f"{ticker} year {record.get('year')}: {e}"
                 )
 
+        # TTM / growth / coverage rows that read the written periods
+        try:
+            refresh_financial_metrics(cursor, company_id, written)
+        except Exception as e:
+            result["errors"].append(f"{ticker} financial_metrics: {e}")
+
         conn.commit()
 
     except Exception as e:
@@ -16,6 +16,7 @@ import logging
 import random
 import time
 import threading
+from datetime import datetime
 from ingestion.nse_fetcher import (
     NSESession, get_company_info, get_financial_results,
     download_xbrl_file, fetch_nifty50_tickers, fetch_universe_1000
@@ -34,7 +35,7 @@ from db.utils import update_job_status
 # Logging Setup
 # ──────────────────────────────────────────────
 
-LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
+LOG_DIR = os.getenv("FLAGIUM_LOG_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
 _LOG_FORMAT = "[%(asctime)s], [%(levelname)s], [%(ticker)s], %(message)s"
@@ -99,6 +100,36 @@ XBRL_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "xbr
 # Especially for the 1GB production server.
 PARSE_SEMAPHORE = threading.Semaphore(2)
 
+# In-process callbacks run after save_financials() succeeds (see register_on_saved)
+_ON_SAVED = []
+
+
+def register_on_saved(callback):
+    """Call `callback(ticker, db_result)` after each successful save_financials().
+
+    Used by engine/stream.py to queue a ticker for flag evaluation as soon
+    as its financials land. Callbacks run on the ingestion thread and must
+    return quickly.
+    """
+    if callback not in _ON_SAVED:
+        _ON_SAVED.append(callback)
+
+
+def unregister_on_saved(callback):
+    if callback in _ON_SAVED:
+        _ON_SAVED.remove(callback)
+
+
+def _notify_saved(ticker, db_result):
+    """Run the post-save callbacks; a failing callback never fails ingestion."""
+    if db_result["errors"] and not (db_result["inserted"] or db_result["updated"]):
+        return
+    for callback in list(_ON_SAVED):
+        try:
+            callback(ticker, db_result)
+        except Exception as e:
+            _get_ingestion_logger(ticker).warning(f"on_saved hook failed: {e}")
+
 
 def ingest_company(session, conn, ticker, download_dir=None, keep_files=False, delta_mode=False):
     """Ingest financial data for a single company.
@@ -195,6 +226,7 @@ def ingest_company(session, conn, ticker, download_dir=None, keep_files=False, d
                             result["xbrl_downloaded"] = 1
                             result["records_parsed"] = len(records)
                             db_result = save_financials(conn, ticker, deduped, company_info)
+                            _notify_saved(ticker, db_result)
                             result["db_result"] = db_result
                             result["status"] = "success" if not db_result["errors"] else "partial"
                             logger.info(f"DB: {db_result['inserted']} inserted, {db_result['updated']} updated")
@@ -287,8 +319,13 @@ def ingest_company(session, conn, ticker, download_dir=None, keep_files=False, d
                 if "consolidated" in cons_field and "non" not in cons_field:
                     is_cons = True
                 
+                # Point-in-time: when these numbers became public (financials_history)
+                filing_date = _extract_filing_date(filing)
+
                 for r in records:
                     r["is_consolidated"] = is_cons
+                    if filing_date:
+                        r["filing_date"] = filing_date
                     
                 all_records.extend(records)
                 logger.info(f"Parsed {len(records)} record(s) from {filename} (Consolidated: {is_cons})")
@@ -306,6 +343,7 @@ def ingest_company(session, conn, ticker, download_dir=None, keep_files=False, d
 
     # Step 5: Save to database
     db_result = save_financials(conn, ticker, deduped, company_info)
+    _notify_saved(ticker, db_result)
     result["db_result"] = db_result
     result["status"] = "success" if not db_result["errors"] else "partial"
 
@@ -364,7 +402,7 @@ def _is_consolidated(filing):
     return False
 
 
-def ingest_all(tickers=None, limit=None, offset=0, keep_files=False, delta_mode=False):
+def ingest_all(tickers=None, limit=None, offset=0, keep_files=False, delta_mode=False, stream_flags=False):
     """Ingest financial data for multiple companies.
 
     Args:
@@ -373,6 +411,8 @@ def ingest_all(tickers=None, limit=None, offset=0, keep_files=False, delta_mode=
         offset: Number of companies to skip.
         keep_files: If True, do not delete XBRL files after ingestion.
         delta_mode: If True, only fetch data newer than what's in the DB.
+        stream_flags: If True, run the flag engine for each ticker on a
+            background worker as soon as its financials change.
 
     Returns:
         List of result dicts (one per company).
@@ -398,6 +438,13 @@ def ingest_all(tickers=None, limit=None, offset=0, keep_files=False, delta_mode=
 
     update_job_status("Ingestion Job", "running", f"Starting ingestion for {len(tickers)} companies")
 
+    stream = None
+    if stream_flags:
+        from engine.stream import FlagStream
+        stream = FlagStream()
+        stream.start()
+        register_on_saved(stream.on_saved)
+
     session = NSESession()
     conn = get_connection()
     results = []
@@ -436,6 +483,9 @@ def ingest_all(tickers=None, limit=None, offset=0, keep_files=False, delta_mode=
     finally:
         session.close()
         conn.close()
+        if stream:
+            unregister_on_saved(stream.on_saved)
+            stream.close()
 
     # Print summary
     _print_summary(results)
@@ -468,6 +518,7 @@ def ingest_from_xbrl_file(file_path, ticker):
     conn = get_connection()
     try:
         db_result = save_financials(conn, ticker, deduped)
+        _notify_saved(ticker, db_result)
         logger.info(f"DB: {db_result['inserted']} inserted, {db_result['updated']} updated")
         return {"ticker": ticker, "status": "success", "db_result": db_result}
     finally:
@@ -510,6 +561,21 @@ def _extract_period(filing):
     return "unknown"
 
 
+def _extract_filing_date(filing):
+    """Extract the date a filing was disseminated, or None if unknown."""
+    for key in ["filingDate", "broadCastDate", "broadcastDate", "exchdisstime", "submissionDate"]:
+        val = filing.get(key)
+        if not val:
+            continue
+        val = str(val).strip()
+        for fmt in ("%d-%b-%Y %H:%M:%S", "%d-%b-%Y %H:%M", "%d-%b-%Y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+            try:
+                return datetime.strptime(val, fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
 def _get_latest_db_period(conn, ticker):
     """Retrieve the latest year and quarter currently stored in DB for a ticker."""
     cursor = conn.cursor()
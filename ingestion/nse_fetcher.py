@@ -21,7 +21,7 @@ from typing import Optional, List, Dict, Any
 # Module Logger
 # ──────────────────────────────────────────────
 
-_LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
+_LOG_DIR = os.getenv("FLAGIUM_LOG_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
 os.makedirs(_LOG_DIR, exist_ok=True)
 
 _LOG_FORMAT = "[%(asctime)s], [%(levelname)s], [%(ticker)s], %(message)s"
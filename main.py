@@ -4,17 +4,32 @@ Flagium AI — Main Entry Point
 CLI tool for the Flagium AI financial risk detection engine.
 
 Usage:
-    python main.py ingest [--keep] [TICKERS...]  # Ingest Nifty 50 or specific tickers
+    python main.py ingest [--keep] [--stream-flags] [TICKERS...]  # Ingest Nifty 50 or specific tickers
     python main.py ingest-file <path> TICKER     # Ingest from local XBRL file
-    python main.py flags [--ticker X] [--backfill N]  # Run flag engine
+    python main.py flags [--ticker X] [--backfill N] [--preload] [--vectorized] [--workers N] [--incremental] [--resume RUN_ID] [--as-of YYYY-MM-DD]  # Run flag engine
+    python main.py sweep --grid JSON [--year Y] [--quarter Q] [--ticker T] [--json OUT]  # What-if threshold sweep (no writes)
+    python main.py backtest [--horizon N] [--workers N] [--point-in-time] [--snapshot DIR] [--json OUT]  # Flag precision / lead time
+    python main.py snapshot [--dir DIR]          # Export a columnar (Parquet + .npy) snapshot
     python main.py status                        # Show DB status
 
 Options:
     --keep       Keep downloaded XBRL files (do not delete after ingestion)
     --delta      Delta mode: only fetch files newer than what's in the DB
+    --stream-flags Run the flag engine for each ticker right after its financials are saved
     --file       Path to a text file containing tickers (one per line)
     --ticker     Run flag engine for a specific ticker
     --backfill   Number of quarters to backfill (default: 1)
+    --preload    Read financials once into memory before running flags
+    --vectorized Evaluate flags as array expressions over all companies (implies --preload)
+    --workers    Shard the flag engine across N processes by company id range
+    --incremental Only re-evaluate companies/periods whose financials changed since the last run
+    --resume     Continue an interrupted flag engine run (flag_runs id) from its last checkpoint
+    --as-of      Evaluate flags against the financials known on a date (point-in-time)
+    --grid       Sweep grid, inline JSON or a file: {"F4": {"medium_severity_threshold": [2.0, 2.5, 3.0]}}
+    --horizon    Backtest: quarters after a flag in which an outcome counts (default: 8)
+    --point-in-time Backtest: evaluate each quarter on the financials known at the time
+    --snapshot   Backtest: read a snapshot directory (or the latest under a root) instead of the database
+    --dir        Snapshot: root directory to write into (default: ./snapshots)
 """
 
 import sys
@@ -22,7 +37,7 @@ import os
 from db.connection import get_connection
 
 
-def cmd_ingest(tickers=None, keep_files=False, delta_mode=False, limit=None, offset=0):
+def cmd_ingest(tickers=None, keep_files=False, delta_mode=False, limit=None, offset=0, stream_flags=False):
     """Run NSE data ingestion."""
     from ingestion.ingest import ingest_all
 
@@ -31,7 +46,8 @@ def cmd_ingest(tickers=None, keep_files=False, delta_mode=False, limit=None, off
     else:
         print("Ingesting data for all Nifty 50 companies...")
 
-    ingest_all(tickers=tickers if tickers else None, keep_files=keep_files, delta_mode=delta_mode, limit=limit, offset=offset)
+    ingest_all(tickers=tickers if tickers else None, keep_files=keep_files, delta_mode=delta_mode, limit=limit, offset=offset,
+               stream_flags=stream_flags)
 
 
 def cmd_ingest_file(file_path, ticker):
@@ -40,10 +56,36 @@ def cmd_ingest_file(file_path, ticker):
     ingest_from_xbrl_file(file_path, ticker)
 
 
-def cmd_flags(ticker=None, backfill=1):
+def cmd_flags(ticker=None, backfill=1, preload=False, vectorized=False, workers=1, incremental=False, resume=None,
+              as_of=None):
     """Run the flag engine."""
     from engine.runner import run_flags
-    run_flags(ticker=ticker, backfill_quarters=backfill)
+    run_flags(ticker=ticker, backfill_quarters=backfill, preload=preload, vectorized=vectorized, workers=workers,
+              incremental=incremental, resume=resume, as_of=as_of)
+
+
+def cmd_sweep(grid, year=None, quarter=None, ticker=None, json_path=None):
+    """Run a read-only threshold sweep and print flip counts per grid point."""
+    from engine.sweep import run_sweep, print_rows, write_rows
+    rows = run_sweep(grid, year=year, quarter=quarter, ticker=ticker)
+    print_rows(rows)
+    if json_path:
+        write_rows(rows, json_path)
+
+
+def cmd_backtest(horizon=8, workers=1, point_in_time=False, json_path=None, snapshot=None):
+    """Backtest every flag against later outcomes and print the precision / lead-time table."""
+    from engine.backtest import run_backtest, print_report, write_result
+    result = run_backtest(horizon=horizon, workers=workers, point_in_time=point_in_time, snapshot=snapshot)
+    print_report(result)
+    if json_path:
+        write_result(result, json_path)
+
+
+def cmd_snapshot(root=None):
+    """Export companies/financials/flags/flag_definitions to a versioned columnar snapshot."""
+    from engine.snapshot import run_export, SNAPSHOT_DIR
+    run_export(root or SNAPSHOT_DIR)
 
 
 def cmd_status():
@@ -106,6 +148,7 @@ def main():
         args = sys.argv[2:]
         keep_files = False
         delta_mode = False
+        stream_flags = False
         offset = 0
         limit = None
         ticker_file = None
@@ -122,6 +165,8 @@ def main():
                 keep_files = True
             elif arg == "--delta":
                 delta_mode = True
+            elif arg == "--stream-flags":
+                stream_flags = True
             elif arg == "--file" and i + 1 < len(args):
                 ticker_file = args[i+1]
                 skip_next = 1
@@ -147,7 +192,8 @@ def main():
         else:
             tickers = filtered_args if filtered_args else None
             
-        cmd_ingest(tickers, keep_files=keep_files, delta_mode=delta_mode, limit=limit, offset=offset)
+        cmd_ingest(tickers, keep_files=keep_files, delta_mode=delta_mode, limit=limit, offset=offset,
+                   stream_flags=stream_flags)
 
     elif command == "ingest-file":
         if len(sys.argv) < 4:
@@ -162,6 +208,12 @@ def main():
         args = sys.argv[2:]
         ticker = None
         backfill = 1
+        preload = False
+        vectorized = False
+        workers = 1
+        incremental = False
+        resume = None
+        as_of = None
         i = 0
         while i < len(args):
             if args[i] == "--ticker" and i + 1 < len(args):
@@ -173,9 +225,104 @@ def main():
                 except ValueError:
                     pass
                 i += 2
+            elif args[i] == "--preload":
+                preload = True
+                i += 1
+            elif args[i] == "--vectorized":
+                vectorized = True
+                i += 1
+            elif args[i] == "--incremental":
+                incremental = True
+                i += 1
+            elif args[i] == "--workers" and i + 1 < len(args):
+                try:
+                    workers = int(args[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            elif args[i] == "--resume" and i + 1 < len(args):
+                try:
+                    resume = int(args[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            elif args[i] == "--as-of" and i + 1 < len(args):
+                from datetime import date
+                try:
+                    as_of = date.fromisoformat(args[i + 1])
+                except ValueError:
+                    print(f"Invalid --as-of date: {args[i + 1]} (expected YYYY-MM-DD)")
+                    sys.exit(1)
+                i += 2
+            else:
+                i += 1
+        cmd_flags(ticker=ticker, backfill=backfill, preload=preload, vectorized=vectorized, workers=workers,
+                  incremental=incremental, resume=resume, as_of=as_of)
+
+    elif command == "sweep":
+        from engine.sweep import load_grid
+        args = sys.argv[2:]
+        grid = None
+        year = quarter = ticker = json_path = None
+        i = 0
+        while i < len(args):
+            if args[i] == "--grid" and i + 1 < len(args):
+                grid = load_grid(args[i + 1])
+                i += 2
+            elif args[i] == "--ticker" and i + 1 < len(args):
+                ticker = args[i + 1]
+                i += 2
+            elif args[i] == "--year" and i + 1 < len(args):
+                year = int(args[i + 1])
+                i += 2
+            elif args[i] == "--quarter" and i + 1 < len(args):
+                quarter = int(args[i + 1])
+                i += 2
+            elif args[i] == "--json" and i + 1 < len(args):
+                json_path = args[i + 1]
+                i += 2
             else:
                 i += 1
-        cmd_flags(ticker=ticker, backfill=backfill)
+        if not grid:
+            print("Usage: python main.py sweep --grid '{\"F4\": {\"medium_severity_threshold\": [2.0, 3.0]}}'")
+            return
+        cmd_sweep(grid, year=year, quarter=quarter, ticker=ticker, json_path=json_path)
+
+    elif command == "backtest":
+        args = sys.argv[2:]
+        horizon = 8
+        workers = 1
+        point_in_time = False
+        json_path = None
+        snapshot = None
+        i = 0
+        while i < len(args):
+            if args[i] == "--horizon" and i + 1 < len(args):
+                horizon = int(args[i + 1])
+                i += 2
+            elif args[i] == "--workers" and i + 1 < len(args):
+                workers = int(args[i + 1])
+                i += 2
+            elif args[i] == "--point-in-time":
+                point_in_time = True
+                i += 1
+            elif args[i] == "--snapshot" and i + 1 < len(args):
+                snapshot = args[i + 1]
+                i += 2
+            elif args[i] == "--json" and i + 1 < len(args):
+                json_path = args[i + 1]
+                i += 2
+            else:
+                i += 1
+        cmd_backtest(horizon=horizon, workers=workers, point_in_time=point_in_time, json_path=json_path,
+                     snapshot=snapshot)
+
+    elif command == "snapshot":
+        args = sys.argv[2:]
+        root = None
+        if "--dir" in args and args.index("--dir") + 1 < len(args):
+            root = args[args.index("--dir") + 1]
+        cmd_snapshot(root)
 
     else:
         print(f"Unknown command: {command}")
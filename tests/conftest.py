@@ -1,8 +1,12 @@
 import pytest
 import os
 import sys
+import tempfile
 from unittest.mock import MagicMock
 
+# Engine / ingestion logs and the run report go to a scratch dir, not the tracked logs/
+os.environ.setdefault("FLAGIUM_LOG_DIR", tempfile.mkdtemp(prefix="flagium-test-logs-"))
+
 # Mock growwapi which is missing and causing import errors
 sys.modules["growwapi"] = MagicMock()
 
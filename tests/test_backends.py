@@ -0,0 +1,418 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock, patch
+import sys
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db.backends import connect, get_backend
+from db.backends.base import translate, upsert_sql
+from db.backends.clone import clone_tables
+from db.backends.pool import ConnectionPool, PoolTimeoutError
+from ingestion.db_writer import save_financials, save_shareholding, get_all_companies
+from engine.history import load_histories
+from engine import incremental
+from engine.financial_metrics import rebuild_financial_metrics
+from engine.risk_scores import load_flags_by_company, load_risk_scores, refresh_risk_scores, score_companies
+from engine.sector_index import refresh_sector_index
+from engine.risk_history import record_risk_history, load_score_series, load_density_series
+
+
+def _record(year, quarter, revenue, **extra):
+    record = {
+        "year": year, "quarter": quarter, "revenue": revenue, "net_profit": revenue // 10,
+        "profit_before_tax": revenue // 8, "operating_cash_flow": revenue // 12,
+        "free_cash_flow": revenue // 20, "total_debt": revenue * 2, "interest_expense": revenue // 50,
+    }
+    record.update(extra)
+    return record
+
+
+class TestTranslate(unittest.TestCase):
+
+    def test_upsert_rewritten_with_conflict_target(self):
+        sql = translate(
+            "INSERT INTO system_jobs (job_name, status) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE status = VALUES(status), message = NULL",
+            "duckdb"
+        )
+        self.assertEqual(
+            sql,
+            "INSERT INTO system_jobs (job_name, status) VALUES (?, ?) "
+            "ON CONFLICT (job_name) DO UPDATE SET status = excluded.status, message = NULL"
+        )
+
+    def test_ignore_now_and_mysql_passthrough(self):
+        self.assertEqual(translate("INSERT IGNORE INTO flags VALUES (%s)", "sqlite"), "INSERT OR IGNORE INTO flags VALUES (?)")
+        self.assertEqual(translate("SELECT NOW()", "sqlite"), "SELECT CURRENT_TIMESTAMP")
+        mysql_sql = "INSERT INTO t (a) VALUES (%s) ON DUPLICATE KEY UPDATE a = VALUES(a)"
+        self.assertEqual(translate(mysql_sql, "mysql"), mysql_sql)
+
+    def test_upsert_sql(self):
+        self.assertEqual(
+            upsert_sql("sqlite", "shareholding", ["company_id", "year", "promoter_holding_pct"], ["promoter_holding_pct"]),
+            "INSERT INTO shareholding (company_id, year, promoter_holding_pct) VALUES (%s, %s, %s) "
+            "ON CONFLICT (company_id, year) DO UPDATE SET promoter_holding_pct = excluded.promoter_holding_pct"
+        )
+
+    def test_unknown_backend(self):
+        with patch.dict(os.environ, {"DB_BACKEND": "oracle"}):
+            with self.assertRaises(ValueError):
+                get_backend()
+
+
+class _BackendRoundTrip:
+    """Ingestion writes and engine reads against a local backend."""
+
+    backend = None
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = connect(self.backend, os.path.join(self.tmp.name, f"test.{self.backend}"))
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def test_save_financials_and_load_histories(self):
+        first = save_financials(self.conn, "ACME", [_record(2024, 1, 1000), _record(2024, 2, 1100)])
+        again = save_financials(self.conn, "ACME", [_record(2024, 1, 1000), _record(2024, 2, 1200)])
+        save_shareholding(self.conn, 1, 2024, 51.5)
+        save_shareholding(self.conn, 1, 2024, 52.0)
+
+        self.assertEqual((first["inserted"], first["errors"]), (2, []))
+        self.assertEqual((again["unchanged"], again["updated"]), (1, 1))
+        self.assertEqual(get_all_companies(self.conn), [{"id": 1, "ticker": "ACME", "name": "ACME", "sector": None}])
+
+        history = load_histories(self.conn)[1]
+        self.assertEqual(history.quarter_row(2024, 2)["revenue"], 1200)
+
+        cursor = self.conn.cursor(dictionary=True)
+        # The same-day revision replaces that day's vintage
+        cursor.execute("SELECT quarter, revenue FROM financials_history ORDER BY quarter")
+        self.assertEqual(cursor.fetchall(), [{"quarter": 1, "revenue": 1000}, {"quarter": 2, "revenue": 1200}])
+        cursor.execute("SELECT promoter_holding_pct FROM shareholding")
+        self.assertEqual(cursor.fetchall(), [{"promoter_holding_pct": 52.0}])
+
+    def test_financial_metrics_follow_writes(self):
+        quarters = [_record(2023, q, 1000) for q in (1, 2, 3, 4)] + [_record(2024, 1, 1100), _record(2024, 2, 1100)]
+        save_financials(self.conn, "ACME", quarters)
+        # Revising 2023 Q2 moves its own row, Q3's QoQ and every TTM that spans it
+        save_financials(self.conn, "ACME", [_record(2023, 2, 1200)])
+
+        cursor = self.conn.cursor(dictionary=True)
+        cursor.execute(
+            "SELECT year, quarter, ttm_revenue, revenue_yoy, revenue_qoq FROM financial_metrics "
+            "WHERE quarter > 0 ORDER BY year, quarter"
+        )
+        rows = {(r["year"], r["quarter"]): r for r in cursor.fetchall()}
+        incremental_rows = dict(rows)
+
+        self.assertEqual(rows[(2023, 4)]["ttm_revenue"], 4200)
+        self.assertEqual(rows[(2024, 1)]["ttm_revenue"], 4300)
+        self.assertAlmostEqual(rows[(2024, 2)]["revenue_yoy"], -100 / 1200)
+        self.assertAlmostEqual(rows[(2023, 3)]["revenue_qoq"], -200 / 1200)
+        self.assertIsNone(rows[(2023, 3)]["ttm_revenue"])
+
+        rebuild_financial_metrics(self.conn)
+        cursor.execute(
+            "SELECT year, quarter, ttm_revenue, revenue_yoy, revenue_qoq FROM financial_metrics "
+            "WHERE quarter > 0 ORDER BY year, quarter"
+        )
+        self.assertEqual({(r["year"], r["quarter"]): r for r in cursor.fetchall()}, incremental_rows)
+
+    def test_risk_scores_refresh_and_staleness(self):
+        save_financials(self.conn, "ACME", [_record(2024, 1, 1000)])
+        save_financials(self.conn, "BETA", [_record(2024, 1, 500)])
+        cursor = self.conn.cursor(dictionary=True)
+        cursor.execute(
+            "INSERT INTO flags (company_id, flag_code, flag_name, severity, period_type, fiscal_year, fiscal_quarter) "
+            "VALUES (1, 'F1', 'Debt Spike', 'HIGH', 'quarterly', 2024, 1)"
+        )
+        self.conn.commit()
+
+        self.assertEqual(refresh_risk_scores(self.conn, run_id=7), 2)
+        scores = load_risk_scores(cursor, [1, 2])
+        self.assertEqual(set(scores), {1, 2})
+        self.assertGreater(scores[1]["risk_score"], scores[2]["risk_score"])
+        self.assertIsInstance(scores[1]["history"], list)
+        self.assertIn("delta_qoq", scores[1]["predictive"])
+
+        # A new flag makes ACME's row stale; a new quarter makes every row stale, age alone does not
+        cursor.execute(
+            "INSERT INTO flags (company_id, flag_code, flag_name, severity, period_type, fiscal_year, fiscal_quarter) "
+            "VALUES (1, 'F2', 'Margin Drop', 'MEDIUM', 'quarterly', 2024, 1)"
+        )
+        self.conn.commit()
+        self.assertEqual(set(load_risk_scores(cursor, [1, 2])), {2})
+        today = date.today()
+        first_month = (today.month - 1) // 3 * 3 + 4
+        next_quarter = datetime(today.year + (first_month > 12), (first_month - 1) % 12 + 1, 1)
+        self.assertEqual(set(load_risk_scores(cursor, [1, 2], now=next_quarter - timedelta(seconds=1))), {2})
+        self.assertEqual(load_risk_scores(cursor, [1, 2], now=next_quarter), {})
+
+        # A newer universe-wide run makes older rows stale; a --ticker run does not
+        universe = incremental.start_run(self.conn, "full", incremental.current_watermark(self.conn))
+        incremental.finish_run(self.conn, universe, "completed")
+        refresh_risk_scores(self.conn, run_id=universe)
+        self.assertEqual(set(load_risk_scores(cursor, [1, 2])), {1, 2})
+        ticker = incremental.start_run(self.conn, "full", incremental.current_watermark(self.conn), ticker="ACME")
+        incremental.finish_run(self.conn, ticker, "completed")
+        self.assertEqual(set(load_risk_scores(cursor, [1, 2])), {1, 2})
+        later = incremental.start_run(self.conn, "incremental", incremental.current_watermark(self.conn))
+        incremental.finish_run(self.conn, later, "completed")
+        self.assertEqual(load_risk_scores(cursor, [1, 2]), {})
+
+    def test_shared_scores_match_separate_passes(self):
+        save_financials(self.conn, "ACME", [_record(2024, 1, 1000)])
+        save_financials(self.conn, "BETA", [_record(2024, 1, 500)])
+        cursor = self.conn.cursor(dictionary=True)
+        cursor.execute(
+            "INSERT INTO flags (company_id, flag_code, flag_name, severity, period_type, fiscal_year, fiscal_quarter) "
+            "VALUES (1, 'F1', 'Debt Spike', 'HIGH', 'quarterly', 2024, 1)"
+        )
+        self.conn.commit()
+        refresh_sector_index(self.conn)
+        refresh_risk_scores(self.conn)
+        separate = load_risk_scores(cursor, [1, 2])
+        cursor.execute("SELECT sector, metric, sorted_values FROM sector_distributions ORDER BY sector, metric")
+        distributions = cursor.fetchall()
+
+        flags = load_flags_by_company(self.conn)
+        scores = score_companies(self.conn, flags)
+        refresh_sector_index(self.conn, scores)
+        self.assertEqual(refresh_risk_scores(self.conn, company_ids=[1], flags_by_company=flags, scores=scores), 1)
+        cursor.execute("SELECT sector, metric, sorted_values FROM sector_distributions ORDER BY sector, metric")
+        self.assertEqual(cursor.fetchall(), distributions)
+        self.assertEqual(load_risk_scores(cursor, [1, 2]), separate)
+
+    def test_risk_history_keeps_recorded_quarters(self):
+        save_financials(self.conn, "ACME", [_record(2024, 1, 1000)])
+        save_financials(self.conn, "BETA", [_record(2024, 1, 500)])
+        cursor = self.conn.cursor(dictionary=True)
+        cursor.execute(
+            "INSERT INTO flags (company_id, flag_code, flag_name, severity, period_type, fiscal_year, fiscal_quarter) "
+            "VALUES (1, 'F1', 'Debt Spike', 'HIGH', 'quarterly', 2024, 2)"
+        )
+        self.conn.commit()
+        quarters = [(2024, 2), (2024, 1), (2023, 4), (2023, 3), (2023, 2), (2023, 1)]
+
+        self.assertEqual(record_risk_history(self.conn, quarters, run_id=1), 12)
+        # The flag is retired; the next run only rewrites its own quarter
+        cursor.execute("DELETE FROM flags")
+        self.conn.commit()
+        record_risk_history(self.conn, [(2024, 3)], run_id=2)
+
+        series = load_score_series(cursor, [1, 2])
+        self.assertEqual([p["risk_score"] for p in series[1]], [0, 0, 0, 0, 15, 0])
+        self.assertEqual((series[1][-1]["year"], series[1][-1]["quarter"]), (2024, 3))
+        density = load_density_series(cursor, quarters=3)
+        self.assertEqual([(r["quarter"], r["risk_density"]) for r in density], [(1, 0.0), (2, 1.5), (3, 0.0)])
+
+        # Six consecutive recorded quarters replace the rebuilt history
+        refresh_risk_scores(self.conn)
+        self.assertEqual(load_risk_scores(cursor, [1])[1]["history"], [0, 0, 0, 0, 15, 0])
+
+    def test_flag_changes_feed(self):
+        from fastapi.testclient import TestClient
+        from api import routes
+        from api.server import app
+
+        save_financials(self.conn, "ACME", [_record(2024, 1, 1000)])
+        full = incremental.start_run(self.conn, "full", incremental.current_watermark(self.conn))
+        incremental.finish_run(self.conn, full, "completed")
+        as_of = incremental.start_run(self.conn, "as_of", incremental.current_watermark(self.conn), as_of="2024-06-30")
+        incremental.finish_run(self.conn, as_of, "completed")
+        ticker = incremental.start_run(self.conn, "full", incremental.current_watermark(self.conn), ticker="ACME")
+        incremental.finish_run(self.conn, ticker, "completed")
+        cursor = self.conn.cursor()
+        cursor.executemany(
+            "INSERT INTO flag_events (run_id, company_id, flag_code, event_type, severity) VALUES (%s, 1, %s, %s, 'HIGH')",
+            [(full, "F1", "raised"), (full, "F2", "raised"), (as_of, "F3", "cleared"), (ticker, "F4", "raised")]
+        )
+        self.conn.commit()
+
+        path = os.path.join(self.tmp.name, f"test.{self.backend}")
+        client = TestClient(app)
+        with patch.object(routes, "get_connection", side_effect=lambda: connect(self.backend, path)):
+            first = client.get("/api/flags/changes", params={"since": 0, "limit": 2, "user_only": False}).json()
+            second = client.get("/api/flags/changes", params={"since": first["next_cursor"], "user_only": False}).json()
+            third = client.get("/api/flags/changes", params={"since": second["next_cursor"], "user_only": False}).json()
+            latest = routes._latest_run_events()
+
+        self.assertEqual([e["flag_code"] for e in first["events"]], ["F1", "F2"])
+        self.assertEqual((first["next_cursor"], first["has_more"]), (2, True))
+        # The as-of run's event stays out of the live feed
+        self.assertEqual([e["flag_code"] for e in second["events"]], ["F4"])
+        self.assertEqual((second["next_cursor"], second["has_more"]), (4, False))
+        self.assertEqual((third["events"], third["next_cursor"]), ([], 4))
+        # The dashboard's latest run skips the as-of and --ticker runs
+        self.assertEqual([e["flag_code"] for e in latest], ["F1", "F2"])
+
+    def test_ticker_run_keeps_universe_watermark(self):
+        from engine import runner
+        save_financials(self.conn, "ACME", [_record(2024, 1, 1000)])
+        save_financials(self.conn, "BETA", [_record(2024, 1, 500)])
+        full = incremental.start_run(self.conn, "full", "2000-01-01 00:00:00")
+        incremental.finish_run(self.conn, full, "completed")
+        # An ACME-only run after BETA's rows were written must not cover BETA
+        ticker = incremental.start_run(self.conn, "full", "2999-01-01 00:00:00", ticker="ACME")
+        incremental.finish_run(self.conn, ticker, "completed")
+        self.conn.commit()
+
+        self.assertEqual(str(incremental.last_watermark(self.conn))[:10], "2000-01-01")
+        companies, periods, _ = runner._incremental_scope(self.conn, get_all_companies(self.conn), [(2024, 1)])
+        self.assertEqual([c["ticker"] for c in companies], ["ACME", "BETA"])
+
+    def test_uncommitted_writes_roll_back(self):
+        run_id = incremental.start_run(self.conn, "full", incremental.current_watermark(self.conn))
+        self.conn.commit()
+        incremental.save_checkpoint(self.conn, run_id, 7, 7, 3)
+        self.conn.rollback()
+
+        self.assertEqual(run_id, 1)
+        self.assertIsNone(incremental.load_run(self.conn, run_id)["last_company_id"])
+
+
+class TestAsOfRun(unittest.TestCase):
+
+    def test_as_of_run_leaves_live_tables_alone(self):
+        from benchmarks.local_db import create_database
+        from benchmarks.run import _environ
+        from benchmarks.synthetic import generate_universe
+        from engine import runner
+
+        def snapshot(conn):
+            cursor = conn.cursor()
+            tables = {}
+            for table, order in (("flags", "id"), ("flag_events", "id"), ("company_risk_scores", "company_id"),
+                                 ("risk_score_history", "company_id, year, quarter")):
+                cursor.execute(f"SELECT * FROM {table} ORDER BY {order}")
+                tables[table] = cursor.fetchall()
+            cursor.close()
+            return tables
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "asof.sqlite")
+            companies, rows = generate_universe(20, quarters=16, end=runner.get_current_fiscal_quarter(), seed=5)
+            as_of = date.today() - timedelta(days=365)
+            create_database(path, companies, rows)
+            conn = connect("sqlite", path)
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO financials_history (company_id, year, quarter, filing_date, revenue, net_profit, "
+                "profit_before_tax, operating_cash_flow, free_cash_flow, total_debt, interest_expense) "
+                "SELECT company_id, year, quarter, '2020-01-01', revenue, net_profit, profit_before_tax, "
+                "operating_cash_flow, free_cash_flow, total_debt, interest_expense FROM financials"
+            )
+            conn.commit()
+
+            with _environ(DB_BACKEND="sqlite", DB_PATH=path):
+                runner.run_flags(backfill_quarters=4, log_dir=tmp, report_path=os.path.join(tmp, "report.json"))
+                before = snapshot(conn)
+                runner.run_flags(as_of=as_of, log_dir=tmp, report_path=os.path.join(tmp, "report.json"))
+
+            self.assertTrue(before["flags"])
+            self.assertEqual(snapshot(conn), before)
+            cursor.execute("SELECT DISTINCT as_of FROM flags_as_of")
+            self.assertEqual([str(r[0]) for r in cursor.fetchall()], [as_of.isoformat()])
+            cursor.close()
+            conn.close()
+
+
+class TestClone(unittest.TestCase):
+
+    def test_clone_sqlite_into_duckdb(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = connect("sqlite", os.path.join(tmp, "src.sqlite"))
+            dest = connect("duckdb", os.path.join(tmp, "dst.duckdb"))
+            save_financials(source, "ACME", [_record(2024, 1, 1000), _record(2024, 0, 4000)])
+            save_financials(source, "BETA", [_record(2024, 1, 500)])
+
+            counts = clone_tables(source, dest, ["companies", "financials"])
+            # Generated ids continue after the cloned rows
+            save_financials(dest, "GAMMA", [_record(2024, 1, 700)])
+
+            self.assertEqual(counts, {"companies": 2, "financials": 3})
+            self.assertEqual([c["id"] for c in get_all_companies(dest)], [1, 2, 3])
+            self.assertEqual(load_histories(dest)[1].annual_row(2024)["revenue"], 4000)
+            source.close()
+            dest.close()
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.opened = []
+
+    def _factory(self):
+        raw = MagicMock()
+        raw.is_connected.return_value = True
+        self.opened.append(raw)
+        return raw
+
+    def test_reuses_released_connection_after_rollback(self):
+        pool = ConnectionPool(self._factory, size=2)
+        first = pool.checkout()
+        first.cursor()
+        first.close()
+        second = pool.checkout()
+
+        self.assertIs(second.native, self.opened[0])
+        self.assertEqual(len(self.opened), 1)
+        self.opened[0].rollback.assert_called_once()
+        self.opened[0].close.assert_not_called()
+        self.assertEqual(pool.stats()["in_use"], 1)
+
+    def test_checkout_times_out_when_exhausted(self):
+        pool = ConnectionPool(self._factory, size=1, timeout=0.05)
+        held = pool.checkout()
+
+        with self.assertRaises(PoolTimeoutError):
+            pool.checkout()
+        stats = pool.stats()
+        self.assertEqual((stats["open"], stats["in_use"], stats["timeouts"]), (1, 1, 1))
+        held.close()
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_dead_idle_connection_replaced(self):
+        pool = ConnectionPool(self._factory, size=1, ping_after=0)
+        pool.checkout().close()
+        self.opened[0].is_connected.return_value = False
+
+        conn = pool.checkout()
+        self.assertIs(conn.native, self.opened[1])
+        self.opened[0].close.assert_called_once()
+        self.assertEqual(pool.stats()["failed_checks"], 1)
+
+    def test_unreleased_connection_returned_on_collection(self):
+        pool = ConnectionPool(self._factory, size=1, timeout=0.05)
+        conn = pool.checkout()
+        del conn
+
+        self.assertEqual(pool.stats()["idle"], 1)
+        self.assertIs(pool.checkout().native, self.opened[0])
+
+    def test_forked_child_opens_its_own_connections(self):
+        pool = ConnectionPool(self._factory, size=1)
+        pool.checkout().close()
+
+        with patch("db.backends.pool.os.getpid", return_value=-1):
+            conn = pool.checkout()
+        self.assertIs(conn.native, self.opened[1])
+        self.assertEqual(pool.stats()["created"], 1)
+
+
+class TestSQLiteBackend(_BackendRoundTrip, unittest.TestCase):
+    backend = "sqlite"
+
+
+class TestDuckDBBackend(_BackendRoundTrip, unittest.TestCase):
+    backend = "duckdb"
+
+
+if __name__ == '__main__':
+    unittest.main()
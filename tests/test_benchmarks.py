@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+import sys
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.synthetic import generate_universe
+from benchmarks.local_db import create_database
+from db.backends import connect
+from benchmarks import run as bench
+from engine.history import FINANCIAL_COLUMNS
+
+
+class TestSyntheticUniverse(unittest.TestCase):
+
+    def test_deterministic_shape(self):
+        companies, rows = generate_universe(20, quarters=12, end=(2025, 4), seed=7)
+        again = generate_universe(20, quarters=12, end=(2025, 4), seed=7)
+
+        self.assertEqual((companies, rows), again)
+        self.assertEqual([c["id"] for c in companies], list(range(1, 21)))
+        # 12 quarters + 3 complete fiscal years per company
+        self.assertEqual(len(rows), 20 * 15)
+        self.assertTrue(all(set(FINANCIAL_COLUMNS) <= set(r) for r in rows))
+
+    def test_annual_rows_sum_quarters(self):
+        _, rows = generate_universe(3, quarters=8, end=(2025, 4), seed=1)
+        annual = next(r for r in rows if r["company_id"] == 1 and r["year"] == 2025 and r["quarter"] == 0)
+        quarters = [r for r in rows if r["company_id"] == 1 and r["year"] == 2025 and r["quarter"] > 0]
+        q4 = next(r for r in quarters if r["quarter"] == 4)
+
+        self.assertEqual(len(quarters), 4)
+        if q4["total_debt"] is not None:
+            self.assertEqual(annual["total_debt"], q4["total_debt"])
+        if all(q["revenue"] is not None for q in quarters):
+            self.assertAlmostEqual(annual["revenue"], sum(q["revenue"] for q in quarters), delta=4)
+
+
+class TestBenchmarkDatabase(unittest.TestCase):
+
+    def test_create_database_loads_universe(self):
+        companies, rows = generate_universe(5, quarters=8, seed=3)
+        for backend in ("sqlite", "duckdb"):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, f"t.{backend}")
+                create_database(path, companies, rows, backend)
+                conn = connect(backend, path)
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("SELECT COUNT(*) AS n FROM financials WHERE company_id = %s", (5,))
+                self.assertEqual(cursor.fetchone(), {"n": len(rows) // 5})
+                conn.close()
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_modes_agree_and_history_is_appended(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            history = os.path.join(tmp, "history.json")
+            results, _ = bench.run_suite(
+                sizes=[30], modes=["row", "preload", "vectorized"], quarters=12, history_path=history,
+            )
+
+            self.assertEqual([r["mode"] for r in results], ["row", "preload", "vectorized"])
+            self.assertEqual(len({r["flags"] for r in results}), 1)
+            with open(history) as f:
+                self.assertEqual(len(json.load(f)), 3)
+
+    def test_regression_against_previous_entry(self):
+        previous = {"backend": "sqlite", "companies": 1000, "quarters": 40, "backfill_quarters": 1, "mode": "preload", "workers": 1, "seconds": 10.0}
+        result = dict(previous, seconds=13.0)
+
+        self.assertIs(bench.previous_result([previous], result), previous)
+        change, regressed = bench.compare(previous, result)
+        self.assertAlmostEqual(change, 0.3)
+        self.assertTrue(regressed)
+        self.assertEqual(bench.compare(None, result), (None, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
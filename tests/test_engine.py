@@ -0,0 +1,959 @@
+import random
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from engine.history import CompanyHistory, load_histories, FINANCIAL_COLUMNS
+from engine.panel import FinancialsPanel
+from engine import incremental
+from engine.metrics import derived_metrics
+from flags import ocf_vs_pat, negative_fcf, revenue_debt_divergence, interest_coverage, profit_collapse
+
+
+def _row(year, quarter=0, **metrics):
+    row = {
+        "year": year, "quarter": quarter,
+        "revenue": None, "net_profit": None, "profit_before_tax": None,
+        "operating_cash_flow": None, "free_cash_flow": None,
+        "total_debt": None, "interest_expense": None,
+    }
+    row.update(metrics)
+    return row
+
+
+class TestCompanyHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.history = CompanyHistory(1)
+        # Deteriorating company: cash burn, falling revenue, rising debt
+        self.history.add(_row(2022, revenue=100, net_profit=100, operating_cash_flow=120,
+                              free_cash_flow=-5, total_debt=100, profit_before_tax=50, interest_expense=5))
+        self.history.add(_row(2023, revenue=100, net_profit=100, operating_cash_flow=50,
+                              free_cash_flow=-20, total_debt=100, profit_before_tax=50, interest_expense=5))
+        self.history.add(_row(2024, revenue=95, net_profit=40, operating_cash_flow=30,
+                              free_cash_flow=-10, total_debt=120, profit_before_tax=10, interest_expense=10))
+        self.history.add(_row(2024, 3, net_profit=100, profit_before_tax=2, interest_expense=10))
+        self.history.add(_row(2025, 3, net_profit=30, profit_before_tax=30, interest_expense=10))
+
+    def test_annual_rows_window(self):
+        rows = self.history.annual_rows(2023, limit=3, columns=("year",))
+        self.assertEqual(rows, [{"year": 2023}, {"year": 2022}])
+        self.assertEqual(self.history.latest_annual_row(("year",)), {"year": 2024})
+        self.assertEqual(self.history.latest_quarter_row(("year", "quarter")), {"year": 2025, "quarter": 3})
+
+    def test_annual_flags_from_history(self):
+        self.assertEqual(ocf_vs_pat.check_history(self.history, "TEST", year=2024)["flag_code"], "F1")
+        self.assertEqual(negative_fcf.check_history(self.history, "TEST", year=2024)["flag_code"], "F2")
+        self.assertEqual(revenue_debt_divergence.check_history(self.history, "TEST", year=2024)["flag_code"], "F3")
+        self.assertEqual(interest_coverage.check_history(self.history, "TEST", year=2024)["severity"], "MEDIUM")
+        self.assertEqual(profit_collapse.check_history(self.history, "TEST", year=2024)["flag_code"], "F5")
+
+        # Not enough history before 2023
+        self.assertIsNone(negative_fcf.check_history(self.history, "TEST", year=2023))
+        self.assertIsNone(profit_collapse.check_history(self.history, "TEST", year=2022))
+
+    def test_quarterly_flags_from_history(self):
+        result = profit_collapse.check_history(self.history, "TEST", period_type="quarterly", year=2025, quarter=3)
+        self.assertEqual(result["details"]["previous_period"], "FY2024 Q3")
+        self.assertIsNone(interest_coverage.check_history(self.history, "TEST", period_type="quarterly", year=2025, quarter=3))
+        self.assertEqual(
+            interest_coverage.check_history(self.history, "TEST", period_type="quarterly", year=2024, quarter=3)["severity"],
+            "HIGH",
+        )
+        self.assertIsNone(ocf_vs_pat.check_history(self.history, "TEST", period_type="quarterly", year=2025, quarter=3))
+
+    def test_history_matches_sql_path(self):
+        # check() against mocked SQL rows and check_history() must agree
+        conn = MagicMock()
+        cursor = MagicMock()
+        conn.cursor.return_value = cursor
+        cursor.fetchall.return_value = self.history.annual_rows(2024, limit=3, columns=("year", "net_profit", "operating_cash_flow"))
+        self.assertEqual(
+            ocf_vs_pat.check(conn, 1, "TEST", year=2024),
+            ocf_vs_pat.check_history(self.history, "TEST", year=2024),
+        )
+
+
+class TestDerivedMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.history = CompanyHistory(1)
+        self.history.add(_row(2023, profit_before_tax=50, interest_expense=10, revenue=100))
+        self.history.add(_row(2024, profit_before_tax=10, interest_expense=10, revenue=80))
+        for year, quarter, pat in ((2024, 1, 10), (2024, 2, 20), (2024, 3, 30), (2024, 4, 40), (2025, 1, 5)):
+            self.history.add(_row(year, quarter, net_profit=pat))
+
+    def test_values(self):
+        metrics = derived_metrics(self.history)
+        self.assertEqual(metrics.ebit(2024), 20)
+        self.assertEqual(metrics.interest_coverage(2023), 6.0)
+        self.assertAlmostEqual(metrics.yoy("revenue", 2024), -0.2)
+        self.assertAlmostEqual(metrics.qoq("net_profit", 2025, 1), -0.875)
+        self.assertEqual(metrics.ttm("net_profit", 2024, 4), 100)
+        self.assertEqual(metrics.ttm("net_profit", 2025, 1), 95)
+        self.assertIsNone(metrics.ttm("net_profit", 2025, 2))
+        self.assertEqual(metrics.rolling("revenue", 2024, 3), [80, 100])
+
+    def test_memoized_per_history(self):
+        metrics = derived_metrics(self.history)
+        self.assertIs(derived_metrics(self.history), metrics)
+        metrics.ebit(2024)
+        self.history.annual[2024]["interest_expense"] = 0
+        self.assertEqual(metrics.ebit(2024), 20)  # served from cache
+
+        # Adding rows invalidates the stage
+        self.history.add(_row(2022, revenue=1))
+        self.assertIsNot(derived_metrics(self.history), metrics)
+
+
+class TestLoadHistories(unittest.TestCase):
+
+    def test_streams_rows_into_histories(self):
+        conn = MagicMock()
+        cursor = MagicMock()
+        conn.cursor.return_value = cursor
+        cursor.fetchmany.side_effect = [
+            [
+                (1, 2023, 0, 100, 10, 12, 8, 5, 50, 2),
+                (1, 2024, 1, 30, 3, 4, None, None, None, 1),
+            ],
+            [(2, 2024, 0, 200, 20, 25, 30, 10, 0, 0)],
+            [],
+        ]
+
+        histories = load_histories(conn)
+
+        self.assertEqual(sorted(histories), [1, 2])
+        self.assertEqual(histories[1].annual_row(2023)["revenue"], 100)
+        self.assertEqual(histories[1].quarter_row(2024, 1)["net_profit"], 3)
+        self.assertEqual(histories[2].annual_row(2024)["operating_cash_flow"], 30)
+        self.assertNotIn("WHERE", cursor.execute.call_args[0][0])
+
+
+def _random_universe(n_companies=60, seed=7):
+    """Companies with gappy, partly-null annual and quarterly histories."""
+    rng = random.Random(seed)
+    companies, histories = [], {}
+    for cid in range(1, n_companies + 1):
+        companies.append({"id": cid, "ticker": f"T{cid}"})
+        history = CompanyHistory(cid)
+        for year in range(2018, 2026):
+            for quarter in (0, 1, 2, 3, 4):
+                if rng.random() < 0.2:
+                    continue  # missing filing
+                metrics = {
+                    m: (None if rng.random() < 0.1 else rng.randint(-50, 200))
+                    for m in FINANCIAL_COLUMNS
+                }
+                history.add(_row(year, quarter, **metrics))
+        histories[cid] = history
+    # A company with no financials at all
+    companies.append({"id": n_companies + 1, "ticker": "EMPTY"})
+    return companies, histories
+
+
+class TestFinancialsPanel(unittest.TestCase):
+
+    def test_batch_matches_history_path(self):
+        companies, histories = _random_universe()
+        panel = FinancialsPanel.from_histories(histories, companies)
+        modules = [ocf_vs_pat, negative_fcf, revenue_debt_divergence, interest_coverage, profit_collapse]
+
+        for module in modules:
+            for year in (2017, 2019, 2022, 2025, 2027):
+                for period_type, quarter in (("annual", None), ("quarterly", 2), ("quarterly", 4)):
+                    batch = module.check_batch(panel, period_type, year, quarter)
+                    expected = {}
+                    for c in companies:
+                        history = histories.get(c["id"]) or CompanyHistory(c["id"])
+                        result = module.check_history(history, c["ticker"], period_type, year, quarter)
+                        if result:
+                            expected[c["id"]] = result
+                    self.assertEqual(batch, expected, f"{module.FLAG_CODE} {period_type} {year} Q{quarter}")
+
+    def test_annual_window_skips_missing_years(self):
+        history = CompanyHistory(1)
+        for year, fcf in ((2019, -1), (2022, -2), (2024, -3)):
+            history.add(_row(year, free_cash_flow=fcf))
+        panel = FinancialsPanel.from_histories({1: history}, [{"id": 1, "ticker": "GAP"}])
+
+        values, complete = panel.annual_window(2024, 3, ("free_cash_flow",))
+        self.assertTrue(complete[0])
+        self.assertEqual(values["free_cash_flow"][0].tolist(), [-3, -2, -1])
+        self.assertIn(1, negative_fcf.check_batch(panel, "annual", 2024))
+
+
+class TestSharding(unittest.TestCase):
+
+    def test_shards_are_contiguous_id_ranges(self):
+        from engine.runner import _shard_by_id
+        companies = [{"id": i, "ticker": f"T{i}"} for i in (9, 1, 5, 3, 7, 2, 8)]
+
+        shards = _shard_by_id(companies, 3)
+
+        self.assertEqual([[c["id"] for c in s] for s in shards], [[1, 2, 3], [5, 7, 8], [9]])
+        self.assertEqual(_shard_by_id([], 4), [])
+        self.assertEqual(len(_shard_by_id(companies, 20)), len(companies))
+
+
+class TestIncremental(unittest.TestCase):
+
+    def test_affected_targets(self):
+        targets = [(2026, 1), (2025, 4), (2025, 3), (2025, 2), (2025, 1), (2024, 4)]
+
+        # Quarter restated: its own period and the YoY comparison a year later
+        self.assertEqual(incremental.affected_targets({(2025, 1)}, targets), [(2026, 1), (2025, 1)])
+        # Annual restated: annual checks for that year and the next two
+        self.assertEqual(incremental.affected_targets({(2023, 0)}, targets), [(2025, 4), (2024, 4)])
+        self.assertEqual(incremental.affected_targets({(2019, 0), (2020, 2)}, targets), [])
+
+    def test_affected_targets_follow_configured_lookbacks(self):
+        from engine.rules import compile_rule
+        from flags import get_all_flags
+
+        targets = [(2026, 4), (2025, 4), (2024, 4), (2023, 4)]
+        self.assertEqual(incremental.flag_lookbacks(get_all_flags()), (3, 1))
+        try:
+            # A raised F1 lookback reaches further forward from a restated year
+            ocf_vs_pat.configure({"lookback": 5})
+            annual, lookahead = incremental.flag_lookbacks(get_all_flags())
+            self.assertEqual((annual, lookahead), (5, 1))
+            self.assertEqual(incremental.affected_targets({(2022, 0)}, targets, annual, lookahead),
+                             [(2026, 4), (2025, 4), (2024, 4), (2023, 4)])
+        finally:
+            ocf_vs_pat.configure({})
+
+        rule = compile_rule("X", "X", {"span": 4, "rule": {
+            "period_types": ["annual", "quarterly"],
+            "when": "prev(net_profit, 2) > 0 and all(revenue > 0, span)"}})
+        self.assertEqual(rule.LOOKBACK_YEARS, 4)
+        self.assertEqual(incremental.flag_lookbacks([interest_coverage, rule]), (4, 3))
+
+    def test_changed_periods_grouped_by_company(self):
+        conn = MagicMock()
+        cursor = MagicMock()
+        conn.cursor.return_value = cursor
+        cursor.fetchall.return_value = [(1, 2025, 0), (1, 2025, 2), (2, 2024, None)]
+
+        changed = incremental.get_changed_periods(conn, "2025-01-01 00:00:00", [1, 2])
+
+        self.assertEqual(changed, {1: {(2025, 0), (2025, 2)}, 2: {(2024, 0)}})
+        query, params = cursor.execute.call_args[0]
+        self.assertIn("updated_at >= %s", query)
+        self.assertEqual(params, ("2025-01-01 00:00:00", 1, 2))
+
+
+class TestSaveFinancialsWatermark(unittest.TestCase):
+
+    def test_identical_rows_are_not_rewritten(self):
+        from ingestion.db_writer import save_financials
+        conn = MagicMock()
+        cursor = MagicMock()
+        conn.cursor.return_value = cursor
+        record = {"year": 2024, "quarter": 0, "revenue": 100, "net_profit": 10, "profit_before_tax": 12,
+                  "operating_cash_flow": 8, "free_cash_flow": 5, "total_debt": 50, "interest_expense": 2}
+        cursor.fetchone.side_effect = [
+            (7,),                                       # ensure_company
+            (11, False, 100, 10, 12, 8, 5, 50, 2),      # unchanged row
+            (12, False, 100, 10, 12, 8, 5, 50, 3),      # changed row
+        ]
+
+        result = save_financials(conn, "TEST", [record, dict(record, year=2025)])
+
+        self.assertEqual((result["unchanged"], result["updated"], result["inserted"]), (1, 1, 0))
+        updates = [c for c in cursor.execute.call_args_list if "UPDATE financials" in c[0][0]]
+        self.assertEqual(len(updates), 1)
+        self.assertIn("updated_at = CURRENT_TIMESTAMP", updates[0][0][0])
+
+
+class TestPointInTime(unittest.TestCase):
+
+    def test_revisions_append_vintages(self):
+        from datetime import date
+        from ingestion.db_writer import save_financials
+        conn = MagicMock()
+        cursor = MagicMock()
+        conn.cursor.return_value = cursor
+        record = {"year": 2024, "quarter": 0, "revenue": 100, "net_profit": 10, "profit_before_tax": 12,
+                  "operating_cash_flow": 8, "free_cash_flow": 5, "total_debt": 50, "interest_expense": 2,
+                  "filing_date": date(2024, 5, 20)}
+        cursor.fetchone.side_effect = [
+            (7,),                                       # ensure_company
+            (11, False, 100, 10, 12, 8, 5, 50, 2),      # unchanged row
+            (12, False, 90, 10, 12, 8, 5, 50, 2),       # restated row
+            None,                                       # new row, filing date unknown
+        ]
+
+        save_financials(conn, "TEST", [record, dict(record, year=2023), dict(record, year=2025, filing_date=None)])
+
+        vintages = [c[0][1] for c in cursor.execute.call_args_list if "INSERT INTO financials_history" in c[0][0]]
+        self.assertEqual([(v[1], v[3]) for v in vintages], [(2023, date(2024, 5, 20)), (2025, date.today())])
+
+    def test_as_of_reads_latest_vintage_before_date(self):
+        import sqlite3
+        from engine.history import load_histories
+
+        db = sqlite3.connect(":memory:")
+        db.execute(f"CREATE TABLE financials_history (company_id, year, quarter, filing_date, {', '.join(FINANCIAL_COLUMNS)})")
+        for cid, year, filed, revenue in [(1, 2023, "2023-05-10", 100), (1, 2023, "2024-05-12", 80),
+                                          (1, 2024, "2024-05-12", 120), (2, 2023, "2023-06-01", 50)]:
+            db.execute("INSERT INTO financials_history (company_id, year, quarter, filing_date, revenue) VALUES (?, ?, 0, ?, ?)",
+                       (cid, year, filed, revenue))
+
+        class _Conn:
+            def cursor(self):
+                cursor = db.cursor()
+                return MagicMock(
+                    execute=lambda query, params=(): cursor.execute(query.replace("%s", "?"), params),
+                    fetchmany=cursor.fetchmany,
+                )
+
+        before = load_histories(_Conn(), as_of="2024-01-01")
+        self.assertEqual({y: r["revenue"] for y, r in before[1].annual.items()}, {2023: 100})
+        after = load_histories(_Conn(), company_ids=[1], as_of="2024-06-30")
+        self.assertEqual({y: r["revenue"] for y, r in after[1].annual.items()}, {2023: 80, 2024: 120})
+        self.assertNotIn(2, after)
+
+
+class TestSaveFlags(unittest.TestCase):
+
+    def _result(self, code, severity="HIGH", message="m", year=2024, quarter=0, period_type="annual"):
+        return {"flag_code": code, "flag_name": code, "severity": severity, "message": message,
+                "details": {"x": 1}, "period_type": period_type, "fiscal_year": year, "fiscal_quarter": quarter}
+
+    def test_writes_only_the_diff(self):
+        from engine.runner import save_flags, flag_content_hash
+        cursor = MagicMock()
+        same = self._result("F1")
+        changed = self._result("F2", severity="MEDIUM")
+        new = self._result("F3")
+        cursor.fetchall.return_value = [
+            (10, 1, "F1", "annual", 2024, 0, flag_content_hash(same), "F1", "HIGH"),
+            (11, 1, "F2", "annual", 2024, 0, flag_content_hash(self._result("F2")), "F2", "HIGH"),
+            (12, 1, "F4", "annual", 2024, 0, "stale", "F4", "MEDIUM"),  # no longer fires -> retired
+            (13, 1, "F4", "annual", 2019, 0, "old", "F4", "MEDIUM"),    # outside evaluated scope -> kept
+        ]
+        slots = {(1, code, "annual", 2024, 0) for code in ("F1", "F2", "F3", "F4")}
+
+        counts = save_flags(cursor, [(1, same), (1, changed), (1, new)], slots)
+
+        self.assertEqual(counts, {"inserted": 1, "updated": 1, "unchanged": 1, "retired": 1})
+        statements = {" ".join(c[0][0].split()[:3]): c[0][1] for c in cursor.executemany.call_args_list}
+        self.assertEqual([row[1] for row in statements["INSERT INTO flags"]], ["F3"])
+        self.assertEqual([row[-1] for row in statements["UPDATE flags SET"]], [11])
+        self.assertNotIn("created_at", cursor.executemany.call_args_list[1][0][0])
+        delete = cursor.execute.call_args_list[-1][0]
+        self.assertTrue(delete[0].startswith("DELETE FROM flags"))
+        self.assertEqual(delete[1], (12,))
+
+    def test_records_change_events(self):
+        from engine.runner import save_flags, flag_content_hash
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [
+            (10, 1, "F1", "annual", 2024, 0, flag_content_hash(self._result("F1", severity="MEDIUM")), "F1", "MEDIUM"),
+            (11, 1, "F2", "annual", 2024, 0, flag_content_hash(self._result("F2")), "F2", "HIGH"),
+            (12, 1, "F4", "annual", 2024, 0, "stale", "F4", "HIGH"),
+        ]
+        slots = {(1, code, "annual", 2024, 0) for code in ("F1", "F2", "F3", "F4")}
+        hits = [
+            (1, self._result("F1", severity="HIGH")),
+            (1, self._result("F2", message="same severity, new text")),
+            (1, self._result("F3", severity="MEDIUM")),
+        ]
+
+        save_flags(cursor, hits, slots, run_id=7)
+
+        events = cursor.executemany.call_args_list[-1][0]
+        self.assertIn("INSERT INTO flag_events", events[0])
+        self.assertEqual(
+            [(e[0], e[2], e[7], e[8], e[9]) for e in events[1]],
+            [(7, "F1", "escalated", "HIGH", "MEDIUM"),
+             (7, "F3", "raised", "MEDIUM", None),
+             (7, "F4", "cleared", "HIGH", "HIGH")],
+        )
+
+
+class TestBackfill(unittest.TestCase):
+
+    def test_annual_window_slides_over_out_of_order_rows(self):
+        history = CompanyHistory(1)
+        for year in (2021, 2019, 2024, 2020):
+            history.add(_row(year))
+        self.assertEqual([r["year"] for r in history.annual_rows(2022, limit=2, columns=("year",))], [2021, 2020])
+        history.add(_row(2022))
+        self.assertEqual([r["year"] for r in history.annual_rows(2022, limit=2, columns=("year",))], [2022, 2021])
+
+    def test_backfill_reads_financials_once(self):
+        import engine.runner as runner
+        companies, histories = _random_universe(20)
+        conn = MagicMock()
+        # A mocked connection has no MySQL named locks; take the in-process feed lock instead
+        with patch.dict(os.environ, {"DB_BACKEND": "sqlite"}), \
+                patch.object(runner, "get_connection", return_value=conn), \
+                patch.object(runner, "update_job_status"), \
+                patch.object(runner, "get_all_companies", return_value=companies), \
+                patch.object(runner, "load_histories", return_value=histories) as load, \
+                patch.object(runner, "get_current_fiscal_quarter", return_value=(2025, 4)), \
+                patch.object(runner.inc, "current_watermark", return_value=None), \
+                patch.object(runner.inc, "start_run", return_value=None), \
+                patch.object(runner, "save_flags", return_value={"inserted": 0, "updated": 0, "unchanged": 0, "retired": 0}) as save, \
+                patch.object(runner, "save_report"):
+            runner.run_flags(backfill_quarters=8)
+
+        load.assert_called_once()
+        hits = save.call_args[0][1]
+        self.assertEqual({(r["fiscal_year"], r["fiscal_quarter"]) for _, r in hits} - {(y, q) for y in (2024, 2025) for q in range(5)}, set())
+        self.assertTrue(any(r["fiscal_year"] == 2024 for _, r in hits))
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def _run(self, companies, histories, **kwargs):
+        import engine.runner as runner
+        conn = MagicMock()
+        # A mocked connection has no MySQL named locks; take the in-process feed lock instead
+        with patch.dict(os.environ, {"DB_BACKEND": "sqlite"}), \
+                patch.object(runner, "get_connection", return_value=conn), \
+                patch.object(runner, "update_job_status"), \
+                patch.object(runner, "get_all_companies", return_value=companies), \
+                patch.object(runner, "load_histories", return_value=histories), \
+                patch.object(runner, "get_current_fiscal_quarter", return_value=(2025, 4)), \
+                patch.object(runner, "CHECKPOINT_COMPANIES", 25), \
+                patch.object(runner.inc, "current_watermark", return_value="W"), \
+                patch.object(runner.inc, "start_run", return_value=9), \
+                patch.object(runner.inc, "reopen_run") as reopen, \
+                patch.object(runner.inc, "save_checkpoint") as checkpoint, \
+                patch.object(runner.inc, "finish_run") as finish, \
+                patch.object(runner, "save_flags", return_value={"inserted": 0, "updated": 0, "unchanged": 0, "retired": 0}) as save, \
+                patch.object(runner, "load_flags_by_company", return_value={}) as load_flags, \
+                patch.object(runner, "score_companies", return_value={}) as score, \
+                patch.object(runner, "refresh_sector_index") as sector_index, \
+                patch.object(runner, "refresh_risk_scores") as risk_scores, \
+                patch.object(runner, "record_risk_history") as risk_history, \
+                patch.object(runner, "save_report"):
+            self.post_run = {"load_flags": load_flags, "score": score, "sector_index": sector_index,
+                             "risk_scores": risk_scores, "risk_history": risk_history}
+            if "resume_from" in kwargs:
+                with patch.object(runner.inc, "load_run", return_value=kwargs.pop("resume_from")):
+                    runner.run_flags(**kwargs)
+            else:
+                runner.run_flags(**kwargs)
+        return conn, save, checkpoint, finish, reopen
+
+    def test_commits_after_each_checkpoint(self):
+        companies, histories = _random_universe(60)
+        conn, save, checkpoint, finish, _ = self._run(list(reversed(companies)), histories)
+
+        self.assertEqual([c.args[2:4] for c in checkpoint.call_args_list], [(25, 25), (50, 50), (61, 61)])
+        self.assertEqual(save.call_count, 3)
+        self.assertEqual(conn.commit.call_count, 3)
+        self.assertEqual(finish.call_args.args[2:5], ("completed", 61, sum(len(c.args[1]) for c in save.call_args_list)))
+
+    def test_sharded_chunks_share_one_pool(self):
+        import engine.runner as runner
+        from concurrent.futures import Future
+
+        class _InlinePool:
+            created = 0
+
+            def __init__(self, max_workers):
+                _InlinePool.created += 1
+
+            def submit(self, fn, *args):
+                future = Future()
+                future.set_result(fn(*args))
+                return future
+
+            def shutdown(self):
+                pass
+
+        companies, histories = _random_universe(60)
+        with patch.object(runner, "ProcessPoolExecutor", _InlinePool), \
+                patch.object(runner.multiprocessing, "Manager") as manager:
+            manager.return_value.dict.return_value = {}
+            _, save, checkpoint, finish, _ = self._run(companies, histories, workers=2)
+
+        # Two checkpoint chunks of 2 x 25 companies, one pool and Manager for the run
+        self.assertEqual([c.args[2] for c in checkpoint.call_args_list], [50, 61])
+        self.assertEqual(_InlinePool.created, 1)
+        manager.assert_called_once()
+        manager.return_value.shutdown.assert_called_once()
+        self.assertEqual(finish.call_args.args[2], "completed")
+
+    def test_post_run_scores_once(self):
+        companies, histories = _random_universe(10)
+        _, _, _, finish, _ = self._run(companies, histories, ticker="T3")
+
+        post = self.post_run
+        post["load_flags"].assert_called_once()
+        post["score"].assert_called_once()
+        flags, scores = post["load_flags"].return_value, post["score"].return_value
+        self.assertIs(post["risk_history"].call_args.args[3], flags)
+        self.assertIs(post["sector_index"].call_args.args[1], scores)
+        # A --ticker run rewrites only its own company's stored score
+        self.assertEqual(post["risk_scores"].call_args.args[1], [3])
+        self.assertIs(post["risk_scores"].call_args.kwargs["scores"], scores)
+        self.assertEqual(finish.call_args.args[2], "completed")
+
+    def test_resume_skips_checkpointed_companies(self):
+        companies, histories = _random_universe(60)
+        resume_from = {"id": 9, "mode": "full", "status": "failed", "watermark": "W", "ticker": None,
+                       "target_periods": [(2025, 4), (2025, 3)], "last_company_id": 50,
+                       "companies_evaluated": 50, "flags_detected": 40}
+        conn, save, checkpoint, finish, reopen = self._run(companies, histories, resume=9, resume_from=resume_from)
+
+        self.assertEqual(reopen.call_args.args[1], 9)
+        evaluated = {key[0] for call in save.call_args_list for key in call.args[2]}
+        self.assertEqual(evaluated, set(range(51, 62)))
+        self.assertEqual({key[3:] for call in save.call_args_list for key in call.args[2]} - {(2025, 4), (2025, 3), (2025, 0)}, set())
+        self.assertEqual(checkpoint.call_args.args[2:4], (61, 61))
+        self.assertEqual(finish.call_args.args[3], 61)
+        self.assertGreaterEqual(finish.call_args.args[4], 40)
+
+    def test_early_returns_close_the_connection(self):
+        companies, histories = _random_universe(5)
+        conn, save, _, _, _ = self._run(companies, histories, ticker="NOPE")
+        self.assertEqual((save.call_count, conn.close.call_count), (0, 1))
+
+        for resume_from in (None, {"id": 9, "status": "completed"}):
+            conn, save, _, _, reopen = self._run(companies, histories, resume=9, resume_from=resume_from)
+            self.assertEqual((save.call_count, reopen.call_count, conn.close.call_count), (0, 0, 1))
+
+        conn, _, _, _, _ = self._run(companies, histories)
+        conn.close.assert_called_once()
+
+
+class TestSweep(unittest.TestCase):
+
+    def test_grid_points_and_flips(self):
+        from engine.sweep import grid_points, sweep_panel
+        self.assertEqual(grid_points({"b": [1, 2], "a": 0}), [{"a": 0, "b": 1}, {"a": 0, "b": 2}])
+
+        companies, histories = _random_universe()
+        panel = FinancialsPanel.from_histories(histories, companies)
+        flags = [interest_coverage, profit_collapse]
+        grid = {"F4": {"medium_severity_threshold": [1.0, 2.5, 4.0]}, "F5": {"drop_threshold": [0.5]}}
+
+        rows = sweep_panel(panel, flags, grid, 2025, 3)
+
+        f4 = [r for r in rows if r["flag_code"] == "F4" and r["period_type"] == "annual"]
+        self.assertEqual([r["year"] for r in f4], [2024] * 3)
+        counts = [r["count"] for r in f4]
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual(f4[1]["count"], len(interest_coverage.check_batch(panel, "annual", 2024)))
+        self.assertEqual((f4[1]["added"], f4[1]["removed"]), ([], []))
+        self.assertTrue(f4[0]["removed"] and f4[2]["added"])
+        self.assertEqual(len(f4[2]["companies"]), f4[2]["baseline_count"] + len(f4[2]["added"]))
+        self.assertEqual({(r["flag_code"], r["period_type"]) for r in rows},
+                         {("F4", "annual"), ("F4", "quarterly"), ("F5", "annual"), ("F5", "quarterly")})
+
+        # Module thresholds are restored after the sweep
+        self.assertEqual(interest_coverage.MEDIUM_SEVERITY_THRESHOLD, 2.5)
+        with self.assertRaises(ValueError):
+            sweep_panel(panel, flags, {"F9": {"x": [1]}}, 2025, 3)
+
+
+class TestRunReport(unittest.TestCase):
+
+    def test_counts_sql_per_flag_scope(self):
+        from engine.report import RunReport, CountingConnection
+        report = RunReport()
+        raw = MagicMock()
+        raw.cursor.return_value.fetchall.return_value = [{"year": 2024}, {"year": 2023}]
+        conn = CountingConnection(raw, report)
+
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        with report.flag_scope("F1"):
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT year FROM financials")
+            self.assertEqual(len(cursor.fetchall()), 2)
+
+        self.assertEqual((report.flags["engine"]["sql_statements"], report.flags["engine"]["rows_read"]), (1, 0))
+        self.assertEqual((report.flags["F1"]["sql_statements"], report.flags["F1"]["rows_read"]), (1, 2))
+
+    def test_merge_and_slowest_companies(self):
+        from engine.report import RunReport, SLOWEST_COMPANIES
+        parent, shard = RunReport(), RunReport()
+        for i in range(30):
+            (parent if i % 2 else shard).record_company(f"T{i}", i / 100)
+        shard.record_call("F4", 0.5, True)
+        parent.record_call("F4", 0.25, False)
+        parent.merge(shard)
+
+        data = parent.to_dict(run_id=7, mode="full")
+        self.assertEqual(data["run_id"], 7)
+        self.assertEqual(data["companies_timed"], 30)
+        self.assertEqual(len(data["slowest_companies"]), SLOWEST_COMPANIES)
+        self.assertEqual(data["slowest_companies"][0]["ticker"], "T29")
+        self.assertEqual((data["flags"]["F4"]["calls"], data["flags"]["F4"]["hits"]), (2, 1))
+
+    def test_flag_exceptions_are_recorded(self):
+        import engine.runner as runner
+        from engine.report import RunReport
+
+        class Broken:
+            FLAG_CODE = "FX"
+            SUPPORTS_QUARTERLY = True
+
+            @staticmethod
+            def check_history(history, ticker, period_type="annual", year=None, quarter=None):
+                raise ZeroDivisionError("boom")
+
+        companies, histories = _random_universe(3)
+        report = RunReport()
+        with patch.object(runner, "get_all_flags", return_value=[Broken, profit_collapse]):
+            hits, _ = runner._evaluate_companies(MagicMock(), companies, [(2025, 4)], histories, report=report)
+
+        self.assertEqual(report.flags["FX"]["errors"], 2 * len(companies))
+        self.assertIn("ZeroDivisionError: boom", report.flags["FX"]["error_samples"][0])
+        self.assertEqual(report.flags["F5"]["errors"], 0)
+        self.assertEqual(len(report.companies), len(companies))
+        self.assertFalse([r for _, r in hits if r["flag_code"] == "FX"])
+
+    def test_malformed_results_are_recorded(self):
+        import engine.runner as runner
+        from engine.report import RunReport
+
+        class Malformed:
+            FLAG_CODE = "FM"
+            SUPPORTS_QUARTERLY = True
+
+            @staticmethod
+            def check_history(history, ticker, period_type="annual", year=None, quarter=None):
+                return "not a result"
+
+        companies, histories = _random_universe(2)
+        report = RunReport()
+        with patch.object(runner, "get_all_flags", return_value=[Malformed]):
+            hits, _ = runner._evaluate_companies(MagicMock(), companies, [(2025, 4)], histories, report=report)
+
+        self.assertEqual(hits, [])
+        self.assertEqual(report.flags["FM"]["errors"], 2 * len(companies))
+        self.assertIn("TypeError", report.flags["FM"]["error_samples"][0])
+
+
+class TestFlagStream(unittest.TestCase):
+
+    def test_saved_tickers_are_evaluated_in_background(self):
+        import threading
+        import engine.stream as stream
+        from ingestion import ingest
+
+        release = threading.Event()
+        evaluated = []
+
+        def _run_company_flags(conn, ticker, target_quarters):
+            release.wait(5)
+            evaluated.append(ticker)
+            return {"inserted": 1, "updated": 0, "unchanged": 0, "retired": 0}
+
+        with patch.object(stream, "get_connection", return_value=MagicMock()), \
+                patch.object(stream, "run_company_flags", side_effect=_run_company_flags):
+            flag_stream = stream.FlagStream().start()
+            ingest.register_on_saved(flag_stream.on_saved)
+            ingest.register_on_saved(MagicMock(side_effect=RuntimeError("broken hook")))
+            try:
+                for ticker in ("AAA", "BBB", "BBB"):
+                    ingest._notify_saved(ticker, {"inserted": 1, "updated": 0, "errors": []})
+                ingest._notify_saved("CCC", {"inserted": 0, "updated": 0, "unchanged": 4, "errors": []})
+            finally:
+                ingest._ON_SAVED.clear()
+            release.set()
+            flag_stream.close(timeout=5)
+
+        self.assertEqual(evaluated, ["AAA", "BBB"])
+        self.assertEqual((flag_stream.stats["evaluated"], flag_stream.stats["inserted"]), (2, 2))
+
+    def test_run_company_flags_writes_the_diff(self):
+        import engine.runner as runner
+        companies, histories = _random_universe(5)
+        conn = MagicMock()
+        conn.cursor.return_value.fetchone.return_value = (3, "T3")
+        held = []
+        conn.commit.side_effect = lambda: held.append(runner._event_feed_mutex.locked())
+        with patch.dict(os.environ, {"DB_BACKEND": "sqlite"}), \
+                patch.object(runner, "load_histories", return_value={3: histories[3]}), \
+                patch.object(runner, "save_flags", return_value={"inserted": 2}) as save:
+            self.assertEqual(runner.run_company_flags(conn, "T3", [(2025, 4)]), {"inserted": 2})
+
+        hits, slots = save.call_args[0][1:]
+        self.assertEqual({cid for cid, _ in hits} | {key[0] for key in slots}, {3})
+        # The event diff commits under the change-feed write lock, which is released afterwards
+        self.assertEqual(held, [True])
+        self.assertFalse(runner._event_feed_mutex.locked())
+
+    def test_event_feed_lock_on_mysql(self):
+        import engine.runner as runner
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+        cursor.fetchone.return_value = (1,)
+        with patch.dict(os.environ, {"DB_BACKEND": "mysql"}):
+            with runner._event_feed_lock(conn):
+                conn.commit()
+            cursor.fetchone.return_value = (0,)
+            with self.assertRaises(RuntimeError), runner._event_feed_lock(conn):
+                self.fail("entered the block without the lock")
+
+        sql = [call[0][0] for call in cursor.execute.call_args_list]
+        self.assertEqual(sql, ["SELECT GET_LOCK(%s, %s)", "SELECT RELEASE_LOCK(%s)", "SELECT GET_LOCK(%s, %s)"])
+
+
+class TestBacktest(unittest.TestCase):
+
+    def test_precision_lead_time_and_coverage(self):
+        import numpy as np
+        from engine.backtest import score_flag
+        hits = np.zeros((1, 12), dtype=bool)
+        events = np.zeros((1, 12), dtype=bool)
+        hits[0, [1, 7]] = True
+        events[0, [3, 10]] = True
+
+        row = score_flag(hits, events, np.ones((1, 12), dtype=bool), horizon=4, first_t=0, last_t=11)
+
+        self.assertEqual((row["hits"], row["precision"], row["median_lead_quarters"]), (2, 1.0, 2.5))
+        # The event at t=3 is left-censored; t=10 is preceded by the hit at t=7
+        self.assertEqual((row["events"], row["coverage"]), (1, 1.0))
+
+    def test_replay_matches_engine_and_point_in_time(self):
+        from datetime import timedelta
+        from engine.backtest import replay, backtest, quarter_end, available_periods
+
+        companies, histories = _random_universe(40)
+        panel = FinancialsPanel.from_histories(histories, companies)
+        periods = available_periods(panel)
+        hits = set(replay(companies, periods, histories=histories))
+        self.assertEqual({cid for code, cid, y, q in hits if code == "F5" and (y, q) == (2024, 2)},
+                         set(profit_collapse.check_batch(panel, "quarterly", 2024, 2)))
+
+        # Vintages filed 30 days after each period: point-in-time sees the same numbers
+        vintages = {}
+        for cid, history in histories.items():
+            rows = [dict(r, quarter=0) for r in history.annual.values()] + list(history.quarterly.values())
+            for r in rows:
+                filed = quarter_end(r["year"], r["quarter"] or 4) + timedelta(days=30)
+                vintages.setdefault(cid, {})[(r["year"], r["quarter"])] = ([filed], [r])
+        self.assertEqual(set(replay(companies, periods, vintages=vintages)), hits)
+
+        result = backtest(histories, companies, horizon=4)
+        codes = {(r["flag_code"], r["outcome"]) for r in result["rows"]}
+        self.assertIn(("ANY", "profit_collapse"), codes)
+        self.assertTrue(all(0 <= r["precision"] <= 1 and 0 <= r["coverage"] <= 1 for r in result["rows"]))
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def test_export_and_memory_mapped_panel(self):
+        import tempfile
+        import numpy as np
+        from benchmarks.synthetic import generate_universe
+        from benchmarks.local_db import create_database
+        from db.backends import connect
+        from engine import snapshot
+
+        companies, rows = generate_universe(25, quarters=16, seed=5)
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "u.sqlite")
+            create_database(db_path, companies, rows)
+            conn = connect("sqlite", db_path)
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO flag_definitions (flag_code, flag_name, params, is_active) VALUES (%s, %s, %s, %s)",
+                           ("F4", "Low Interest Coverage", '{"medium_severity_threshold": 3.0}', 0))
+            conn.commit()
+            root = os.path.join(tmp, "snapshots")
+            path = snapshot.export_snapshot(conn, root, version="v1")
+            histories = load_histories(conn)
+            conn.close()
+
+            # The root resolves to its LATEST snapshot
+            panel = snapshot.load_panel(root)
+            expected = FinancialsPanel.from_histories(histories, companies)
+
+            self.assertEqual(snapshot.resolve_snapshot(root), path)
+            self.assertEqual(sorted(os.listdir(root)), [snapshot.LATEST_FILE, "v1"])
+            self.assertIsInstance(panel.quarterly, np.memmap)
+            self.assertEqual(panel.tickers, expected.tickers)
+            for name in ("annual", "quarterly"):
+                self.assertTrue(np.array_equal(getattr(panel, name), getattr(expected, name), equal_nan=True))
+                self.assertTrue(np.array_equal(getattr(panel, f"{name}_present"), getattr(expected, f"{name}_present")))
+            self.assertEqual(snapshot.load_histories(root)[3].quarterly, histories[3].quarterly)
+            self.assertEqual(snapshot.load_flag_definitions(root),
+                             {"F4": ("Low Interest Coverage", {"medium_severity_threshold": 3.0}, False)})
+            self.assertEqual(snapshot.load_manifest(root)["rows"]["financials"], len(rows))
+            with self.assertRaises(FileExistsError):
+                snapshot.export_snapshot(connect("sqlite", db_path), root, version="v1")
+
+    def test_panel_arrays_drop_unknown_companies(self):
+        from engine.snapshot import build_panel_arrays
+        financials = {"company_id": [1, 9, 2], "year": [2024, 2024, 2023], "quarter": [0, 0, 3]}
+        financials.update({m: [100, 5, None] for m in FINANCIAL_COLUMNS})
+
+        arrays = build_panel_arrays([1, 2], financials)
+
+        self.assertEqual(arrays["years"].tolist(), [2023, 2024])
+        self.assertEqual(arrays["annual"][0, 1, 0], 100)
+        self.assertTrue(arrays["quarterly_present"][1, 2])
+        self.assertEqual(int(arrays["annual_present"].sum() + arrays["quarterly_present"].sum()), 2)
+
+
+class TestSectorIndex(unittest.TestCase):
+
+    def test_percentiles_and_small_sector_fallback(self):
+        from engine.sector_index import SectorIndex, build_distributions, ALL_SECTORS
+        sectors = {cid: "Banking" for cid in range(1, 7)}
+        sectors[7] = "Shipping"
+        scores = [0, 0, 15, 30, 45, 60, 90]
+        values = {cid: {"risk_score": score, "revenue_yoy": None} for cid, score in zip(range(1, 8), scores)}
+
+        distributions = build_distributions(sectors, values)
+        index = SectorIndex(distributions)
+
+        self.assertEqual(distributions[("Banking", "risk_score")], [0, 0, 15, 30, 45, 60])
+        self.assertNotIn(("Banking", "revenue_yoy"), distributions)
+        # Lower risk ranks higher: a clean company is at least as good as every peer
+        self.assertEqual(index.percentile("Banking", "risk_score", 0, lower_is_better=True), 100)
+        self.assertEqual(index.percentile("Banking", "risk_score", 45, lower_is_better=True), 33)
+        self.assertEqual(index.percentile("Banking", "risk_score", 45), 83)
+        self.assertEqual(index.median("Banking", "risk_score"), 22.5)
+        # One Shipping company: ranked against the whole universe instead
+        self.assertEqual(index.values("Shipping", "risk_score"), distributions[(ALL_SECTORS, "risk_score")])
+        self.assertIsNone(index.percentile("Banking", "revenue_yoy", 0.1))
+
+    def test_scoring_uses_sector_ranks(self):
+        from api.scoring import calculate_risk_score
+        from engine.sector_index import SectorIndex
+        index = SectorIndex({
+            ("Banking", "risk_score"): [0, 0, 0, 15, 30],
+            ("Banking", "category:Earnings Quality"): [7.0, 10.0, 10.0, 10.0, 10.0],
+        })
+        flags = [{"flag_code": "F1", "flag_name": "OCF vs PAT", "severity": "HIGH",
+                  "category": "Earnings Quality", "impact_weight": 8}]
+
+        data = calculate_risk_score(flags, "Banking", index)
+        plain = calculate_risk_score(flags)
+
+        self.assertEqual(data["predictive"]["sector_percentile"], 40)
+        self.assertEqual(data["structural_scores"]["Earnings Quality"], {"score": 7.0, "percentile": 20, "sector_median": 10.0})
+        self.assertIsNone(plain["predictive"]["sector_percentile"])
+        self.assertIsNone(plain["structural_scores"]["Earnings Quality"]["sector_median"])
+
+
+class TestBulkScoring(unittest.TestCase):
+
+    def test_bulk_matches_single_company_scoring(self):
+        from api.scoring import calculate_risk_score, calculate_risk_scores_bulk
+        from engine.sector_index import SectorIndex
+
+        def flag(code, year, quarter, category="Earnings Quality", impact=8, severity="HIGH"):
+            return {"flag_code": code, "flag_name": code, "severity": severity, "period_type": "quarterly",
+                    "fiscal_year": year, "fiscal_quarter": quarter, "category": category, "impact_weight": impact}
+
+        flags_by_company = {
+            1: [flag("F1", 2024, 1), flag("F2", 2024, 3, "Balance Sheet Stress", 3), flag("F1", 2023, 4)],
+            # Future periods move the anchor; an annual flag borrows the running quarter
+            2: [flag("F3", 2030, 2, "Liquidity"), flag("F4", 2031, 0, None, None, "CRITICAL"), flag("F5", None, 3)],
+            3: [],
+            4: [flag(f"F{i}", 2025, 1 + i % 4, "Governance") for i in range(10)],
+        }
+        sectors = {1: "Banking", 2: "Banking", 3: None, 4: "IT"}
+        index = SectorIndex({("Banking", "risk_score"): [0, 0, 15, 30, 45, 100]})
+
+        bulk = calculate_risk_scores_bulk(flags_by_company, sectors, index)
+
+        self.assertEqual(list(bulk), [1, 2, 3, 4])
+        for cid, flags in flags_by_company.items():
+            self.assertEqual(bulk[cid], calculate_risk_score(flags, sectors[cid], index))
+        self.assertEqual(bulk[4]["risk_score"], 100)
+        self.assertEqual(calculate_risk_scores_bulk({}), {})
+
+
+class TestScoreCache(unittest.TestCase):
+
+    def setUp(self):
+        from api import scoring
+        self.scoring = scoring
+        scoring.invalidate_score_cache()
+        self.flags = [{"flag_code": "F1", "flag_name": "OCF vs PAT", "severity": "HIGH", "fiscal_year": 2024,
+                       "fiscal_quarter": 2, "category": "Earnings Quality", "impact_weight": 8, "details": '{"x": 1}'}]
+
+    def _delta(self, before):
+        after = self.scoring.score_cache_stats()
+        return after["hits"] - before["hits"], after["misses"] - before["misses"]
+
+    def test_hits_misses_and_invalidation(self):
+        before = self.scoring.score_cache_stats()
+        first = self.scoring.cached_risk_score(self.flags)
+        again = self.scoring.cached_risk_score([dict(f) for f in self.flags])
+        other = self.scoring.cached_risk_score([dict(self.flags[0], severity="MEDIUM")])
+
+        self.assertEqual(self._delta(before), (1, 2))
+        self.assertEqual(first, self.scoring.calculate_risk_score(self.flags))
+        self.assertEqual(again, first)
+        self.assertEqual(other["timeline"][0]["severity"], "Medium")
+
+        # A newer engine run empties the cache; the same run id does not
+        self.assertTrue(self.scoring.invalidate_score_cache(5))
+        self.assertFalse(self.scoring.invalidate_score_cache(5))
+        self.assertFalse(self.scoring.invalidate_score_cache(4))
+        self.assertEqual(self.scoring.score_cache_stats()["size"], 0)
+
+    def test_lru_eviction_and_bulk(self):
+        with patch.object(self.scoring, "SCORE_CACHE_SIZE", 2):
+            flag_sets = {cid: [dict(self.flags[0], fiscal_quarter=cid)] for cid in (1, 2, 3)}
+            before = self.scoring.score_cache_stats()
+            bulk = self.scoring.cached_risk_scores_bulk(flag_sets)
+            # 1 was evicted, 3 is still cached
+            self.scoring.cached_risk_scores_bulk({3: flag_sets[3], 1: flag_sets[1]})
+            stats = self.scoring.score_cache_stats()
+
+        self.assertEqual(bulk, self.scoring.calculate_risk_scores_bulk(flag_sets))
+        self.assertEqual(self._delta(before), (1, 4))
+        self.assertEqual(stats["evictions"] - before["evictions"], 2)
+        self.assertEqual(stats["size"], 2)
+
+    def test_same_flag_codes_share_an_entry(self):
+        tcs = [dict(self.flags[0], company_id=1, message="TCS: OCF below PAT", ticker="TCS")]
+        infy = [dict(self.flags[0], company_id=2, message="INFY: OCF below PAT", ticker="INFY")]
+        before = self.scoring.score_cache_stats()
+        scored = self.scoring.cached_risk_scores_bulk({1: tcs, 2: infy})
+        single = self.scoring.cached_risk_score(infy, sector="IT")
+
+        # Scored once within the bulk call, then a hit for the single call
+        self.assertEqual(self._delta(before), (1, 1))
+        self.assertEqual(self.scoring.score_cache_stats()["size"], 1)
+        # Shared numbers, per-company enriched flags
+        self.assertEqual(scored, self.scoring.calculate_risk_scores_bulk({1: tcs, 2: infy}))
+        self.assertEqual(scored[1]["processed_flags"][0]["explanation"], "TCS: OCF below PAT")
+        self.assertEqual(scored[2]["processed_flags"][0]["ticker"], "INFY")
+        self.assertEqual(single, self.scoring.calculate_risk_score(infy, sector="IT"))
+
+
+class TestRiskHistory(unittest.TestCase):
+
+    def test_flags_as_of_and_windows(self):
+        from engine.risk_history import flags_as_of, complete_window, acceleration_index
+        flags = {1: [
+            {"flag_code": "Q", "fiscal_year": 2024, "fiscal_quarter": 2},
+            {"flag_code": "A", "fiscal_year": 2024, "fiscal_quarter": 0},
+            {"flag_code": "U", "fiscal_year": None, "fiscal_quarter": None},
+        ]}
+        # Annual flags count from Q4 of their fiscal year; undated flags always
+        self.assertEqual([f["flag_code"] for f in flags_as_of(flags, 2024, 3)[1]], ["Q", "U"])
+        self.assertEqual([f["flag_code"] for f in flags_as_of(flags, 2024, 4)[1]], ["Q", "A", "U"])
+
+        points = [{"year": 2023, "quarter": q, "risk_score": q} for q in (1, 2, 3, 4)] + \
+                 [{"year": 2024, "quarter": q, "risk_score": 10 * q} for q in (1, 2)]
+        self.assertEqual(complete_window(points), [1, 2, 3, 4, 10, 20])
+        self.assertIsNone(complete_window(points[:1] + points[2:] + [{"year": 2024, "quarter": 3, "risk_score": 0}]))
+        self.assertIsNone(complete_window(points[1:]))
+
+        self.assertEqual(acceleration_index([1, 2, 4, 8]), 2)
+        self.assertIsNone(acceleration_index([1, 2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
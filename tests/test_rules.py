@@ -0,0 +1,130 @@
+import unittest
+from unittest.mock import MagicMock
+import json
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from engine.panel import FinancialsPanel
+from engine.rules import compile_rule, RuleError
+from flags import get_all_flags, ocf_vs_pat, interest_coverage, profit_collapse
+from test_engine import _random_universe
+
+
+class TestRuleCompiler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.companies, histories = _random_universe(seed=11)
+        cls.panel = FinancialsPanel.from_histories(histories, cls.companies)
+
+    def _same_hits(self, rule, module, period_type="annual", quarter=None):
+        for year in (2019, 2021, 2024, 2025):
+            expected = module.check_batch(self.panel, period_type, year, quarter)
+            actual = rule.check_batch(self.panel, period_type, year, quarter)
+            self.assertEqual(sorted(actual), sorted(expected), f"{rule.FLAG_CODE} {period_type} {year}")
+            for cid, result in actual.items():
+                self.assertEqual(result["severity"], expected[cid]["severity"])
+        return actual
+
+    def test_window_rule_matches_ocf_vs_pat(self):
+        rule = compile_rule("X1", "OCF < PAT", {
+            "lookback": 3, "threshold_count": 2,
+            "rule": {"when": "count(operating_cash_flow < net_profit, lookback) >= threshold_count",
+                     "severity": "HIGH", "require_row": False},
+        })
+        self._same_hits(rule, ocf_vs_pat)
+
+    def test_severity_tiers_match_interest_coverage(self):
+        rule = compile_rule("X4", "Low Interest Coverage", {
+            "high": 1.5, "medium": 2.5,
+            "rule": {
+                "period_types": ["annual", "quarterly"],
+                "when": "ebit / interest_expense < medium",
+                "severity": [{"when": "ebit / interest_expense < high", "level": "HIGH"}, {"level": "MEDIUM"}],
+                "values": {"ratio": "ebit / interest_expense"},
+                "message": "{ticker}: coverage {ratio:.2f}x in {period}",
+            },
+        })
+        self._same_hits(rule, interest_coverage)
+        hits = self._same_hits(rule, interest_coverage, "quarterly", 3)
+        result = next(iter(hits.values()))
+        self.assertIn(" in FY2025 Q3", result["message"])
+        self.assertIn("ratio", result["details"])
+
+    def test_prev_matches_profit_collapse(self):
+        rule = compile_rule("X5", "Profit Collapse", json.dumps({
+            "drop_threshold": 0.5,
+            "rule": {"period_types": ["annual", "quarterly"], "severity": "HIGH",
+                     "when": "prev(net_profit) > 0 and net_profit < drop_threshold * prev(net_profit)"},
+        }))
+        self._same_hits(rule, profit_collapse)
+        self._same_hits(rule, profit_collapse, "quarterly", 2)
+
+    def _missing_panel(self):
+        """ACME has revenue 100 in 2023 and no 2024 row; BETA has a 2024 row with no revenue."""
+        from engine.history import CompanyHistory
+        acme, beta = CompanyHistory(1), CompanyHistory(2)
+        acme.annual[2023] = {"year": 2023, "revenue": 100}
+        beta.annual[2023] = {"year": 2023, "revenue": 100}
+        beta.annual[2024] = {"year": 2024, "revenue": None}
+        return FinancialsPanel.from_histories({1: acme, 2: beta}, [{"id": 1, "ticker": "ACME"}, {"id": 2, "ticker": "BETA"}])
+
+    def test_not_equal_is_false_when_missing(self):
+        panel = self._missing_panel()
+        rule = compile_rule("X", "X", {"rule": {"when": "revenue != 100"}})
+        self.assertEqual(rule.check_batch(panel, "annual", 2024), {})
+        self.assertEqual(rule.check_batch(panel, "annual", 2023), {})
+
+    def test_not_propagates_missing(self):
+        panel = self._missing_panel()
+        rule = compile_rule("X", "X", {"rule": {"when": "not (revenue > 50)"}})
+        self.assertEqual(rule.check_batch(panel, "annual", 2024), {})
+        # `or` is decided by its true side even when the other is missing
+        rule = compile_rule("X", "X", {"rule": {"when": "not (revenue > 50) or prev(revenue) == 100"}})
+        self.assertEqual(sorted(rule.check_batch(panel, "annual", 2024)), [2])
+
+    def test_company_without_row_does_not_fire(self):
+        panel = self._missing_panel()
+        rule = compile_rule("X", "X", {"rule": {"when": "prev(revenue) > 50"}})
+        self.assertEqual(sorted(rule.check_batch(panel, "annual", 2024)), [2])
+        rule = compile_rule("X", "X", {"rule": {"when": "prev(revenue) > 50", "require_row": False}})
+        self.assertEqual(sorted(rule.check_batch(panel, "annual", 2024)), [1, 2])
+
+    def test_rejects_unsafe_or_unknown_expressions(self):
+        for when in ("__import__('os').system('x')", "revenue.real > 0", "unknown_metric > 0",
+                     "revenue >", "count(revenue > 0, revenue)", "[1, 2]"):
+            with self.assertRaises(RuleError, msg=when):
+                compile_rule("X", "X", {"rule": {"when": when}})
+
+
+class TestFlagRegistry(unittest.TestCase):
+
+    def tearDown(self):
+        interest_coverage.configure({})
+
+    def test_definitions_configure_modules_and_add_rules(self):
+        conn = MagicMock()
+        cursor = MagicMock()
+        conn.cursor.return_value = cursor
+        cursor.fetchall.return_value = [
+            ("F2", "Negative FCF Streak", None, 0),
+            ("F4", "Low Interest Coverage", json.dumps({"medium_severity_threshold": 3.0}), 1),
+            ("F9", "Revenue Slump", json.dumps({"rule": {"when": "prev(revenue) > 0 and revenue < 0.5 * prev(revenue)"}}), 1),
+            ("F10", "Broken", json.dumps({"rule": {"when": "nope > 1"}}), 1),
+        ]
+
+        active = get_all_flags(conn)
+        codes = [m.FLAG_CODE for m in active]
+
+        self.assertNotIn("F2", codes)
+        self.assertEqual(codes[-1], "F9")
+        self.assertNotIn("F10", codes)
+        self.assertEqual(interest_coverage.MEDIUM_SEVERITY_THRESHOLD, 3.0)
+        self.assertEqual(interest_coverage.HIGH_SEVERITY_THRESHOLD, 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -67,7 +67,8 @@ export default function CompanyDetail() {
                             </div>
                         </div>
                         <div className="rem-density-row">
-                            <span>{predictive?.sector_percentile}th Percentile (Sector)</span>
+                            {/* No sector index yet: the API sends null */}
+                            <span>{predictive?.sector_percentile != null ? `${predictive.sector_percentile}th` : "-"} Percentile (Sector)</span>
                             <span className="mx-2 opacity-30">•</span>
                             <span>Accel: +{predictive?.acceleration} Qtrs</span>
                         </div>
@@ -282,10 +283,12 @@ export default function CompanyDetail() {
                                     </div>
                                     <div className="relative h-2 bg-slate-100 dark:bg-slate-800 rounded-full overflow-hidden">
                                         <div className="absolute inset-y-0 left-0 bg-blue-600 rounded-full transition-all duration-500" style={{ width: `${metric.percentile}%` }}></div>
-                                        {/* Sector Median Marker (V6) */}
-                                        <div className="absolute top-0 bottom-0 w-1 bg-slate-400/50 z-10" style={{ left: `${(metric.sector_median / 10) * 100}%` }} title={`Sector Median: ${metric.sector_median}`}></div>
+                                        {/* Sector Median Marker (V6), only when the sector index has a median */}
+                                        {metric.sector_median != null && (
+                                            <div className="absolute top-0 bottom-0 w-1 bg-slate-400/50 z-10" style={{ left: `${(metric.sector_median / 10) * 100}%` }} title={`Sector Median: ${metric.sector_median}`}></div>
+                                        )}
                                     </div>
-                                    <div className="text-[9px] text-slate-400 font-bold uppercase tracking-wider text-right">vs Sector Median ({metric.sector_median})</div>
+                                    <div className="text-[9px] text-slate-400 font-bold uppercase tracking-wider text-right">vs Sector Median ({metric.sector_median != null ? metric.sector_median : "-"})</div>
                                 </div>
                             ))}
                         </div>